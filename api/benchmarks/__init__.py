@@ -0,0 +1,4 @@
+"""
+MediScan Benchmarks
+Synthetic medicine-pack corpus and per-stage performance benchmarks
+"""
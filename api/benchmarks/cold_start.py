@@ -0,0 +1,151 @@
+"""
+Cold-Start Benchmark
+Measures import time, time-to-ready and time until the first fast /verify for a fresh server
+
+Usage (from the api/ directory):
+    python -m benchmarks.cold_start --requests 8
+    python -m benchmarks.cold_start --no-warmup --output var/benchmarks/cold-nowarm.json
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+import requests
+
+from .synthetic_packs import SyntheticPackGenerator, encode_jpeg
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_import(runs: int) -> List[float]:
+    """Seconds to `import main` in a fresh interpreter, per run"""
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return samples
+
+
+def wait_ready(base: str, launched: float, timeout: float) -> float:
+    """Poll /health until the server reports ready; seconds since launch"""
+    while time.perf_counter() - launched < timeout:
+        try:
+            response = requests.get(f"{base}/health", timeout=1)
+            if response.status_code == 200 and response.json().get("ready"):
+                return time.perf_counter() - launched
+        except requests.RequestException:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError("Server did not become ready in time")
+
+
+def fast_threshold(latencies: List[float], factor: float) -> Optional[float]:
+    """Latency considered 'warm': factor x median of the second half of the run"""
+    tail = latencies[len(latencies) // 2:]
+    if not tail:
+        return None
+    return float(np.median(tail)) * factor
+
+
+class ColdStartRun:
+    """Starts uvicorn in a subprocess and times it from launch to first fast request"""
+
+    def __init__(self, requests_count: int = 8, warmup: bool = True, seed: int = 99, fast_factor: float = 1.25):
+        self.requests_count = requests_count
+        self.warmup = warmup
+        self.fast_factor = fast_factor
+        # Distinct packs so the perceptual result cache never short-circuits a request
+        self.uploads = [encode_jpeg(p["image"]) for p in SyntheticPackGenerator(seed=seed).generate(requests_count)]
+
+    def run(self, timeout: float = 120.0) -> Dict[str, Any]:
+        port = free_port()
+        env = dict(os.environ, WARMUP_ENABLED="true" if self.warmup else "false")
+        base = f"http://127.0.0.1:{port}"
+
+        launched = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            ready_after = wait_ready(base, launched, timeout)
+            latencies = []
+            completed_after = []
+            for data in self.uploads:
+                start = time.perf_counter()
+                requests.post(f"{base}/verify", files=[("images", ("pack.jpg", data, "image/jpeg"))], timeout=timeout)
+                end = time.perf_counter()
+                latencies.append(end - start)
+                completed_after.append(end - launched)
+            health = requests.get(f"{base}/health", timeout=10).json()
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+        threshold = fast_threshold(latencies, self.fast_factor)
+        first_fast = next((i for i, t in enumerate(latencies) if threshold is not None and t <= threshold), None)
+
+        return {
+            "warmup": self.warmup,
+            "ready_after_launch_s": round(ready_after, 3),
+            "request_latencies_ms": [round(t * 1000, 1) for t in latencies],
+            "fast_threshold_ms": round(threshold * 1000, 1) if threshold else None,
+            "first_fast_request_index": first_fast,
+            "cold_start_to_first_fast_request_s": round(completed_after[first_fast], 3) if first_fast is not None else None,
+            "server_startup": health.get("startup"),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MediScan cold-start benchmark")
+    parser.add_argument("--requests", type=int, default=8, help="Sequential /verify requests after ready")
+    parser.add_argument("--import-runs", type=int, default=3, help="Fresh-interpreter `import main` timings")
+    parser.add_argument("--no-warmup", action="store_true", help="Start the server with WARMUP_ENABLED=false")
+    parser.add_argument("--output", default=None, help="JSON report path (default var/benchmarks/cold-<timestamp>.json)")
+    args = parser.parse_args()
+
+    imports = time_import(args.import_runs)
+    print(f"[cold-start] import main: {', '.join(f'{t * 1000:.0f} ms' for t in imports)}")
+
+    result = ColdStartRun(requests_count=args.requests, warmup=not args.no_warmup).run()
+    print(f"[cold-start] ready after launch: {result['ready_after_launch_s']} s")
+    print(f"[cold-start] request latencies (ms): {result['request_latencies_ms']}")
+    print(f"[cold-start] cold start to first fast request: {result['cold_start_to_first_fast_request_s']} s")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "cpu_count": os.cpu_count(),
+        },
+        "import_main_ms": [round(t * 1000, 1) for t in imports],
+        "server": result,
+    }
+
+    output = args.output or os.path.join(
+        "var", "benchmarks", f"cold-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
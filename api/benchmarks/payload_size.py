@@ -0,0 +1,228 @@
+"""
+Payload Size Benchmark
+Measures /verify response bytes (plain and gzipped) and serialization time for each encoding and view
+
+Usage (from the api/ directory):
+    python -m benchmarks.payload_size --packs 20 --repeat 50
+    python -m benchmarks.payload_size --results var/captured-verify.ndjson --fields status,risk_level,expiry_date
+
+"before" is the former path: VerificationResponse(**result), FastAPI's
+response_model serialization and the stdlib JSON encoder. The other rows
+render with services.response_encoding as /verify does now. --results
+takes captured /verify responses (a JSON object or list, or NDJSON)
+instead of the synthetic ones.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Any
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from services.response_encoding import encode_json, orjson, shape_response
+from .run_benchmarks import summarize
+from .synthetic_packs import SyntheticPackGenerator
+
+
+LOREM = (
+    "Batch recalled after the manufacturer reported a labelling mismatch. "
+    "The product is listed on the national drug portal with the same composition and strength. "
+)
+
+
+def synthetic_result(pack: Dict[str, Any], sources: int, rand: random.Random) -> Dict[str, Any]:
+    """A verification result shaped like VerificationPipeline output, with Tavily-backed upstream dicts"""
+    truth = pack["truth"]
+    tavily_sources = [
+        {
+            "title": f"{truth['product_name']} - {truth['manufacturer']} ({i + 1})",
+            "url": f"https://example.org/drugs/{truth['gtin13']}/{i}",
+            "snippet": (LOREM * 3)[:300],
+        }
+        for i in range(sources)
+    ]
+    gs1 = {
+        "found": True, "verified": True, "gtin": truth["gtin13"], "source": "Tavily AI Search",
+        "product_name": truth["product_name"], "company_name": truth["manufacturer"], "country": "India",
+        "ai_summary": LOREM * 2, "sources": tavily_sources, "cached": rand.random() < 0.5,
+    }
+    cdsco = {
+        "found": True, "source": "Tavily AI Search + CDSCO", "product_name": truth["product_name"],
+        "manufacturer": truth["manufacturer"], "approved": True, "license_number": f"KTK/25/{rand.randint(100, 999)}/P",
+        "ai_summary": LOREM * 2, "sources": tavily_sources, "warnings": [],
+    }
+    barcodes = [
+        {"type": "EAN13", "data": truth["gtin13"], "parsed": {"gtin": truth["gtin13"], "type": "EAN13"}},
+        {"type": "CODE128", "data": truth["gs1_128"], "parsed": {
+            "gtin": truth["gtin14"], "expiry_date": truth["expiry"].isoformat(),
+            "batch_number": truth["batch"], "serial_number": truth["serial"],
+        }},
+        {"type": "QRCODE", "data": truth["qr_payload"], "parsed": {
+            "gtin": truth["gtin14"], "batch_number": truth["batch"], "serial_number": truth["serial"],
+        }},
+    ]
+    text = "\n".join(pack["text_lines"])
+    expiry = truth["expiry"].isoformat()
+    return {
+        "status": "authentic", "risk_level": "low", "is_expired": False, "expiry_date": expiry,
+        "gtin": truth["gtin13"], "gtin_verified": True, "product_name": truth["product_name"],
+        "batch_number": truth["batch"], "manufacturer": truth["manufacturer"], "country": "India",
+        "risk_factors": [{"type": "packaging", "severity": "low", "description": "Print quality slightly below reference"}],
+        "recommendations": ["Medicine appears authentic", "Check the expiry date before dispensing"],
+        "details": {
+            "expiry_check": {"is_expired": False, "status": "valid", "expiry_date": expiry, "days_until_expiry": 540},
+            "gtin_check": {"verified": True, "source": gs1["source"]},
+            "product_consistency": {"consistent": True, "issues": []},
+            "batch_validity": {"valid": True, "issues": []},
+            "regulatory_warnings": [],
+            "packaging_issues": [],
+            "watchlist": {"flagged": False, "matches": []},
+            "batch_alerts": {"checked": True, "listed": False, "spurious": False, "matches": []},
+            "serial_check": {"checked": 1, "replays": []},
+        },
+        "raw_data": {
+            "barcodes": barcodes,
+            "ocr_texts": [
+                {"text_preview": text[:200] + "..." if len(text) > 200 else text, "quality_score": round(rand.uniform(0.5, 0.95), 3)}
+                for _ in range(3)
+            ],
+            "catalog": {"ocr_product_name": truth["product_name"], "matches": [
+                {"brand": truth["product_name"], "manufacturer": truth["manufacturer"], "score": 0.97}
+            ]},
+            "gs1_verification": gs1,
+            "cdsco_verification": cdsco,
+            "image_hashes": [f"{rand.getrandbits(64):016x}" for _ in range(3)],
+            "frames": [
+                {"index": i, "score": round(rand.uniform(0.3, 0.9), 3), "usable": True, "reasons": [],
+                 "selected": i < 2, "dropped": None}
+                for i in range(3)
+            ],
+            "cache": {"hit": False},
+            "sources_unavailable": [],
+            "memory": {"peak_mb": round(rand.uniform(80, 160), 1), "samples": {"after_decode": 92.4, "frame_0": 118.2}},
+            "trace_id": f"{rand.getrandbits(128):032x}",
+        },
+    }
+
+
+def load_results(path: str) -> List[Dict[str, Any]]:
+    """Captured /verify responses: a JSON object, a JSON list or NDJSON"""
+    with open(path) as f:
+        text = f.read().strip()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    return data if isinstance(data, list) else [data]
+
+
+def before_encoder() -> Callable[[Dict[str, Any]], bytes]:
+    """The former /verify path: model construction, response_model serialization, stdlib JSON"""
+    from main import VerificationResponse
+
+    field = create_model_field("Response_verify_medicine", VerificationResponse, mode="serialization")
+
+    def encode(result: Dict[str, Any]) -> bytes:
+        # serialize_response is a coroutine that never suspends for async
+        # handlers; step it directly instead of timing an event loop too
+        coro = serialize_response(field=field, response_content=VerificationResponse(**result))
+        try:
+            coro.send(None)
+        except StopIteration as done:
+            return JSONResponse(done.value).body
+        raise RuntimeError("serialize_response suspended")
+
+    return encode
+
+
+def measure(name: str, encode: Callable[[Dict[str, Any]], bytes], results: List[Dict[str, Any]],
+            repeat: int, gzip_level: int) -> Dict[str, Any]:
+    """Bytes per response (plain and gzipped) and encode/gzip time"""
+    encode_samples, gzip_samples = [], []
+    sizes, gzip_sizes = [], []
+    for r in range(repeat):
+        for result in results:
+            start = time.perf_counter()
+            body = encode(result)
+            encode_samples.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            packed = gzip.compress(body, compresslevel=gzip_level)
+            gzip_samples.append(time.perf_counter() - start)
+            if r == 0:
+                sizes.append(len(body))
+                gzip_sizes.append(len(packed))
+    return {
+        "variant": name,
+        "bytes_mean": round(sum(sizes) / len(sizes)),
+        "gzip_bytes_mean": round(sum(gzip_sizes) / len(gzip_sizes)),
+        "encode": summarize(encode_samples),
+        "gzip": summarize(gzip_samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MediScan /verify payload size benchmark")
+    parser.add_argument("--packs", type=int, default=20, help="Synthetic results to generate")
+    parser.add_argument("--sources", type=int, default=5, help="Tavily sources per upstream lookup")
+    parser.add_argument("--results", default=None, help="Captured /verify responses to use instead")
+    parser.add_argument("--fields", default="status,risk_level,is_expired,expiry_date,gtin,product_name,batch_number",
+                        help="fields= selection to measure")
+    parser.add_argument("--repeat", type=int, default=50, help="Repetitions per result")
+    parser.add_argument("--gzip-level", type=int, default=int(os.getenv("RESPONSE_GZIP_LEVEL", "6")))
+    parser.add_argument("--output", default=None, help="JSON report path (default var/benchmarks/payload-<timestamp>.json)")
+    args = parser.parse_args()
+
+    if args.results:
+        results = load_results(args.results)
+    else:
+        rand = random.Random(1234)
+        packs = SyntheticPackGenerator(seed=1234).generate(args.packs, augment=False)
+        results = [synthetic_result(p, args.sources, rand) for p in packs]
+
+    variants = [
+        ("before (pydantic + json)", before_encoder()),
+        ("full", lambda r: encode_json(shape_response(r, "full"))),
+        ("compact", lambda r: encode_json(shape_response(r, "compact"))),
+        ("fields", lambda r: encode_json(shape_response(r, fields=args.fields))),
+    ]
+    rows = []
+    for name, encode in variants:
+        row = measure(name, encode, results, args.repeat, args.gzip_level)
+        rows.append(row)
+        print(f"[payload] {name:>24}: {row['bytes_mean']:>6} B, gzip {row['gzip_bytes_mean']:>6} B, "
+              f"encode p50 {row['encode']['p50_ms']} ms, gzip p50 {row['gzip']['p50_ms']} ms")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "encoder": "orjson" if orjson is not None else "json",
+            "results": len(results),
+            "source": args.results or "synthetic",
+            "sources_per_lookup": None if args.results else args.sources,
+            "fields": args.fields,
+            "gzip_level": args.gzip_level,
+            "repeat": args.repeat,
+        },
+        "variants": rows,
+    }
+
+    output = args.output or os.path.join(
+        "var", "benchmarks", f"payload-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
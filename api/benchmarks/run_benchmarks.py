@@ -0,0 +1,260 @@
+"""
+Per-Stage Benchmark Suite
+Times the OCR, barcode and date-parsing stages and the full /verify path on a synthetic corpus
+
+Usage (from the api/ directory):
+    python -m benchmarks.run_benchmarks --count 20 --output var/benchmarks/run.json
+    python -m benchmarks.run_benchmarks --compare var/benchmarks/before.json var/benchmarks/after.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Any
+
+import cv2
+import numpy as np
+
+from .synthetic_packs import SyntheticPackGenerator, encode_jpeg, format_date, DATE_FORMATS
+
+ALL_STAGES = [
+    "preprocess_for_ocr",
+    "detect_and_decode",
+    "extract_text_from_image",
+    "extract_expiry_date",
+    "normalize_date",
+    "verify",
+]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency percentiles in milliseconds"""
+    arr = np.array(samples) * 1000.0
+    return {
+        "runs": len(samples),
+        "mean_ms": round(float(arr.mean()), 3),
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p95_ms": round(float(np.percentile(arr, 95)), 3),
+        "p99_ms": round(float(np.percentile(arr, 99)), 3),
+        "min_ms": round(float(arr.min()), 3),
+        "max_ms": round(float(arr.max()), 3),
+    }
+
+
+def time_calls(func: Callable[[Any], Any], inputs: List[Any], repeat: int) -> Dict[str, Any]:
+    """Call func on every input `repeat` times and summarize wall time"""
+    samples = []
+    outputs = []
+    for r in range(repeat):
+        for item in inputs:
+            start = time.perf_counter()
+            out = func(item)
+            samples.append(time.perf_counter() - start)
+            if r == 0:
+                outputs.append(out)
+    return {"timing": summarize(samples), "outputs": outputs}
+
+
+class BenchmarkSuite:
+    """Runs the selected stage benchmarks on one synthetic corpus"""
+
+    def __init__(self, count: int = 20, seed: int = 1234, repeat: int = 3, tesseract_cmd: Optional[str] = None):
+        self.count = count
+        self.seed = seed
+        self.repeat = repeat
+        self.tesseract_cmd = tesseract_cmd or os.getenv("TESSERACT_CMD") or shutil.which("tesseract")
+        self.packs = SyntheticPackGenerator(seed=seed).generate(count)
+
+    def run(self, stages: List[str]) -> Dict[str, Any]:
+        """Run stages and return the JSON-serializable report"""
+        report = {"meta": self._meta(), "stages": {}}
+
+        for stage in stages:
+            method = getattr(self, f"bench_{stage}")
+            print(f"[bench] {stage}...")
+            try:
+                report["stages"][stage] = method()
+            except Exception as e:
+                # Missing native deps (zbar, tesseract) skip a stage rather than abort the run
+                report["stages"][stage] = {"skipped": f"{type(e).__name__}: {e}"}
+            print(f"[bench] {stage}: {json.dumps(report['stages'][stage].get('timing', report['stages'][stage]))}")
+
+        return report
+
+    def bench_preprocess_for_ocr(self) -> Dict[str, Any]:
+        from services.image_processor import ImageProcessor
+
+        processor = ImageProcessor()
+        result = time_calls(processor.preprocess_for_ocr, [p["image"] for p in self.packs], self.repeat)
+        return {"timing": result["timing"]}
+
+    def bench_detect_and_decode(self) -> Dict[str, Any]:
+        from services.barcode_service import BarcodeService
+
+        service = BarcodeService()
+        result = time_calls(service.detect_and_decode, [p["image"] for p in self.packs], self.repeat)
+
+        found = {"ean13": 0, "gs1_128": 0, "qr": 0}
+        for pack, codes in zip(self.packs, result["outputs"]):
+            payloads = {c["raw_data"].replace("\x1d", "") for c in codes}
+            truth = pack["truth"]
+            found["ean13"] += truth["gtin13"] in payloads
+            found["gs1_128"] += truth["gs1_128"] in payloads
+            found["qr"] += truth["qr_payload"] in payloads
+
+        return {
+            "timing": result["timing"],
+            "accuracy": {k: round(v / len(self.packs), 3) for k, v in found.items()},
+        }
+
+    def bench_extract_text_from_image(self) -> Dict[str, Any]:
+        from services.ocr_service import OCRService
+
+        if not self.tesseract_cmd:
+            raise RuntimeError("tesseract binary not found (set TESSERACT_CMD)")
+
+        service = OCRService(tesseract_cmd=self.tesseract_cmd)
+        # Full multi-rotation OCR is slow; one pass per pack is enough for timing
+        result = time_calls(service.extract_text_from_image, [p["image"] for p in self.packs], 1)
+
+        hits = 0
+        for pack, text in zip(self.packs, result["outputs"]):
+            expiry = service.extract_expiry_date(text)
+            hits += bool(expiry) and expiry["date"].year == pack["truth"]["expiry"].year \
+                and expiry["date"].month == pack["truth"]["expiry"].month
+
+        return {"timing": result["timing"], "accuracy": {"expiry_month": round(hits / len(self.packs), 3)}}
+
+    def bench_extract_expiry_date(self) -> Dict[str, Any]:
+        from services.ocr_service import OCRService
+
+        service = OCRService()
+        texts = ["\n".join(p["text_lines"]) for p in self.packs]
+        result = time_calls(service.extract_expiry_date, texts, self.repeat * 10)
+
+        hits = 0
+        for pack, expiry in zip(self.packs, result["outputs"]):
+            truth = pack["truth"]["expiry"]
+            hits += bool(expiry) and expiry["date"].year == truth.year and expiry["date"].month == truth.month
+
+        return {"timing": result["timing"], "accuracy": {"expiry_month": round(hits / len(self.packs), 3)}}
+
+    def bench_normalize_date(self) -> Dict[str, Any]:
+        from services.ocr_service import OCRService
+
+        service = OCRService()
+        inputs = []
+        for pack in self.packs:
+            for fmt in DATE_FORMATS:
+                inputs.append((format_date(pack["truth"]["expiry"], fmt), pack["truth"]["expiry"]))
+
+        result = time_calls(lambda item: service._normalize_date(item[0]), inputs, self.repeat * 10)
+
+        by_format: Dict[str, List[int]] = {}
+        for (text, truth), parsed, fmt in zip(inputs, result["outputs"], DATE_FORMATS * len(self.packs)):
+            ok = bool(parsed) and parsed.year == truth.year and parsed.month == truth.month
+            by_format.setdefault(fmt, []).append(int(ok))
+
+        return {
+            "timing": result["timing"],
+            "accuracy": {fmt: round(sum(v) / len(v), 3) for fmt, v in by_format.items()},
+        }
+
+    def bench_verify(self) -> Dict[str, Any]:
+        from fastapi.testclient import TestClient
+        import main
+
+        uploads = [encode_jpeg(p["image"]) for p in self.packs]
+        samples = []
+        statuses: Dict[str, int] = {}
+
+        with TestClient(main.app) as client:
+            for data in uploads:
+                # Bypass the perceptual result cache so every request runs the full pipeline
+                if getattr(main, "result_cache", None) is not None:
+                    main.result_cache.clear()
+                start = time.perf_counter()
+                response = client.post("/verify", files=[("images", ("pack.jpg", data, "image/jpeg"))])
+                samples.append(time.perf_counter() - start)
+                key = str(response.status_code)
+                statuses[key] = statuses.get(key, 0) + 1
+
+        return {"timing": summarize(samples), "http_status": statuses}
+
+    def _meta(self) -> Dict[str, Any]:
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+            ).stdout.strip() or None
+        except Exception:
+            commit = None
+
+        return {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "opencv": cv2.__version__,
+            "cpu_count": os.cpu_count(),
+            "seed": self.seed,
+            "packs": self.count,
+            "repeat": self.repeat,
+            "tesseract": self.tesseract_cmd,
+        }
+
+
+def compare_reports(before: Dict[str, Any], after: Dict[str, Any]) -> List[str]:
+    """Human-readable p50/p95 deltas between two saved runs"""
+    lines = [f"{'stage':<26}{'p50 before':>12}{'p50 after':>12}{'delta':>9}{'p95 before':>12}{'p95 after':>12}{'delta':>9}"]
+    for stage in ALL_STAGES:
+        a = before.get("stages", {}).get(stage, {}).get("timing")
+        b = after.get("stages", {}).get(stage, {}).get("timing")
+        if not a or not b:
+            continue
+        d50 = (b["p50_ms"] - a["p50_ms"]) / a["p50_ms"] * 100 if a["p50_ms"] else 0.0
+        d95 = (b["p95_ms"] - a["p95_ms"]) / a["p95_ms"] * 100 if a["p95_ms"] else 0.0
+        lines.append(
+            f"{stage:<26}{a['p50_ms']:>12.2f}{b['p50_ms']:>12.2f}{d50:>8.1f}%"
+            f"{a['p95_ms']:>12.2f}{b['p95_ms']:>12.2f}{d95:>8.1f}%"
+        )
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MediScan per-stage benchmarks")
+    parser.add_argument("--count", type=int, default=20, help="Synthetic packs to generate")
+    parser.add_argument("--seed", type=int, default=1234, help="Corpus seed")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions per input")
+    parser.add_argument("--stages", nargs="+", choices=ALL_STAGES, default=ALL_STAGES)
+    parser.add_argument("--output", default=None, help="JSON report path (default var/benchmarks/<timestamp>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two saved reports")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            before = json.load(f)
+        with open(args.compare[1]) as f:
+            after = json.load(f)
+        print("\n".join(compare_reports(before, after)))
+        return
+
+    suite = BenchmarkSuite(count=args.count, seed=args.seed, repeat=args.repeat)
+    report = suite.run(args.stages)
+
+    output = args.output or os.path.join(
+        "var", "benchmarks", f"bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,381 @@
+"""
+Synthetic Medicine Pack Generator
+Renders deterministic blister strips and cartons with known text and barcode payloads
+"""
+
+import random
+from datetime import date
+from typing import List, Dict, Optional, Any, Tuple
+
+import cv2
+import numpy as np
+
+
+PRODUCTS = [
+    ("DOLO 650", "Paracetamol Tablets IP 650 mg", "Micro Labs Ltd"),
+    ("CROCIN ADVANCE", "Paracetamol Tablets IP 500 mg", "GlaxoSmithKline Pharmaceuticals Ltd"),
+    ("AZITHRAL 500", "Azithromycin Tablets IP 500 mg", "Alembic Pharmaceuticals Ltd"),
+    ("PAN 40", "Pantoprazole Gastro-resistant Tablets IP", "Alkem Laboratories Ltd"),
+    ("AUGMENTIN 625 DUO", "Amoxycillin and Potassium Clavulanate Tablets IP", "GlaxoSmithKline Pharmaceuticals Ltd"),
+    ("CALPOL 500", "Paracetamol Tablets IP 500 mg", "GlaxoSmithKline Pharmaceuticals Ltd"),
+    ("ALLEGRA 120", "Fexofenadine Hydrochloride Tablets IP 120 mg", "Sanofi India Ltd"),
+    ("MONTAIR LC", "Montelukast and Levocetirizine Tablets", "Cipla Ltd"),
+    ("THYRONORM 50", "Thyroxine Sodium Tablets IP 50 mcg", "Abbott India Ltd"),
+    ("SHELCAL 500", "Calcium and Vitamin D3 Tablets", "Torrent Pharmaceuticals Ltd"),
+    ("OMEZ 20", "Omeprazole Capsules IP 20 mg", "Dr. Reddy's Laboratories Ltd"),
+    ("ECOSPRIN 75", "Aspirin Gastro-resistant Tablets IP 75 mg", "USV Pvt Ltd"),
+    ("GLYCOMET 500", "Metformin Hydrochloride Tablets IP 500 mg", "USV Pvt Ltd"),
+    ("TELMA 40", "Telmisartan Tablets IP 40 mg", "Glenmark Pharmaceuticals Ltd"),
+    ("CIFRAN 500", "Ciprofloxacin Tablets IP 500 mg", "Sun Pharmaceutical Industries Ltd"),
+    ("ZINCOVIT", "Multivitamin and Zinc Tablets", "Apex Laboratories Pvt Ltd"),
+]
+
+MONTHS = ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+
+# Date renderings seen on Indian packs; {m} month number, {mon} month name, {y} year
+DATE_FORMATS = [
+    "{m:02d}/{y}",
+    "{m:02d}/{yy:02d}",
+    "{m:02d}-{y}",
+    "{m:02d}.{y}",
+    "{mon} {y}",
+    "{mon}.{yy:02d}",
+    "{mon}-{y}",
+    "{d:02d}/{m:02d}/{y}",
+    "{d:02d}-{m:02d}-{yy:02d}",
+]
+
+EXPIRY_LABELS = ["EXP.", "EXP", "Exp. Date", "EXPIRY", "Expiry Date:", "USE BEFORE"]
+MFG_LABELS = ["MFG.", "Mfd.", "MFG DATE", "Mfg. Dt."]
+BATCH_LABELS = ["B.No.", "Batch No.", "BATCH NO:", "LOT"]
+
+# EAN-13 element patterns
+_EAN_L = ["0001101", "0011001", "0010011", "0111101", "0100011",
+          "0110001", "0101111", "0111011", "0110111", "0001011"]
+_EAN_G = ["0100111", "0110011", "0011011", "0100001", "0011101",
+          "0111001", "0000101", "0010001", "0001001", "0010111"]
+_EAN_R = ["1110010", "1100110", "1101100", "1000010", "1011100",
+          "1001110", "1010000", "1000100", "1001000", "1110100"]
+_EAN_PARITY = ["LLLLLL", "LLGLGG", "LLGGLG", "LLGGGL", "LGLLGG",
+               "LGGLLG", "LGGGLL", "LGLGLG", "LGLGGL", "LGGLGL"]
+
+# Code 128 bar/space widths for symbol values 0..106 (106 = stop)
+_CODE128_WIDTHS = [
+    "212222", "222122", "222221", "121223", "121322", "131222", "122213", "122312", "132212", "221213",
+    "221312", "231212", "112232", "122132", "122231", "113222", "123122", "123221", "223211", "221132",
+    "221231", "213212", "223112", "312131", "311222", "321122", "321221", "312212", "322112", "322211",
+    "212123", "212321", "232121", "111323", "131123", "131321", "112313", "132113", "132311", "211313",
+    "231113", "231311", "112133", "112331", "132131", "113123", "113321", "133121", "313121", "211331",
+    "231131", "213113", "213311", "213131", "311123", "311321", "331121", "312113", "312311", "332111",
+    "314111", "221411", "431111", "111224", "111422", "121124", "121421", "141122", "141221", "112214",
+    "112412", "122114", "122411", "142112", "142211", "241211", "221114", "413111", "241112", "134111",
+    "111242", "121142", "121241", "114212", "124112", "124211", "411212", "421112", "421211", "212141",
+    "214121", "412121", "111143", "111341", "131141", "114113", "114311", "411113", "411311", "113141",
+    "114131", "311141", "411131", "211412", "211214", "211232", "2331112",
+]
+_C128_CODE_C = 99
+_C128_CODE_B = 100
+_C128_FNC1 = 102
+_C128_START_B = 104
+_C128_START_C = 105
+_C128_STOP = 106
+
+# Marker for the GS1 FNC1 separator inside element strings
+FNC1 = "\x1D"
+
+
+def gtin_check_digit(body: str) -> str:
+    """GS1 mod-10 check digit for a GTIN body (all digits but the last)"""
+    total = 0
+    for i, ch in enumerate(reversed(body)):
+        total += int(ch) * (3 if i % 2 == 0 else 1)
+    return str((10 - total % 10) % 10)
+
+
+def ean13_modules(gtin13: str) -> str:
+    """Module string (1 = bar) for an EAN-13 symbol"""
+    parity = _EAN_PARITY[int(gtin13[0])]
+    left = "".join(
+        (_EAN_L if p == "L" else _EAN_G)[int(d)] for p, d in zip(parity, gtin13[1:7])
+    )
+    right = "".join(_EAN_R[int(d)] for d in gtin13[7:])
+    return "101" + left + "01010" + right + "101"
+
+
+def code128_values(data: str) -> List[int]:
+    """
+    Encode a string into Code 128 symbol values using sets B and C
+
+    FNC1 characters in data are emitted as the FNC1 symbol, which makes a
+    leading FNC1 produce a GS1-128 symbol.
+    """
+    def digit_run(pos: int) -> int:
+        end = pos
+        while end < len(data) and data[end].isdigit():
+            end += 1
+        return end - pos
+
+    values: List[int] = []
+    i = 0
+    current = "C" if digit_run(1 if data.startswith(FNC1) else 0) >= 4 else "B"
+    values.append(_C128_START_C if current == "C" else _C128_START_B)
+
+    while i < len(data):
+        ch = data[i]
+        if ch == FNC1:
+            values.append(_C128_FNC1)
+            i += 1
+            continue
+
+        run = digit_run(i)
+        if current == "C":
+            if run >= 2:
+                values.append(int(data[i:i + 2]))
+                i += 2
+                continue
+            values.append(_C128_CODE_B)
+            current = "B"
+            continue
+
+        if run >= 4 and run % 2 == 0:
+            values.append(_C128_CODE_C)
+            current = "C"
+            continue
+        values.append(ord(ch) - 32)
+        i += 1
+
+    checksum = values[0]
+    for pos, value in enumerate(values[1:], start=1):
+        checksum += pos * value
+    values.append(checksum % 103)
+    values.append(_C128_STOP)
+    return values
+
+
+def code128_modules(data: str) -> str:
+    """Module string (1 = bar) for a Code 128 / GS1-128 symbol"""
+    modules = []
+    for value in code128_values(data):
+        bar = True
+        for width in _CODE128_WIDTHS[value]:
+            modules.append(("1" if bar else "0") * int(width))
+            bar = not bar
+    return "".join(modules)
+
+
+def render_linear(modules: str, module_px: int = 3, height: int = 120, quiet: int = 10,
+                  caption: Optional[str] = None) -> np.ndarray:
+    """Render a module string as a white-background grayscale barcode image"""
+    width = (len(modules) + 2 * quiet) * module_px
+    caption_h = 30 if caption else 0
+    img = np.full((height + caption_h, width), 255, np.uint8)
+
+    for idx, module in enumerate(modules):
+        if module == "1":
+            x = (idx + quiet) * module_px
+            img[:height, x:x + module_px] = 0
+
+    if caption:
+        cv2.putText(img, caption, (quiet * module_px, height + 24),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, 0, 2, cv2.LINE_AA)
+    return img
+
+
+def render_qr(payload: str, module_px: int = 5) -> np.ndarray:
+    """Render a QR code with OpenCV's encoder"""
+    encoder = cv2.QRCodeEncoder.create()
+    qr = encoder.encode(payload)
+    qr = cv2.resize(qr, None, fx=module_px, fy=module_px, interpolation=cv2.INTER_NEAREST)
+    return cv2.copyMakeBorder(qr, 4 * module_px, 4 * module_px, 4 * module_px, 4 * module_px,
+                              cv2.BORDER_CONSTANT, value=255)
+
+
+def format_date(value: date, fmt: str) -> str:
+    """Render a date with one of DATE_FORMATS"""
+    return fmt.format(d=value.day, m=value.month, y=value.year, yy=value.year % 100,
+                      mon=MONTHS[value.month - 1])
+
+
+class SyntheticPackGenerator:
+    """
+    Deterministic generator of labelled medicine-pack images
+
+    The same seed always yields the same packs, so benchmark runs on
+    different commits see an identical corpus.
+    """
+
+    def __init__(self, seed: int = 1234):
+        self.seed = seed
+        self.rand = random.Random(seed)
+        self.rng = np.random.default_rng(seed)
+
+    def generate(self, count: int, augment: bool = True) -> List[Dict[str, Any]]:
+        """
+        Generate a list of packs
+
+        Args:
+            count: Number of packs
+            augment: Apply rotation, blur, noise and glare
+
+        Returns:
+            List of dicts with "image" (BGR), "clean_image", "text_lines" and "truth"
+        """
+        return [self.generate_one(i, augment=augment) for i in range(count)]
+
+    def generate_one(self, index: int, augment: bool = True) -> Dict[str, Any]:
+        """Generate one pack"""
+        brand, generic, manufacturer = self.rand.choice(PRODUCTS)
+        kind = self.rand.choice(["strip", "carton"])
+
+        mfg = date(self.rand.randint(2023, 2025), self.rand.randint(1, 12), self.rand.randint(1, 28))
+        expiry = date(mfg.year + self.rand.randint(1, 3), mfg.month, min(mfg.day, 28))
+        expiry_fmt = self.rand.choice(DATE_FORMATS)
+        mfg_fmt = self.rand.choice(DATE_FORMATS)
+        batch = "".join(self.rand.choice("ABCDEFGHJKLMNPRSTUVWXYZ") for _ in range(2)) + \
+            "".join(self.rand.choice("0123456789") for _ in range(self.rand.randint(3, 5)))
+        serial = "".join(self.rand.choice("0123456789ABCDEF") for _ in range(10))
+
+        body = "890" + f"{self.rand.randint(1000, 9999)}" + f"{self.rand.randint(0, 99999):05d}"
+        gtin13 = body + gtin_check_digit(body)
+        gtin14 = "0" + gtin13
+        yymmdd = expiry.strftime("%y%m%d")
+
+        gs1_128 = f"{FNC1}01{gtin14}17{yymmdd}10{batch}{FNC1}21{serial}"
+        if self.rand.random() < 0.5:
+            qr_payload = f"(01){gtin14}(17){yymmdd}(10){batch}(21){serial}"
+        else:
+            qr_payload = f"https://id.gs1.org/01/{gtin14}/10/{batch}/21/{serial}"
+
+        text_lines = [
+            brand,
+            generic,
+            f"{self.rand.choice(BATCH_LABELS)} {batch}",
+            f"{self.rand.choice(MFG_LABELS)} {format_date(mfg, mfg_fmt)}",
+            f"{self.rand.choice(EXPIRY_LABELS)} {format_date(expiry, expiry_fmt)}",
+            f"M.R.P. Rs. {self.rand.randint(20, 400)}.00 incl. of all taxes",
+            f"Mfd. by: {manufacturer}",
+        ]
+
+        clean = self._render(kind, text_lines, gtin13, gs1_128, qr_payload)
+        image = self._augment(clean) if augment else clean.copy()
+
+        return {
+            "index": index,
+            "kind": kind,
+            "image": image,
+            "clean_image": clean,
+            "text_lines": text_lines,
+            "truth": {
+                "product_name": brand,
+                "manufacturer": manufacturer,
+                "batch": batch,
+                "serial": serial,
+                "expiry": expiry,
+                "mfg": mfg,
+                "expiry_text": format_date(expiry, expiry_fmt),
+                "expiry_format": expiry_fmt,
+                "gtin13": gtin13,
+                "gtin14": gtin14,
+                "gs1_128": gs1_128.replace(FNC1, ""),
+                "qr_payload": qr_payload,
+            },
+        }
+
+    def _render(self, kind: str, lines: List[str], gtin13: str, gs1_128: str, qr_payload: str) -> np.ndarray:
+        """Lay out text and symbols on a strip or carton background"""
+        if kind == "strip":
+            h, w = 620, 1100
+            base = np.array([self.rand.randint(185, 215)] * 3, np.float32)
+        else:
+            h, w = 760, 1100
+            base = np.array([self.rand.randint(150, 255) for _ in range(3)], np.float32)
+
+        # Soft vertical gradient so the background is not perfectly flat
+        ramp = np.linspace(0.9, 1.05, h, dtype=np.float32)[:, None, None]
+        canvas = np.clip(base[None, None, :] * ramp * np.ones((h, w, 1), np.float32), 0, 255).astype(np.uint8)
+
+        ink = (20, 20, 20) if kind == "strip" else (self.rand.randint(0, 60), self.rand.randint(0, 60), self.rand.randint(0, 90))
+        cv2.putText(canvas, lines[0], (40, 90), cv2.FONT_HERSHEY_DUPLEX, 2.2, ink, 4, cv2.LINE_AA)
+        cv2.putText(canvas, lines[1], (40, 145), cv2.FONT_HERSHEY_SIMPLEX, 0.9, ink, 2, cv2.LINE_AA)
+        y = 200
+        for line in lines[2:]:
+            cv2.putText(canvas, line, (40, y), cv2.FONT_HERSHEY_SIMPLEX, 0.95, ink, 2, cv2.LINE_AA)
+            y += 45
+
+        ean = render_linear(ean13_modules(gtin13), module_px=3, height=110, caption=gtin13)
+        gs1 = render_linear(code128_modules(gs1_128), module_px=2, height=90)
+        qr = render_qr(qr_payload, module_px=5)
+
+        self._paste(canvas, ean, (w - ean.shape[1] - 30, 30))
+        self._paste(canvas, qr, (w - qr.shape[1] - 40, 210))
+        self._paste(canvas, gs1, (40, h - gs1.shape[0] - 30))
+        return canvas
+
+    def _paste(self, canvas: np.ndarray, symbol: np.ndarray, origin: Tuple[int, int]):
+        """Paste a grayscale symbol, clipping at the canvas edge"""
+        x, y = origin
+        sh = min(symbol.shape[0], canvas.shape[0] - y)
+        sw = min(symbol.shape[1], canvas.shape[1] - x)
+        if sh <= 0 or sw <= 0:
+            return
+        canvas[y:y + sh, x:x + sw] = cv2.cvtColor(symbol[:sh, :sw], cv2.COLOR_GRAY2BGR)
+
+    def _augment(self, image: np.ndarray) -> np.ndarray:
+        """Camera-like distortions: rotation, blur, sensor noise, glare"""
+        img = image.copy()
+        h, w = img.shape[:2]
+
+        angle = self.rand.uniform(-8, 8)
+        if abs(angle) > 0.5:
+            M = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+            img = cv2.warpAffine(img, M, (w, h), borderMode=cv2.BORDER_REPLICATE)
+        if self.rand.random() < 0.15:
+            img = cv2.rotate(img, self.rand.choice([cv2.ROTATE_90_CLOCKWISE, cv2.ROTATE_180,
+                                                    cv2.ROTATE_90_COUNTERCLOCKWISE]))
+
+        blur = self.rand.choice([0, 0, 3, 5])
+        if blur:
+            img = cv2.GaussianBlur(img, (blur, blur), 0)
+
+        sigma = self.rand.uniform(0, 12)
+        if sigma > 1:
+            noise = self.rng.normal(0, sigma, img.shape).astype(np.float32)
+            img = np.clip(img.astype(np.float32) + noise, 0, 255).astype(np.uint8)
+
+        if self.rand.random() < 0.35:
+            hh, ww = img.shape[:2]
+            cx, cy = self.rand.randint(0, ww), self.rand.randint(0, hh)
+            radius = self.rand.randint(min(hh, ww) // 8, min(hh, ww) // 3)
+            yy, xx = np.ogrid[:hh, :ww]
+            dist = np.sqrt((xx - cx) ** 2 + (yy - cy) ** 2)
+            glare = np.clip(1 - dist / radius, 0, 1) ** 2 * self.rand.uniform(120, 230)
+            img = np.clip(img.astype(np.float32) + glare[..., None], 0, 255).astype(np.uint8)
+
+        return img
+
+
+def encode_jpeg(image: np.ndarray, quality: int = 90) -> bytes:
+    """JPEG-encode a generated image for upload benchmarks"""
+    ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return buf.tobytes()
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description="Write a synthetic medicine-pack corpus to disk")
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", default="var/synthetic_packs")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    generator = SyntheticPackGenerator(seed=args.seed)
+    for pack in generator.generate(args.count):
+        path = os.path.join(args.out, f"pack_{pack['index']:04d}.jpg")
+        with open(path, "wb") as f:
+            f.write(encode_jpeg(pack["image"]))
+        print(f"{path}: {pack['truth']['product_name']} EXP {pack['truth']['expiry_text']} GTIN {pack['truth']['gtin13']}")
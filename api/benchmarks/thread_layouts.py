@@ -0,0 +1,169 @@
+"""
+Thread Layout Benchmark
+Measures /verify throughput of a multi-worker server under different worker/OpenCV/tesseract thread layouts
+
+Usage (from the api/ directory):
+    python -m benchmarks.thread_layouts --layouts 1:4:4 2:2:1 4:1:1 ungoverned --seconds 30
+    python -m benchmarks.thread_layouts --clients 8 --output var/benchmarks/layouts.json
+
+A layout is WORKERS:OPENCV_THREADS:OMP_THREADS, "WORKERS" alone for the
+resource governor's own plan, or "ungoverned" for library defaults.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Any
+
+import requests
+
+from services.resource_governor import ResourceGovernor
+from .cold_start import free_port, wait_ready
+from .run_benchmarks import summarize
+from .synthetic_packs import SyntheticPackGenerator, encode_jpeg
+
+
+def layout_env(layout: str) -> Dict[str, str]:
+    """Server environment for one layout spec"""
+    if layout == "ungoverned":
+        return {"RESOURCE_GOVERNOR_ENABLED": "false", "WEB_CONCURRENCY": str(os.cpu_count() or 1)}
+    parts = layout.split(":")
+    env = {"RESOURCE_GOVERNOR_ENABLED": "true", "WEB_CONCURRENCY": parts[0]}
+    if len(parts) == 3:
+        env["OPENCV_THREADS"] = parts[1]
+        env["OMP_THREAD_LIMIT"] = parts[2]
+    return env
+
+
+class LayoutRun:
+    """Starts uvicorn with one layout and drives /verify from concurrent clients"""
+
+    def __init__(self, uploads: List[bytes], clients: int = 4, seconds: float = 30.0):
+        self.uploads = uploads
+        self.clients = clients
+        self.seconds = seconds
+
+    def run(self, layout: str, timeout: float = 180.0) -> Dict[str, Any]:
+        port = free_port()
+        base = f"http://127.0.0.1:{port}"
+        env = dict(os.environ, **layout_env(layout), WARMUP_ENABLED="true")
+        # Distinct packs every request: measure the pipeline, not the result cache
+        env["RESULT_CACHE_TTL"] = "0"
+        for name in ("OPENCV_THREADS", "OMP_THREAD_LIMIT"):
+            if name not in layout_env(layout):
+                env.pop(name, None)
+
+        launched = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", env["WEB_CONCURRENCY"], "--log-level", "warning"],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_ready(base, launched, timeout)
+            health = requests.get(f"{base}/health", timeout=10).json()
+            latencies, errors, elapsed = self._load(base)
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+        return {
+            "layout": layout,
+            "env": layout_env(layout),
+            "resources": health.get("resources"),
+            "requests": len(latencies),
+            "errors": errors,
+            "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else None,
+            "latency": summarize(latencies) if latencies else None,
+        }
+
+    def _load(self, base: str):
+        latencies: List[float] = []
+        errors = [0]
+        lock = threading.Lock()
+        deadline = time.perf_counter() + self.seconds
+
+        def client(offset: int):
+            session = requests.Session()
+            i = offset
+            while time.perf_counter() < deadline:
+                data = self.uploads[i % len(self.uploads)]
+                i += self.clients
+                start = time.perf_counter()
+                try:
+                    response = session.post(f"{base}/verify", files=[("images", ("pack.jpg", data, "image/jpeg"))], timeout=120)
+                    ok = response.status_code == 200
+                except requests.RequestException:
+                    ok = False
+                with lock:
+                    if ok:
+                        latencies.append(time.perf_counter() - start)
+                    else:
+                        errors[0] += 1
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client, args=(n,)) for n in range(self.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, errors[0], time.perf_counter() - started
+
+
+def main():
+    cpus = ResourceGovernor().cpus
+    default_layouts = ["ungoverned", "1", f"1:{cpus}:{cpus}"]
+    if cpus > 1:
+        default_layouts += [str(cpus // 2), f"{cpus}:1:1"]
+
+    parser = argparse.ArgumentParser(description="MediScan thread layout benchmark")
+    parser.add_argument("--layouts", nargs="+", default=default_layouts,
+                        help="WORKERS:OPENCV_THREADS:OMP_THREADS, WORKERS (governor plan) or 'ungoverned'")
+    parser.add_argument("--clients", type=int, default=max(2, cpus), help="Concurrent /verify clients")
+    parser.add_argument("--seconds", type=float, default=30.0, help="Load duration per layout")
+    parser.add_argument("--packs", type=int, default=32, help="Distinct synthetic packs to cycle through")
+    parser.add_argument("--output", default=None, help="JSON report path (default var/benchmarks/layouts-<timestamp>.json)")
+    args = parser.parse_args()
+
+    uploads = [encode_jpeg(p["image"]) for p in SyntheticPackGenerator(seed=7).generate(args.packs)]
+    runner = LayoutRun(uploads, clients=args.clients, seconds=args.seconds)
+
+    results = []
+    for layout in args.layouts:
+        result = runner.run(layout)
+        results.append(result)
+        latency = result["latency"] or {}
+        print(f"[layouts] {layout:>12}: {result['throughput_rps']} req/s, "
+              f"p50 {latency.get('p50_ms')} ms, p95 {latency.get('p95_ms')} ms, {result['errors']} errors")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "cpu_count": os.cpu_count(),
+            "cpus_available": cpus,
+            "clients": args.clients,
+            "seconds": args.seconds,
+        },
+        "layouts": results,
+    }
+
+    output = args.output or os.path.join(
+        "var", "benchmarks", f"layouts-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,6 @@
+"""
+Test Configuration
+pytest collects api/tests; test_tavily.py is a manual check against the live Tavily API, not a test module
+"""
+
+collect_ignore = ["test_tavily.py"]
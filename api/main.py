@@ -3,22 +3,52 @@ MediScan API v2 - Medicine Expiry and Authenticity Detection
 Enhanced version with web scraping, multi-image support, and authenticity checking
 """
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import time
+
+# Reference point for cold-start timing (before the heavy imports below)
+PROCESS_STARTED_AT = time.perf_counter()
+
+from fastapi import FastAPI, UploadFile, File, Form, Query, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager, nullcontext
 from typing import List, Optional
 from pydantic import BaseModel
 import numpy as np
-import cv2
+import functools
 import os
-from datetime import date
+import json
 
 # Import our custom services
-from services.barcode_service import BarcodeService, detect_barcodes_multi_image
-from services.ocr_service import OCRService, extract_text_multi_image
-from services.gs1_scraper import GS1Scraper, verify_barcode
-from services.cdsco_scraper import CDSCOScraper, verify_drug_regulatory
-from services.authenticity_checker import AuthenticityChecker, verify_authenticity
-from services.image_processor import ImageProcessor
+from services.container import ServiceContainer
+from services.gs1_registry import get_gs1_registry
+from services.gs1_scraper import verify_barcodes_bulk
+from services.watchlist import get_watchlist
+from services.batch_alerts import get_batch_alert_index
+from services.cdsco_index import get_cdsco_index
+from services.serial_registry import get_serial_registry
+from services.drug_catalog import get_drug_catalog
+from services.scan_history import get_scan_history
+from services.scan_analytics import get_scan_analytics
+from services.circuit_breaker import breaker_stats
+from services.resource_governor import ResourceGovernor
+from services.admission import AdmissionController, AdmissionRejected
+from services.prewarm import Prewarmer, collect_prewarm_lists, prewarm_items
+from services.verification_pipeline import VerificationPipeline, decode_image_bytes
+from services.job_queue import JobQueue, QueueFullError
+from services.result_cache import ResultCache
+from services.cache_backend import get_shared_backend
+from services.response_encoding import (
+    FastJSONResponse, ResponseCompressionMiddleware, parse_fields, shape_response,
+)
+from services.upload_ingest import UploadIngestor, UploadLimitError, MemoryTracker
+from services.profiler import RequestProfiler, ContinuousProfiler, PROFILE_MODES
+from services.tracing import Tracer, OTLPJsonExporter
+from services.metrics import (
+    INFLIGHT_VERIFICATIONS, JOB_QUEUE_DEPTH, VERIFY_REQUESTS, WORKER_POOL_BUSY, WORKER_POOL_SIZE,
+    render_metrics, time_stage,
+)
 
 # Configure Tesseract path
 pytesseract_cmd = os.getenv(
@@ -26,11 +56,295 @@ pytesseract_cmd = os.getenv(
     r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 )
 
+# Upload limits (per file, per request, image count)
+MAX_UPLOAD_FILES = int(os.getenv("MAX_UPLOAD_FILES", "10"))
+MAX_UPLOAD_FILE_BYTES = int(os.getenv("MAX_UPLOAD_FILE_BYTES", str(15 * 1024 * 1024)))
+MAX_UPLOAD_TOTAL_BYTES = int(os.getenv("MAX_UPLOAD_TOTAL_BYTES", str(60 * 1024 * 1024)))
+
+ingestor = UploadIngestor(
+    max_files=MAX_UPLOAD_FILES,
+    max_file_bytes=MAX_UPLOAD_FILE_BYTES,
+    max_total_bytes=MAX_UPLOAD_TOTAL_BYTES,
+)
+
+# CPU layout: OpenCV/tesseract threads and the job pool are sized from the
+# cores (and cgroup quota) left to this worker after WEB_CONCURRENCY workers
+RESOURCE_GOVERNOR_ENABLED = os.getenv("RESOURCE_GOVERNOR_ENABLED", "true").lower() in ("1", "true", "yes")
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+RESOURCE_CPUS = int(os.getenv("RESOURCE_CPUS", "0")) or None
+RESOURCE_PIN_WORKERS = os.getenv("RESOURCE_PIN_WORKERS", "false").lower() in ("1", "true", "yes")
+RESOURCE_GOVERNOR_DIR = os.getenv("RESOURCE_GOVERNOR_DIR", "var/governor")
+
+resource_governor = ResourceGovernor(
+    workers=WEB_CONCURRENCY,
+    cpus=RESOURCE_CPUS,
+    job_workers=int(os.getenv("JOB_WORKERS", "0")) or None,
+    request_slots=int(os.getenv("ADMISSION_MAX_CONCURRENCY", "0")) or None,
+    pin=RESOURCE_PIN_WORKERS,
+    data_dir=RESOURCE_GOVERNOR_DIR,
+)
+if RESOURCE_GOVERNOR_ENABLED:
+    resource_governor.apply()
+
+# Admission control for /verify: an AIMD-adapted concurrency limit (capped by
+# the governor's plan) with a short bounded queue; beyond it requests get 429
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "0")) or resource_governor.layout["request_slots"]
+ADMISSION_MIN_CONCURRENCY = int(os.getenv("ADMISSION_MIN_CONCURRENCY", "1"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "16"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "10"))
+ADMISSION_TARGET_LATENCY_SECONDS = float(os.getenv("ADMISSION_TARGET_LATENCY_SECONDS", "5"))
+
+verify_admission = AdmissionController(
+    name="verify",
+    max_limit=ADMISSION_MAX_CONCURRENCY,
+    min_limit=ADMISSION_MIN_CONCURRENCY,
+    max_queue=ADMISSION_MAX_QUEUE,
+    queue_timeout=ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    target_latency=ADMISSION_TARGET_LATENCY_SECONDS,
+)
+
+# Response compression: gzip when the client accepts it and the body is at
+# least RESPONSE_GZIP_MIN_BYTES; level 1-9 trades CPU for size
+RESPONSE_GZIP_MIN_BYTES = int(os.getenv("RESPONSE_GZIP_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+
+# Background job queue settings
+JOB_QUEUE_DIR = os.getenv("JOB_QUEUE_DIR", "var/jobs")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "0")) or (
+    resource_governor.layout["job_workers"] if RESOURCE_GOVERNOR_ENABLED else 2
+)
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "100"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_RETRY_AFTER_SECONDS = 5
+JOB_MAX_LONG_POLL_SECONDS = 30
+
+# Result cache for re-scanned packs: identical pixels hit directly; a
+# near-identical photo (dHash within RESULT_CACHE_MAX_DISTANCE bits) only
+# when its batch/expiry barcodes decode to the same payloads
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "3600"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1024"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_MAX_DISTANCE = int(os.getenv("RESULT_CACHE_MAX_DISTANCE", "6"))
+
+result_cache = ResultCache(
+    ttl_seconds=RESULT_CACHE_TTL,
+    max_entries=RESULT_CACHE_MAX_ENTRIES,
+    max_bytes=RESULT_CACHE_MAX_BYTES,
+    max_distance=RESULT_CACHE_MAX_DISTANCE,
+    backend=get_shared_backend(),
+)
+
+# Frames analysed per request after duplicate/quality pruning
+MAX_ANALYSIS_FRAMES = int(os.getenv("MAX_ANALYSIS_FRAMES", "4"))
+
+# Warm OCR/barcode once at startup so the first request is not the slow one
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Offline GS1 registry: company-prefix CSVs dropped into GS1_REGISTRY_DIR/drops
+GS1_REGISTRY_REFRESH_SECONDS = float(os.getenv("GS1_REGISTRY_REFRESH_SECONDS", "300"))
+gs1_registry = get_gs1_registry()
+
+# Bulk GTIN verification: request size cap and concurrent upstream lookups
+BULK_VERIFY_MAX_GTINS = int(os.getenv("BULK_VERIFY_MAX_GTINS", "10000"))
+BULK_VERIFY_CONCURRENCY = int(os.getenv("BULK_VERIFY_CONCURRENCY", "4"))
+
+# Counterfeit watchlist: CSVs in WATCHLIST_DIR, recompiled when they change.
+# Cached verdicts predate the new terms, so they are dropped on every rebuild.
+WATCHLIST_REFRESH_SECONDS = float(os.getenv("WATCHLIST_REFRESH_SECONDS", "60"))
+watchlist = get_watchlist()
+watchlist.add_listener(result_cache.clear)
+
+# CDSCO NSQ/spurious/recall batch lists dropped into BATCH_ALERTS_DIR/drops
+BATCH_ALERTS_REFRESH_SECONDS = float(os.getenv("BATCH_ALERTS_REFRESH_SECONDS", "3600"))
+batch_alerts = get_batch_alert_index()
+batch_alerts.add_listener(result_cache.clear)
+
+# CDSCO approved-drug and licence lists dropped into CDSCO_INDEX_DIR/drops
+CDSCO_INDEX_REFRESH_SECONDS = float(os.getenv("CDSCO_INDEX_REFRESH_SECONDS", "86400"))
+cdsco_index = get_cdsco_index()
+cdsco_index.add_listener(result_cache.clear)
+
+# Scanned GTIN+serial pairs for cloned-code detection, compacted daily
+SERIAL_REGISTRY_COMPACT_SECONDS = float(os.getenv("SERIAL_REGISTRY_COMPACT_SECONDS", "86400"))
+serial_registry = get_serial_registry()
+
+# Local brand/generic catalog (CSVs in DRUG_CATALOG_DIR) for OCR product names
+DRUG_CATALOG_REFRESH_SECONDS = float(os.getenv("DRUG_CATALOG_REFRESH_SECONDS", "300"))
+drug_catalog = get_drug_catalog()
+drug_catalog.add_listener(result_cache.clear)
+
+# Audit trail of every verification, written behind the request path into
+# one SQLite file per day under SCAN_HISTORY_DIR
+SCAN_HISTORY_ENABLED = os.getenv("SCAN_HISTORY_ENABLED", "true").lower() in ("1", "true", "yes")
+scan_history = get_scan_history() if SCAN_HISTORY_ENABLED else None
+
+# Minute/hour/day rollups for /analytics, updated from each written history batch
+scan_analytics = None
+if scan_history is not None:
+    scan_analytics = get_scan_analytics()
+    scan_history.add_listener(scan_analytics.apply)
+
+# Long-lived service instances, built and warmed up in lifespan()
+services = ServiceContainer(tesseract_cmd=pytesseract_cmd, started_at=PROCESS_STARTED_AT)
+
+# Cache pre-warming: POST /admin/prewarm (or the services.prewarm CLI), and
+# optionally re-run every PREWARM_INTERVAL_SECONDS from PREWARM_FILE, the
+# PREWARM_HISTORY_LIMIT most scanned GTINs/products of the last
+# PREWARM_HISTORY_DAYS days, and/or (PREWARM_REGISTRY) the GS1 registry's
+# licensees under PREWARM_REGISTRY_PREFIXES (comma-separated; empty for all).
+# With WEB_CONCURRENCY > 1 one worker (elected by a lock in PREWARM_DIR) runs
+# the schedule, and a pass warms only the caches of the worker running it
+# unless CACHE_BACKEND is shared (sqlite or redis)
+PREWARM_DIR = os.getenv("PREWARM_DIR", "var/prewarm")
+PREWARM_CONCURRENCY = int(os.getenv("PREWARM_CONCURRENCY", "4"))
+PREWARM_RATE_PER_SECOND = float(os.getenv("PREWARM_RATE_PER_SECOND", "2"))
+PREWARM_MAX_ITEMS = int(os.getenv("PREWARM_MAX_ITEMS", "100000"))
+PREWARM_FILE = os.getenv("PREWARM_FILE")
+PREWARM_INTERVAL_SECONDS = float(os.getenv("PREWARM_INTERVAL_SECONDS", "0"))
+PREWARM_HISTORY_DAYS = float(os.getenv("PREWARM_HISTORY_DAYS", "0"))
+PREWARM_HISTORY_LIMIT = int(os.getenv("PREWARM_HISTORY_LIMIT", "500"))
+PREWARM_REGISTRY = os.getenv("PREWARM_REGISTRY", "false").lower() == "true"
+PREWARM_REGISTRY_PREFIXES = [p.strip() for p in os.getenv("PREWARM_REGISTRY_PREFIXES", "").split(",") if p.strip()]
+PREWARM_REGISTRY_LIMIT = int(os.getenv("PREWARM_REGISTRY_LIMIT", "500"))
+
+prewarmer = Prewarmer(
+    services,
+    data_dir=PREWARM_DIR,
+    concurrency=PREWARM_CONCURRENCY,
+    rate_per_second=PREWARM_RATE_PER_SECOND,
+)
+
+pipeline = VerificationPipeline(
+    tesseract_cmd=pytesseract_cmd,
+    result_cache=result_cache,
+    max_frames=MAX_ANALYSIS_FRAMES,
+    services=services,
+    watchlist=watchlist,
+    batch_alerts=batch_alerts,
+    serial_registry=serial_registry,
+    catalog=drug_catalog,
+    history=scan_history,
+)
+
+# Tracing: OTLP/JSON to a file and/or a local collector; off when neither is set
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE")
+TRACE_EXPORT_ENDPOINT = os.getenv("TRACE_EXPORT_ENDPOINT")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+
+trace_exporter = None
+if TRACE_EXPORT_FILE or TRACE_EXPORT_ENDPOINT:
+    trace_exporter = OTLPJsonExporter(file_path=TRACE_EXPORT_FILE, endpoint=TRACE_EXPORT_ENDPOINT)
+
+tracer = Tracer(exporter=trace_exporter, sample_rate=TRACE_SAMPLE_RATE)
+
+
+def run_verification_job(images: list) -> dict:
+    """Job queue handler: verify stored uploads inside a trace"""
+    with tracer.start_trace("job verify", attributes={"image_count": len(images)}):
+        return pipeline.verify_image_bytes(images)
+
+
+job_queue = JobQueue(
+    handler=run_verification_job,
+    data_dir=JOB_QUEUE_DIR,
+    max_workers=JOB_WORKERS,
+    max_queued=JOB_MAX_QUEUED,
+    max_attempts=JOB_MAX_ATTEMPTS,
+    lease_seconds=JOB_LEASE_SECONDS,
+)
+
+# Queue gauges are read at scrape time rather than updated on every job
+JOB_QUEUE_DEPTH.set_function(job_queue.queued_count)
+WORKER_POOL_BUSY.set_function(job_queue.busy_workers, pool="jobs")
+WORKER_POOL_SIZE.set_function(lambda: job_queue.max_workers, pool="jobs")
+
+# Opt-in request profiling (?profile=1 or X-MediScan-Profile header)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILING_DIR = os.getenv("PROFILING_DIR", "var/profiles")
+PROFILING_MODE = os.getenv("PROFILING_MODE", "sample")
+PROFILING_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILING_SAMPLE_INTERVAL_MS", "5"))
+
+# Process-wide continuous sampling; 0 Hz disables it
+CONTINUOUS_PROFILING_HZ = float(os.getenv("CONTINUOUS_PROFILING_HZ", "0"))
+CONTINUOUS_PROFILING_WINDOW_SECONDS = float(os.getenv("CONTINUOUS_PROFILING_WINDOW_SECONDS", "60"))
+CONTINUOUS_PROFILING_KEEP = int(os.getenv("CONTINUOUS_PROFILING_KEEP", "60"))
+
+request_profiler = RequestProfiler(
+    output_dir=PROFILING_DIR,
+    mode=PROFILING_MODE,
+    sample_interval=PROFILING_SAMPLE_INTERVAL_MS / 1000.0,
+)
+
+continuous_profiler = None
+if CONTINUOUS_PROFILING_HZ > 0:
+    continuous_profiler = ContinuousProfiler(
+        output_dir=os.path.join(PROFILING_DIR, "continuous"),
+        window_seconds=CONTINUOUS_PROFILING_WINDOW_SECONDS,
+        hz=CONTINUOUS_PROFILING_HZ,
+        keep=CONTINUOUS_PROFILING_KEEP,
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build and warm up services, then start background workers"""
+    await run_in_threadpool(gs1_registry.refresh_from_drops)
+    gs1_registry.start_watcher(GS1_REGISTRY_REFRESH_SECONDS)
+    await run_in_threadpool(watchlist.refresh)
+    watchlist.start_watcher(WATCHLIST_REFRESH_SECONDS)
+    await run_in_threadpool(batch_alerts.refresh_from_drops)
+    batch_alerts.start_watcher(BATCH_ALERTS_REFRESH_SECONDS)
+    await run_in_threadpool(cdsco_index.refresh_from_drops)
+    cdsco_index.start_watcher(CDSCO_INDEX_REFRESH_SECONDS)
+    serial_registry.start_compactor(SERIAL_REGISTRY_COMPACT_SECONDS)
+    await run_in_threadpool(drug_catalog.refresh)
+    drug_catalog.start_watcher(DRUG_CATALOG_REFRESH_SECONDS)
+    await run_in_threadpool(services.start, WARMUP_ENABLED)
+    if scan_history is not None:
+        scan_history.start()
+    if trace_exporter is not None:
+        trace_exporter.start()
+    job_queue.start()
+    if PREWARM_INTERVAL_SECONDS > 0 and (PREWARM_FILE or PREWARM_HISTORY_DAYS > 0 or PREWARM_REGISTRY):
+        prewarmer.start_schedule(
+            functools.partial(
+                collect_prewarm_lists,
+                csv_paths=[PREWARM_FILE] if PREWARM_FILE else [],
+                history=scan_history,
+                history_days=PREWARM_HISTORY_DAYS,
+                history_limit=PREWARM_HISTORY_LIMIT,
+                registry=gs1_registry,
+                registry_prefixes=PREWARM_REGISTRY_PREFIXES if PREWARM_REGISTRY else None,
+                registry_limit=PREWARM_REGISTRY_LIMIT,
+            ),
+            PREWARM_INTERVAL_SECONDS,
+        )
+    if continuous_profiler is not None:
+        continuous_profiler.start()
+    yield
+    if continuous_profiler is not None:
+        continuous_profiler.stop()
+    prewarmer.stop_schedule()
+    job_queue.stop()
+    if scan_history is not None:
+        scan_history.stop()
+    drug_catalog.stop_watcher()
+    serial_registry.stop_compactor()
+    cdsco_index.stop_watcher()
+    batch_alerts.stop_watcher()
+    watchlist.stop_watcher()
+    gs1_registry.stop_watcher()
+    if trace_exporter is not None:
+        trace_exporter.stop()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="MediScan API v2",
     description="Medicine Expiry and Authenticity Detection System",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -42,6 +356,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Gzip negotiation (Accept-Encoding); the NDJSON stream is left uncompressed
+# so its lines are not held back in the compressor
+app.add_middleware(
+    ResponseCompressionMiddleware,
+    minimum_size=RESPONSE_GZIP_MIN_BYTES,
+    compresslevel=RESPONSE_GZIP_LEVEL,
+    exclude_paths=("/verify-barcodes/bulk",),
+)
+
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Refuse image uploads over the byte limit before the body is parsed"""
+    if request.method == "POST" and request.url.path in ("/verify", "/jobs"):
+        try:
+            ingestor.check_content_length(request.headers.get("content-length"))
+        except UploadLimitError as e:
+            return JSONResponse(status_code=e.status_code, content={"detail": str(e)})
+    return await call_next(request)
+
 
 # Response models
 class VerificationResponse(BaseModel):
@@ -62,16 +396,41 @@ class VerificationResponse(BaseModel):
     raw_data: dict
 
 
+class BulkBarcodeRequest(BaseModel):
+    """Request model for bulk barcode verification"""
+    gtins: List[str]
+    upstream: bool = True
+
+
+class PrewarmRequest(BaseModel):
+    """Request model for cache pre-warming"""
+    gtins: List[str] = []
+    products: List[str] = []
+    # Most scanned GTINs and products of the last history_days days (0: off)
+    history_days: float = 0
+    history_limit: int = 500
+    # GS1 registry licensees under these company prefixes ([] for all, None: off)
+    registry_prefixes: Optional[List[str]] = None
+    registry_limit: int = 500
+    name: str = "manual"
+    resume: bool = True
+
+
 # Helper functions
 def file_to_cv2_image(data: bytes) -> Optional[np.ndarray]:
     """Convert uploaded file bytes to OpenCV image"""
-    try:
-        arr = np.frombuffer(data, np.uint8)
-        img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-        return img
-    except Exception as e:
-        print(f"Image conversion error: {e}")
+    return decode_image_bytes(data)
+
+
+def requested_profile_mode(request: Request, profile: Optional[str]) -> Optional[str]:
+    """Profiling mode asked for by query parameter or header, or None"""
+    value = profile or request.headers.get("x-mediscan-profile")
+    if not value or value.lower() in ("0", "false", "no"):
         return None
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=403, detail="Profiling is disabled on this server")
+    value = value.lower()
+    return value if value in PROFILE_MODES else PROFILING_MODE
 
 
 # API Endpoints
@@ -79,166 +438,200 @@ def file_to_cv2_image(data: bytes) -> Optional[np.ndarray]:
 async def health_check():
     """Health check endpoint"""
     return {
-        "status": "healthy",
+        "status": "healthy" if services.ready else "starting",
         "version": "2.0.0",
-        "tesseract_configured": os.path.exists(pytesseract_cmd) if pytesseract_cmd else False
+        "ready": services.ready,
+        "startup": services.stats(),
+        "tesseract_configured": os.path.exists(pytesseract_cmd) if pytesseract_cmd else False,
+        "jobs": job_queue.stats(),
+        "result_cache": result_cache.stats(),
+        "gs1_registry": gs1_registry.stats(),
+        "watchlist": watchlist.stats(),
+        "batch_alerts": batch_alerts.stats(),
+        "cdsco_index": cdsco_index.stats(),
+        "serial_registry": serial_registry.stats(),
+        "drug_catalog": drug_catalog.stats(),
+        "scan_history": scan_history.stats() if scan_history else None,
+        "scan_analytics": scan_analytics.stats() if scan_analytics else None,
+        "circuits": breaker_stats(),
+        "resources": resource_governor.stats(),
+        "admission": {"verify": verify_admission.stats()},
+        "tracing": trace_exporter.stats() if trace_exporter else None
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.post("/verify", response_model=VerificationResponse)
-async def verify_medicine(images: List[UploadFile] = File(...)):
+async def verify_medicine(
+    request: Request,
+    images: List[UploadFile] = File(...),
+    store_id: Optional[str] = Form(None, description="Pharmacy/store or scanner id, for serial replay detection"),
+    profile: Optional[str] = Query(None, description="Profile this request: 1, sample or cprofile"),
+    view: str = Query("full", pattern="^(compact|full)$", description="compact: verdict only, without raw_data evidence"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. status,risk_level,raw_data.cache")
+):
     """
     Main verification endpoint - analyzes medicine packaging images
 
-    Accepts multiple images and returns comprehensive authenticity analysis
+    Accepts multiple images and returns comprehensive authenticity analysis.
+    view=compact drops the barcode, OCR and upstream evidence from raw_data;
+    fields= returns only the listed (dotted) fields. The body is written
+    with orjson and gzipped for clients that accept it.
+    When profiling is enabled, ?profile=1 (or the X-MediScan-Profile header)
+    adds a profile report to raw_data and bypasses the result cache.
+    Requests beyond the admission limit and queue are answered with 429.
     """
     if not images or len(images) == 0:
         raise HTTPException(status_code=400, detail="At least one image is required")
+    try:
+        parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    profile_mode = requested_profile_mode(request, profile)
+    INFLIGHT_VERIFICATIONS.inc()
+    started = time.perf_counter()
 
     try:
-        # Step 1: Convert uploaded files to OpenCV images
-        cv_images = []
-        for uploaded_file in images:
-            data = await uploaded_file.read()
-            img = file_to_cv2_image(data)
-            if img is not None:
-                cv_images.append(img)
+        async with verify_admission.admit():
+            # The pipeline is CPU-bound: run it off the event loop so cheap
+            # endpoints (/health, /verify-barcode, ...) keep answering
+            result = await run_in_threadpool(
+                run_verification, images, store_id, profile_mode, request.headers.get("traceparent")
+            )
+        VERIFY_REQUESTS.inc(status=result["status"])
+        services.record_request(time.perf_counter() - started)
+        return FastJSONResponse(shape_response(result, view, fields))
+
+    except AdmissionRejected as e:
+        VERIFY_REQUESTS.inc(status="shed")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except UploadLimitError as e:
+        VERIFY_REQUESTS.inc(status="rejected")
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except HTTPException:
+        VERIFY_REQUESTS.inc(status="rejected")
+        raise
+    except Exception as e:
+        VERIFY_REQUESTS.inc(status="error")
+        print(f"Verification error: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Verification failed: {str(e)}")
+    finally:
+        INFLIGHT_VERIFICATIONS.dec()
+
+
+def run_verification(
+    images: List[UploadFile],
+    store_id: Optional[str],
+    profile_mode: Optional[str],
+    traceparent: Optional[str]
+) -> dict:
+    """Decode the uploads and run the pipeline inside a trace (worker thread)"""
+    memory = MemoryTracker()
+    trace = tracer.start_trace("POST /verify", traceparent=traceparent)
+    session_cm = request_profiler.profile("/verify", mode=profile_mode) if profile_mode else nullcontext()
+    with trace, session_cm as session:
+        # Step 1: Decode uploads straight from their spool buffers, enforcing limits
+        with time_stage("decode") as span:
+            cv_images = ingestor.decode_images(images, tracker=memory)
+            span.set_attribute("uploads", len(images))
+            span.set_attribute("decoded", len(cv_images))
+            if cv_images:
+                span.set_attribute("image.width", cv_images[0].shape[1])
+                span.set_attribute("image.height", cv_images[0].shape[0])
+        memory.sample("after_decode")
 
         if not cv_images:
             raise HTTPException(status_code=400, detail="No valid images provided")
 
-        # Step 2: Detect and decode barcodes/QR codes from all images
-        print("Step 2: Detecting barcodes...")
-        barcode_service = BarcodeService()
-        all_barcodes = []
-        gtin = None
-        barcode_expiry = None
-        batch_from_barcode = None
-
-        for img in cv_images:
-            codes = barcode_service.detect_and_decode(img)
-            all_barcodes.extend(codes)
-
-            # Extract GTIN and other info
-            for code in codes:
-                if code["parsed"].get("gtin") and not gtin:
-                    gtin = code["parsed"]["gtin"]
-                if code["parsed"].get("expiry") and not barcode_expiry:
-                    barcode_expiry = code["parsed"]["expiry"]
-                if code["parsed"].get("batch") and not batch_from_barcode:
-                    batch_from_barcode = code["parsed"]["batch"]
-
-        print(f"Found {len(all_barcodes)} barcodes, GTIN: {gtin}")
-
-        # Step 3: Perform OCR on all images
-        print("Step 3: Performing OCR...")
-        ocr_service = OCRService(tesseract_cmd=pytesseract_cmd)
-        ocr_results = ocr_service.extract_from_multiple_images(cv_images)
-
-        # Extract key information from OCR
-        ocr_expiry = ocr_results.get("expiry_date", {}).get("date") if ocr_results.get("expiry_date") else None
-        ocr_batch = ocr_results.get("batch_number")
-        product_name = ocr_results.get("product_name")
-
-        print(f"OCR - Product: {product_name}, Expiry: {ocr_expiry}, Batch: {ocr_batch}")
-
-        # Step 4: Determine final expiry date (prefer barcode, fallback to OCR)
-        final_expiry = barcode_expiry or ocr_expiry
-        final_batch = batch_from_barcode or ocr_batch
-
-        # Step 5: Verify GTIN against GS1 database
-        print("Step 5: Verifying GTIN with GS1...")
-        gs1_data = None
-        if gtin:
-            gs1_scraper = GS1Scraper()
-            gs1_data = gs1_scraper.verify_gtin(gtin)
-            print(f"GS1 verification: {gs1_data}")
-
-        # Step 6: Check regulatory database (CDSCO)
-        print("Step 6: Checking CDSCO...")
-        cdsco_data = None
-        if product_name or gtin:
-            cdsco_scraper = CDSCOScraper()
-            manufacturer = gs1_data.get("company_name") if gs1_data else None
-            cdsco_data = cdsco_scraper.search_drug(
-                drug_name=product_name,
-                license_number=None  # Would need to extract from packaging
-            )
-
-            # Check for counterfeit alerts
-            if product_name or manufacturer:
-                alerts = cdsco_scraper.check_counterfeit_alerts(product_name, manufacturer)
-                if alerts:
-                    if not cdsco_data:
-                        cdsco_data = {}
-                    cdsco_data["warnings"] = alerts
-
-            print(f"CDSCO verification: {cdsco_data}")
-
-        # Step 7: Perform comprehensive authenticity check
-        print("Step 7: Performing authenticity check...")
-        authenticity_result = verify_authenticity(
-            gtin=gtin,
-            expiry_date=final_expiry,
-            batch_number=final_batch,
-            product_name=product_name,
-            gs1_data=gs1_data,
-            cdsco_data=cdsco_data,
-            ocr_data=ocr_results
+        result = pipeline.verify_images(
+            cv_images, memory_tracker=memory, use_cache=session is None, location=store_id
         )
+        trace.set_attribute("status", result["status"])
 
-        print(f"Authenticity result: {authenticity_result['status']}, Risk: {authenticity_result['risk_level']}")
-
-        # Step 8: Build response
-        manufacturer = None
-        country = None
-
-        if gs1_data and gs1_data.get("found"):
-            manufacturer = gs1_data.get("company_name")
-            country = gs1_data.get("country")
-
-        response = VerificationResponse(
-            status=authenticity_result["status"],
-            risk_level=authenticity_result["risk_level"],
-            is_expired=authenticity_result["is_expired"],
-            expiry_date=authenticity_result["expiry_date"],
-            gtin=gtin,
-            gtin_verified=authenticity_result["gtin_verified"],
-            product_name=product_name,
-            batch_number=final_batch,
-            manufacturer=manufacturer,
-            country=country,
-            risk_factors=authenticity_result["risk_factors"],
-            recommendations=authenticity_result["recommendations"],
-            details=authenticity_result["details"],
-            raw_data={
-                "barcodes": [
-                    {
-                        "type": bc["type"],
-                        "data": bc["raw_data"],
-                        "parsed": bc["parsed"]
-                    }
-                    for bc in all_barcodes
-                ],
-                "ocr_texts": [
-                    {
-                        "text_preview": t["text"][:200] + "..." if len(t["text"]) > 200 else t["text"],
-                        "quality_score": t["quality"]["quality_score"]
-                    }
-                    for t in ocr_results.get("all_texts", [])
-                ],
-                "gs1_verification": gs1_data,
-                "cdsco_verification": cdsco_data
-            }
-        )
+    result["raw_data"]["memory"] = memory.report()
+    if trace.trace_id:
+        result["raw_data"]["trace_id"] = trace.trace_id
+    if session is not None:
+        result["raw_data"]["profile"] = session.report
+    return result
 
-        return response
 
-    except Exception as e:
-        print(f"Verification error: {e}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Verification failed: {str(e)}")
+@app.post("/jobs", status_code=202)
+async def submit_verification_job(
+    images: List[UploadFile] = File(...),
+    priority: int = Form(0)
+):
+    """
+    Queue a verification and return immediately with a job id
+
+    Poll GET /jobs/{job_id} for the result
+    """
+    if not images or len(images) == 0:
+        raise HTTPException(status_code=400, detail="At least one image is required")
+
+    try:
+        ingestor.check_uploads(images)
+        job_id = job_queue.submit(ingestor.iter_buffers(images), priority=priority)
+    except UploadLimitError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(JOB_RETRY_AFTER_SECONDS)})
+
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "poll_url": f"/jobs/{job_id}"
+    }
+
+
+@app.get("/jobs/{job_id}")
+async def get_verification_job(job_id: str, wait: float = Query(0, ge=0, le=JOB_MAX_LONG_POLL_SECONDS)):
+    """
+    Get job status and result
+
+    Pass wait=N to long-poll for up to N seconds until the job finishes
+    """
+    if wait > 0:
+        job = await run_in_threadpool(job_queue.wait, job_id, wait)
+    else:
+        job = job_queue.get(job_id)
+
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job
+
+
+@app.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    """Stored profile report of a profiled request"""
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=403, detail="Profiling is disabled on this server")
+
+    report = request_profiler.load_report(profile_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return report
+
+
+@app.get("/profiles/{profile_id}/stacks", response_class=PlainTextResponse)
+async def get_profile_stacks(profile_id: str):
+    """Collapsed stacks of a profiled request (flamegraph.pl / speedscope input)"""
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=403, detail="Profiling is disabled on this server")
+
+    stacks = request_profiler.load_stacks(profile_id)
+    if stacks is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(stacks)
 
 
 @app.post("/verify-barcode")
@@ -249,8 +642,9 @@ async def verify_barcode_only(gtin: str):
     Useful for manual barcode entry
     """
     try:
-        gs1_scraper = GS1Scraper()
-        result = gs1_scraper.verify_gtin(gtin)
+        gs1_scraper = services.build().gs1_scraper
+        # Not admission-controlled, but an upstream lookup must not block the event loop
+        result = await run_in_threadpool(gs1_scraper.verify_gtin, gtin)
 
         is_valid = gs1_scraper.validate_gtin_checksum(gtin)
 
@@ -264,6 +658,161 @@ async def verify_barcode_only(gtin: str):
         raise HTTPException(status_code=500, detail=f"Verification failed: {str(e)}")
 
 
+@app.post("/verify-barcodes/bulk")
+def verify_barcodes(body: BulkBarcodeRequest):
+    """
+    Verify a list of GTINs (e.g. from an invoice or stock list)
+
+    Streams one JSON object per line as each GTIN resolves: invalid check
+    digits and locally known GTINs first, upstream lookups as they finish.
+    Set "upstream": false to skip network lookups entirely.
+    """
+    if len(body.gtins) > BULK_VERIFY_MAX_GTINS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_VERIFY_MAX_GTINS} GTINs per request")
+
+    results = verify_barcodes_bulk(
+        body.gtins,
+        scraper=services.build().gs1_scraper,
+        max_workers=BULK_VERIFY_CONCURRENCY,
+        upstream=body.upstream,
+    )
+    lines = (json.dumps(item, default=str) + "\n" for item in results)
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
+@app.get("/history")
+def get_scan_history_rows(
+    store_id: Optional[str] = Query(None, description="Store or scanner id given to /verify"),
+    gtin: Optional[str] = Query(None),
+    status: Optional[str] = Query(None, description="Verdict, e.g. SUSPICIOUS"),
+    days: float = Query(7, gt=0, le=3650, description="How far back to look"),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """Recorded scans, newest first (the audit trail per pharmacy)"""
+    if scan_history is None:
+        raise HTTPException(status_code=404, detail="Scan history is disabled on this server")
+    scans = scan_history.query(
+        store=store_id, gtin=gtin, status=status, since=time.time() - days * 86400, limit=limit
+    )
+    return {"count": len(scans), "scans": scans}
+
+
+def require_analytics():
+    if scan_analytics is None:
+        raise HTTPException(status_code=404, detail="Scan history is disabled on this server")
+    return scan_analytics
+
+
+@app.get("/analytics/top-suspicious")
+def analytics_top_suspicious(
+    days: float = Query(30, gt=0, le=3650),
+    limit: int = Query(10, ge=1, le=500),
+    store_id: Optional[str] = Query(None)
+):
+    """Products with the most SUSPICIOUS/COUNTERFEIT verdicts"""
+    products = require_analytics().top_suspicious(time.time() - days * 86400, limit=limit, store=store_id)
+    return {"days": days, "products": products}
+
+
+@app.get("/analytics/expiry-trend")
+def analytics_expiry_trend(
+    days: float = Query(30, gt=0, le=3650),
+    granularity: str = Query("day", pattern="^(minute|hour|day)$"),
+    store_id: Optional[str] = Query(None)
+):
+    """Share of scanned packs found expired, per minute/hour/day"""
+    buckets = require_analytics().expiry_trend(time.time() - days * 86400, granularity=granularity, store=store_id)
+    return {"granularity": granularity, "buckets": buckets}
+
+
+@app.get("/analytics/source-failures")
+def analytics_source_failures(
+    days: float = Query(1, gt=0, le=3650),
+    granularity: str = Query("hour", pattern="^(minute|hour|day)$"),
+    store_id: Optional[str] = Query(None)
+):
+    """Share of scans verified without each upstream source (open circuit), per bucket"""
+    buckets = require_analytics().source_failure_rates(time.time() - days * 86400, granularity=granularity, store=store_id)
+    return {"granularity": granularity, "buckets": buckets}
+
+
+@app.get("/analytics/counts")
+def analytics_counts(
+    by: str = Query("status", pattern="^(gtin|manufacturer|status|risk_level|store)$"),
+    days: float = Query(7, gt=0, le=3650),
+    granularity: str = Query("day", pattern="^(minute|hour|day)$"),
+    store_id: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=1000)
+):
+    """Scan counts per bucket by GTIN, manufacturer, status, risk level or store"""
+    buckets = require_analytics().counts(
+        by, time.time() - days * 86400, granularity=granularity, store=store_id, limit=limit
+    )
+    return {"by": by, "granularity": granularity, "buckets": buckets}
+
+
+@app.post("/admin/analytics/rebuild", status_code=202)
+def rebuild_analytics():
+    """
+    Recompute the rollups from the raw scan history in the background
+
+    /analytics keeps answering from the current rollups until the rebuilt
+    ones are swapped in. Poll GET /admin/analytics/rebuild for progress
+    """
+    analytics = require_analytics()
+    if not analytics.start_rebuild(scan_history):
+        raise HTTPException(status_code=409, detail="A rebuild is already running")
+    return analytics.rebuild_status()
+
+
+@app.get("/admin/analytics/rebuild")
+def get_rebuild_analytics_status():
+    """Progress of the current or last rollup rebuild"""
+    analytics = require_analytics()
+    return dict(analytics.rebuild_status(), rows=analytics.stats()["rows"])
+
+
+@app.post("/admin/prewarm", status_code=202)
+async def start_prewarm(body: PrewarmRequest):
+    """
+    Resolve GTINs and product names in the background so their GS1, CDSCO
+    and Tavily results are cached before real traffic asks for them
+
+    The lists in the body are combined with the most scanned GTINs and
+    products of the scan history (history_days) and the GS1 registry's
+    licensees (registry_prefixes). Poll GET /admin/prewarm for progress
+
+    The pass runs in the worker process that receives the request, so with
+    WEB_CONCURRENCY > 1 it warms the other workers only if CACHE_BACKEND is
+    shared (sqlite or redis), and progress is visible from that worker only
+    """
+    if body.history_days > 0 and scan_history is None:
+        raise HTTPException(status_code=404, detail="Scan history is disabled on this server")
+    lists = await run_in_threadpool(
+        collect_prewarm_lists,
+        history=scan_history,
+        history_days=body.history_days,
+        history_limit=body.history_limit,
+        registry=gs1_registry,
+        registry_prefixes=body.registry_prefixes,
+        registry_limit=body.registry_limit,
+    )
+    items = prewarm_items(body.gtins + lists["gtins"], body.products + lists["products"])
+    if len(items) > PREWARM_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {PREWARM_MAX_ITEMS} items per pre-warm")
+    if not prewarmer.start(items, name=body.name, resume=body.resume):
+        raise HTTPException(
+            status_code=409, detail="A pre-warm pass is already running here, or under this name in another worker"
+        )
+    return prewarmer.status()
+
+
+@app.get("/admin/prewarm")
+async def get_prewarm_status():
+    """Progress of the current or last pre-warm pass"""
+    return prewarmer.status()
+
+
 @app.get("/")
 async def root():
     """Root endpoint with API information"""
@@ -273,8 +822,14 @@ async def root():
         "description": "Medicine Expiry and Authenticity Detection System",
         "endpoints": {
             "/health": "Health check",
-            "/verify": "Verify medicine from images (POST)",
+            "/metrics": "Prometheus metrics (GET)",
+            "/verify": "Verify medicine from images (POST), optional ?profile=1",
             "/verify-barcode": "Verify GTIN/barcode only (POST)",
+            "/verify-barcodes/bulk": "Verify a list of GTINs, streamed as NDJSON (POST)",
+            "/admin/prewarm": "Pre-warm upstream caches for GTINs and products (POST), progress (GET)",
+            "/jobs": "Queue an asynchronous verification (POST)",
+            "/jobs/{job_id}": "Poll job status and result, optional ?wait= long-poll (GET)",
+            "/profiles/{profile_id}": "Profile report of a profiled request (GET)",
             "/docs": "API documentation (Swagger UI)"
         }
     }
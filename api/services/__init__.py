@@ -3,24 +3,53 @@ MediScan Services Package
 Contains all core services for medicine verification
 """
 
-from .barcode_service import BarcodeService, detect_barcodes_multi_image
-from .ocr_service import OCRService, extract_text_multi_image
-from .gs1_scraper import GS1Scraper, verify_barcode
-from .cdsco_scraper import CDSCOScraper, verify_drug_regulatory
-from .authenticity_checker import AuthenticityChecker, verify_authenticity
-from .image_processor import ImageProcessor, preprocess_image
+import importlib
 
-__all__ = [
-    "BarcodeService",
-    "detect_barcodes_multi_image",
-    "OCRService",
-    "extract_text_multi_image",
-    "GS1Scraper",
-    "verify_barcode",
-    "CDSCOScraper",
-    "verify_drug_regulatory",
-    "AuthenticityChecker",
-    "verify_authenticity",
-    "ImageProcessor",
-    "preprocess_image",
-]
+# Exported name -> submodule. Submodules are imported on first attribute
+# access so that importing one service does not pull in every other one.
+_EXPORTS = {
+    "BarcodeService": "barcode_service",
+    "detect_barcodes_multi_image": "barcode_service",
+    "OCRService": "ocr_service",
+    "extract_text_multi_image": "ocr_service",
+    "GS1Scraper": "gs1_scraper",
+    "verify_barcode": "gs1_scraper",
+    "CDSCOScraper": "cdsco_scraper",
+    "verify_drug_regulatory": "cdsco_scraper",
+    "DAVAPortalScraper": "dava_scraper",
+    "AuthenticityChecker": "authenticity_checker",
+    "verify_authenticity": "authenticity_checker",
+    "ImageProcessor": "image_processor",
+    "preprocess_image": "image_processor",
+    "VerificationPipeline": "verification_pipeline",
+    "ServiceContainer": "container",
+    "JobQueue": "job_queue",
+    "QueueFullError": "job_queue",
+    "ResultCache": "result_cache",
+    "FastJSONResponse": "response_encoding",
+    "CacheBackend": "cache_backend",
+    "Watchlist": "watchlist",
+    "BatchAlertIndex": "batch_alerts",
+    "CDSCOIndex": "cdsco_index",
+    "SerialRegistry": "serial_registry",
+    "DrugCatalog": "drug_catalog",
+    "ScanHistory": "scan_history",
+    "ScanAnalytics": "scan_analytics",
+    "render_metrics": "metrics",
+    "time_stage": "metrics",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,180 @@
+"""
+Admission Control
+Adaptive (AIMD) concurrency limit with a bounded, deadline-limited wait queue for expensive endpoints
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional, Any
+
+from .metrics import ADMISSION_LIMIT, ADMISSION_QUEUED, ADMISSION_REJECTED, ADMISSION_WAIT_SECONDS
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of admitted"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server busy ({reason}), retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Caps concurrent verifications and sheds load once a short queue is full
+
+    At most `limit` requests run at once; up to max_queue more wait, each
+    for at most queue_timeout seconds, and everything beyond that is
+    rejected at once with AdmissionRejected. The limit adapts to latency in
+    AIMD fashion: every completion faster than target_latency adds
+    1/limit (about +1 per round of requests), and a slower one multiplies
+    it by `backoff`, at most once per target_latency so one slow burst
+    counts once.
+
+    All methods run on the event loop; no locking is needed.
+    """
+
+    def __init__(
+        self,
+        name: str = "verify",
+        max_limit: int = 4,
+        min_limit: int = 1,
+        initial_limit: Optional[int] = None,
+        max_queue: int = 16,
+        queue_timeout: float = 10.0,
+        target_latency: float = 5.0,
+        backoff: float = 0.7
+    ):
+        """
+        Args:
+            name: Label for the admission metrics
+            max_limit: Upper bound of the concurrency limit
+            min_limit: Lower bound of the concurrency limit
+            initial_limit: Starting limit (default: max_limit)
+            max_queue: Requests allowed to wait for a slot
+            queue_timeout: Longest wait for a slot before rejecting
+            target_latency: Completions slower than this shrink the limit
+            backoff: Multiplicative decrease factor
+        """
+        self.name = name
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(initial_limit or self.max_limit)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.inflight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        self._latency_ewma: Optional[float] = None
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"queue_full": 0, "queue_timeout": 0}
+
+        ADMISSION_LIMIT.set_function(lambda: int(self.limit), endpoint=name)
+        ADMISSION_QUEUED.set_function(lambda: len(self._waiters), endpoint=name)
+
+    @asynccontextmanager
+    async def admit(self):
+        """
+        Hold one concurrency slot for the body of the block
+
+        Raises:
+            AdmissionRejected: The queue is full or no slot freed up in time
+        """
+        await self._acquire()
+        started = time.perf_counter()
+        completed = False
+        try:
+            yield
+            completed = True
+        finally:
+            self._release(time.perf_counter() - started if completed else None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": round(self.limit, 2),
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "inflight": self.inflight,
+            "queued": len(self._waiters),
+            "max_queue": self.max_queue,
+            "latency_ewma_seconds": round(self._latency_ewma, 3) if self._latency_ewma is not None else None,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
+
+    def retry_after(self) -> int:
+        """Seconds until a retry has a fair chance: the queue ahead drained at the current rate"""
+        latency = self._latency_ewma or self.target_latency
+        return max(1, math.ceil(latency * (len(self._waiters) + 1) / max(1, int(self.limit))))
+
+    async def _acquire(self):
+        if self.inflight < int(self.limit) and not self._waiters:
+            self.inflight += 1
+            self.admitted += 1
+            ADMISSION_WAIT_SECONDS.observe(0.0, endpoint=self.name)
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self._reject("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # Client went away: hand on a slot it may have been given meanwhile
+            self._abandon(waiter)
+            raise
+        if not waiter.done() or waiter.cancelled():
+            self._abandon(waiter)
+            self._reject("queue_timeout")
+        self.admitted += 1
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - started, endpoint=self.name)
+
+    def _abandon(self, waiter: asyncio.Future):
+        if waiter.done() and not waiter.cancelled():
+            self._release(None)
+            return
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _reject(self, reason: str):
+        self.rejected[reason] += 1
+        ADMISSION_REJECTED.inc(endpoint=self.name, reason=reason)
+        raise AdmissionRejected(reason, self.retry_after())
+
+    def _release(self, latency: Optional[float]):
+        self.inflight -= 1
+        if latency is not None:
+            self._adapt(latency)
+        # Hand freed slots to waiters in arrival order
+        while self._waiters and self.inflight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.inflight += 1
+                waiter.set_result(True)
+
+    def _adapt(self, latency: float):
+        self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+        now = time.monotonic()
+        if latency > self.target_latency:
+            if now - self._last_decrease >= self.target_latency:
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                self._last_decrease = now
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+
+if __name__ == "__main__":
+    print("Admission control module loaded successfully")
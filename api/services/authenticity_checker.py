@@ -42,7 +42,10 @@ class AuthenticityChecker:
         product_name: Optional[str],
         gs1_data: Optional[Dict],
         cdsco_data: Optional[Dict],
-        ocr_data: Optional[Dict]
+        ocr_data: Optional[Dict],
+        watchlist_hits: Optional[List[Dict]] = None,
+        batch_alert: Optional[Dict] = None,
+        catalog_match: Optional[Dict] = None
     ) -> Dict[str, Any]:
         """
         Comprehensive authenticity verification
@@ -55,6 +58,9 @@ class AuthenticityChecker:
             gs1_data: Data from GS1 verification
             cdsco_data: Data from CDSCO verification
             ocr_data: All OCR extracted data
+            watchlist_hits: Watchlist terms found on the pack
+            batch_alert: Result of the CDSCO batch alert lookup
+            catalog_match: Best local drug catalog match for the OCR text
 
         Returns:
             Verification result with status and risk factors
@@ -69,7 +75,7 @@ class AuthenticityChecker:
 
         # 3. Cross-verify product information
         product_consistency = self._verify_product_consistency(
-            gtin, product_name, gs1_data, cdsco_data
+            gtin, product_name, gs1_data, cdsco_data, catalog_match
         )
 
         # 4. Check batch and manufacturing dates
@@ -85,13 +91,20 @@ class AuthenticityChecker:
         # 6. Detect packaging inconsistencies
         packaging_issues = self._detect_packaging_issues(ocr_data, gs1_data)
 
+        # 7. Check for watchlisted products, batches and manufacturers
+        watchlist_status = self._check_watchlist(watchlist_hits)
+
+        # 8. Check the batch against NSQ, spurious and recall lists
+        batch_alert_status = self._check_batch_alerts(batch_alert)
+
         # Calculate overall risk level
         risk_level = self._calculate_risk_level()
 
         # Determine final status
         status = self._determine_status(
             expiry_status, gtin_status, product_consistency,
-            batch_validity, regulatory_issues
+            batch_validity, regulatory_issues, watchlist_status,
+            batch_alert_status
         )
 
         return {
@@ -108,7 +121,9 @@ class AuthenticityChecker:
                 "product_consistency": product_consistency,
                 "batch_validity": batch_validity,
                 "regulatory_warnings": regulatory_issues,
-                "packaging_issues": packaging_issues
+                "packaging_issues": packaging_issues,
+                "watchlist": watchlist_status,
+                "batch_alerts": batch_alert_status
             }
         }
 
@@ -177,7 +192,8 @@ class AuthenticityChecker:
         gtin: Optional[str],
         product_name: Optional[str],
         gs1_data: Optional[Dict],
-        cdsco_data: Optional[Dict]
+        cdsco_data: Optional[Dict],
+        catalog_match: Optional[Dict] = None
     ) -> Dict[str, Any]:
         """Check consistency between different data sources"""
         issues = []
@@ -206,9 +222,21 @@ class AuthenticityChecker:
                         "message": "Different manufacturers in databases"
                     })
 
+        # Check the catalog's manufacturer for the product on the pack
+        catalog_company = (catalog_match or {}).get("manufacturer")
+        if catalog_company and gs1_data and gs1_data.get("company_name"):
+            if not self._fuzzy_match(catalog_company.lower(), gs1_data["company_name"].lower()):
+                issues.append("Manufacturer mismatch between drug catalog and GS1")
+                self.risk_factors.append({
+                    "type": "MANUFACTURER_MISMATCH",
+                    "severity": "HIGH",
+                    "message": f"Catalog lists {catalog_company} for this product, barcode is registered to {gs1_data['company_name']}"
+                })
+
         return {
             "consistent": len(issues) == 0,
-            "issues": issues
+            "issues": issues,
+            "catalog_match": catalog_match
         }
 
     def _verify_batch_dates(
@@ -277,6 +305,97 @@ class AuthenticityChecker:
             "count": len(warnings)
         }
 
+    def _check_watchlist(self, watchlist_hits: Optional[List[Dict]]) -> Dict[str, Any]:
+        """Flag each distinct watchlist term printed on the pack"""
+        matches = watchlist_hits or []
+        flagged = set()
+
+        for match in matches:
+            key = (match["category"], match["term"])
+            if key in flagged:
+                continue
+            flagged.add(key)
+            message = f"Watchlisted {match['category']} found on pack: {match['matched_text']}"
+            if match.get("note"):
+                message += f" ({match['note']})"
+            self.risk_factors.append({
+                "type": "WATCHLIST_MATCH",
+                "severity": match["severity"],
+                "message": message
+            })
+
+        return {
+            "has_matches": len(matches) > 0,
+            "critical": any(m["severity"] == "CRITICAL" for m in matches),
+            "matches": matches,
+            "count": len(flagged)
+        }
+
+    def _check_batch_alerts(self, batch_alert: Optional[Dict]) -> Dict[str, Any]:
+        """
+        Raise a critical risk factor if the batch is on a CDSCO alert list
+
+        Only a match on product and batch is confirmed. When the product name
+        could not be read, a batch-number hit is a medium, unconfirmed factor:
+        batch numbers are short and repeat across manufacturers.
+        """
+        if not batch_alert or not batch_alert.get("checked"):
+            return {"checked": False, "listed": False, "unconfirmed": False, "spurious": False, "matches": []}
+
+        confirmed = [m for m in batch_alert["matches"] if m["product_match"] is True]
+        unconfirmed = [m for m in batch_alert["matches"] if m["product_match"] is None]
+        for match in confirmed:
+            label = {"nsq": "Not of Standard Quality", "spurious": "spurious drug", "recall": "recall"}.get(
+                match["list_type"], match["list_type"]
+            )
+            month = f" ({match['month']})" if match.get("month") else ""
+            self.risk_factors.append({
+                "type": "BATCH_ALERT",
+                "severity": "CRITICAL",
+                "message": f"Batch {match['batch']} of {match['product']} is on the CDSCO {label} list{month}"
+            })
+        if unconfirmed and not confirmed:
+            products = ", ".join(sorted({m["product"] for m in unconfirmed if m["product"]}))
+            self.risk_factors.append({
+                "type": "BATCH_ALERT_UNCONFIRMED",
+                "severity": "MEDIUM",
+                "message": f"Batch {unconfirmed[0]['batch']} appears on a CDSCO alert list for {products or 'another product'}; "
+                           f"the product name could not be read to confirm it"
+            })
+
+        return {
+            "checked": True,
+            "listed": len(confirmed) > 0,
+            "unconfirmed": len(unconfirmed) > 0 and not confirmed,
+            "spurious": any(m["list_type"] == "spurious" for m in confirmed),
+            "matches": batch_alert["matches"]
+        }
+
+    def _check_serials(self, serial_checks: List[Dict]) -> Dict[str, Any]:
+        """Flag serial numbers already scanned elsewhere (cloned codes)"""
+        replays = [c for c in serial_checks if c.get("replay")]
+
+        for check in replays:
+            if check["other_location"]:
+                message = (
+                    f"Serial {check['serial']} was already scanned at {check['locations'] - 1} other "
+                    f"location(s), first on {check['first_seen_at']}"
+                )
+            else:
+                message = f"Serial {check['serial']} has been scanned {check['previous_scans'] + 1} times"
+            self.risk_factors.append({
+                "type": "SERIAL_REPLAY",
+                "severity": check["severity"],
+                "message": message
+            })
+
+        return {
+            "checked": len(serial_checks),
+            "replayed": len(replays) > 0,
+            "critical": any(c["severity"] == "CRITICAL" for c in replays),
+            "serials": serial_checks
+        }
+
     def _detect_packaging_issues(
         self,
         ocr_data: Optional[Dict],
@@ -347,7 +466,9 @@ class AuthenticityChecker:
         gtin_status: Dict,
         product_consistency: Dict,
         batch_validity: Dict,
-        regulatory_issues: Dict
+        regulatory_issues: Dict,
+        watchlist_status: Dict,
+        batch_alert_status: Dict
     ) -> AuthenticityStatus:
         """Determine overall authenticity status"""
 
@@ -359,6 +480,22 @@ class AuthenticityChecker:
         if regulatory_issues["has_warnings"]:
             return AuthenticityStatus.COUNTERFEIT
 
+        # Batch declared spurious, or substandard/recalled, by the regulator
+        if batch_alert_status["spurious"]:
+            return AuthenticityStatus.COUNTERFEIT
+        if batch_alert_status["listed"]:
+            return AuthenticityStatus.SUSPICIOUS
+
+        # Known fake manufacturer, recalled product or spurious batch
+        if watchlist_status["critical"]:
+            return AuthenticityStatus.COUNTERFEIT
+        if watchlist_status["has_matches"]:
+            return AuthenticityStatus.SUSPICIOUS
+
+        # Batch number listed for a product we could not read: never counterfeit on that alone
+        if batch_alert_status.get("unconfirmed"):
+            return AuthenticityStatus.SUSPICIOUS
+
         # GTIN not verified + other issues
         if not gtin_status["verified"]:
             if not product_consistency["consistent"] or not batch_validity["valid"]:
@@ -445,7 +582,10 @@ def verify_authenticity(
     product_name: Optional[str],
     gs1_data: Optional[Dict],
     cdsco_data: Optional[Dict],
-    ocr_data: Optional[Dict]
+    ocr_data: Optional[Dict],
+    watchlist_hits: Optional[List[Dict]] = None,
+    batch_alert: Optional[Dict] = None,
+    catalog_match: Optional[Dict] = None
 ) -> Dict[str, Any]:
     """
     Main function to verify medicine authenticity
@@ -455,7 +595,47 @@ def verify_authenticity(
     checker = AuthenticityChecker()
     return checker.verify_medicine(
         gtin, expiry_date, batch_number, product_name,
-        gs1_data, cdsco_data, ocr_data
+        gs1_data, cdsco_data, ocr_data, watchlist_hits, batch_alert,
+        catalog_match
+    )
+
+
+def apply_serial_checks(result: Dict[str, Any], serial_checks: List[Dict]) -> Dict[str, Any]:
+    """
+    Add serial replay findings to a finished verification result
+
+    Serial checks run on every scan, including those answered from the
+    result cache, so they are applied on top of the (possibly cached)
+    verdict. The input is not modified because it may be shared with the
+    cache.
+
+    Args:
+        result: Verification result from the pipeline
+        serial_checks: SerialRegistry.record() output per scanned serial
+
+    Returns:
+        Result with SERIAL_REPLAY risk factors, updated status, risk level
+        and recommendations
+    """
+    checker = AuthenticityChecker()
+    checker.risk_factors = list(result["risk_factors"])
+    serial_status = checker._check_serials(serial_checks)
+
+    status = AuthenticityStatus(result["status"])
+    if status not in (AuthenticityStatus.EXPIRED, AuthenticityStatus.COUNTERFEIT):
+        if serial_status["critical"]:
+            status = AuthenticityStatus.COUNTERFEIT
+        elif serial_status["replayed"]:
+            status = AuthenticityStatus.SUSPICIOUS
+
+    risk_level = checker._calculate_risk_level()
+    return dict(
+        result,
+        status=status.value,
+        risk_level=risk_level.value,
+        risk_factors=checker.risk_factors,
+        recommendations=checker._generate_recommendations(status, risk_level),
+        details=dict(result["details"], serial_check=serial_status),
     )
 
 
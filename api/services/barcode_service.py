@@ -9,6 +9,9 @@ from pyzbar.pyzbar import decode as zbar_decode, ZBarSymbol
 from typing import List, Dict, Optional, Any
 from datetime import datetime, date
 from .image_processor import ImageProcessor
+from .gtin import is_valid_gtin
+from .metrics import BARCODE_VARIANT_SUCCESS
+from .tracing import start_span
 
 
 class BarcodeService:
@@ -34,7 +37,9 @@ class BarcodeService:
         image_variations = self.processor.preprocess_for_barcode(image)
 
         for idx, variant in enumerate(image_variations):
-            codes = self._decode_barcodes(variant)
+            with start_span("barcode.variant", variant_index=idx) as span:
+                codes = self._decode_barcodes(variant)
+                span.set_attribute("codes_found", len(codes))
 
             for code in codes:
                 # Parse the code data
@@ -51,6 +56,7 @@ class BarcodeService:
                 # Avoid duplicates
                 if not self._is_duplicate(results, result):
                     results.append(result)
+                    BARCODE_VARIANT_SUCCESS.inc(variant=str(idx))
 
         return results
 
@@ -288,25 +294,7 @@ class BarcodeService:
         Returns:
             True if valid
         """
-        if not gtin.isdigit():
-            return False
-
-        if len(gtin) not in [8, 12, 13, 14]:
-            return False
-
-        # GS1 checksum algorithm
-        digits = [int(d) for d in gtin[:-1]]
-        check_digit = int(gtin[-1])
-
-        total = 0
-        multiplier = [3, 1]
-
-        for i, digit in enumerate(reversed(digits)):
-            total += digit * multiplier[i % 2]
-
-        calculated = (10 - (total % 10)) % 10
-
-        return calculated == check_digit
+        return is_valid_gtin(gtin)
 
 
 import re
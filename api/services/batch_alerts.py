@@ -0,0 +1,425 @@
+"""
+Batch Alert Index
+CDSCO Not-of-Standard-Quality, spurious and recalled batches with a Bloom-filter fast path
+"""
+
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Any, Iterable, Set
+
+from .table_files import changed_drop_files, heading_map, read_table_file
+
+
+LIST_TYPES = ("nsq", "spurious", "recall")
+
+# Dosage-form and pharmacopoeia words that differ between an alert list and
+# the printed pack without changing which product is meant
+_FORM_WORDS = {
+    "tablet", "tablets", "tab", "tabs", "capsule", "capsules", "cap", "caps",
+    "syrup", "suspension", "injection", "inj", "cream", "ointment", "gel",
+    "drops", "solution", "oral", "ip", "bp", "usp", "mg", "ml", "mcg", "gm",
+    "g", "w", "v", "and", "of", "the",
+}
+
+# Column headings seen in CDSCO lists and state drug-controller exports
+_COLUMN_ALIASES = {
+    "product": ("product", "product name", "name of the drug", "name of drug", "drug name", "drug", "brand name"),
+    "batch": ("batch", "batch no", "batch number", "b no", "lot", "lot no", "lot number"),
+    "manufacturer": ("manufacturer", "manufactured by", "name of manufacturer", "manufacturer name", "mfd by", "firm"),
+    "list_type": ("list", "list type", "alert type", "category"),
+    "month": ("month", "reporting month", "reported month", "month of reporting"),
+    "reason": ("reason", "reason for nsq", "nsq parameter", "test result", "remarks"),
+}
+
+
+_HEADING_TO_FIELD = heading_map(_COLUMN_ALIASES)
+
+
+def normalize_batch(batch: Optional[str]) -> str:
+    """Upper-case batch number with separators removed ("bn-23/x91" -> "BN23X91")"""
+    return re.sub(r"[^0-9A-Za-z]", "", batch or "").upper()
+
+
+def normalize_product(name: Optional[str]) -> str:
+    """Sorted distinct name tokens without dosage-form words"""
+    tokens = {t for t in re.findall(r"[a-z0-9]+", (name or "").lower()) if t not in _FORM_WORDS}
+    return " ".join(sorted(tokens))
+
+
+def _products_match(a: str, b: str) -> bool:
+    """Whether two normalized product names share a distinctive word"""
+    words_a = {t for t in a.split() if len(t) >= 4 and not t.isdigit()}
+    words_b = {t for t in b.split() if len(t) >= 4 and not t.isdigit()}
+    return bool(words_a & words_b)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings
+
+    Uses double hashing of one BLAKE2b digest, so a membership test costs a
+    single hash plus k bit probes.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        """
+        Args:
+            capacity: Expected number of keys
+            error_rate: Target false-positive rate at capacity
+        """
+        capacity = max(capacity, 1)
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str) -> Iterable[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        size = self.size
+        return ((h1 + i * h2) % size for i in range(self.hashes))
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+def _list_type_from_name(path: str) -> str:
+    name = os.path.basename(path).lower()
+    if "spurious" in name:
+        return "spurious"
+    if "recall" in name:
+        return "recall"
+    return "nsq"
+
+
+def read_alert_file(path: str, list_type: Optional[str] = None) -> List[Dict[str, str]]:
+    """
+    Read alert rows from a saved list or an offline fixture
+
+    Any format read_table_file() accepts. Columns are matched by heading,
+    so CDSCO's "Name of the Drug" / "Batch No." layout and plain
+    product/batch fixtures both work.
+
+    Args:
+        path: File to read
+        list_type: nsq, spurious or recall (default: from a "list" column,
+            else guessed from the file name)
+
+    Returns:
+        Rows with product, batch, manufacturer, list_type, month and reason
+    """
+    records = read_table_file(path, _HEADING_TO_FIELD)
+
+    default_type = list_type or _list_type_from_name(path)
+    result = []
+    for record in records:
+        if not record.get("batch") or not record.get("product"):
+            continue
+        row_type = (record.get("list_type") or "").lower()
+        record["list_type"] = list_type or next((t for t in LIST_TYPES if t in row_type), default_type)
+        result.append(record)
+    return result
+
+
+class BatchAlertIndex:
+    """
+    Local index of alerted (product, batch) pairs
+
+    A Bloom filter over normalized batch numbers answers the usual "batch not
+    on any list" case in memory. Only on a filter hit is the SQLite store
+    consulted, and a hit counts as confirmed only if the listed product also
+    matches the pack. Every ingest bumps a generation counter in the store;
+    worker processes sharing data_dir compare it on each watcher tick and
+    rebuild their filter (and notify listeners) when another one ingested.
+    """
+
+    def __init__(self, data_dir: str = "var/batch_alerts", error_rate: float = 0.001):
+        """
+        Args:
+            data_dir: Folder for the SQLite store; lists to ingest go in data_dir/drops
+            error_rate: Bloom filter false-positive rate
+        """
+        self.data_dir = data_dir
+        self.drops_dir = os.path.join(data_dir, "drops")
+        self.error_rate = error_rate
+        os.makedirs(self.data_dir, exist_ok=True)
+
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(data_dir, "batch_alerts.db"),
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._init_schema()
+
+        self._listeners: List[Callable[[], None]] = []
+        self._generation = 0
+        self._bloom = BloomFilter(1024, error_rate)
+        self._reload()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self._lookups = 0
+        self._fast_path = 0
+
+    def _init_schema(self):
+        with self._db_lock:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS alerts (
+                    list_type TEXT NOT NULL,
+                    product_key TEXT NOT NULL,
+                    batch_key TEXT NOT NULL,
+                    product TEXT NOT NULL,
+                    batch TEXT NOT NULL,
+                    manufacturer TEXT,
+                    month TEXT NOT NULL DEFAULT '',
+                    reason TEXT,
+                    source TEXT,
+                    UNIQUE (list_type, product_key, batch_key, month)
+                );
+                CREATE INDEX IF NOT EXISTS idx_alerts_batch ON alerts (batch_key);
+                CREATE INDEX IF NOT EXISTS idx_alerts_source ON alerts (source);
+                CREATE TABLE IF NOT EXISTS sources (
+                    path TEXT PRIMARY KEY,
+                    mtime_ns INTEGER NOT NULL,
+                    rows INTEGER NOT NULL,
+                    ingested_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS generation (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    value INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO generation (id, value) VALUES (0, 0);
+                """
+            )
+
+    def add_listener(self, callback: Callable[[], None]):
+        """Call `callback` after every ingest (e.g. to drop cached verdicts)"""
+        self._listeners.append(callback)
+
+    def ingest(self, paths: Iterable[str], list_type: Optional[str] = None) -> int:
+        """
+        Load alert files into the store, replacing earlier rows from the same file,
+        and rebuild the Bloom filter
+
+        Args:
+            paths: Saved lists or fixtures (see read_alert_file)
+            list_type: Override the list type of every row
+
+        Returns:
+            Number of rows read
+        """
+        total = 0
+        for path in paths:
+            source = os.path.basename(path)
+            rows = read_alert_file(path, list_type)
+            records = [
+                (
+                    row["list_type"], normalize_product(row["product"]), normalize_batch(row["batch"]),
+                    row["product"], row["batch"], row.get("manufacturer"), row.get("month") or "",
+                    row.get("reason"), source,
+                )
+                for row in rows
+                if normalize_batch(row["batch"])
+            ]
+            with self._db_lock:
+                self._conn.execute("BEGIN")
+                try:
+                    # A corrected list drops the rows it no longer contains
+                    self._conn.execute("DELETE FROM alerts WHERE source = ?", (source,))
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO alerts (list_type, product_key, batch_key, product, batch, "
+                        "manufacturer, month, reason, source) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        records,
+                    )
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO sources (path, mtime_ns, rows, ingested_at) VALUES (?, ?, ?, ?)",
+                        (os.path.abspath(path), os.stat(path).st_mtime_ns, len(records), time.time()),
+                    )
+                    self._conn.execute("UPDATE generation SET value = value + 1 WHERE id = 0")
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            total += len(records)
+
+        self._reload()
+        return total
+
+    def refresh_from_drops(self) -> bool:
+        """
+        Ingest drop-folder files that are new or changed since their last ingest,
+        or pick up what another worker process ingested
+
+        Returns:
+            True if anything was ingested or reloaded
+        """
+        with self._db_lock:
+            seen = {row["path"]: row["mtime_ns"] for row in self._conn.execute("SELECT path, mtime_ns FROM sources")}
+            generation = self._conn.execute("SELECT value FROM generation WHERE id = 0").fetchone()[0]
+        changed = changed_drop_files(self.drops_dir, seen)
+        if not changed:
+            if generation == self._generation:
+                return False
+            self._reload()
+            return True
+
+        count = self.ingest(changed)
+        print(f"Batch alert index: ingested {count} rows from {len(changed)} file(s)")
+        return True
+
+    def check(self, product_name: Optional[str], batch_number: Optional[str]) -> Dict[str, Any]:
+        """
+        Look up a pack's batch number in the alert lists
+
+        Args:
+            product_name: Product name read from the pack (may be None)
+            batch_number: Batch number read from the pack
+
+        Returns:
+            listed: True if the batch is on a list for this product;
+            unconfirmed: True if the batch is listed but the pack's product
+            is unknown (batch numbers are only unique per manufacturer);
+            matches: alert rows for this batch, each with product_match
+            (None if the product is unknown)
+        """
+        batch_key = normalize_batch(batch_number)
+        result = {"checked": False, "listed": False, "unconfirmed": False, "batch_key": batch_key, "matches": []}
+        if len(batch_key) < 3:
+            return result
+
+        result["checked"] = True
+        self._lookups += 1
+        if batch_key not in self._bloom:
+            self._fast_path += 1
+            return result
+
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT list_type, product_key, product, batch, manufacturer, month, reason, source "
+                "FROM alerts WHERE batch_key = ?",
+                (batch_key,),
+            ).fetchall()
+
+        product_key = normalize_product(product_name) if product_name else None
+        for row in rows:
+            product_match = None if not product_key else (
+                row["product_key"] == product_key or _products_match(row["product_key"], product_key)
+            )
+            result["matches"].append({
+                "list_type": row["list_type"],
+                "product": row["product"],
+                "batch": row["batch"],
+                "manufacturer": row["manufacturer"],
+                "month": row["month"] or None,
+                "reason": row["reason"],
+                "source": row["source"],
+                "product_match": product_match,
+            })
+
+        result["listed"] = any(m["product_match"] is True for m in result["matches"])
+        result["unconfirmed"] = any(m["product_match"] is None for m in result["matches"])
+        return result
+
+    def start_watcher(self, interval: float = 3600.0):
+        """Check the drop folder for new or updated lists every `interval` seconds"""
+        os.makedirs(self.drops_dir, exist_ok=True)
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="batch-alerts", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._db_lock:
+            by_type = {
+                row["list_type"]: row["n"]
+                for row in self._conn.execute("SELECT list_type, COUNT(*) AS n FROM alerts GROUP BY list_type")
+            }
+            sources = self._conn.execute("SELECT COUNT(*) FROM sources").fetchone()[0]
+        bloom = self._bloom
+        return {
+            "alerts": by_type,
+            "sources": sources,
+            "generation": self._generation,
+            "bloom": {"batches": bloom.count, "bits": bloom.size, "hashes": bloom.hashes},
+            "lookups": self._lookups,
+            "fast_path_rate": round(self._fast_path / self._lookups, 4) if self._lookups else None,
+        }
+
+    def close(self):
+        with self._db_lock:
+            self._conn.close()
+
+    def _reload(self):
+        """Rebuild the Bloom filter from the store and notify listeners"""
+        with self._db_lock:
+            # One read transaction, so the generation matches the keys read
+            self._conn.execute("BEGIN")
+            try:
+                generation = self._conn.execute("SELECT value FROM generation WHERE id = 0").fetchone()[0]
+                keys: Set[str] = {row[0] for row in self._conn.execute("SELECT DISTINCT batch_key FROM alerts")}
+            finally:
+                self._conn.execute("COMMIT")
+        # Sized with headroom so that monthly additions keep the error rate
+        bloom = BloomFilter(max(len(keys) * 2, 1024), self.error_rate)
+        for key in keys:
+            bloom.add(key)
+        self._bloom = bloom
+        self._generation = generation
+        for callback in self._listeners:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Batch alert listener error: {e}")
+
+    def _watch(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh_from_drops()
+            except Exception as e:
+                print(f"Batch alert refresh error: {e}")
+
+
+# Singleton instance
+_batch_alert_index = None
+
+
+def get_batch_alert_index() -> BatchAlertIndex:
+    """Get singleton batch alert index (data directory from BATCH_ALERTS_DIR)"""
+    global _batch_alert_index
+    if _batch_alert_index is None:
+        _batch_alert_index = BatchAlertIndex(os.getenv("BATCH_ALERTS_DIR", "var/batch_alerts"))
+    return _batch_alert_index
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) >= 3 and sys.argv[1] == "import":
+        index = get_batch_alert_index()
+        print(f"Ingested {index.ingest(sys.argv[2:])} rows")
+        print(index.stats())
+    elif len(sys.argv) == 4 and sys.argv[1] == "check":
+        print(get_batch_alert_index().check(sys.argv[2], sys.argv[3]))
+    else:
+        print("Batch alert index module loaded successfully")
+        print("Usage: python -m services.batch_alerts import <file>... | check <product> <batch>")
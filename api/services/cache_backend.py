@@ -0,0 +1,340 @@
+"""
+Cache Backends
+Pluggable storage for the upstream and verification-result caches: in-process LRU, SQLite file or Redis
+"""
+
+import json
+import os
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Iterable, Tuple
+
+
+try:
+    import msgpack
+except ImportError:  # optional: values fall back to compact JSON
+    msgpack = None
+
+
+# Header of a stored value: soft expiry (epoch seconds) followed by the payload
+_HEADER = struct.Struct("<d")
+
+
+def dumps(value: Any) -> bytes:
+    """Serialize a cache value (msgpack when installed, else compact JSON)"""
+    if msgpack is not None:
+        return b"m" + msgpack.packb(value, use_bin_type=True, default=str)
+    return b"j" + json.dumps(value, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def loads(data: bytes) -> Any:
+    """Inverse of dumps(); either format can be read regardless of what is installed"""
+    if data[:1] == b"m":
+        return msgpack.unpackb(data[1:], raw=False)
+    return json.loads(data[1:].decode("utf-8"))
+
+
+def namespace_ttl(namespace: str, default: float) -> float:
+    """TTL for a namespace: CACHE_TTL_<NAMESPACE> (e.g. CACHE_TTL_GS1) or default"""
+    value = os.getenv(f"CACHE_TTL_{namespace.upper()}")
+    return float(value) if value else default
+
+
+class CacheBackend:
+    """
+    Storage behind TTLCache and the shared tier of ResultCache
+
+    Entries live in namespaces. Each entry has a soft expiry, returned with
+    the value so callers can serve it stale, and a hard expiry after which
+    the backend no longer returns it. Values are serialized, so callers
+    always get their own copy.
+    """
+
+    name = "base"
+
+    def get_many(self, namespace: str, keys: Iterable[str]) -> Dict[str, Tuple[float, Any]]:
+        """
+        Look up several keys at once
+
+        Returns:
+            {key: (soft expiry, value)} for the keys present and not past their hard expiry
+        """
+        raise NotImplementedError
+
+    def set_many(self, namespace: str, items: Dict[str, Any], ttl_seconds: float, stale_seconds: float = 0):
+        """
+        Store several values at once
+
+        Args:
+            namespace: Cache namespace
+            items: {key: value}
+            ttl_seconds: Time until the entries are stale (soft TTL)
+            stale_seconds: Further time they may still be served (hard TTL = soft + stale)
+        """
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key: str):
+        raise NotImplementedError
+
+    def clear(self, namespace: str):
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[float, Any]]:
+        return self.get_many(namespace, [key]).get(key)
+
+    def set(self, namespace: str, key: str, value: Any, ttl_seconds: float, stale_seconds: float = 0):
+        self.set_many(namespace, {key: value}, ttl_seconds, stale_seconds)
+
+
+class MemoryBackend(CacheBackend):
+    """
+    In-process LRU, one instance per cache
+
+    Values are kept serialized so that entries cost their encoded size and
+    readers never share objects. Also serves as the in-memory stand-in for
+    the shared backends when none is configured.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # (namespace, key) -> (soft expiry, hard expiry, payload)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, float, bytes]]" = OrderedDict()
+
+    def get_many(self, namespace: str, keys: Iterable[str]) -> Dict[str, Tuple[float, Any]]:
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get((namespace, key))
+                if entry is None:
+                    continue
+                if entry[1] <= now:
+                    del self._entries[(namespace, key)]
+                    continue
+                self._entries.move_to_end((namespace, key))
+                found[key] = (entry[0], entry[2])
+        return {key: (soft, loads(payload)) for key, (soft, payload) in found.items()}
+
+    def set_many(self, namespace: str, items: Dict[str, Any], ttl_seconds: float, stale_seconds: float = 0):
+        soft = time.time() + ttl_seconds
+        encoded = {key: dumps(value) for key, value in items.items()}
+        with self._lock:
+            for key, payload in encoded.items():
+                self._entries[(namespace, key)] = (soft, soft + stale_seconds, payload)
+                self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            self._entries.pop((namespace, key), None)
+
+    def clear(self, namespace: str):
+        with self._lock:
+            for entry_key in [k for k in self._entries if k[0] == namespace]:
+                del self._entries[entry_key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": self.name, "entries": len(self._entries), "max_entries": self.max_entries}
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    Cache in one SQLite file, shared by every worker process on the host
+
+    WAL mode lets workers read while one writes. Expired rows are purged
+    every `purge_every` writes.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = "var/cache/cache.db", purge_every: int = 1000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.purge_every = purge_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                soft_expires REAL NOT NULL,
+                hard_expires REAL NOT NULL,
+                value BLOB NOT NULL,
+                PRIMARY KEY (namespace, key)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_hard ON entries (hard_expires)")
+
+    def get_many(self, namespace: str, keys: Iterable[str]) -> Dict[str, Tuple[float, Any]]:
+        keys = list(keys)
+        found = {}
+        now = time.time()
+        # SQLite limits bound parameters per statement
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT key, soft_expires, value FROM entries "
+                    f"WHERE namespace = ? AND key IN ({marks}) AND hard_expires > ?",
+                    (namespace, *chunk, now),
+                ).fetchall()
+            for key, soft, payload in rows:
+                found[key] = (soft, loads(payload))
+        return found
+
+    def set_many(self, namespace: str, items: Dict[str, Any], ttl_seconds: float, stale_seconds: float = 0):
+        soft = time.time() + ttl_seconds
+        rows = [(namespace, key, soft, soft + stale_seconds, dumps(value)) for key, value in items.items()]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO entries (namespace, key, soft_expires, hard_expires, value) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._writes += len(rows)
+                if self._writes >= self.purge_every:
+                    self._writes = 0
+                    self._conn.execute("DELETE FROM entries WHERE hard_expires <= ?", (time.time(),))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def clear(self, namespace: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            by_namespace = dict(self._conn.execute("SELECT namespace, COUNT(*) FROM entries GROUP BY namespace"))
+        return {"backend": self.name, "path": self.path, "entries": by_namespace}
+
+
+class RedisBackend(CacheBackend):
+    """
+    Cache in Redis, shared by every worker on every host
+
+    Each entry is one key "<prefix>:<namespace>:<key>" holding the soft
+    expiry header and payload, with the hard TTL as the Redis expiry.
+    Multi-get and multi-set are single MGET / pipelined SET round trips.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = "redis://localhost:6379/0", prefix: str = "mediscan", client: Any = None):
+        """
+        Args:
+            url: Redis URL (ignored when client is given)
+            prefix: Key prefix, so several deployments can share one server
+            client: Existing redis.Redis-compatible client
+        """
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}:{namespace}:{key}"
+
+    def get_many(self, namespace: str, keys: Iterable[str]) -> Dict[str, Tuple[float, Any]]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self.client.mget([self._key(namespace, key) for key in keys])
+        found = {}
+        for key, data in zip(keys, values):
+            if data is not None:
+                found[key] = (_HEADER.unpack_from(data)[0], loads(data[_HEADER.size:]))
+        return found
+
+    def set_many(self, namespace: str, items: Dict[str, Any], ttl_seconds: float, stale_seconds: float = 0):
+        soft = time.time() + ttl_seconds
+        expire_ms = max(1, int((ttl_seconds + stale_seconds) * 1000))
+        pipe = self.client.pipeline(transaction=False)
+        for key, value in items.items():
+            pipe.set(self._key(namespace, key), _HEADER.pack(soft) + dumps(value), px=expire_ms)
+        pipe.execute()
+
+    def delete(self, namespace: str, key: str):
+        self.client.delete(self._key(namespace, key))
+
+    def clear(self, namespace: str):
+        batch: List[bytes] = []
+        for redis_key in self.client.scan_iter(match=f"{self.prefix}:{namespace}:*", count=1000):
+            batch.append(redis_key)
+            if len(batch) >= 1000:
+                self.client.delete(*batch)
+                batch = []
+        if batch:
+            self.client.delete(*batch)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "prefix": self.prefix}
+
+
+# Shared backend instance (SQLite or Redis); the memory backend is per cache
+_shared_backend = None
+_shared_lock = threading.Lock()
+
+
+def get_cache_backend(max_entries: int = 10000) -> CacheBackend:
+    """
+    Backend for one cache, from CACHE_BACKEND (memory, sqlite or redis)
+
+    memory returns a new per-cache LRU of max_entries; sqlite (CACHE_SQLITE_PATH)
+    and redis (REDIS_URL) return one instance shared by every cache.
+    """
+    global _shared_backend
+    kind = os.getenv("CACHE_BACKEND", "memory").lower()
+    if kind == "memory":
+        return MemoryBackend(max_entries)
+    if _shared_backend is None:
+        with _shared_lock:
+            if _shared_backend is None:
+                if kind == "sqlite":
+                    _shared_backend = SQLiteBackend(os.getenv("CACHE_SQLITE_PATH", "var/cache/cache.db"))
+                elif kind == "redis":
+                    _shared_backend = RedisBackend(
+                        os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+                        prefix=os.getenv("CACHE_KEY_PREFIX", "mediscan"),
+                    )
+                else:
+                    raise ValueError(f"Unknown CACHE_BACKEND: {kind}")
+    return _shared_backend
+
+
+def get_shared_backend() -> Optional[CacheBackend]:
+    """The cross-worker backend, or None when caches are in-process only"""
+    if os.getenv("CACHE_BACKEND", "memory").lower() == "memory":
+        return None
+    return get_cache_backend()
+
+
+if __name__ == "__main__":
+    print("Cache backend module loaded successfully")
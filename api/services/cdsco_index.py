@@ -0,0 +1,412 @@
+"""
+CDSCO Drug Index
+Local SQLite FTS5 index of CDSCO approved-drug and manufacturing-licence lists
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Any, Iterable
+
+from .batch_alerts import normalize_product
+from .table_files import changed_drop_files, heading_map, read_table_file
+
+
+LIST_KINDS = ("approved", "licence")
+
+# Column headings seen in the CDSCO approved-drug list and state licence registers
+_COLUMN_ALIASES = {
+    "name": ("name", "name of the drug", "name of drug", "drug name", "drug", "product", "product name", "brand name"),
+    "composition": ("composition", "generic", "generic name", "active ingredient", "salt"),
+    "manufacturer": ("manufacturer", "name of the firm", "name of firm", "firm", "firm name", "company", "applicant", "licence holder", "license holder"),
+    "licence_number": ("licence no", "licence number", "license no", "license number", "mfg licence no", "mfg license no", "ml no"),
+    "strength": ("strength", "dosage", "dose"),
+    "approval_date": ("date of approval", "approval date", "date of issue", "issue date"),
+    "indication": ("indication", "indications", "therapeutic category"),
+    "state": ("state", "state licensing authority"),
+    "kind": ("list", "list type", "kind"),
+}
+
+# Weights of name, composition, manufacturer and licence_number in bm25()
+_BM25_WEIGHTS = (10.0, 4.0, 1.0, 0.5)
+
+# Words shared by too many company names to tell manufacturers apart
+_COMPANY_WORDS = {
+    "ltd", "limited", "pvt", "private", "inc", "company", "corporation", "pharma", "pharmaceutical",
+    "pharmaceuticals", "laboratories", "lab", "labs", "healthcare", "health", "life", "sciences", "india",
+}
+
+
+_HEADING_TO_FIELD = heading_map(_COLUMN_ALIASES)
+
+
+def normalize_licence(licence_number: Optional[str]) -> str:
+    """Upper-case licence number with separators removed ("KTK/25/123/2010" -> "KTK251232010")"""
+    return re.sub(r"[^0-9A-Za-z]", "", licence_number or "").upper()
+
+
+def read_cdsco_file(path: str, kind: Optional[str] = None) -> List[Dict[str, str]]:
+    """
+    Read approved-drug or licence rows from a saved list
+
+    Any format read_table_file() accepts; columns are matched by heading.
+
+    Args:
+        path: File to read
+        kind: approved or licence (default: from a "list" column, else
+            "licence" if the file name mentions licences)
+
+    Returns:
+        Rows with name, composition, manufacturer, licence_number, strength,
+        approval_date, indication, state and kind
+    """
+    records = read_table_file(path, _HEADING_TO_FIELD)
+
+    name = os.path.basename(path).lower()
+    default_kind = kind or ("licence" if "licen" in name else "approved")
+    result = []
+    for record in records:
+        if not record.get("name") and not record.get("licence_number"):
+            continue
+        row_kind = (record.get("kind") or "").lower()
+        if "licen" in row_kind:
+            row_kind = "licence"
+        elif "approv" in row_kind:
+            row_kind = "approved"
+        record["kind"] = kind or (row_kind if row_kind in LIST_KINDS else default_kind)
+        result.append(record)
+    return result
+
+
+class CDSCOIndex:
+    """
+    Full-text index of CDSCO approved drugs and manufacturing licences
+
+    Rows live in a SQLite table mirrored into an FTS5 table over name,
+    composition, manufacturer and licence number; name queries are ranked
+    with bm25() and licence numbers are looked up by their normalized key.
+    Every ingest bumps a generation counter in the store, so worker
+    processes sharing data_dir notify their listeners on their next
+    watcher tick when another one ingested.
+    """
+
+    def __init__(self, data_dir: str = "var/cdsco"):
+        """
+        Args:
+            data_dir: Folder for the SQLite store; lists to ingest go in data_dir/drops
+        """
+        self.data_dir = data_dir
+        self.drops_dir = os.path.join(data_dir, "drops")
+        os.makedirs(self.data_dir, exist_ok=True)
+
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(data_dir, "cdsco.db"),
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._init_schema()
+
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self._listeners: List[Callable[[], None]] = []
+        self._generation = self._read_generation()
+        self._lookups = 0
+        self._hits = 0
+
+    def _init_schema(self):
+        with self._db_lock:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS records (
+                    id INTEGER PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    name TEXT,
+                    composition TEXT,
+                    manufacturer TEXT,
+                    licence_number TEXT,
+                    licence_key TEXT,
+                    strength TEXT,
+                    approval_date TEXT,
+                    indication TEXT,
+                    state TEXT,
+                    source TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_records_licence ON records (licence_key);
+                CREATE INDEX IF NOT EXISTS idx_records_source ON records (source);
+                CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5 (
+                    name, composition, manufacturer, licence_number
+                );
+                CREATE TABLE IF NOT EXISTS sources (
+                    path TEXT PRIMARY KEY,
+                    mtime_ns INTEGER NOT NULL,
+                    rows INTEGER NOT NULL,
+                    ingested_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS generation (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    value INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO generation (id, value) VALUES (0, 0);
+                """
+            )
+
+    def add_listener(self, callback: Callable[[], None]):
+        """Call `callback` after every ingest (e.g. to drop cached verdicts)"""
+        self._listeners.append(callback)
+
+    def ingest(self, paths: Iterable[str], kind: Optional[str] = None) -> int:
+        """
+        Load CDSCO lists into the index, replacing earlier rows from the same file
+
+        Args:
+            paths: Saved lists (see read_cdsco_file)
+            kind: Override the kind of every row
+
+        Returns:
+            Number of rows read
+        """
+        total = 0
+        for path in paths:
+            source = os.path.basename(path)
+            records = [
+                (
+                    row["kind"], row.get("name"), row.get("composition"), row.get("manufacturer"),
+                    row.get("licence_number"), normalize_licence(row.get("licence_number")) or None,
+                    row.get("strength"), row.get("approval_date"), row.get("indication"), row.get("state"),
+                    source,
+                )
+                for row in read_cdsco_file(path, kind)
+            ]
+            with self._db_lock:
+                self._conn.execute("BEGIN")
+                try:
+                    self._conn.execute(
+                        "DELETE FROM records_fts WHERE rowid IN (SELECT id FROM records WHERE source = ?)", (source,)
+                    )
+                    self._conn.execute("DELETE FROM records WHERE source = ?", (source,))
+                    self._conn.executemany(
+                        "INSERT INTO records (kind, name, composition, manufacturer, licence_number, licence_key, "
+                        "strength, approval_date, indication, state, source) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        records,
+                    )
+                    self._conn.execute(
+                        "INSERT INTO records_fts (rowid, name, composition, manufacturer, licence_number) "
+                        "SELECT id, name, composition, manufacturer, licence_number FROM records WHERE source = ?",
+                        (source,),
+                    )
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO sources (path, mtime_ns, rows, ingested_at) VALUES (?, ?, ?, ?)",
+                        (os.path.abspath(path), os.stat(path).st_mtime_ns, len(records), time.time()),
+                    )
+                    self._conn.execute("UPDATE generation SET value = value + 1 WHERE id = 0")
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            total += len(records)
+
+        self._reloaded(self._read_generation())
+        return total
+
+    def refresh_from_drops(self) -> bool:
+        """
+        Ingest drop-folder files that are new or changed since their last ingest,
+        or pick up what another worker process ingested
+
+        Returns:
+            True if anything was ingested or changed by another worker
+        """
+        with self._db_lock:
+            seen = {row["path"]: row["mtime_ns"] for row in self._conn.execute("SELECT path, mtime_ns FROM sources")}
+        changed = changed_drop_files(self.drops_dir, seen)
+        if not changed:
+            generation = self._read_generation()
+            if generation == self._generation:
+                return False
+            self._reloaded(generation)
+            return True
+
+        count = self.ingest(changed)
+        print(f"CDSCO index: ingested {count} rows from {len(changed)} file(s)")
+        return True
+
+    def search_name(
+        self,
+        drug_name: Optional[str],
+        limit: int = 5,
+        manufacturer: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Rank records whose name or composition contain every query word
+
+        Dosage-form words are ignored. If nothing contains every word, the
+        query is retried with only the alphabetic words (so a strength that
+        the list spells differently does not hide the product). A word found
+        only in the manufacturer column does not make a match: a company
+        name alone says nothing about which of its drugs is on the pack.
+
+        Args:
+            drug_name: Product name as read from the pack
+            limit: Maximum records
+            manufacturer: Manufacturer from the pack or GS1; records of the
+                same company rank first
+
+        Returns:
+            Records, best first, each with a bm25 score (higher is better)
+            and manufacturer_match (None without a manufacturer)
+        """
+        tokens = normalize_product(drug_name).split()
+        words = [t for t in tokens if not t.isdigit() and len(t) >= 3]
+        company = {w for w in normalize_product(manufacturer).split() if len(w) >= 3} - _COMPANY_WORDS
+        # Extra candidates so a same-company record below the top `limit` can move up
+        candidates = limit * 4 if company else limit
+        rows = []
+        for query_tokens in (tokens, words):
+            if not query_tokens:
+                continue
+            query = "{name composition} : (" + " ".join(f'"{t}"' for t in query_tokens) + ")"
+            with self._db_lock:
+                rows = self._conn.execute(
+                    "SELECT r.*, bm25(records_fts, ?, ?, ?, ?) AS rank FROM records_fts "
+                    "JOIN records r ON r.id = records_fts.rowid "
+                    "WHERE records_fts MATCH ? ORDER BY rank LIMIT ?",
+                    (*_BM25_WEIGHTS, query, candidates),
+                ).fetchall()
+            if rows or query_tokens == words:
+                break
+
+        results = self._record_results(rows)
+        for record in results:
+            record["manufacturer_match"] = bool(
+                company & set(normalize_product(record["manufacturer"]).split())
+            ) if company else None
+        # Stable: bm25 order within each group
+        results.sort(key=lambda record: record["manufacturer_match"] is not True)
+        return results[:limit]
+
+    def search_licence(self, licence_number: Optional[str], limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Find records for a manufacturing licence number (separators ignored)
+
+        Args:
+            licence_number: Licence number as printed, e.g. "KTK/25/123/2010"
+            limit: Maximum records
+        """
+        key = normalize_licence(licence_number)
+        if len(key) < 4:
+            return []
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT r.*, 0.0 AS rank FROM records r WHERE licence_key = ? "
+                "ORDER BY kind = 'licence' DESC, id LIMIT ?",
+                (key, limit),
+            ).fetchall()
+        return self._record_results(rows)
+
+    def start_watcher(self, interval: float = 86400.0):
+        """Check the drop folder for new or updated lists every `interval` seconds"""
+        os.makedirs(self.drops_dir, exist_ok=True)
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="cdsco-index", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._db_lock:
+            by_kind = {
+                row["kind"]: row["n"]
+                for row in self._conn.execute("SELECT kind, COUNT(*) AS n FROM records GROUP BY kind")
+            }
+            sources = self._conn.execute("SELECT COUNT(*) FROM sources").fetchone()[0]
+        return {
+            "records": by_kind,
+            "sources": sources,
+            "generation": self._generation,
+            "lookups": self._lookups,
+            "hit_rate": round(self._hits / self._lookups, 4) if self._lookups else None,
+        }
+
+    def close(self):
+        with self._db_lock:
+            self._conn.close()
+
+    def _read_generation(self) -> int:
+        with self._db_lock:
+            return self._conn.execute("SELECT value FROM generation WHERE id = 0").fetchone()[0]
+
+    def _reloaded(self, generation: int):
+        """Record the store generation now in use and notify listeners"""
+        self._generation = generation
+        for callback in self._listeners:
+            try:
+                callback()
+            except Exception as e:
+                print(f"CDSCO index listener error: {e}")
+
+    def _record_results(self, rows: List[sqlite3.Row]) -> List[Dict[str, Any]]:
+        self._lookups += 1
+        if rows:
+            self._hits += 1
+        return [
+            {
+                "kind": row["kind"],
+                "name": row["name"],
+                "composition": row["composition"],
+                "manufacturer": row["manufacturer"],
+                "licence_number": row["licence_number"],
+                "strength": row["strength"],
+                "approval_date": row["approval_date"],
+                "indication": row["indication"],
+                "state": row["state"],
+                "source": row["source"],
+                "score": round(-row["rank"], 4),
+            }
+            for row in rows
+        ]
+
+    def _watch(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh_from_drops()
+            except Exception as e:
+                print(f"CDSCO index refresh error: {e}")
+
+
+# Singleton instance
+_cdsco_index = None
+
+
+def get_cdsco_index() -> CDSCOIndex:
+    """Get singleton CDSCO index (data directory from CDSCO_INDEX_DIR)"""
+    global _cdsco_index
+    if _cdsco_index is None:
+        _cdsco_index = CDSCOIndex(os.getenv("CDSCO_INDEX_DIR", "var/cdsco"))
+    return _cdsco_index
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) >= 3 and sys.argv[1] == "import":
+        index = get_cdsco_index()
+        print(f"Ingested {index.ingest(sys.argv[2:])} rows")
+        print(index.stats())
+    elif len(sys.argv) >= 3 and sys.argv[1] == "search":
+        for record in get_cdsco_index().search_name(" ".join(sys.argv[2:])):
+            print(record)
+    elif len(sys.argv) == 3 and sys.argv[1] == "licence":
+        for record in get_cdsco_index().search_licence(sys.argv[2]):
+            print(record)
+    else:
+        print("CDSCO index module loaded successfully")
+        print("Usage: python -m services.cdsco_index import <file>... | search <name> | licence <number>")
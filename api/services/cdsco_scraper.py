@@ -4,17 +4,27 @@ Scrapes CDSCO website for drug registration and approval information
 """
 
 import requests
-from bs4 import BeautifulSoup
 from typing import Optional, Dict, Any, List
 import re
 import time
 from .tavily_search import get_tavily_service
+from .cdsco_index import CDSCOIndex, get_cdsco_index
+from .ttl_cache import DEFAULT_STALE_SECONDS, TTLCache
+from .circuit_breaker import guarded_upstream
+from .metrics import CDSCO_LOOKUPS
 
 
 class CDSCOScraper:
     """Scraper for CDSCO India data sources"""
 
-    def __init__(self):
+    def __init__(self, index: Optional[CDSCOIndex] = None, cache: Optional[TTLCache] = None):
+        """
+        Args:
+            index: Local approved-drug and licence index (default: shared instance)
+            cache: Cache of the scraped alerts page
+        """
+        self.index = index or get_cdsco_index()
+        self.cache = cache or TTLCache("cdsco", ttl_seconds=3600, max_entries=16, stale_seconds=DEFAULT_STALE_SECONDS)
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
@@ -24,13 +34,17 @@ class CDSCOScraper:
         self.cdsco_base_url = "https://cdsco.gov.in"
         self.approved_drugs_url = f"{self.cdsco_base_url}/opencms/opencms/en/Drugs/"
 
-    def search_drug(self, drug_name: str = None, license_number: str = None) -> Dict[str, Any]:
+    def search_drug(self, drug_name: str = None, license_number: str = None, manufacturer: str = None) -> Dict[str, Any]:
         """
         Search for drug information in CDSCO database
 
+        The local index is searched first; Tavily is only asked when neither
+        the licence number nor the name is found there.
+
         Args:
             drug_name: Name of the drug
             license_number: Manufacturing license number
+            manufacturer: Manufacturer, to prefer that company's records in the local index
 
         Returns:
             Dictionary with drug information if found
@@ -49,12 +63,14 @@ class CDSCOScraper:
             license_result = self._search_by_license(license_number)
             if license_result["found"]:
                 result.update(license_result)
+                CDSCO_LOOKUPS.inc(resolved_by="local")
                 return result
 
         if drug_name:
-            drug_result = self._search_by_name(drug_name)
+            drug_result = self._search_by_name(drug_name, manufacturer)
             if drug_result["found"]:
                 result.update(drug_result)
+                CDSCO_LOOKUPS.inc(resolved_by="local")
                 return result
 
         # Try Tavily AI search as fallback
@@ -62,8 +78,10 @@ class CDSCOScraper:
         if tavily_result["found"]:
             result.update(tavily_result)
             result["source"] = "Tavily AI Search + CDSCO"
+            CDSCO_LOOKUPS.inc(resolved_by="network")
             return result
 
+        CDSCO_LOOKUPS.inc(resolved_by="not_found")
         return result
 
     def _search_tavily(self, drug_name: str) -> Dict[str, Any]:
@@ -95,33 +113,43 @@ class CDSCOScraper:
         result = {"found": False}
 
         try:
-            # CDSCO doesn't have a direct API, so this is a placeholder
-            # In practice, you'd need to navigate through their portal
-            # or use the DAVA portal if you have access
-
-            # Placeholder implementation
-            # Real implementation would require detailed scraping or API access
-            pass
+            matches = self.index.search_licence(license_number)
+            if matches:
+                result = self._index_result(matches)
+                result["license_number"] = matches[0]["licence_number"]
 
         except Exception as e:
             print(f"License search error: {e}")
 
         return result
 
-    def _search_by_name(self, drug_name: str) -> Dict[str, Any]:
+    def _search_by_name(self, drug_name: str, manufacturer: str = None) -> Dict[str, Any]:
         """Search by drug name"""
         result = {"found": False}
 
         try:
-            # Placeholder for drug name search
-            # Would require accessing CDSCO's approved drugs list
-            pass
+            matches = self.index.search_name(drug_name, manufacturer=manufacturer)
+            if matches:
+                result = self._index_result(matches)
 
         except Exception as e:
             print(f"Drug name search error: {e}")
 
         return result
 
+    def _index_result(self, matches: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Search result fields from local index records, best first"""
+        best = matches[0]
+        return {
+            "found": True,
+            "manufacturer": best["manufacturer"],
+            "approval_status": "Approved" if best["kind"] == "approved" else "Licensed",
+            "composition": best["composition"],
+            "approval_date": best["approval_date"],
+            "matches": matches,
+            "source": "CDSCO local index"
+        }
+
     def check_counterfeit_alerts(self, drug_name: str = None, manufacturer: str = None) -> List[Dict[str, Any]]:
         """
         Check CDSCO's counterfeit drug alerts
@@ -136,36 +164,28 @@ class CDSCOScraper:
         alerts = []
 
         try:
-            # CDSCO publishes alerts about counterfeit drugs
-            # This would scrape their alerts page
-            alerts_url = f"{self.cdsco_base_url}/opencms/opencms/en/Drugs/Drugs-Alert/"
-
-            response = self.session.get(alerts_url, timeout=10)
-
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-
-                # Look for alert content
-                alert_sections = soup.find_all('div', class_=['alert-content', 'content'])
-
-                for section in alert_sections:
-                    text = section.get_text(strip=True).lower()
-
-                    # Check if drug name or manufacturer mentioned
-                    if drug_name and drug_name.lower() in text:
-                        alerts.append({
-                            "type": "counterfeit_alert",
-                            "description": section.get_text(strip=True)[:200],
-                            "match": drug_name
-                        })
-                    elif manufacturer and manufacturer.lower() in text:
-                        alerts.append({
-                            "type": "manufacturer_alert",
-                            "description": section.get_text(strip=True)[:200],
-                            "match": manufacturer
-                        })
-
-            time.sleep(1)  # Rate limiting
+            # CDSCO publishes alerts about counterfeit drugs on one page,
+            # shared by every request (served stale while it is re-fetched)
+            alert_sections = self.cache.get("alerts_page", refresh=self._fetch_alert_sections)
+            if alert_sections is None:
+                alert_sections = self._fetch_alert_sections()
+
+            for section in alert_sections:
+                text = section.lower()
+
+                # Check if drug name or manufacturer mentioned
+                if drug_name and drug_name.lower() in text:
+                    alerts.append({
+                        "type": "counterfeit_alert",
+                        "description": section[:200],
+                        "match": drug_name
+                    })
+                elif manufacturer and manufacturer.lower() in text:
+                    alerts.append({
+                        "type": "manufacturer_alert",
+                        "description": section[:200],
+                        "match": manufacturer
+                    })
 
         except Exception as e:
             print(f"Alert check error: {e}")
@@ -190,46 +210,28 @@ class CDSCOScraper:
         return alerts
 
 
-class DAVAPortalScraper:
-    """
-    Scraper for DAVA Portal (Directorate General of Foreign Trade)
-    Used for pharmaceutical export verification
-    """
-
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        })
-        self.dava_url = "https://dava.dgft.gov.in"
-
-    def verify_export_barcode(self, gtin: str) -> Dict[str, Any]:
-        """
-        Verify barcode against DAVA portal for export medicines
+    def _fetch_alert_sections(self) -> List[str]:
+        """Scrape the alert texts from the CDSCO alerts page and cache them"""
+        alerts_url = f"{self.cdsco_base_url}/opencms/opencms/en/Drugs/Drugs-Alert/"
 
-        Args:
-            gtin: GTIN barcode
+        with guarded_upstream("cdsco_alerts", breaker="cdsco") as call:
+            response = self.session.get(alerts_url, timeout=call.timeout)
+            call.status = response.status_code
+            if response.status_code != 200:
+                call.outcome = "http_error"
 
-        Returns:
-            Verification result
-        """
-        result = {
-            "found": False,
-            "gtin": gtin,
-            "export_approved": False,
-            "source": "DAVA Portal"
-        }
+        sections = []
+        if response.status_code == 200:
+            from bs4 import BeautifulSoup
+            soup = BeautifulSoup(response.content, 'html.parser')
 
-        try:
-            # DAVA portal verification
-            # This would require authentication and proper API access
-            # Placeholder implementation
-            pass
+            # Look for alert content
+            for section in soup.find_all('div', class_=['alert-content', 'content']):
+                sections.append(section.get_text(strip=True))
+            self.cache.set("alerts_page", sections)
 
-        except Exception as e:
-            print(f"DAVA verification error: {e}")
-
-        return result
+        time.sleep(1)  # Rate limiting
+        return sections
 
 
 def verify_drug_regulatory(drug_name: str = None, license_number: str = None, manufacturer: str = None) -> Dict[str, Any]:
@@ -247,7 +249,7 @@ def verify_drug_regulatory(drug_name: str = None, license_number: str = None, ma
     scraper = CDSCOScraper()
 
     # Search drug information
-    result = scraper.search_drug(drug_name, license_number)
+    result = scraper.search_drug(drug_name, license_number, manufacturer)
 
     # Check for counterfeit alerts
     alerts = scraper.check_counterfeit_alerts(drug_name, manufacturer)
@@ -258,6 +260,14 @@ def verify_drug_regulatory(drug_name: str = None, license_number: str = None, ma
     return result
 
 
+def __getattr__(name: str):
+    # DAVAPortalScraper moved to dava_scraper; imported only when asked for
+    if name == "DAVAPortalScraper":
+        from .dava_scraper import DAVAPortalScraper
+        return DAVAPortalScraper
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 if __name__ == "__main__":
     # Test CDSCO scraper
     print("Testing CDSCO scraper...")
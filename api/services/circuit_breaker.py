@@ -0,0 +1,247 @@
+"""
+Circuit Breakers
+Per-source failure-rate circuit breakers and latency-adaptive timeouts for upstream calls
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Any, Iterator, Tuple
+
+from .metrics import CIRCUIT_STATE, UPSTREAM_SKIPPED, UpstreamCall, time_upstream
+
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Sources skipped or failed while a collect_unavailable() block is active
+_UNAVAILABLE_LOGS: ContextVar[Tuple[List[str], ...]] = ContextVar("mediscan_unavailable_sources", default=())
+
+
+class SourceUnavailable(Exception):
+    """Raised instead of calling a source whose circuit is open"""
+
+    def __init__(self, source: str):
+        super().__init__(f"{source} unavailable (circuit open)")
+        self.source = source
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker over a sliding window of call outcomes
+
+    The circuit opens when at least `failure_rate` of the last `window`
+    calls failed (once `min_calls` have been seen). After `open_seconds` one
+    probe call is let through: success closes the circuit, failure opens it
+    again. Timeouts follow the source's recent successful latencies.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        open_seconds: float = 30.0,
+        min_timeout: float = 1.0,
+        max_timeout: float = 10.0,
+        timeout_percentile: float = 0.99,
+        timeout_multiplier: float = 3.0
+    ):
+        """
+        Args:
+            name: Source name (metric label)
+            window: Number of recent calls the failure rate is computed over
+            min_calls: Calls needed in the window before the circuit can open
+            failure_rate: Failure fraction that opens the circuit
+            open_seconds: Time the circuit stays open before a probe
+            min_timeout: Lower bound of the adaptive timeout
+            max_timeout: Upper bound, and the timeout until enough latencies are known
+            timeout_percentile: Latency percentile the timeout is based on
+            timeout_multiplier: Headroom applied to that percentile
+        """
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_percentile = timeout_percentile
+        self.timeout_multiplier = timeout_multiplier
+        self.state = CLOSED
+        self._outcomes: deque = deque(maxlen=window)
+        self._latencies: deque = deque(maxlen=100)
+        self._opened_at = 0.0
+        self._probing = False
+        self._opens = 0
+        self._skipped = 0
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set_function(lambda: _STATE_VALUES[self.state], source=name)
+
+    def allow(self) -> bool:
+        """Whether a call may be made now (claims the probe slot when half-open)"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self._skipped += 1
+        UPSTREAM_SKIPPED.inc(source=self.name)
+        return False
+
+    def record(self, success: bool, elapsed: float):
+        """
+        Record the outcome of a call made after allow()
+
+        Args:
+            success: False for errors, timeouts and server-side failures
+            elapsed: Call duration in seconds
+        """
+        with self._lock:
+            if success:
+                self._latencies.append(elapsed)
+            if self.state == HALF_OPEN:
+                self._probing = False
+                if success:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+
+            self._outcomes.append(success)
+            if self.state == CLOSED and len(self._outcomes) >= self.min_calls:
+                failures = self._outcomes.count(False)
+                if failures / len(self._outcomes) >= self.failure_rate:
+                    self._open()
+
+    def timeout(self) -> float:
+        """Request timeout for the next call, from recent successful latencies"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < 10:
+            return self.max_timeout
+        observed = latencies[min(len(latencies) - 1, int(len(latencies) * self.timeout_percentile))]
+        return round(min(self.max_timeout, max(self.min_timeout, observed * self.timeout_multiplier)), 3)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = len(self._outcomes)
+            failures = self._outcomes.count(False)
+            state = self.state
+            opens, skipped = self._opens, self._skipped
+        return {
+            "state": state,
+            "window_calls": calls,
+            "window_failure_rate": round(failures / calls, 4) if calls else None,
+            "timeout_seconds": self.timeout(),
+            "opens": opens,
+            "skipped": skipped,
+        }
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._opens += 1
+        self._outcomes.clear()
+
+
+def _call_succeeded(call: UpstreamCall) -> bool:
+    """Errors, timeouts, 5xx and 429 count against the source; 4xx and not-found do not"""
+    if call.outcome in ("error", "timeout"):
+        return False
+    return not (call.status and (call.status >= 500 or call.status == 429))
+
+
+@contextmanager
+def guarded_upstream(source: str, breaker: Optional[str] = None) -> Iterator[UpstreamCall]:
+    """
+    Time one upstream call through its source's circuit breaker
+
+    Yields the UpstreamCall with `timeout` set to the adaptive timeout for
+    this source. Raises SourceUnavailable without calling anything if the
+    circuit is open.
+
+    Args:
+        source: Upstream source label (e.g. "gepir")
+        breaker: Breaker name, if several sources share one (default: source)
+    """
+    circuit = get_breaker(breaker or source)
+    if not circuit.allow():
+        for log in _UNAVAILABLE_LOGS.get():
+            log.append(circuit.name)
+        raise SourceUnavailable(circuit.name)
+
+    call = time_upstream(source)
+    try:
+        with call:
+            call.timeout = circuit.timeout()
+            yield call
+    finally:
+        succeeded = _call_succeeded(call)
+        circuit.record(succeeded, call.elapsed)
+        if not succeeded:
+            # Callers swallow upstream errors; the log is how a degraded
+            # result (and the job queue's retry) learns about them
+            for log in _UNAVAILABLE_LOGS.get():
+                log.append(circuit.name)
+
+
+@contextmanager
+def collect_unavailable() -> Iterator[List[str]]:
+    """
+    Record every source skipped in this context because its circuit was open,
+    or whose call failed (error, timeout, 5xx or 429)
+
+    Yields:
+        List that receives the skipped breaker names (nested blocks see them too)
+    """
+    log: List[str] = []
+    token = _UNAVAILABLE_LOGS.set(_UNAVAILABLE_LOGS.get() + (log,))
+    try:
+        yield log
+    finally:
+        _UNAVAILABLE_LOGS.reset(token)
+
+
+# Breakers by source, created on first use
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Get the shared breaker for a source (thresholds from CIRCUIT_* env vars)"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = _breakers[name] = CircuitBreaker(
+                    name,
+                    window=int(os.getenv("CIRCUIT_WINDOW", "20")),
+                    min_calls=int(os.getenv("CIRCUIT_MIN_CALLS", "5")),
+                    failure_rate=float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5")),
+                    open_seconds=float(os.getenv("CIRCUIT_OPEN_SECONDS", "30")),
+                    min_timeout=float(os.getenv("UPSTREAM_MIN_TIMEOUT_SECONDS", "1")),
+                    max_timeout=float(os.getenv("UPSTREAM_MAX_TIMEOUT_SECONDS", "10")),
+                )
+    return breaker
+
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    """State of every breaker created so far, for /health"""
+    return {name: breaker.stats() for name, breaker in sorted(_breakers.items())}
+
+
+if __name__ == "__main__":
+    print("Circuit breaker module loaded successfully")
@@ -0,0 +1,144 @@
+"""
+Service Container
+Long-lived service instances built once per process and warmed up before serving
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Any
+
+import cv2
+import numpy as np
+
+from .barcode_service import BarcodeService
+from .ocr_service import OCRService
+from .gs1_scraper import GS1Scraper
+from .cdsco_scraper import CDSCOScraper
+from .tavily_search import get_tavily_service
+
+
+class ServiceContainer:
+    """
+    Holds the barcode, OCR and registry services shared by every request
+
+    These services keep no per-request state: the scrapers reuse one
+    requests.Session (and its connection pool) and the OCR/barcode services
+    only hold configuration, so one instance each serves all requests and
+    job workers.
+    """
+
+    def __init__(self, tesseract_cmd: Optional[str] = None, started_at: Optional[float] = None):
+        """
+        Args:
+            tesseract_cmd: Path to the tesseract binary
+            started_at: time.perf_counter() at process start, for cold-start timing
+        """
+        self.tesseract_cmd = tesseract_cmd
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.barcode_service: Optional[BarcodeService] = None
+        self.ocr_service: Optional[OCRService] = None
+        self.gs1_scraper: Optional[GS1Scraper] = None
+        self.cdsco_scraper: Optional[CDSCOScraper] = None
+        self.ready = False
+        self.timings: Dict[str, Optional[float]] = {
+            "build_seconds": None,
+            "warmup_seconds": None,
+            "ready_after_seconds": None,
+            "first_request_seconds": None,
+            "first_request_done_after_seconds": None,
+        }
+        self.warmup: Dict[str, Any] = {}
+        self._built = False
+        self._lock = threading.Lock()
+
+    def build(self) -> "ServiceContainer":
+        """Construct every service once (safe to call repeatedly)"""
+        if self._built:
+            return self
+
+        with self._lock:
+            if not self._built:
+                start = time.perf_counter()
+                self.barcode_service = BarcodeService()
+                self.ocr_service = OCRService(tesseract_cmd=self.tesseract_cmd)
+                self.gs1_scraper = GS1Scraper()
+                self.cdsco_scraper = CDSCOScraper()
+                self.timings["build_seconds"] = round(time.perf_counter() - start, 4)
+                self._built = True
+
+        return self
+
+    def start(self, warm_up: bool = True):
+        """
+        Build services and optionally warm them up, then mark the container ready
+
+        Args:
+            warm_up: Run a dummy barcode decode and OCR pass first
+        """
+        self.build()
+        if warm_up:
+            self.warm_up()
+        self.ready = True
+        self.timings["ready_after_seconds"] = round(time.perf_counter() - self.started_at, 4)
+
+    def warm_up(self):
+        """
+        Run one barcode decode and one OCR pass on a small synthetic image
+
+        The first real request otherwise pays for loading zbar, spawning
+        tesseract and reading its language data from disk, and for OpenCV's
+        lazy initialisation of the codecs and kernels it uses.
+        """
+        start = time.perf_counter()
+        image = np.full((120, 360, 3), 255, dtype=np.uint8)
+        cv2.putText(image, "EXP 12/2030", (10, 75), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 0), 3)
+
+        ok, encoded = cv2.imencode(".jpg", image)
+        if ok:
+            cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+
+        step = time.perf_counter()
+        try:
+            self.barcode_service.detect_and_decode(image)
+            self.warmup["barcode"] = {"ok": True, "seconds": round(time.perf_counter() - step, 4)}
+        except Exception as e:
+            print(f"Barcode warm-up error: {e}")
+            self.warmup["barcode"] = {"ok": False, "error": str(e)}
+
+        step = time.perf_counter()
+        try:
+            text = self.ocr_service.warm_up(image)
+            self.warmup["ocr"] = {"ok": True, "seconds": round(time.perf_counter() - step, 4), "chars": len(text)}
+        except Exception as e:
+            print(f"OCR warm-up error: {e}")
+            self.warmup["ocr"] = {"ok": False, "error": str(e)}
+
+        self.timings["warmup_seconds"] = round(time.perf_counter() - start, 4)
+
+    def record_request(self, seconds: float):
+        """Note the latency of the first verification after start-up"""
+        if self.timings["first_request_seconds"] is None:
+            self.timings["first_request_seconds"] = round(seconds, 4)
+            self.timings["first_request_done_after_seconds"] = round(time.perf_counter() - self.started_at, 4)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "timings": dict(self.timings),
+            "warmup": dict(self.warmup),
+            "upstream_caches": self.cache_stats(),
+        }
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit, stale-hit and miss counts of the GS1, CDSCO and Tavily result caches"""
+        if not self._built:
+            return {}
+        return {
+            "gs1": self.gs1_scraper.cache.stats(),
+            "cdsco": self.cdsco_scraper.cache.stats(),
+            "tavily": get_tavily_service().cache.stats(),
+        }
+
+
+if __name__ == "__main__":
+    print("Service container module loaded successfully")
@@ -0,0 +1,53 @@
+"""
+DAVA Portal Scraper
+Export-medicine barcode verification against the DGFT DAVA portal
+"""
+
+import requests
+from typing import Dict, Any
+
+
+class DAVAPortalScraper:
+    """
+    Scraper for DAVA Portal (Directorate General of Foreign Trade)
+    Used for pharmaceutical export verification
+    """
+
+    def __init__(self):
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+        })
+        self.dava_url = "https://dava.dgft.gov.in"
+
+    def verify_export_barcode(self, gtin: str) -> Dict[str, Any]:
+        """
+        Verify barcode against DAVA portal for export medicines
+
+        Args:
+            gtin: GTIN barcode
+
+        Returns:
+            Verification result
+        """
+        result = {
+            "found": False,
+            "gtin": gtin,
+            "export_approved": False,
+            "source": "DAVA Portal"
+        }
+
+        try:
+            # DAVA portal verification
+            # This would require authentication and proper API access
+            # Placeholder implementation
+            pass
+
+        except Exception as e:
+            print(f"DAVA verification error: {e}")
+
+        return result
+
+
+if __name__ == "__main__":
+    print("DAVA scraper module loaded successfully")
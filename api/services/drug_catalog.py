@@ -0,0 +1,467 @@
+"""
+Drug Name Catalog
+Local brand/generic catalog with trigram and symmetric-delete indexes for OCR-tolerant name lookup
+"""
+
+import csv
+import glob
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Any, Iterable, Set, Tuple
+
+
+# Characters tesseract confuses between letters and digits. A token that is
+# mostly digits gets letters folded to digits ("65O" -> "650") and vice
+# versa ("D0LO" -> "dolo"), so both sides of a lookup agree.
+_TO_DIGIT = str.maketrans({"o": "0", "q": "0", "d": "0", "i": "1", "l": "1", "z": "2", "s": "5", "b": "8", "g": "9"})
+_TO_ALPHA = str.maketrans({"0": "o", "1": "l", "5": "s", "8": "b", "6": "g", "2": "z"})
+
+# Words that say what the pack is, not which product
+_FORM_WORDS = {
+    "tab", "tabs", "tablet", "tablets", "cap", "caps", "capsule", "capsules",
+    "syp", "syr", "syrup", "inj", "injection", "susp", "suspension", "ip", "bp", "usp",
+    "mg", "ml", "mcg", "gm",
+}
+
+_CSV_COLUMNS = {
+    "brand": ("brand", "brand_name", "name", "product", "product_name"),
+    "generic": ("generic", "generic_name", "composition", "salt", "molecule"),
+    "manufacturer": ("manufacturer", "company", "company_name", "marketer"),
+    "strength": ("strength", "dose"),
+    "form": ("form", "dosage_form", "type"),
+}
+
+
+def fold_token(token: str) -> str:
+    """Lower-case a token and undo letter/digit OCR confusions"""
+    token = token.lower()
+    digits = sum(ch.isdigit() for ch in token)
+    # "65o", "5oo", "4o": a leading digit makes the whole token a number
+    numeric = token[0].isdigit() and all(ch.isdigit() or ch in "oqdilzsbg" for ch in token)
+    if numeric or digits * 2 > len(token):
+        return token.translate(_TO_DIGIT)
+    return token.translate(_TO_ALPHA)
+
+
+def tokenize(text: str) -> List[str]:
+    """Folded alphanumeric tokens without dosage-form words"""
+    text = re.sub(r"(?<=[0-9OoIl])(mg|ml|mcg|gm)\b", r" \1", text or "", flags=re.IGNORECASE)
+    tokens = (fold_token(t) for t in re.findall(r"[A-Za-z0-9]+", text))
+    return [t for t in tokens if t not in _FORM_WORDS]
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Optimal-string-alignment distance between a and b
+
+    Returns limit + 1 as soon as the distance is known to exceed limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if a == b:
+        return 0
+    if limit == 1:
+        return 1 if _one_edit_apart(a, b) else 2
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        best = cur[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+            best = min(best, cur[j])
+        if best > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+def _one_edit_apart(a: str, b: str) -> bool:
+    """Whether distinct a and b differ by one insert, delete, substitution or adjacent swap"""
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        if a[i + 1:] == b[i + 1:]:
+            return True
+        return i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+    return a[i:] == b[i + 1:]
+
+
+def read_catalog_csv(path: str) -> List[Dict[str, str]]:
+    """
+    Read catalog rows from a CSV file
+
+    Columns (first match wins): brand/name, generic/composition,
+    manufacturer/company, strength and form. Rows without a brand or
+    generic name are skipped.
+    """
+    entries = []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+            entry = {
+                field: next((row[c] for c in columns if row.get(c)), None)
+                for field, columns in _CSV_COLUMNS.items()
+            }
+            if entry["brand"] or entry["generic"]:
+                entries.append(entry)
+    return entries
+
+
+class _CatalogIndex:
+    """
+    Immutable lookup structures over one catalog snapshot
+
+    Every distinct brand or generic name is indexed once, with the catalog
+    entries it names; a generic such as "paracetamol" is one name shared by
+    many entries.
+
+    trigram_postings: trigram -> ids of names containing it
+    token_postings: folded token -> ids of names containing it
+    deletes: symmetric-delete variants -> dictionary tokens (SymSpell)
+    """
+
+    def __init__(self, entries: List[Dict[str, str]], max_distance: int, prefix_length: int):
+        self.entries = entries
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.names: List[str] = []
+        self.name_tokens: List[Tuple[str, ...]] = []
+        self.name_kinds: List[str] = []
+        self.name_entries: List[List[int]] = []
+        self.trigram_postings: Dict[str, List[int]] = defaultdict(list)
+        self.token_postings: Dict[str, List[int]] = defaultdict(list)
+        self.deletes: Dict[str, Set[str]] = defaultdict(set)
+
+        ids: Dict[str, int] = {}
+        for idx, entry in enumerate(entries):
+            for kind in ("brand", "generic"):
+                tokens = tuple(tokenize(entry.get(kind) or ""))
+                folded = " ".join(tokens)
+                if not folded:
+                    continue
+                name_id = ids.get(folded)
+                if name_id is None:
+                    name_id = ids[folded] = len(self.names)
+                    self.names.append(folded)
+                    self.name_tokens.append(tokens)
+                    self.name_kinds.append(kind)
+                    self.name_entries.append([])
+                    for gram in trigrams(folded):
+                        self.trigram_postings[gram].append(name_id)
+                    for token in set(tokens):
+                        self.token_postings[token].append(name_id)
+                elif kind == "brand":
+                    self.name_kinds[name_id] = "brand"
+                if idx not in self.name_entries[name_id]:
+                    self.name_entries[name_id].append(idx)
+
+        for token in self.token_postings:
+            if len(token) >= 3 and not token.isdigit():
+                for variant in self._variants(token):
+                    self.deletes[variant].add(token)
+
+        self.trigram_postings = dict(self.trigram_postings)
+        self.token_postings = dict(self.token_postings)
+        self.deletes = dict(self.deletes)
+
+        self._corrections: Dict[str, str] = {}
+
+        # Postings longer than these (strength numbers, "acid", trigrams such
+        # as "  p") are too unselective to generate candidates from
+        self.max_token_postings = max(1000, len(self.names) // 20)
+        self.max_trigram_postings = max(500, len(self.names) // 100)
+
+        self.products = [self._product(name_id) for name_id in range(len(self.names))]
+
+    def _product(self, name_id: int) -> Dict[str, Any]:
+        """Catalog product for a name; a generic shared by several brands keeps only common fields"""
+        entries = [self.entries[i] for i in self.name_entries[name_id]]
+        kind = self.name_kinds[name_id]
+        if kind == "brand" or len(entries) == 1:
+            product = dict(entries[0])
+        else:
+            product = {
+                field: entries[0][field] if len({e[field] for e in entries}) == 1 else None
+                for field in _CSV_COLUMNS
+            }
+            product["brand"] = None
+        product.update({"matched": kind, "catalog_entries": len(entries)})
+        return product
+
+    def _variants(self, word: str) -> Set[str]:
+        """word's prefix and every string reachable from it by up to max_distance deletes"""
+        word = word[:self.prefix_length]
+        variants = {word}
+        frontier = {word}
+        for _ in range(self.max_distance):
+            frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w)) if len(w) > 1}
+            variants |= frontier
+        return variants
+
+    def correct(self, token: str) -> str:
+        """Closest dictionary token within max_distance (the token itself if none)"""
+        if token in self.token_postings or len(token) < 3 or token.isdigit():
+            return token
+        corrected = self._corrections.get(token)
+        if corrected is None:
+            corrected = self._correct(token)
+            # OCR of the same pack repeats words across frames and passes
+            if len(self._corrections) >= 65536:
+                self._corrections.clear()
+            self._corrections[token] = corrected
+        return corrected
+
+    def _correct(self, token: str) -> str:
+        limit = self.max_distance if len(token) >= 6 else min(self.max_distance, 1)
+        best, best_distance = token, limit + 1
+        candidates = set()
+        for variant in self._variants(token):
+            candidates |= self.deletes.get(variant, set())
+        for candidate in candidates:
+            distance = edit_distance(token, candidate, limit)
+            if distance < best_distance or (distance == best_distance and len(self.token_postings[candidate]) > len(self.token_postings.get(best, ()))):
+                best, best_distance = candidate, distance
+        return best
+
+
+class DrugCatalog:
+    """
+    Catalog of brand and generic drug names with manufacturers
+
+    Every OCR line is corrected token by token against the catalog
+    vocabulary (symmetric-delete lookup), then scored against the names
+    sharing a corrected token or enough trigrams. The CSV files in data_dir
+    are recompiled in the background when they change.
+    """
+
+    def __init__(self, data_dir: str = "var/catalog", max_distance: int = 2, prefix_length: int = 7, min_score: float = 0.6):
+        """
+        Args:
+            data_dir: Folder of catalog CSV files
+            max_distance: Maximum edit distance for spelling correction
+            prefix_length: Characters of each word indexed for deletes
+            min_score: Matches scoring below this are dropped
+        """
+        self.data_dir = data_dir
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.min_score = min_score
+        self._index: Optional[_CatalogIndex] = None
+        self._signature: Optional[Tuple] = None
+        self._built_at: Optional[float] = None
+        self._build_seconds: Optional[float] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self._listeners: List[Callable[[], None]] = []
+
+    def add_listener(self, callback: Callable[[], None]):
+        """Call `callback` after every rebuild (e.g. to drop cached verdicts)"""
+        self._listeners.append(callback)
+
+    def rebuild(self, entries: Optional[List[Dict[str, str]]] = None) -> int:
+        """
+        Index a new catalog snapshot and swap it in
+
+        Args:
+            entries: Catalog rows (default: read the CSV files in data_dir);
+                missing fields default to None, rows without a brand or
+                generic name are skipped
+
+        Returns:
+            Number of catalog entries
+        """
+        start = time.perf_counter()
+        signature = self._files_signature()
+        if entries is None:
+            entries = []
+            for path in sorted(glob.glob(os.path.join(self.data_dir, "*.csv"))):
+                try:
+                    entries.extend(read_catalog_csv(path))
+                except (OSError, csv.Error, UnicodeDecodeError) as e:
+                    print(f"Drug catalog: skipping {path}: {e}")
+        entries = [
+            dict({field: None for field in _CSV_COLUMNS}, **entry)
+            for entry in entries if entry.get("brand") or entry.get("generic")
+        ]
+
+        index = _CatalogIndex(entries, self.max_distance, self.prefix_length)
+        with self._lock:
+            self._index = index
+            self._signature = signature
+            self._built_at = time.time()
+            self._build_seconds = round(time.perf_counter() - start, 4)
+
+        for callback in self._listeners:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Drug catalog listener error: {e}")
+        return len(entries)
+
+    def refresh(self) -> bool:
+        """
+        Rebuild if the catalog files changed since the last build
+
+        Returns:
+            True if the index was rebuilt
+        """
+        if self._index is not None and self._files_signature() == self._signature:
+            return False
+        count = self.rebuild()
+        print(f"Drug catalog indexed {count} entries")
+        return True
+
+    def match(self, text: str, limit: int = 3) -> List[Dict[str, Any]]:
+        """
+        Rank catalog products for one line of OCR text
+
+        Args:
+            text: OCR line, e.g. "D0LO 65O TABLETS"
+            limit: Maximum matches
+
+        Returns:
+            Matches, best first, with brand, generic, manufacturer, strength,
+            form, matched name kind and a score in [0, 1]
+        """
+        index = self._index
+        if index is None or not index.names:
+            return []
+
+        tokens = [index.correct(t) for t in tokenize(text)]
+        if not tokens:
+            return []
+        query_grams = trigrams(" ".join(tokens))
+        query_tokens = set(tokens)
+
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in query_grams:
+            postings = index.trigram_postings.get(gram, ())
+            if len(postings) <= index.max_trigram_postings:
+                for name_id in postings:
+                    shared[name_id] += 1
+
+        candidates = set()
+        for token in query_tokens:
+            postings = index.token_postings.get(token, ())
+            if not token.isdigit() and len(postings) <= index.max_token_postings:
+                candidates.update(postings)
+        # Names sharing at least a third of the query trigrams, for lines whose
+        # words are too garbled for per-token correction
+        floor = len(query_grams) / 3
+        candidates.update(name_id for name_id, n in shared.items() if n >= floor)
+
+        scored = []
+        for name_id in candidates:
+            name_tokens = index.name_tokens[name_id]
+            coverage = sum(1 for t in name_tokens if t in query_tokens) / len(name_tokens)
+            name_grams = trigrams(index.names[name_id])
+            dice = 2 * len(query_grams & name_grams) / (len(query_grams) + len(name_grams))
+            score = 0.6 * coverage + 0.4 * dice
+            if score >= self.min_score:
+                scored.append((score, name_id))
+
+        scored.sort(reverse=True)
+        return [dict(index.products[name_id], score=round(score, 3), line=text) for score, name_id in scored[:limit]]
+
+    def match_lines(self, lines: Iterable[str], limit: int = 3) -> List[Dict[str, Any]]:
+        """Best matches across several OCR lines, one per catalog product"""
+        best: Dict[Tuple, Dict[str, Any]] = {}
+        for line in lines:
+            if len(line.strip()) < 3:
+                continue
+            for match in self.match(line, limit):
+                key = (match["brand"], match["generic"], match["manufacturer"])
+                if key not in best or match["score"] > best[key]["score"]:
+                    best[key] = match
+        return sorted(best.values(), key=lambda m: m["score"], reverse=True)[:limit]
+
+    def start_watcher(self, interval: float = 300.0):
+        """Check the catalog folder for changes every `interval` seconds"""
+        os.makedirs(self.data_dir, exist_ok=True)
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="drug-catalog", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def stats(self) -> Dict[str, Any]:
+        index = self._index
+        return {
+            "entries": len(index.entries) if index else 0,
+            "names": len(index.names) if index else 0,
+            "vocabulary": len(index.token_postings) if index else 0,
+            "delete_variants": len(index.deletes) if index else 0,
+            "built_at": self._built_at,
+            "build_seconds": self._build_seconds,
+        }
+
+    def _watch(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Drug catalog refresh error: {e}")
+
+    def _files_signature(self) -> Tuple:
+        signature = []
+        for path in sorted(glob.glob(os.path.join(self.data_dir, "*.csv"))):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            signature.append((path, st.st_mtime_ns, st.st_size))
+        return tuple(signature)
+
+
+# Singleton instance
+_drug_catalog = None
+
+
+def get_drug_catalog() -> DrugCatalog:
+    """Get singleton drug catalog (CSV folder from DRUG_CATALOG_DIR)"""
+    global _drug_catalog
+    if _drug_catalog is None:
+        _drug_catalog = DrugCatalog(os.getenv("DRUG_CATALOG_DIR", "var/catalog"))
+    return _drug_catalog
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) >= 3 and sys.argv[1] == "import":
+        import shutil
+
+        catalog = get_drug_catalog()
+        os.makedirs(catalog.data_dir, exist_ok=True)
+        for src in sys.argv[2:]:
+            shutil.copy(src, catalog.data_dir)
+        catalog.refresh()
+        print(catalog.stats())
+    elif len(sys.argv) >= 3 and sys.argv[1] == "match":
+        catalog = get_drug_catalog()
+        catalog.refresh()
+        for match in catalog.match(" ".join(sys.argv[2:])):
+            print(match)
+    else:
+        print("Drug catalog module loaded successfully")
+        print("Usage: python -m services.drug_catalog import <csv>... | match <text>")
@@ -0,0 +1,60 @@
+"""
+File Locks
+Advisory locks on files, for state shared by worker processes (WEB_CONCURRENCY > 1) in one data folder
+"""
+
+import os
+from contextlib import contextmanager
+from typing import IO, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: one worker process, locks are no-ops
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path: str, shared: bool = False) -> Iterator[None]:
+    """
+    Hold a lock on `path` (created if missing) for the block
+
+    Args:
+        path: Lock file
+        shared: Take a shared (reader) lock instead of an exclusive one
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def try_lock(path: str) -> Optional[IO]:
+    """
+    Take an exclusive lock on `path` without waiting
+
+    Returns:
+        Open handle that holds the lock until it is closed, or None if
+        another process holds it
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    handle = open(path, "a")
+    if fcntl is not None:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return None
+    return handle
+
+
+if __name__ == "__main__":
+    print("File lock module loaded successfully")
@@ -0,0 +1,610 @@
+"""
+Offline GS1 Registry
+GS1 prefix ranges and a memory-mapped company-prefix table for network-free GTIN resolution
+"""
+
+import csv
+import glob
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_right
+from typing import Dict, List, Optional, Any, Iterable, Iterator, Tuple
+
+from .file_lock import file_lock
+
+
+# (first, last, country/region, member organisation, kind) for 3-digit GS1 prefixes.
+# kind: "member" (national GS1 organisation), "restricted" (in-store / internal use),
+# "coupon", "issn", "isbn", "global" (GS1 Global Office allocations)
+GS1_PREFIX_RANGES: List[Tuple[int, int, Optional[str], str, str]] = [
+    (0, 19, "United States", "GS1 US", "member"),
+    (20, 29, None, "Restricted distribution", "restricted"),
+    (30, 39, "United States", "GS1 US", "member"),
+    (40, 49, None, "Restricted distribution", "restricted"),
+    (50, 59, None, "Coupons", "coupon"),
+    (60, 139, "United States", "GS1 US", "member"),
+    (200, 299, None, "Restricted distribution", "restricted"),
+    (300, 379, "France", "GS1 France", "member"),
+    (380, 380, "Bulgaria", "GS1 Bulgaria", "member"),
+    (383, 383, "Slovenia", "GS1 Slovenia", "member"),
+    (385, 385, "Croatia", "GS1 Croatia", "member"),
+    (387, 387, "Bosnia and Herzegovina", "GS1 BIH", "member"),
+    (389, 389, "Montenegro", "GS1 Montenegro", "member"),
+    (390, 390, "Kosovo", "GS1 Kosovo", "member"),
+    (400, 440, "Germany", "GS1 Germany", "member"),
+    (450, 459, "Japan", "GS1 Japan", "member"),
+    (460, 469, "Russia", "GS1 Russia", "member"),
+    (470, 470, "Kyrgyzstan", "GS1 Kyrgyzstan", "member"),
+    (471, 471, "Taiwan", "GS1 Taiwan", "member"),
+    (474, 474, "Estonia", "GS1 Estonia", "member"),
+    (475, 475, "Latvia", "GS1 Latvia", "member"),
+    (476, 476, "Azerbaijan", "GS1 Azerbaijan", "member"),
+    (477, 477, "Lithuania", "GS1 Lithuania", "member"),
+    (478, 478, "Uzbekistan", "GS1 Uzbekistan", "member"),
+    (479, 479, "Sri Lanka", "GS1 Sri Lanka", "member"),
+    (480, 480, "Philippines", "GS1 Philippines", "member"),
+    (481, 481, "Belarus", "GS1 Belarus", "member"),
+    (482, 482, "Ukraine", "GS1 Ukraine", "member"),
+    (483, 483, "Turkmenistan", "GS1 Turkmenistan", "member"),
+    (484, 484, "Moldova", "GS1 Moldova", "member"),
+    (485, 485, "Armenia", "GS1 Armenia", "member"),
+    (486, 486, "Georgia", "GS1 Georgia", "member"),
+    (487, 487, "Kazakhstan", "GS1 Kazakhstan", "member"),
+    (488, 488, "Tajikistan", "GS1 Tajikistan", "member"),
+    (489, 489, "Hong Kong", "GS1 Hong Kong", "member"),
+    (490, 499, "Japan", "GS1 Japan", "member"),
+    (500, 509, "United Kingdom", "GS1 UK", "member"),
+    (520, 521, "Greece", "GS1 Association Greece", "member"),
+    (528, 528, "Lebanon", "GS1 Lebanon", "member"),
+    (529, 529, "Cyprus", "GS1 Cyprus", "member"),
+    (530, 530, "Albania", "GS1 Albania", "member"),
+    (531, 531, "North Macedonia", "GS1 North Macedonia", "member"),
+    (535, 535, "Malta", "GS1 Malta", "member"),
+    (539, 539, "Ireland", "GS1 Ireland", "member"),
+    (540, 549, "Belgium and Luxembourg", "GS1 Belgium & Luxembourg", "member"),
+    (560, 560, "Portugal", "GS1 Portugal", "member"),
+    (569, 569, "Iceland", "GS1 Iceland", "member"),
+    (570, 579, "Denmark", "GS1 Denmark", "member"),
+    (590, 590, "Poland", "GS1 Poland", "member"),
+    (594, 594, "Romania", "GS1 Romania", "member"),
+    (599, 599, "Hungary", "GS1 Hungary", "member"),
+    (600, 601, "South Africa", "GS1 South Africa", "member"),
+    (603, 603, "Ghana", "GS1 Ghana", "member"),
+    (604, 604, "Senegal", "GS1 Senegal", "member"),
+    (608, 608, "Bahrain", "GS1 Bahrain", "member"),
+    (609, 609, "Mauritius", "GS1 Mauritius", "member"),
+    (611, 611, "Morocco", "GS1 Morocco", "member"),
+    (613, 613, "Algeria", "GS1 Algeria", "member"),
+    (615, 615, "Nigeria", "GS1 Nigeria", "member"),
+    (616, 616, "Kenya", "GS1 Kenya", "member"),
+    (617, 617, "Cameroon", "GS1 Cameroon", "member"),
+    (618, 618, "Côte d'Ivoire", "GS1 Côte d'Ivoire", "member"),
+    (619, 619, "Tunisia", "GS1 Tunisia", "member"),
+    (620, 620, "Tanzania", "GS1 Tanzania", "member"),
+    (621, 621, "Syria", "GS1 Syria", "member"),
+    (622, 622, "Egypt", "GS1 Egypt", "member"),
+    (623, 623, "Brunei", "GS1 Brunei", "member"),
+    (624, 624, "Libya", "GS1 Libya", "member"),
+    (625, 625, "Jordan", "GS1 Jordan", "member"),
+    (626, 626, "Iran", "GS1 Iran", "member"),
+    (627, 627, "Kuwait", "GS1 Kuwait", "member"),
+    (628, 628, "Saudi Arabia", "GS1 Saudi Arabia", "member"),
+    (629, 629, "United Arab Emirates", "GS1 UAE", "member"),
+    (630, 630, "Qatar", "GS1 Qatar", "member"),
+    (631, 631, "Namibia", "GS1 Namibia", "member"),
+    (640, 649, "Finland", "GS1 Finland", "member"),
+    (690, 699, "China", "GS1 China", "member"),
+    (700, 709, "Norway", "GS1 Norway", "member"),
+    (729, 729, "Israel", "GS1 Israel", "member"),
+    (730, 739, "Sweden", "GS1 Sweden", "member"),
+    (740, 740, "Guatemala", "GS1 Guatemala", "member"),
+    (741, 741, "El Salvador", "GS1 El Salvador", "member"),
+    (742, 742, "Honduras", "GS1 Honduras", "member"),
+    (743, 743, "Nicaragua", "GS1 Nicaragua", "member"),
+    (744, 744, "Costa Rica", "GS1 Costa Rica", "member"),
+    (745, 745, "Panama", "GS1 Panama", "member"),
+    (746, 746, "Dominican Republic", "GS1 Dominican Republic", "member"),
+    (750, 750, "Mexico", "GS1 Mexico", "member"),
+    (754, 755, "Canada", "GS1 Canada", "member"),
+    (759, 759, "Venezuela", "GS1 Venezuela", "member"),
+    (760, 769, "Switzerland", "GS1 Switzerland", "member"),
+    (770, 771, "Colombia", "GS1 Colombia", "member"),
+    (773, 773, "Uruguay", "GS1 Uruguay", "member"),
+    (775, 775, "Peru", "GS1 Peru", "member"),
+    (777, 777, "Bolivia", "GS1 Bolivia", "member"),
+    (778, 779, "Argentina", "GS1 Argentina", "member"),
+    (780, 780, "Chile", "GS1 Chile", "member"),
+    (784, 784, "Paraguay", "GS1 Paraguay", "member"),
+    (786, 786, "Ecuador", "GS1 Ecuador", "member"),
+    (789, 790, "Brazil", "GS1 Brasil", "member"),
+    (800, 839, "Italy", "GS1 Italy", "member"),
+    (840, 849, "Spain", "GS1 Spain", "member"),
+    (850, 850, "Cuba", "GS1 Cuba", "member"),
+    (858, 858, "Slovakia", "GS1 Slovakia", "member"),
+    (859, 859, "Czech Republic", "GS1 Czech Republic", "member"),
+    (860, 860, "Serbia", "GS1 Serbia", "member"),
+    (865, 865, "Mongolia", "GS1 Mongolia", "member"),
+    (867, 867, "North Korea", "GS1 North Korea", "member"),
+    (868, 869, "Türkiye", "GS1 Türkiye", "member"),
+    (870, 879, "Netherlands", "GS1 Netherlands", "member"),
+    (880, 880, "South Korea", "GS1 Korea", "member"),
+    (883, 883, "Myanmar", "GS1 Myanmar", "member"),
+    (884, 884, "Cambodia", "GS1 Cambodia", "member"),
+    (885, 885, "Thailand", "GS1 Thailand", "member"),
+    (888, 888, "Singapore", "GS1 Singapore", "member"),
+    (890, 890, "India", "GS1 India", "member"),
+    (893, 893, "Vietnam", "GS1 Vietnam", "member"),
+    (896, 896, "Pakistan", "GS1 Pakistan", "member"),
+    (899, 899, "Indonesia", "GS1 Indonesia", "member"),
+    (900, 919, "Austria", "GS1 Austria", "member"),
+    (930, 939, "Australia", "GS1 Australia", "member"),
+    (940, 949, "New Zealand", "GS1 New Zealand", "member"),
+    (950, 950, None, "GS1 Global Office", "global"),
+    (951, 951, None, "GS1 Global Office (EPC)", "global"),
+    (955, 955, "Malaysia", "GS1 Malaysia", "member"),
+    (958, 958, "Macau", "GS1 Macau", "member"),
+    (960, 969, None, "GS1 Global Office (GTIN-8)", "global"),
+    (977, 977, None, "Serial publications (ISSN)", "issn"),
+    (978, 979, None, "Bookland (ISBN)", "isbn"),
+    (980, 980, None, "Refund receipts", "restricted"),
+    (981, 984, None, "Coupons", "coupon"),
+    (990, 999, None, "Coupons", "coupon"),
+]
+
+_RANGE_STARTS = [r[0] for r in GS1_PREFIX_RANGES]
+
+# Company-prefix table file layout (little endian):
+#   header  : magic(8s) record_count(I) reserved(I)
+#   records : prefix(12s, digits right-padded with spaces) name_offset(I) name_length(H) parent(i)
+#   names   : UTF-8 licensee names referenced by the records
+# Records are sorted by prefix. `parent` is the index of the longest other
+# record that is a prefix of this one (-1 if none), so a lookup needs a
+# single binary search plus a short walk up the parent chain.
+_MAGIC = b"GS1CP\x00\x01\x00"
+_HEADER = struct.Struct("<8sII")
+_RECORD = struct.Struct("<12sIHi")
+_PREFIX_WIDTH = 12
+MIN_PREFIX_LENGTH = 4
+# Superseded tables are kept this long, so other worker processes still
+# mapping one can finish with it and move to the newest table first
+STALE_TABLE_SECONDS = 3600
+
+
+def gs1_prefix_info(prefix3: str) -> Optional[Dict[str, Any]]:
+    """
+    Resolve a 3-digit GS1 prefix to its member organisation
+
+    Args:
+        prefix3: First three digits of a GTIN-13 (or GTIN-8)
+
+    Returns:
+        {"gs1_prefix", "country", "member_organisation", "kind"} or None if unassigned
+    """
+    if len(prefix3) != 3 or not prefix3.isdigit():
+        return None
+    value = int(prefix3)
+    idx = bisect_right(_RANGE_STARTS, value) - 1
+    if idx < 0:
+        return None
+    first, last, country, organisation, kind = GS1_PREFIX_RANGES[idx]
+    if value > last:
+        return None
+    return {"gs1_prefix": prefix3, "country": country, "member_organisation": organisation, "kind": kind}
+
+
+def normalize_gtin(gtin: str) -> Optional[str]:
+    """
+    Convert GTIN-12/13/14 to the 13-digit form used for prefix lookups
+
+    GTIN-14 drops the packaging indicator and UPC-A gains a leading zero.
+    GTIN-8 is returned unchanged (it has no company prefix).
+    """
+    gtin = (gtin or "").strip()
+    if not gtin.isdigit():
+        return None
+    if len(gtin) == 14:
+        return gtin[1:]
+    if len(gtin) == 13 or len(gtin) == 8:
+        return gtin
+    if len(gtin) == 12:
+        return "0" + gtin
+    return None
+
+
+class _PrefixTable:
+    """Read-only view over one memory-mapped company-prefix file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file cannot be mapped
+            self._file.close()
+            raise ValueError(f"Empty registry file: {path}")
+
+        magic, self.count, _ = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            self.close()
+            raise ValueError(f"Not a GS1 company-prefix file: {path}")
+        self._names_offset = _HEADER.size + self.count * _RECORD.size
+
+    def _prefix_at(self, idx: int) -> bytes:
+        off = _HEADER.size + idx * _RECORD.size
+        return self._mm[off:off + _PREFIX_WIDTH]
+
+    def lookup(self, key: bytes) -> Optional[Tuple[str, str]]:
+        """
+        Longest registered prefix of key
+
+        Args:
+            key: Up to 12 ASCII digits (GTIN-13 without check digit)
+
+        Returns:
+            (prefix, licensee) or None
+        """
+        padded = key.ljust(_PREFIX_WIDTH, b" ")
+
+        # Rightmost record <= key
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._prefix_at(mid) <= padded:
+                lo = mid + 1
+            else:
+                hi = mid
+        idx = lo - 1
+
+        # The longest prefix of key is this record or one of its ancestors
+        while idx >= 0:
+            prefix, name_offset, name_length, parent = _RECORD.unpack_from(
+                self._mm, _HEADER.size + idx * _RECORD.size
+            )
+            prefix = prefix.rstrip(b" ")
+            if key.startswith(prefix):
+                start = self._names_offset + name_offset
+                name = self._mm[start:start + name_length].decode("utf-8")
+                return prefix.decode("ascii"), name
+            idx = parent
+
+        return None
+
+    def entries(self) -> Iterator[Tuple[str, str]]:
+        """Every (prefix, licensee) in prefix order"""
+        for idx in range(self.count):
+            prefix, name_offset, name_length, _ = _RECORD.unpack_from(self._mm, _HEADER.size + idx * _RECORD.size)
+            start = self._names_offset + name_offset
+            yield prefix.rstrip(b" ").decode("ascii"), self._mm[start:start + name_length].decode("utf-8")
+
+    def close(self):
+        try:
+            self._mm.close()
+        finally:
+            self._file.close()
+
+
+def write_prefix_table(path: str, entries: Dict[str, str]):
+    """
+    Write a sorted company-prefix file atomically
+
+    Args:
+        path: Destination file
+        entries: company prefix (4-12 digits) -> licensee name
+    """
+    prefixes = sorted(entries, key=lambda p: p.encode("ascii").ljust(_PREFIX_WIDTH, b" "))
+
+    names = bytearray()
+    records = []
+    stack: List[Tuple[str, int]] = []  # open ancestors (prefix, index)
+    for idx, prefix in enumerate(prefixes):
+        while stack and not prefix.startswith(stack[-1][0]):
+            stack.pop()
+        parent = stack[-1][1] if stack else -1
+        stack.append((prefix, idx))
+
+        name = entries[prefix].encode("utf-8")[:0xFFFF]
+        records.append(_RECORD.pack(prefix.encode("ascii").ljust(_PREFIX_WIDTH, b" "), len(names), len(name), parent))
+        names.extend(name)
+
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, len(records), 0))
+        for record in records:
+            f.write(record)
+        f.write(names)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_prefix_csv(path: str) -> Dict[str, str]:
+    """
+    Parse a company-prefix CSV
+
+    Accepts a header with a prefix column (prefix, company_prefix, gcp) and a
+    name column (licensee, company_name, name); without a recognised header
+    the first two columns are used. Invalid prefixes are skipped.
+    """
+    entries: Dict[str, str] = {}
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        rows = list(csv.reader(f))
+    if not rows:
+        return entries
+
+    header = [c.strip().lower() for c in rows[0]]
+    prefix_col = next((header.index(c) for c in ("prefix", "company_prefix", "gcp") if c in header), None)
+    name_col = next((header.index(c) for c in ("licensee", "company_name", "name") if c in header), None)
+    if prefix_col is None or name_col is None:
+        prefix_col, name_col = 0, 1
+    else:
+        rows = rows[1:]
+
+    for row in rows:
+        if len(row) <= max(prefix_col, name_col):
+            continue
+        prefix = row[prefix_col].strip()
+        name = row[name_col].strip()
+        if prefix.isdigit() and MIN_PREFIX_LENGTH <= len(prefix) <= _PREFIX_WIDTH and name:
+            entries[prefix] = name
+
+    return entries
+
+
+class GS1Registry:
+    """
+    Offline GTIN -> country / member organisation / licensee resolver
+
+    Company prefixes come from CSV files dropped into `<data_dir>/drops`.
+    They are compiled into a sorted fixed-width table that is memory-mapped
+    and searched by longest prefix, so lookups cost a few microseconds and
+    no network. Rebuilds write a new file and swap it in atomically;
+    readers keep using the previous mapping until they finish. Worker
+    processes sharing data_dir compile a drop once (under a lock file) and
+    the others open the newest table on their next refresh.
+    """
+
+    def __init__(self, data_dir: str = "var/gs1"):
+        """
+        Args:
+            data_dir: Directory holding the compiled table and the CSV drop folder
+        """
+        self.data_dir = data_dir
+        self.drops_dir = os.path.join(data_dir, "drops")
+        self._table: Optional[_PrefixTable] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self._open_latest()
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    def lookup(self, gtin: str) -> Dict[str, Any]:
+        """
+        Resolve a GTIN without network access
+
+        Args:
+            gtin: GTIN-8/12/13/14
+
+        Returns:
+            {"gs1_prefix", "country", "member_organisation", "kind",
+             "company_prefix", "licensee"}; unknown fields are None
+        """
+        result = {
+            "gs1_prefix": None,
+            "country": None,
+            "member_organisation": None,
+            "kind": None,
+            "company_prefix": None,
+            "licensee": None,
+        }
+
+        key = normalize_gtin(gtin)
+        if key is None:
+            return result
+
+        info = gs1_prefix_info(key[:3])
+        if info:
+            result.update(info)
+
+        table = self._table
+        if table is not None and len(key) == 13:
+            match = table.lookup(key[:12].encode("ascii"))
+            if match:
+                result["company_prefix"], result["licensee"] = match
+
+        return result
+
+    def company_prefix(self, gtin: str) -> Optional[str]:
+        """Registered company prefix of a GTIN, or None if not in the registry"""
+        return self.lookup(gtin)["company_prefix"]
+
+    def licensees(self, prefixes: Iterable[str] = (), limit: Optional[int] = None) -> List[Tuple[str, str]]:
+        """
+        Registered company prefixes and their licensees
+
+        Args:
+            prefixes: Only company prefixes starting with one of these
+                (e.g. "890" for GS1 India); empty for all
+            limit: Maximum entries returned
+
+        Returns:
+            (company prefix, licensee) pairs in prefix order
+        """
+        table = self._table
+        if table is None:
+            return []
+        prefixes = tuple(prefixes)
+        found = []
+        for prefix, name in table.entries():
+            if prefixes and not prefix.startswith(prefixes):
+                continue
+            found.append((prefix, name))
+            if limit is not None and len(found) >= limit:
+                break
+        return found
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def rebuild(self, csv_paths: Iterable[str]) -> int:
+        """
+        Compile CSV files (later files win on duplicate prefixes) and swap in the result
+
+        Returns:
+            Number of company prefixes in the new table
+        """
+        entries: Dict[str, str] = {}
+        for path in csv_paths:
+            entries.update(read_prefix_csv(path))
+
+        os.makedirs(self.data_dir, exist_ok=True)
+        path = os.path.join(self.data_dir, f"company_prefixes-{time.time_ns()}.bin")
+        write_prefix_table(path, entries)
+        self._swap(path)
+        return len(entries)
+
+    def refresh_from_drops(self) -> bool:
+        """
+        Switch to the newest compiled table, rebuilding it first if any CSV
+        in the drop folder is newer
+
+        Returns:
+            True if a different table is in use afterwards
+        """
+        if self._is_current():
+            return False
+
+        with file_lock(os.path.join(self.data_dir, "rebuild.lock")):
+            # Another process may have compiled the drops while we waited
+            if self._is_current():
+                return False
+            tables = self._table_files()
+            newest_drop = self._newest_drop()
+            if tables and (newest_drop is None or os.path.getmtime(tables[-1]) >= newest_drop):
+                self._swap(tables[-1])
+                return True
+            count = self.rebuild(sorted(glob.glob(os.path.join(self.drops_dir, "*.csv"))))
+        print(f"GS1 registry rebuilt with {count} company prefixes")
+        return True
+
+    def start_watcher(self, interval: float = 300.0):
+        """Check the drop folder for new CSVs every `interval` seconds"""
+        os.makedirs(self.drops_dir, exist_ok=True)
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="gs1-registry", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def stats(self) -> Dict[str, Any]:
+        table = self._table
+        return {
+            "company_prefixes": table.count if table else 0,
+            "table": os.path.basename(table.path) if table else None,
+            "gs1_prefix_ranges": len(GS1_PREFIX_RANGES),
+        }
+
+    def _watch(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh_from_drops()
+            except Exception as e:
+                print(f"GS1 registry refresh error: {e}")
+
+    def _table_files(self) -> List[str]:
+        """Compiled tables on disk, oldest first (names carry time_ns)"""
+        return sorted(glob.glob(os.path.join(self.data_dir, "company_prefixes-*.bin")))
+
+    def _newest_drop(self) -> Optional[float]:
+        mtimes = []
+        for path in glob.glob(os.path.join(self.drops_dir, "*.csv")):
+            try:
+                mtimes.append(os.path.getmtime(path))
+            except OSError:
+                pass
+        return max(mtimes) if mtimes else None
+
+    def _is_current(self) -> bool:
+        """Whether the mapped table is the newest on disk and no drop is newer than it"""
+        tables = self._table_files()
+        table = self._table
+        newest_drop = self._newest_drop()
+        if not tables:
+            return newest_drop is None
+        try:
+            newest_table = os.path.getmtime(tables[-1])
+        except OSError:
+            return False
+        if newest_drop is not None and newest_table < newest_drop:
+            return False
+        return table is not None and table.path == tables[-1]
+
+    def _open_latest(self):
+        for path in reversed(self._table_files()):
+            try:
+                self._swap(path)
+                return
+            except (OSError, ValueError) as e:
+                print(f"GS1 registry: skipping {path}: {e}")
+
+    def _swap(self, path: str):
+        table = _PrefixTable(path)
+        with self._lock:
+            previous, self._table = self._table, table
+
+        # Old mappings are left for the garbage collector so in-flight
+        # lookups never see a closed map. A file is only removed once the
+        # table that replaced it is STALE_TABLE_SECONDS old, since other
+        # worker processes may still map it until their next refresh.
+        cutoff = time.time() - STALE_TABLE_SECONDS
+        files = self._table_files()
+        for old, successor in zip(files, files[1:]):
+            if old == path or (previous is not None and old == previous.path):
+                continue
+            try:
+                if os.path.getmtime(successor) < cutoff:
+                    os.remove(old)
+            except OSError:
+                pass
+
+
+# Singleton instance
+_gs1_registry = None
+
+
+def get_gs1_registry() -> GS1Registry:
+    """Get singleton GS1 registry (data directory from GS1_REGISTRY_DIR)"""
+    global _gs1_registry
+    if _gs1_registry is None:
+        _gs1_registry = GS1Registry(os.getenv("GS1_REGISTRY_DIR", "var/gs1"))
+    return _gs1_registry
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) >= 3 and sys.argv[1] == "import":
+        import shutil
+
+        registry = get_gs1_registry()
+        os.makedirs(registry.drops_dir, exist_ok=True)
+        for src in sys.argv[2:]:
+            shutil.copy(src, registry.drops_dir)
+        registry.refresh_from_drops()
+        print(registry.stats())
+    elif len(sys.argv) == 3 and sys.argv[1] == "lookup":
+        print(get_gs1_registry().lookup(sys.argv[2]))
+    else:
+        print("GS1 registry module loaded successfully")
+        print("Usage: python -m services.gs1_registry import <csv>... | lookup <gtin>")
@@ -4,18 +4,37 @@ Scrapes GS1 Datakart and Smart Consumer data to verify GTIN/barcode authenticity
 """
 
 import requests
-from bs4 import BeautifulSoup
-from typing import Optional, Dict, Any
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Optional, Dict, Any, Iterable, Iterator, List
 import re
 import time
 from urllib.parse import quote
 from .tavily_search import get_tavily_service
+from .circuit_breaker import collect_unavailable, guarded_upstream
+from .gs1_registry import GS1Registry, get_gs1_registry
+from .gtin import is_valid_gtin, to_gtin14, validate_gtins
+from .ttl_cache import DEFAULT_STALE_SECONDS, TTLCache
 
 
 class GS1Scraper:
     """Scraper for GS1 India data sources"""
 
-    def __init__(self):
+    def __init__(
+        self,
+        registry: Optional[GS1Registry] = None,
+        cache: Optional[TTLCache] = None,
+        negative_ttl_seconds: float = 3600,
+    ):
+        """
+        Args:
+            registry: Offline GS1 prefix registry (default: shared instance)
+            cache: Cache of upstream (GEPIR/Tavily) results keyed by GTIN-14
+            negative_ttl_seconds: Lifetime of cached "not found" results
+        """
+        self.registry = registry or get_gs1_registry()
+        self.cache = cache or TTLCache("gs1", ttl_seconds=86400, max_entries=20000, stale_seconds=DEFAULT_STALE_SECONDS)
+        self.negative_ttl_seconds = negative_ttl_seconds
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
@@ -35,6 +54,40 @@ class GS1Scraper:
         Returns:
             Dictionary with product information if found
         """
+        result = self.resolve_offline(gtin)
+        if result is None:
+            result = self.resolve_upstream(gtin)
+        return result
+
+    def resolve_offline(self, gtin: str) -> Optional[Dict[str, Any]]:
+        """
+        Resolve GTIN from the offline registry or the upstream result cache
+
+        Returns:
+            Verification result, or None if only an upstream lookup can tell
+        """
+        result = self._registry_result(gtin)
+        if result["found"]:
+            return result
+        return self.cached_result(gtin)
+
+    def resolve_upstream(self, gtin: str) -> Dict[str, Any]:
+        """
+        Look GTIN up on GEPIR, then Tavily, and cache the outcome
+
+        A miss is not cached while a source was skipped for an open circuit
+        or failed; the result lists those sources in sources_unavailable instead.
+        """
+        result = self._registry_result(gtin)
+        with collect_unavailable() as unavailable:
+            result.update(self._search_upstream(gtin))
+        if unavailable:
+            result["sources_unavailable"] = sorted(set(unavailable))
+        if result["found"] or not unavailable:
+            self._store(gtin, result)
+        return result
+
+    def _registry_result(self, gtin: str) -> Dict[str, Any]:
         result = {
             "found": False,
             "gtin": gtin,
@@ -46,28 +99,68 @@ class GS1Scraper:
             "verified": False
         }
 
+        # Offline registry first: resolves country and licensee without network
+        registry_result = self._search_registry(gtin)
+        result["country"] = registry_result.get("country")
+        result["member_organisation"] = registry_result.get("member_organisation")
+        result["prefix_kind"] = registry_result.get("prefix_kind")
+        if registry_result["found"]:
+            result.update(registry_result)
+            result["source"] = "GS1 Registry"
+
+        return result
+
+    def cached_result(self, gtin: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a previously fetched upstream result for this GTIN
+
+        GTIN-8/12/13/14 spellings of the same number share one entry. A
+        stale entry is returned as is while a background lookup refreshes it.
+        """
+        cached = self.cache.get(to_gtin14(gtin) or gtin, refresh=lambda: self.resolve_upstream(gtin))
+        if cached is not None:
+            cached["gtin"] = gtin
+            cached["cached"] = True
+        return cached
+
+    def cached_results(self, gtins: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Batched cached_result(): one cache round trip for many GTINs
+
+        Returns:
+            {gtin: result} for the GTINs with a cached upstream result
+        """
+        keys = {gtin: to_gtin14(gtin) or gtin for gtin in gtins}
+        by_key = {key: gtin for gtin, key in keys.items()}
+        found = self.cache.get_many(
+            by_key, refresh=lambda key: (lambda: self.resolve_upstream(by_key[key]))
+        )
+        results = {}
+        for key, cached in found.items():
+            cached["gtin"] = by_key[key]
+            cached["cached"] = True
+            results[by_key[key]] = cached
+        return results
+
+    def _store(self, gtin: str, result: Dict[str, Any]):
+        ttl = None if result["found"] else self.negative_ttl_seconds
+        self.cache.set(to_gtin14(gtin) or gtin, result, ttl_seconds=ttl)
+
+    def _search_upstream(self, gtin: str) -> Dict[str, Any]:
+        """Query GEPIR, then Tavily; returns the fields to merge into the result"""
         # Try GEPIR (Global Electronic Party Information Registry)
         gepir_result = self._search_gepir(gtin)
         if gepir_result["found"]:
-            result.update(gepir_result)
-            result["source"] = "GEPIR"
-            return result
-
-        # Try GS1 India verification
-        gs1_india_result = self._search_gs1_india(gtin)
-        if gs1_india_result["found"]:
-            result.update(gs1_india_result)
-            result["source"] = "GS1 India"
-            return result
+            gepir_result["source"] = "GEPIR"
+            return gepir_result
 
         # Try Tavily AI search as fallback
         tavily_result = self._search_tavily(gtin)
         if tavily_result["found"]:
-            result.update(tavily_result)
-            result["source"] = "Tavily AI Search"
-            return result
+            tavily_result["source"] = "Tavily AI Search"
+            return tavily_result
 
-        return result
+        return {}
 
     def _search_tavily(self, gtin: str) -> Dict[str, Any]:
         """Search using Tavily AI as fallback"""
@@ -101,9 +194,14 @@ class GS1Scraper:
             # GEPIR search endpoint
             search_url = f"https://gepir.gs1.org/index.php/search-by-gtin/{gtin}"
 
-            response = self.session.get(search_url, timeout=10)
+            with guarded_upstream("gepir") as call:
+                response = self.session.get(search_url, timeout=call.timeout)
+                call.status = response.status_code
+                if response.status_code != 200:
+                    call.outcome = "http_error"
 
             if response.status_code == 200:
+                from bs4 import BeautifulSoup
                 soup = BeautifulSoup(response.content, 'html.parser')
 
                 # Look for company information
@@ -132,64 +230,53 @@ class GS1Scraper:
 
         return result
 
-    def _search_gs1_india(self, gtin: str) -> Dict[str, Any]:
-        """Search GS1 India website for GTIN verification"""
+    def _search_registry(self, gtin: str) -> Dict[str, Any]:
+        """
+        Resolve GTIN via the offline GS1 registry
+
+        The GS1 prefix range only tells which member organisation issued the
+        number; the GTIN counts as verified only when its company prefix is
+        in the registry.
+        """
         result = {"found": False}
 
         try:
-            # Check if GTIN starts with Indian GS1 prefix (890)
-            if gtin.startswith('890'):
-                result["country"] = "India"
-                result["company_prefix"] = gtin[:7]  # First 7 digits typically
+            info = self.registry.lookup(gtin)
+            result["country"] = info["country"]
+            result["member_organisation"] = info["member_organisation"]
+            result["prefix_kind"] = info["kind"]
+
+            if info["licensee"]:
                 result["found"] = True
                 result["verified"] = True
-
-                # Additional verification can be added here
-                # This is a basic check based on GS1 prefix structure
+                result["company_name"] = info["licensee"]
+                result["company_prefix"] = info["company_prefix"]
 
         except Exception as e:
-            print(f"GS1 India search error: {e}")
+            print(f"GS1 registry lookup error: {e}")
 
         return result
 
     def extract_company_prefix(self, gtin: str) -> Optional[str]:
-        """Extract company prefix from GTIN"""
-        if len(gtin) == 13:  # EAN-13
-            return gtin[:7]  # Typically first 7 digits
-        elif len(gtin) == 14:  # GTIN-14
-            return gtin[1:8]  # Skip indicator digit
-        return None
+        """
+        Extract company prefix from GTIN
+
+        Company prefixes are 4-12 digits long, so the length can only be
+        known from the registry; returns None for prefixes not registered.
+        """
+        return self.registry.company_prefix(gtin)
 
     def validate_gtin_checksum(self, gtin: str) -> bool:
         """
         Validate GTIN check digit using GS1 algorithm
 
         Args:
-            gtin: GTIN string (13 or 14 digits)
+            gtin: GTIN string (8, 12, 13 or 14 digits)
 
         Returns:
             True if checksum is valid
         """
-        if not gtin.isdigit():
-            return False
-
-        if len(gtin) not in [13, 14]:
-            return False
-
-        # GS1 checksum algorithm
-        digits = [int(d) for d in gtin[:-1]]
-        check_digit = int(gtin[-1])
-
-        # Multiply from right to left, alternating 3 and 1
-        total = 0
-        multiplier = [3, 1]
-
-        for i, digit in enumerate(reversed(digits)):
-            total += digit * multiplier[i % 2]
-
-        calculated_check = (10 - (total % 10)) % 10
-
-        return calculated_check == check_digit
+        return is_valid_gtin(gtin)
 
     def search_product_info(self, product_name: str) -> Dict[str, Any]:
         """
@@ -233,6 +320,99 @@ def verify_barcode(gtin: str) -> Dict[str, Any]:
     return result
 
 
+def verify_barcodes_bulk(
+    gtins: Iterable[str],
+    scraper: Optional[GS1Scraper] = None,
+    max_workers: int = 4,
+    upstream: bool = True,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Verify many GTINs, yielding each result as soon as it is known
+
+    Check digits are validated for all inputs in one vectorized pass. Valid
+    GTINs are normalised to GTIN-14 and deduplicated, resolved from the
+    offline registry and the upstream result cache, and only the remaining
+    unknowns are looked up upstream by at most max_workers threads.
+
+    Args:
+        gtins: GTIN strings in any of the GTIN-8/12/13/14 formats
+        scraper: Scraper whose registry and cache to use
+        max_workers: Concurrent upstream lookups
+        upstream: Look up GTINs not known locally (otherwise report them unresolved)
+
+    Yields:
+        One dictionary per input: index, input, gtin14, checksum_valid,
+        resolved_by ("registry", "cache", "upstream" or None) and result
+    """
+    scraper = scraper or GS1Scraper()
+    inputs = [str(g).strip() for g in gtins]
+    valid, normalized = validate_gtins(inputs)
+
+    def records(indices: List[int], resolved_by: Optional[str], result: Optional[Dict[str, Any]]):
+        for index in indices:
+            item = dict(result, gtin=inputs[index]) if result is not None else None
+            yield {
+                "index": index,
+                "input": inputs[index],
+                "gtin14": normalized[index],
+                "checksum_valid": bool(valid[index]),
+                "resolved_by": resolved_by,
+                "result": item,
+            }
+
+    # Duplicates (including GTIN-13 vs GTIN-14 spellings) share one lookup
+    by_gtin14: Dict[str, List[int]] = {}
+    for index, ok in enumerate(valid):
+        if ok:
+            by_gtin14.setdefault(normalized[index], []).append(index)
+        else:
+            yield from records([index], None, None)
+
+    not_registered = []
+    for gtin14, indices in by_gtin14.items():
+        result = scraper._registry_result(gtin14)
+        if result["found"]:
+            yield from records(indices, "registry", result)
+        else:
+            not_registered.append(gtin14)
+
+    # One cache round trip for everything the registry does not know
+    cached = scraper.cached_results(not_registered)
+    unknown = []
+    for gtin14 in not_registered:
+        if gtin14 in cached:
+            yield from records(by_gtin14[gtin14], "cache", cached[gtin14])
+        else:
+            unknown.append(gtin14)
+
+    if not upstream or not unknown:
+        for gtin14 in unknown:
+            yield from records(by_gtin14[gtin14], None, None)
+        return
+
+    # Submit lazily so a large batch never queues more than a window of
+    # requests ahead of the workers
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="gs1-bulk") as executor:
+        remaining = iter(unknown)
+        running = {}
+        for gtin14 in islice(remaining, max_workers * 2):
+            running[executor.submit(scraper.resolve_upstream, gtin14)] = gtin14
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                gtin14 = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Bulk GTIN lookup error: {e}")
+                    result = None
+                yield from records(by_gtin14[gtin14], "upstream" if result is not None else None, result)
+
+            for gtin14 in islice(remaining, len(done)):
+                running[executor.submit(scraper.resolve_upstream, gtin14)] = gtin14
+
+
 if __name__ == "__main__":
     # Test with sample GTINs
     test_gtins = [
@@ -9,6 +9,14 @@ from typing import List, Tuple, Optional, Dict, Any
 from enum import Enum
 
 
+# Frame selection thresholds (measured on a FRAME_SCORE_SIZE thumbnail)
+FRAME_SCORE_SIZE = 256
+MIN_FRAME_SHARPNESS = 15.0
+MAX_FRAME_GLARE = 0.25
+MIN_FRAME_BRIGHTNESS = 25.0
+MAX_FRAME_BRIGHTNESS = 235.0
+
+
 class PreprocessingMode(Enum):
     """Different preprocessing modes for various image types"""
     BARCODE = "barcode"
@@ -214,13 +222,13 @@ class ImageProcessor:
 
     def combine_images_for_analysis(self, images: List[np.ndarray]) -> np.ndarray:
         """
-        Combine multiple images of the same product for comprehensive analysis
+        Pick the single best frame of the same product for analysis
 
         Args:
             images: List of images
 
         Returns:
-            Combined/stitched image or best quality image
+            Highest ranked usable frame
         """
         if not images:
             return None
@@ -228,10 +236,124 @@ class ImageProcessor:
         if len(images) == 1:
             return images[0]
 
-        # For now, return the largest/highest quality image
-        # In future, can implement image stitching
-        largest = max(images, key=lambda x: x.shape[0] * x.shape[1])
-        return largest
+        selected = self.select_frames(images, max_frames=1)
+        return images[selected[0]["index"]]
+
+    def score_frame(self, image: np.ndarray) -> Dict[str, Any]:
+        """
+        Cheap usability score for one frame, computed on a thumbnail
+
+        Args:
+            image: Input image
+
+        Returns:
+            Dictionary with quality metrics, usability flag and reasons
+        """
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+
+        # Score a fixed-size thumbnail so cost does not grow with camera resolution
+        scale = FRAME_SCORE_SIZE / max(gray.shape[:2])
+        if scale < 1:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+        brightness = float(gray.mean())
+        contrast = float(gray.std())
+        glare = float(np.count_nonzero(gray >= 250)) / gray.size
+
+        reasons = []
+        if sharpness < MIN_FRAME_SHARPNESS:
+            reasons.append("blurred")
+        if glare > MAX_FRAME_GLARE:
+            reasons.append("glare")
+        if brightness < MIN_FRAME_BRIGHTNESS:
+            reasons.append("underexposed")
+        elif brightness > MAX_FRAME_BRIGHTNESS:
+            reasons.append("overexposed")
+
+        score = (
+            min(1.0, np.log1p(sharpness) / np.log1p(500.0)) * 60
+            + min(1.0, contrast / 64.0) * 40
+            - glare * 100
+        )
+
+        return {
+            "sharpness": round(sharpness, 2),
+            "brightness": round(brightness, 2),
+            "contrast": round(contrast, 2),
+            "glare": round(glare, 4),
+            "score": round(float(score), 2),
+            "usable": not reasons,
+            "reasons": reasons
+        }
+
+    def select_frames(
+        self,
+        images: List[np.ndarray],
+        max_frames: Optional[int] = None,
+        hashes: Optional[List[int]] = None,
+        max_distance: int = 20,
+        hash_size: int = 16
+    ) -> List[Dict[str, Any]]:
+        """
+        Drop near-duplicate and unusable frames and rank the rest
+
+        Frames are ranked by score; a frame whose dHash lies within
+        max_distance bits of a better kept frame, at the same aspect ratio,
+        is treated as a duplicate. The hash is 16x16 (256 bits): at 8x8 a
+        close-up of the EXP/batch line can hash like a whole-pack shot with
+        a similar layout and be dropped. If every frame is unusable the best
+        one is still kept.
+
+        Args:
+            images: List of images
+            max_frames: Keep at most this many frames (best first)
+            hashes: Precomputed dHashes of hash_size, one per image
+            max_distance: Hamming distance at or below which frames are duplicates
+            hash_size: dHash grid size used for the comparison
+
+        Returns:
+            Report per frame in rank order; kept frames have "selected" True
+        """
+        if hashes is None:
+            hashes = [self.compute_dhash(img, hash_size=hash_size) for img in images]
+
+        frames = []
+        for idx, image in enumerate(images):
+            frame = self.score_frame(image)
+            frame["index"] = idx
+            frame["hash"] = hashes[idx]
+            frame["aspect"] = image.shape[1] / max(1, image.shape[0])
+            frame["selected"] = False
+            frames.append(frame)
+
+        frames.sort(key=lambda f: (f["usable"], f["score"]), reverse=True)
+
+        kept = []
+        for frame in frames:
+            if max_frames is not None and len(kept) >= max_frames:
+                frame["dropped"] = "over_limit"
+                continue
+            if not frame["usable"] and kept:
+                frame["dropped"] = "unusable"
+                continue
+
+            duplicate_of = None
+            for other in kept:
+                if abs(frame["aspect"] - other["aspect"]) > 0.1 * other["aspect"]:
+                    continue
+                if bin(frame["hash"] ^ other["hash"]).count("1") <= max_distance:
+                    duplicate_of = other["index"]
+                    break
+
+            if duplicate_of is not None:
+                frame["dropped"] = f"duplicate_of_{duplicate_of}"
+                continue
+
+            frame["selected"] = True
+            kept.append(frame)
+
+        return kept + [f for f in frames if not f["selected"]]
 
     def assess_image_quality(self, image: np.ndarray) -> Dict[str, float]:
         """
@@ -261,6 +383,31 @@ class ImageProcessor:
             "quality_score": min(100, (laplacian_var / 100) * 50 + (contrast / 128) * 50)
         }
 
+    def compute_dhash(self, image: np.ndarray, hash_size: int = 8) -> int:
+        """
+        Compute a difference hash (dHash) perceptual fingerprint
+
+        Small JPEG re-encoding, resizing and brightness changes flip only a
+        few bits, so near-identical photos have a small Hamming distance
+
+        Args:
+            image: Input image
+            hash_size: Hash grid size (8 gives a 64-bit hash)
+
+        Returns:
+            Hash as an integer
+        """
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+
+        # One extra column so each row yields hash_size horizontal gradients
+        small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+        bits = (small[:, 1:] > small[:, :-1]).flatten()
+
+        value = 0
+        for bit in bits:
+            value = (value << 1) | int(bit)
+        return value
+
     def auto_rotate_upright(self, image: np.ndarray) -> np.ndarray:
         """
         Automatically rotate image to upright orientation using text detection
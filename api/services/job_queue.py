@@ -0,0 +1,536 @@
+"""
+Persistent Verification Job Queue
+SQLite-backed queue with a worker pool, bounded length, priorities and retries
+"""
+
+import json
+import mmap
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional, Any, Tuple
+
+import requests
+
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+FINISHED_STATES = (SUCCEEDED, FAILED)
+
+# Errors worth another attempt if they escape the handler. Upstream lookups
+# catch their own errors, so degraded results are retried on
+# raw_data["sources_unavailable"] instead (see _run_job)
+TRANSIENT_ERRORS: Tuple[type, ...] = (
+    ConnectionError,
+    TimeoutError,
+    requests.RequestException,
+)
+
+
+class QueueFullError(Exception):
+    """Raised when the queue already holds its maximum number of pending jobs"""
+
+
+def _json_default(value: Any) -> Any:
+    """Serialize dates found in pipeline results"""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+class JobQueue:
+    """
+    Durable job queue for long-running verifications
+
+    Jobs and their uploaded images are written to disk before the id is
+    returned, so queued work survives an API restart. A fixed pool of worker
+    threads claims jobs by priority (highest first, then oldest).
+
+    Several processes may share data_dir. A claimed job records its owner
+    (this queue instance) and a lease that a heartbeat thread keeps
+    extending; only jobs whose lease has run out, because their process
+    died or hung, are put back in the queue for another worker.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], Dict[str, Any]],
+        data_dir: str = "var/jobs",
+        max_workers: int = 2,
+        max_queued: int = 100,
+        max_attempts: int = 3,
+        retry_backoff: float = 2.0,
+        retention_seconds: float = 24 * 3600,
+        lease_seconds: float = 60.0,
+    ):
+        """
+        Args:
+            handler: Callable that runs the pipeline on raw image buffers
+            data_dir: Directory holding the SQLite database and job images
+            max_workers: Number of pipeline worker threads
+            max_queued: Maximum number of jobs waiting to run (backpressure)
+            max_attempts: Attempts per job before it is marked failed
+            retry_backoff: Base delay in seconds for exponential retry backoff
+            retention_seconds: How long finished jobs are kept for polling
+            lease_seconds: How long a claimed job stays with a process that
+                stops renewing it before it may be run elsewhere
+        """
+        self.handler = handler
+        self.data_dir = data_dir
+        self.images_dir = os.path.join(data_dir, "images")
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.retention_seconds = retention_seconds
+        self.lease_seconds = lease_seconds
+        # Unique per queue instance, so a restarted process does not inherit its predecessor's jobs
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        os.makedirs(self.images_dir, exist_ok=True)
+
+        self._db_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._workers: List[threading.Thread] = []
+        self._heartbeat: Optional[threading.Thread] = None
+        self._heartbeat_stop = threading.Event()
+        self._busy = 0
+
+        self._conn = sqlite3.connect(
+            os.path.join(data_dir, "jobs.db"),
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_schema()
+
+    def _init_schema(self):
+        """Create tables and indexes if missing"""
+        with self._db_lock:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    image_count INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    available_at REAL NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    owner TEXT,
+                    lease_until REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_claim
+                    ON jobs (status, priority DESC, available_at, created_at);
+                """
+            )
+            # Databases created before leases existed
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Recover jobs of dead workers and start the worker pool and lease heartbeat"""
+        self.recover_expired()
+
+        self._stopping = False
+        self._heartbeat_stop.clear()
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="verify-heartbeat", daemon=True)
+        self._heartbeat.start()
+        for i in range(self.max_workers):
+            worker = threading.Thread(
+                target=self._worker_loop, name=f"verify-worker-{i}", daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self, timeout: float = 5.0):
+        """Signal workers to exit and wait briefly for them"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+
+        for worker in self._workers:
+            worker.join(timeout=timeout)
+        self._workers = []
+        # Jobs still running keep their lease until it runs out
+        self._heartbeat_stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join(timeout=timeout)
+            self._heartbeat = None
+
+    def recover_expired(self) -> int:
+        """
+        Requeue running jobs whose owner stopped renewing their lease
+
+        Jobs that have already used all their attempts are failed instead,
+        so a job that kills its worker is not retried forever.
+
+        Returns:
+            Number of jobs recovered
+        """
+        now = time.time()
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                expired = " WHERE status = ? AND (lease_until IS NULL OR lease_until < ?)"
+                failed = self._conn.execute(
+                    "UPDATE jobs SET status = ?, updated_at = ?, owner = NULL, lease_until = NULL,"
+                    " error = 'Worker lost after ' || attempts || ' attempts'" + expired + " AND attempts >= ?",
+                    (FAILED, now, RUNNING, now, self.max_attempts),
+                ).rowcount
+                requeued = self._conn.execute(
+                    "UPDATE jobs SET status = ?, updated_at = ?, available_at = ?, owner = NULL, lease_until = NULL"
+                    + expired,
+                    (QUEUED, now, now, RUNNING, now),
+                ).rowcount
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if failed or requeued:
+            print(f"[Jobs] Recovered {requeued} job(s) from lost workers, failed {failed} out of attempts")
+        return failed + requeued
+
+    # ------------------------------------------------------------------
+    # Producer API
+    # ------------------------------------------------------------------
+
+    def submit(self, images: Iterable[Any], priority: int = 0) -> str:
+        """
+        Persist a new job and wake a worker
+
+        Args:
+            images: Raw image file contents (bytes or buffers), written to
+                disk one at a time so they can be streamed from the upload
+            priority: Higher values are processed first
+
+        Returns:
+            Job id
+
+        Raises:
+            QueueFullError: If the pending queue is at capacity
+        """
+        # Cheap early refusal before spooling images; the insert re-checks
+        if self.queued_count() >= self.max_queued:
+            raise QueueFullError(f"Job queue is full ({self.max_queued} pending)")
+
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.images_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        image_count = 0
+        try:
+            for idx, data in enumerate(images):
+                with open(os.path.join(job_dir, f"{idx}.img"), "wb") as f:
+                    f.write(data)
+                image_count += 1
+        except BaseException:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+        # Count and insert in one write transaction so concurrent submits
+        # (threads or other worker processes) cannot overshoot the bound
+        now = time.time()
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                queued = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)
+                ).fetchone()[0]
+                if queued >= self.max_queued:
+                    self._conn.execute("ROLLBACK")
+                    shutil.rmtree(job_dir, ignore_errors=True)
+                    raise QueueFullError(f"Job queue is full ({self.max_queued} pending)")
+                self._conn.execute(
+                    "INSERT INTO jobs (id, status, priority, image_count, created_at, updated_at, available_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, QUEUED, priority, image_count, now, now, now),
+                )
+                self._conn.execute("COMMIT")
+            except QueueFullError:
+                raise
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                shutil.rmtree(job_dir, ignore_errors=True)
+                raise
+
+        with self._cond:
+            self._cond.notify()
+
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get current job status and result
+
+        Args:
+            job_id: Job id returned by submit()
+
+        Returns:
+            Job dictionary or None if unknown
+        """
+        with self._db_lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+        if row is None:
+            return None
+
+        job = {
+            "job_id": row["id"],
+            "status": row["status"],
+            "priority": row["priority"],
+            "attempts": row["attempts"],
+            "created_at": datetime.fromtimestamp(row["created_at"]).isoformat(),
+            "updated_at": datetime.fromtimestamp(row["updated_at"]).isoformat(),
+        }
+        if row["result"]:
+            job["result"] = json.loads(row["result"])
+        if row["error"]:
+            job["error"] = row["error"]
+        return job
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Block until the job finishes or the timeout elapses (long-poll)
+
+        Args:
+            job_id: Job id
+            timeout: Maximum seconds to wait
+
+        Returns:
+            Latest job dictionary or None if unknown
+        """
+        deadline = time.monotonic() + timeout
+        job = self.get(job_id)
+
+        while job and job["status"] not in FINISHED_STATES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            with self._cond:
+                self._cond.wait(timeout=min(remaining, 1.0))
+            job = self.get(job_id)
+
+        return job
+
+    def queued_count(self) -> int:
+        """Number of jobs waiting to be claimed"""
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)
+            ).fetchone()
+        return row[0]
+
+    def busy_workers(self) -> int:
+        """Number of workers currently running a job"""
+        with self._cond:
+            return self._busy
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and worker utilisation"""
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+
+        counts = {status: count for status, count in rows}
+        return {
+            "queued": counts.get(QUEUED, 0),
+            "running": counts.get(RUNNING, 0),
+            "succeeded": counts.get(SUCCEEDED, 0),
+            "failed": counts.get(FAILED, 0),
+            "max_queued": self.max_queued,
+            "workers": self.max_workers,
+            "busy_workers": self._busy,
+        }
+
+    # ------------------------------------------------------------------
+    # Worker side
+    # ------------------------------------------------------------------
+
+    def _claim_next(self) -> Optional[sqlite3.Row]:
+        """Atomically move the highest-priority ready job to RUNNING"""
+        now = time.time()
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, attempts, image_count FROM jobs"
+                    " WHERE status = ? AND available_at <= ?"
+                    " ORDER BY priority DESC, available_at, created_at LIMIT 1",
+                    (QUEUED, now),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ?, owner = ?,"
+                        " lease_until = ? WHERE id = ?",
+                        (RUNNING, now, self.owner, now + self.lease_seconds, row["id"]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row
+
+    def _next_wakeup(self) -> float:
+        """Seconds until the next delayed (retrying) job becomes available"""
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT MIN(available_at) FROM jobs WHERE status = ?", (QUEUED,)
+            ).fetchone()
+        if row[0] is None:
+            return 5.0
+        return max(0.05, min(5.0, row[0] - time.time()))
+
+    def _worker_loop(self):
+        """Claim and run jobs until stopped"""
+        last_cleanup = 0.0
+
+        while not self._stopping:
+            row = self._claim_next()
+            if row is None:
+                with self._cond:
+                    if not self._stopping:
+                        self._cond.wait(timeout=self._next_wakeup())
+
+                if time.monotonic() - last_cleanup > 60:
+                    self._purge_expired()
+                    self.recover_expired()
+                    last_cleanup = time.monotonic()
+                continue
+
+            with self._cond:
+                self._busy += 1
+            try:
+                self._run_job(row["id"], row["attempts"] + 1, row["image_count"])
+            finally:
+                with self._cond:
+                    self._busy -= 1
+                    self._cond.notify_all()
+
+    def _run_job(self, job_id: str, attempt: int, image_count: int):
+        """Execute one job and record its outcome"""
+        job_dir = os.path.join(self.images_dir, job_id)
+        mapped = []
+
+        try:
+            # Map job images read-only instead of copying them onto the heap
+            images = []
+            for idx in range(image_count):
+                with open(os.path.join(job_dir, f"{idx}.img"), "rb") as f:
+                    if os.fstat(f.fileno()).st_size == 0:
+                        images.append(b"")
+                        continue
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                mapped.append(mm)
+                images.append(mm)
+
+            result = self.handler(images)
+            del images
+            self._close_maps(mapped)
+
+            # Upstream lookups swallow their own errors and report the
+            # sources they could not reach; that is the retry signal
+            unavailable = (result.get("raw_data") or {}).get("sources_unavailable") if isinstance(result, dict) else None
+            if unavailable and attempt < self.max_attempts:
+                delay = self.retry_backoff * (2 ** (attempt - 1))
+                print(f"[Jobs] {job_id} sources unavailable {unavailable} (attempt {attempt}), retrying in {delay:.1f}s")
+                self._requeue(job_id, delay, f"Sources unavailable: {', '.join(unavailable)}")
+                return
+            # Out of attempts: keep the degraded result rather than failing the job
+            self._finish(job_id, SUCCEEDED, result=json.dumps(result, default=_json_default))
+
+        except TRANSIENT_ERRORS as e:
+            if attempt < self.max_attempts:
+                delay = self.retry_backoff * (2 ** (attempt - 1))
+                print(f"[Jobs] {job_id} transient failure (attempt {attempt}), retrying in {delay:.1f}s: {e}")
+                self._requeue(job_id, delay, str(e))
+                return
+            self._finish(job_id, FAILED, error=f"Upstream failure after {attempt} attempts: {e}")
+
+        except Exception as e:
+            print(f"[Jobs] {job_id} failed: {e}")
+            self._finish(job_id, FAILED, error=str(e))
+
+        finally:
+            self._close_maps(mapped)
+
+    def _close_maps(self, mapped: List[mmap.mmap]):
+        """Unmap job images (safe to call more than once)"""
+        for mm in mapped:
+            try:
+                mm.close()
+            except BufferError:
+                # A decoded view still references the map; it is freed with it
+                pass
+
+    def _requeue(self, job_id: str, delay: float, error: str):
+        """Put a job back with a retry delay"""
+        now = time.time()
+        with self._db_lock:
+            updated = self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ?, available_at = ?, error = ?, owner = NULL,"
+                " lease_until = NULL WHERE id = ? AND owner = ?",
+                (QUEUED, now, now + delay, error, job_id, self.owner),
+            ).rowcount
+        if not updated:
+            print(f"[Jobs] {job_id} lease lost; leaving it to its new owner")
+
+    def _finish(self, job_id: str, status: str, result: Optional[str] = None, error: Optional[str] = None):
+        """Store the final outcome and drop the job's images"""
+        with self._db_lock:
+            updated = self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ?, result = ?, error = ?, owner = NULL,"
+                " lease_until = NULL WHERE id = ? AND owner = ?",
+                (status, time.time(), result, error, job_id, self.owner),
+            ).rowcount
+        if not updated:
+            # The lease ran out and another worker has the job (and its images) now
+            print(f"[Jobs] {job_id} lease lost; leaving it to its new owner")
+            return
+        shutil.rmtree(os.path.join(self.images_dir, job_id), ignore_errors=True)
+
+    def _heartbeat_loop(self):
+        """Extend the lease of every job this instance is running"""
+        while not self._heartbeat_stop.wait(self.lease_seconds / 3):
+            try:
+                with self._db_lock:
+                    self._conn.execute(
+                        "UPDATE jobs SET lease_until = ? WHERE status = ? AND owner = ?",
+                        (time.time() + self.lease_seconds, RUNNING, self.owner),
+                    )
+            except sqlite3.Error as e:
+                print(f"[Jobs] Lease heartbeat error: {e}")
+
+    def _purge_expired(self):
+        """Delete finished jobs older than the retention window"""
+        cutoff = time.time() - self.retention_seconds
+        with self._db_lock:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (SUCCEEDED, FAILED, cutoff),
+            )
+
+
+if __name__ == "__main__":
+    print("Job queue module loaded successfully")
@@ -0,0 +1,433 @@
+"""
+Prometheus Metrics
+Lightweight counters, gauges and histograms rendered in the Prometheus text format
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .tracing import SPAN_KIND_CLIENT, start_span
+
+
+# Per-request stage log, only set while a request is being profiled
+_STAGE_LOG: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("mediscan_stage_log", default=None)
+
+# Latency buckets (seconds) covering cache hits through slow upstream calls
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0,
+)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base class holding name, help text and label names"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_label_str(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be read from a callback at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, func: Callable[[], float], **labels):
+        """Evaluate func lazily on every scrape (no hot-path cost)"""
+        with self._lock:
+            self._functions[self._key(labels)] = func
+
+    def value(self, **labels) -> float:
+        key = self._key(labels)
+        if key in self._functions:
+            return float(self._functions[key]())
+        return self._values.get(key, 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = dict(self._values)
+            functions = dict(self._functions)
+        for key, func in functions.items():
+            try:
+                items[key] = float(func())
+            except Exception:
+                continue
+        return [f"{self.name}{_label_str(self.labelnames, k)} {_format_value(v)}" for k, v in items.items()]
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observed values"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = [0.0] * (len(self.buckets) + 2)
+                self._values[key] = row
+            row[idx] += 1
+            row[-1] += value
+
+    def time(self, **labels) -> "_Timer":
+        """Context manager observing elapsed wall time"""
+        return _Timer(self, labels)
+
+    def count(self, **labels) -> int:
+        row = self._values.get(self._key(labels))
+        return int(sum(row[:-1])) if row else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+
+        lines = []
+        for key, row in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), row[:-1]):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_label_str(self.labelnames, key, ('le', _format_value(bound)))} "
+                    f"{_format_value(cumulative)}"
+                )
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {_format_value(row[-1])}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {_format_value(cumulative)}")
+        return lines
+
+
+class _Timer:
+    """Observe a histogram with the duration of a with-block"""
+
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class _StageTimer(_Timer):
+    """
+    Stage timer that also opens a trace span and appends to the active
+    stage log, if any
+    """
+
+    __slots__ = ("stage", "span")
+
+    def __init__(self, stage: str):
+        super().__init__(STAGE_SECONDS, {"stage": stage})
+        self.stage = stage
+
+    def __enter__(self):
+        self.span = start_span(self.stage).__enter__()
+        self.start = time.perf_counter()
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        self.span.__exit__(exc_type, exc, tb)
+        self.histogram.observe(elapsed, **self.labels)
+        log = _STAGE_LOG.get()
+        if log is not None:
+            log.append({"stage": self.stage, "start": self.start, "seconds": elapsed})
+        return False
+
+
+class UpstreamCall:
+    """
+    Times one call to an external source and records its outcome
+
+    Set `outcome` inside the block (e.g. "not_found"); exceptions are recorded
+    as "error" and re-raised.
+    """
+
+    __slots__ = ("source", "outcome", "status", "start", "elapsed", "span", "timeout")
+
+    def __init__(self, source: str):
+        self.source = source
+        self.outcome = "ok"
+        self.status: Optional[int] = None
+        self.elapsed = 0.0
+        self.timeout: Optional[float] = None
+
+    def __enter__(self):
+        self.span = start_span(f"upstream.{self.source}", kind=SPAN_KIND_CLIENT, source=self.source).__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.outcome = "timeout" if "Timeout" in exc_type.__name__ else "error"
+        self.span.set_attribute("outcome", self.outcome)
+        self.span.set_attribute("http.status_code", self.status)
+        self.span.__exit__(exc_type, exc, tb)
+        UPSTREAM_SECONDS.observe(self.elapsed, source=self.source, outcome=self.outcome)
+        return False
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together for /metrics"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "mediscan_stage_duration_seconds",
+    "Wall time of each verification pipeline stage",
+    ["stage"],
+))
+UPSTREAM_SECONDS = REGISTRY.register(Histogram(
+    "mediscan_upstream_request_duration_seconds",
+    "Latency of calls to external verification sources",
+    ["source", "outcome"],
+))
+CIRCUIT_STATE = REGISTRY.register(Gauge(
+    "mediscan_circuit_state",
+    "Circuit breaker state per upstream source (0 closed, 1 half-open, 2 open)",
+    ["source"],
+))
+UPSTREAM_SKIPPED = REGISTRY.register(Counter(
+    "mediscan_upstream_skipped_total",
+    "Upstream calls skipped because the source's circuit was open",
+    ["source"],
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "mediscan_cache_requests_total",
+    "Cache lookups by cache and result (hit, near_hit, coalesced, stale, miss)",
+    ["cache", "result"],
+))
+CACHE_STALE_SECONDS = REGISTRY.register(Histogram(
+    "mediscan_cache_stale_served_seconds",
+    "How far past its soft TTL each stale cache entry was when served",
+    ["cache"],
+    buckets=(60.0, 300.0, 900.0, 3600.0, 4 * 3600.0, 12 * 3600.0, 86400.0, 3 * 86400.0, 7 * 86400.0),
+))
+CACHE_REFRESHES = REGISTRY.register(Counter(
+    "mediscan_cache_refreshes_total",
+    "Background stale-while-revalidate refreshes by cache and outcome (ok, error, dropped)",
+    ["cache", "outcome"],
+))
+BARCODE_VARIANT_SUCCESS = REGISTRY.register(Counter(
+    "mediscan_barcode_variant_success_total",
+    "New barcodes decoded per preprocessing variant",
+    ["variant"],
+))
+OCR_PASSES = REGISTRY.register(Counter(
+    "mediscan_ocr_passes_total",
+    "Tesseract passes run, by rotation and page segmentation mode",
+    ["rotation", "psm"],
+))
+VERIFY_REQUESTS = REGISTRY.register(Counter(
+    "mediscan_verify_requests_total",
+    "Verification requests by final status",
+    ["status"],
+))
+INFLIGHT_VERIFICATIONS = REGISTRY.register(Gauge(
+    "mediscan_inflight_verifications",
+    "Synchronous /verify requests currently running or waiting for admission",
+))
+ADMISSION_LIMIT = REGISTRY.register(Gauge(
+    "mediscan_admission_limit",
+    "Current adaptive concurrency limit per admission-controlled endpoint",
+    ["endpoint"],
+))
+ADMISSION_QUEUED = REGISTRY.register(Gauge(
+    "mediscan_admission_queued",
+    "Requests waiting for an admission slot",
+    ["endpoint"],
+))
+ADMISSION_REJECTED = REGISTRY.register(Counter(
+    "mediscan_admission_rejected_total",
+    "Requests shed with 429 by reason (queue_full, queue_timeout)",
+    ["endpoint", "reason"],
+))
+ADMISSION_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "mediscan_admission_wait_seconds",
+    "Time admitted requests waited for a slot",
+    ["endpoint"],
+))
+JOB_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "mediscan_job_queue_depth",
+    "Background jobs waiting to run",
+))
+WORKER_POOL_BUSY = REGISTRY.register(Gauge(
+    "mediscan_worker_pool_busy",
+    "Busy workers per pool",
+    ["pool"],
+))
+WORKER_POOL_SIZE = REGISTRY.register(Gauge(
+    "mediscan_worker_pool_size",
+    "Configured workers per pool",
+    ["pool"],
+))
+CDSCO_LOOKUPS = REGISTRY.register(Counter(
+    "mediscan_cdsco_lookups_total",
+    "CDSCO drug searches by where they were resolved (local, network, not_found)",
+    ["resolved_by"],
+))
+HISTORY_WRITTEN = REGISTRY.register(Counter(
+    "mediscan_scan_history_written_total",
+    "Scans written to the scan history",
+))
+HISTORY_DROPPED = REGISTRY.register(Counter(
+    "mediscan_scan_history_dropped_total",
+    "Scans not recorded because the history write queue was full",
+))
+WATCHLIST_MATCHES = REGISTRY.register(Counter(
+    "mediscan_watchlist_matches_total",
+    "Watchlist terms found in scanned pack text, by term category",
+    ["category"],
+))
+
+
+def time_stage(stage: str) -> _Timer:
+    """Context manager timing one pipeline stage; yields the stage's trace span"""
+    return _StageTimer(stage)
+
+
+@contextmanager
+def collect_stages() -> Iterator[List[Dict[str, Any]]]:
+    """
+    Record every stage timed in this context (e.g. for a profiled request)
+
+    Contexts nest: stages recorded by an inner context are also passed on
+    to the enclosing one when it exits.
+
+    Yields:
+        List that receives {"stage", "start", "seconds"} entries in completion order
+    """
+    log: List[Dict[str, Any]] = []
+    token = _STAGE_LOG.set(log)
+    try:
+        yield log
+    finally:
+        _STAGE_LOG.reset(token)
+        outer = _STAGE_LOG.get()
+        if outer is not None:
+            outer.extend(log)
+
+
+def time_upstream(source: str) -> UpstreamCall:
+    """Context manager timing one upstream call"""
+    return UpstreamCall(source)
+
+
+def render_metrics() -> str:
+    """Prometheus text exposition of all registered metrics"""
+    return REGISTRY.render()
+
+
+if __name__ == "__main__":
+    print("Metrics module loaded successfully")
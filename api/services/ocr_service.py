@@ -12,6 +12,8 @@ from dateutil.parser import parse as dateparse
 from dateutil.relativedelta import relativedelta
 from typing import List, Dict, Optional, Tuple, Any
 from .image_processor import ImageProcessor
+from .metrics import OCR_PASSES, time_stage
+from .tracing import start_span
 
 
 class OCRService:
@@ -48,6 +50,20 @@ class OCRService:
         self.mfg_keywords = r"(MFG|MFD|MANUFACTURED|PRODUCTION|MFG\s*DATE|MANUF|MFD\s*DATE)"
         self.batch_keywords = r"(BATCH|LOT|B\.?NO|L\.?NO|BATCH\s*NO|LOT\s*NO)"
 
+    def warm_up(self, image: np.ndarray) -> str:
+        """
+        Run a single OCR pass so tesseract and its language data are loaded
+
+        Args:
+            image: Small image containing a line of text
+
+        Returns:
+            Recognised text
+        """
+        processed = self.processor.preprocess_for_ocr(image)
+        self.processor.enhance_for_expiry_date(image)
+        return pytesseract.image_to_string(processed, config="--oem 3 --psm 7 -l eng")
+
     def extract_text_from_image(self, image: np.ndarray, preprocess: bool = True) -> str:
         """
         Extract text from image using OCR with multiple strategies
@@ -74,13 +90,16 @@ class OCRService:
                 processed = rotated
 
             configs = [
-                "--oem 3 --psm 6 -l eng",  # Uniform block of text
-                "--oem 3 --psm 11 -l eng",  # Sparse text
+                ("6", "--oem 3 --psm 6 -l eng"),  # Uniform block of text
+                ("11", "--oem 3 --psm 11 -l eng"),  # Sparse text
             ]
 
-            for config in configs:
+            for psm, config in configs:
                 try:
-                    text = pytesseract.image_to_string(processed, config=config)
+                    OCR_PASSES.inc(rotation=str(angle), psm=psm)
+                    with start_span("ocr.pass", rotation=angle, psm=psm) as span:
+                        text = pytesseract.image_to_string(processed, config=config)
+                        span.set_attribute("chars", len(text))
                     if text.strip():
                         # Check if this orientation has readable text (contains common words)
                         word_count = len([w for w in text.split() if len(w) > 2])
@@ -92,7 +111,10 @@ class OCRService:
         # Strategy 2: Enhanced preprocessing for date detection
         try:
             date_enhanced = self.processor.enhance_for_expiry_date(image)
-            text = pytesseract.image_to_string(date_enhanced, config="--oem 3 --psm 6 -l eng")
+            OCR_PASSES.inc(rotation="0", psm="6_date")
+            with start_span("ocr.pass", rotation=0, psm="6_date") as span:
+                text = pytesseract.image_to_string(date_enhanced, config="--oem 3 --psm 6 -l eng")
+                span.set_attribute("chars", len(text))
             if text.strip():
                 all_text.append(text)
         except Exception as e:
@@ -134,7 +156,9 @@ class OCRService:
             quality = self.processor.assess_image_quality(image)
 
             # Extract text
-            text = self.extract_text_from_image(image)
+            with time_stage("ocr_text") as span:
+                span.set_attribute("image_index", idx)
+                text = self.extract_text_from_image(image)
             all_texts.append({
                 "image_index": idx,
                 "text": text,
@@ -143,29 +167,30 @@ class OCRService:
 
 
             # Extract specific information
-            expiry = self.extract_expiry_date(text)
-            if expiry:
-                expiry_candidates.append({
-                    "date": expiry["date"],
-                    "confidence": expiry["confidence"],
-                    "source_text": expiry["snippet"],
-                    "image_index": idx
-                })
-
-            mfg = self.extract_manufacturing_date(text)
-            if mfg:
-                mfg_candidates.append({
-                    "date": mfg["date"],
-                    "source_text": mfg["snippet"],
-                    "image_index": idx
-                })
-
-            batch = self.extract_batch_number(text)
-            if batch:
-                batch_candidates.append({
-                    "batch": batch,
-                    "image_index": idx
-                })
+            with time_stage("field_extraction"):
+                expiry = self.extract_expiry_date(text)
+                if expiry:
+                    expiry_candidates.append({
+                        "date": expiry["date"],
+                        "confidence": expiry["confidence"],
+                        "source_text": expiry["snippet"],
+                        "image_index": idx
+                    })
+
+                mfg = self.extract_manufacturing_date(text)
+                if mfg:
+                    mfg_candidates.append({
+                        "date": mfg["date"],
+                        "source_text": mfg["snippet"],
+                        "image_index": idx
+                    })
+
+                batch = self.extract_batch_number(text)
+                if batch:
+                    batch_candidates.append({
+                        "batch": batch,
+                        "image_index": idx
+                    })
 
         # Choose best candidates
         best_expiry = self._select_best_expiry(expiry_candidates)
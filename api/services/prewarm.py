@@ -0,0 +1,499 @@
+"""
+Cache Pre-warming
+Resolves lists of GTINs and product names through the normal scrapers so their upstream results are cached before traffic arrives
+
+Usage (from the api/ directory, against a running server):
+    python -m services.prewarm top_products.csv --url http://localhost:8000
+    python -m services.prewarm top_products.csv --name nightly --no-resume
+    python -m services.prewarm --history-days 7 --history-limit 1000
+    python -m services.prewarm --registry --registry-prefix 890
+"""
+
+import csv
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import IO, Callable, Dict, List, Optional, Any, Iterable, Set
+
+from .circuit_breaker import collect_unavailable
+from .container import ServiceContainer
+from .file_lock import try_lock
+from .gs1_registry import GS1Registry
+from .gtin import is_valid_gtin, to_gtin14
+from .scan_history import ScanHistory
+
+
+OUTCOMES = ("warmed", "cached", "offline", "invalid", "unavailable", "error")
+
+_GTIN_COLUMNS = ("gtin", "barcode", "ean", "gtin14")
+_PRODUCT_COLUMNS = ("product", "product_name", "name", "drug", "drug_name", "brand")
+
+
+def prewarm_items(gtins: Iterable[str] = (), products: Iterable[str] = ()) -> List[Dict[str, str]]:
+    """De-duplicated work items, GTINs first (GTIN spellings of one number count once)"""
+    items = []
+    seen: Set[str] = set()
+    for kind, values in (("gtin", gtins), ("product", products)):
+        for value in values:
+            value = (value or "").strip()
+            if not value:
+                continue
+            key = f"gtin:{to_gtin14(value) or value}" if kind == "gtin" else f"product:{value.lower()}"
+            if key not in seen:
+                seen.add(key)
+                items.append({"kind": kind, "value": value, "key": key})
+    return items
+
+
+def read_prewarm_csv(path: str) -> Dict[str, List[str]]:
+    """
+    Read GTINs and product names from a CSV file
+
+    Columns: gtin (or barcode/ean) and/or product (or product_name/name/drug);
+    a row may carry both.
+
+    Returns:
+        {"gtins": [...], "products": [...]}
+    """
+    gtins, products = [], []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+            gtin = next((row[c] for c in _GTIN_COLUMNS if row.get(c)), None)
+            product = next((row[c] for c in _PRODUCT_COLUMNS if row.get(c)), None)
+            if gtin:
+                gtins.append(gtin)
+            if product:
+                products.append(product)
+    return {"gtins": gtins, "products": products}
+
+
+def history_prewarm_lists(history: ScanHistory, days: float = 7.0, limit: int = 500) -> Dict[str, List[str]]:
+    """
+    The most scanned GTINs and product names of the last `days` days
+
+    Args:
+        history: Scan history to count from
+        days: Look-back window
+        limit: Maximum GTINs and, separately, product names
+
+    Returns:
+        {"gtins": [...], "products": [...]}, most scanned first
+    """
+    since = time.time() - days * 86400
+    return {
+        "gtins": [gtin for gtin, _ in history.top_values("gtin", since=since, limit=limit)],
+        "products": [name for name, _ in history.top_values("product_name", since=since, limit=limit)],
+    }
+
+
+def registry_prewarm_lists(registry: GS1Registry, prefixes: Iterable[str] = (), limit: int = 500) -> Dict[str, List[str]]:
+    """
+    Licensees of the GS1 company-prefix registry, warmed as product names
+
+    GTINs under a registered prefix already resolve offline, so what is
+    left to warm for them is the CDSCO side: the licensee names go through
+    the same search and counterfeit-alert check as product names.
+
+    Args:
+        registry: Offline GS1 registry
+        prefixes: Only company prefixes starting with one of these; empty for all
+        limit: Maximum licensee names
+
+    Returns:
+        {"gtins": [], "products": [...]}
+    """
+    names: List[str] = []
+    seen: Set[str] = set()
+    for _, name in registry.licensees(prefixes):
+        if name.lower() not in seen:
+            seen.add(name.lower())
+            names.append(name)
+            if len(names) >= limit:
+                break
+    return {"gtins": [], "products": names}
+
+
+def collect_prewarm_lists(
+    csv_paths: Iterable[str] = (),
+    history: Optional[ScanHistory] = None,
+    history_days: float = 0,
+    history_limit: int = 500,
+    registry: Optional[GS1Registry] = None,
+    registry_prefixes: Optional[Iterable[str]] = None,
+    registry_limit: int = 500
+) -> Dict[str, List[str]]:
+    """
+    Combine the GTIN and product lists of every selected source
+
+    Args:
+        csv_paths: CSV files (see read_prewarm_csv); missing files are skipped
+        history: Scan history, used when history_days > 0
+        history_days: Look-back window for the most scanned GTINs and products
+        history_limit: See history_prewarm_lists()
+        registry: GS1 registry, used when registry_prefixes is not None
+        registry_prefixes: Company prefix filter ([] for every licensee)
+        registry_limit: See registry_prewarm_lists()
+
+    Returns:
+        {"gtins": [...], "products": [...]} in source order (CSV, history, registry)
+    """
+    lists = [read_prewarm_csv(path) for path in csv_paths if os.path.exists(path)]
+    if history is not None and history_days > 0:
+        lists.append(history_prewarm_lists(history, history_days, history_limit))
+    if registry is not None and registry_prefixes is not None:
+        lists.append(registry_prewarm_lists(registry, registry_prefixes, registry_limit))
+    return {
+        "gtins": [gtin for found in lists for gtin in found["gtins"]],
+        "products": [name for found in lists for name in found["products"]],
+    }
+
+
+class _RateLimiter:
+    """Spaces call starts at least 1/rate seconds apart across threads"""
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, stop: threading.Event) -> bool:
+        """Wait for the next slot; False if stop was set meanwhile"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        return not stop.wait(slot - now) if slot > now else not stop.is_set()
+
+
+class Prewarmer:
+    """
+    Runs one pre-warm pass at a time in a background thread
+
+    GTINs that the offline registry or the GS1 cache already resolve are
+    skipped; everything else goes through GS1Scraper.resolve_upstream, and
+    product names through CDSCOScraper.search_drug and the counterfeit
+    alert check, as in a real verification. Completed keys are appended to
+    data_dir/<name>.done so an interrupted pass resumes where it stopped;
+    the file is removed once a pass finishes.
+
+    Worker processes sharing data_dir coordinate through lock files there:
+    a pass name runs in one process at a time (it owns the resume file),
+    and only one process runs the schedule. Caches and the rate limit
+    belong to the process running the pass, so a pass warms other workers
+    only when they share a cache backend.
+    """
+
+    def __init__(
+        self,
+        services: ServiceContainer,
+        data_dir: str = "var/prewarm",
+        concurrency: int = 4,
+        rate_per_second: float = 2.0
+    ):
+        """
+        Args:
+            services: Shared service instances whose caches are warmed
+            data_dir: Folder for resume files
+            concurrency: Items resolved at once
+            rate_per_second: Maximum items started per second (upstream politeness)
+        """
+        self.services = services
+        self.data_dir = data_dir
+        self.concurrency = concurrency
+        self.rate_per_second = rate_per_second
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._schedule_stop = threading.Event()
+        self._scheduler: Optional[threading.Thread] = None
+        self._scheduler_lock: Optional[IO] = None
+        self._status: Dict[str, Any] = {"name": None, "running": False}
+
+    def start(self, items: List[Dict[str, str]], name: str = "manual", resume: bool = True) -> bool:
+        """
+        Start a pass in the background
+
+        Args:
+            items: Work items from prewarm_items()
+            name: Pass name; passes with the same name share a resume file
+            resume: Skip items completed by an earlier interrupted pass
+
+        Returns:
+            False if a pass is already running here, or a pass with this
+            name in another worker process
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            pass_lock = self._lock_pass(name)
+            if pass_lock is None:
+                return False
+            self._stop.clear()
+            # Visible to status() before the thread has read its resume file
+            self._status = _new_status(name, len(items), 0)
+            self._thread = threading.Thread(
+                target=self._run_locked, args=(pass_lock, items, name, resume), name="prewarm", daemon=True
+            )
+            self._thread.start()
+        return True
+
+    def run(
+        self,
+        items: List[Dict[str, str]],
+        name: str = "manual",
+        resume: bool = True,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Warm the caches for every item, blocking until done or stopped
+
+        Args:
+            items: Work items from prewarm_items()
+            name: Pass name (resume file data_dir/<name>.done)
+            resume: Skip items completed by an earlier interrupted pass
+            progress: Called with the status after every item
+
+        Returns:
+            Final status, or None if another worker process is running a
+            pass with this name
+        """
+        pass_lock = self._lock_pass(name)
+        if pass_lock is None:
+            return None
+        return self._run_locked(pass_lock, items, name, resume, progress)
+
+    def _lock_pass(self, name: str) -> Optional[IO]:
+        """Claim a pass name (and its resume file) across worker processes"""
+        return try_lock(os.path.join(self.data_dir, f"{_safe_name(name)}.lock"))
+
+    def _run_locked(
+        self,
+        pass_lock: IO,
+        items: List[Dict[str, str]],
+        name: str,
+        resume: bool,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        try:
+            return self._run(items, name, resume, progress)
+        finally:
+            pass_lock.close()
+
+    def _run(
+        self,
+        items: List[Dict[str, str]],
+        name: str,
+        resume: bool,
+        progress: Optional[Callable[[Dict[str, Any]], None]]
+    ) -> Dict[str, Any]:
+        os.makedirs(self.data_dir, exist_ok=True)
+        done_path = os.path.join(self.data_dir, f"{_safe_name(name)}.done")
+        completed = self._read_done(done_path) if resume else set()
+        if not resume and os.path.exists(done_path):
+            os.remove(done_path)
+        pending = [item for item in items if item["key"] not in completed]
+
+        status = _new_status(name, len(items), len(items) - len(pending))
+        with self._lock:
+            self._status = status
+
+        limiter = _RateLimiter(self.rate_per_second)
+        start = time.perf_counter()
+        services = self.services.build()
+        with open(done_path, "a", encoding="utf-8") as done_file, \
+                ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="prewarm") as pool:
+            iterator = iter(pending)
+            inflight = {}
+            while True:
+                while len(inflight) < self.concurrency and not self._stop.is_set():
+                    item = next(iterator, None)
+                    if item is None:
+                        break
+                    inflight[pool.submit(self._warm, services, item, limiter)] = item
+                if not inflight:
+                    break
+                finished, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    item = inflight.pop(future)
+                    outcome = future.result()
+                    # Items that could not reach their source are retried on resume
+                    if outcome not in ("unavailable", "error"):
+                        done_file.write(item["key"] + "\n")
+                        done_file.flush()
+                    with self._lock:
+                        status["done"] += 1
+                        status["outcomes"][outcome] += 1
+                        status["items_per_second"] = round(status["done"] / max(time.perf_counter() - start, 1e-9), 2)
+                    if progress is not None:
+                        progress(self.status())
+
+        with self._lock:
+            status["running"] = False
+            status["finished_at"] = time.time()
+            status["stopped"] = self._stop.is_set()
+        if not status["stopped"] and os.path.exists(done_path):
+            os.remove(done_path)
+        return self.status()
+
+    def stop(self):
+        """Stop the running pass after the items in flight (it can be resumed)"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(
+                self._status,
+                outcomes=dict(self._status.get("outcomes", {})),
+                scheduler=self._scheduler_lock is not None,
+            )
+
+    def start_schedule(self, load: Callable[[], Dict[str, List[str]]], interval: float):
+        """
+        Re-run a list every `interval` seconds (pass name "scheduled")
+
+        Every worker process may call this; the one holding
+        data_dir/scheduler.lock runs the passes and the others stand by,
+        taking over if it exits.
+
+        Args:
+            load: Returns the current {"gtins", "products"} lists, e.g. a
+                partial of collect_prewarm_lists(); called before every pass
+            interval: Seconds between passes
+        """
+        self._schedule_stop.clear()
+        self._scheduler = threading.Thread(
+            target=self._schedule, args=(load, interval), name="prewarm-schedule", daemon=True
+        )
+        self._scheduler.start()
+
+    def stop_schedule(self):
+        self._schedule_stop.set()
+        if self._scheduler is not None:
+            self._scheduler.join(timeout=5)
+            self._scheduler = None
+        self.stop()
+        if self._scheduler_lock is not None:
+            self._scheduler_lock.close()
+            self._scheduler_lock = None
+
+    def is_scheduler(self) -> bool:
+        """True if this process runs the scheduled passes"""
+        return self._scheduler_lock is not None
+
+    def _schedule(self, load: Callable[[], Dict[str, List[str]]], interval: float):
+        while not self._schedule_stop.is_set():
+            if self._scheduler_lock is None:
+                self._scheduler_lock = try_lock(os.path.join(self.data_dir, "scheduler.lock"))
+            if self._scheduler_lock is not None:
+                try:
+                    items = prewarm_items(**load())
+                    if items:
+                        self.start(items, name="scheduled")
+                except Exception as e:
+                    print(f"Scheduled pre-warm error: {e}")
+            # Standby workers check for a departed scheduler at least every minute
+            wait = interval if self._scheduler_lock is not None else min(interval, 60)
+            if self._schedule_stop.wait(wait):
+                break
+
+    def _warm(self, services: ServiceContainer, item: Dict[str, str], limiter: _RateLimiter) -> str:
+        try:
+            if item["kind"] == "gtin":
+                gtin = item["value"]
+                if not is_valid_gtin(gtin):
+                    return "invalid"
+                known = services.gs1_scraper.resolve_offline(gtin)
+                if known is not None:
+                    return "cached" if known.get("cached") else "offline"
+                if not limiter.acquire(self._stop):
+                    return "unavailable"
+                with collect_unavailable() as unavailable:
+                    services.gs1_scraper.resolve_upstream(gtin)
+            else:
+                if not limiter.acquire(self._stop):
+                    return "unavailable"
+                with collect_unavailable() as unavailable:
+                    services.cdsco_scraper.search_drug(drug_name=item["value"])
+                    services.cdsco_scraper.check_counterfeit_alerts(item["value"])
+            return "unavailable" if unavailable else "warmed"
+        except Exception as e:
+            print(f"Pre-warm error for {item['key']}: {e}")
+            return "error"
+
+    @staticmethod
+    def _read_done(path: str) -> Set[str]:
+        if not os.path.exists(path):
+            return set()
+        with open(path, encoding="utf-8") as f:
+            return {line.strip() for line in f if line.strip()}
+
+
+def _new_status(name: str, total: int, resumed: int) -> Dict[str, Any]:
+    return {
+        "pid": os.getpid(),
+        "name": name,
+        "running": True,
+        "started_at": time.time(),
+        "finished_at": None,
+        "total": total,
+        "resumed": resumed,
+        "done": 0,
+        "outcomes": {outcome: 0 for outcome in OUTCOMES},
+        "items_per_second": None,
+    }
+
+
+def _safe_name(name: str) -> str:
+    return "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in name) or "manual"
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    import requests
+
+    parser = argparse.ArgumentParser(description="Pre-warm a running server's GS1/CDSCO/Tavily caches")
+    parser.add_argument("csv", nargs="*", help="CSV files with gtin and/or product columns")
+    parser.add_argument("--history-days", type=float, default=0,
+                        help="Also warm the server's most scanned GTINs and products of the last N days")
+    parser.add_argument("--history-limit", type=int, default=500, help="Most scanned GTINs/products to take")
+    parser.add_argument("--registry", action="store_true", help="Also warm the GS1 registry's licensees")
+    parser.add_argument("--registry-prefix", action="append", default=[],
+                        help="Only licensees whose company prefix starts with this (repeatable)")
+    parser.add_argument("--registry-limit", type=int, default=500, help="Licensees to take")
+    parser.add_argument("--url", default=os.getenv("MEDISCAN_URL", "http://localhost:8000"), help="Server base URL")
+    parser.add_argument("--name", default="manual", help="Pass name; an interrupted pass resumes under the same name")
+    parser.add_argument("--no-resume", action="store_true", help="Start over instead of resuming")
+    parser.add_argument("--poll", type=float, default=2.0, help="Seconds between progress reports")
+    args = parser.parse_args()
+    if not args.csv and args.history_days <= 0 and not args.registry and not args.registry_prefix:
+        parser.error("give CSV files, --history-days or --registry")
+
+    body = {"gtins": [], "products": [], "name": args.name, "resume": not args.no_resume}
+    if args.history_days > 0:
+        body.update(history_days=args.history_days, history_limit=args.history_limit)
+    if args.registry or args.registry_prefix:
+        body.update(registry_prefixes=args.registry_prefix, registry_limit=args.registry_limit)
+    for csv_path in args.csv:
+        rows = read_prewarm_csv(csv_path)
+        body["gtins"].extend(rows["gtins"])
+        body["products"].extend(rows["products"])
+
+    response = requests.post(f"{args.url}/admin/prewarm", json=body, timeout=30)
+    if response.status_code != 202:
+        print(f"Pre-warm not started: {response.status_code} {response.text}")
+        sys.exit(1)
+
+    while True:
+        current = requests.get(f"{args.url}/admin/prewarm", timeout=30).json()
+        outcomes = ", ".join(f"{k}={v}" for k, v in current.get("outcomes", {}).items() if v)
+        print(f"[{current['name']}] {current['done']}/{current['total'] - current['resumed']} "
+              f"({current['resumed']} resumed) {outcomes} {current['items_per_second'] or 0}/s")
+        if not current["running"]:
+            break
+        time.sleep(args.poll)
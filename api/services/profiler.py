@@ -0,0 +1,374 @@
+"""
+Request Profiler
+Opt-in per-request profiling and continuous low-rate stack sampling
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Iterable
+
+from .metrics import collect_stages
+
+
+PROFILE_MODES = ("sample", "cprofile")
+
+
+def _frame_label(frame) -> str:
+    """Flame-graph frame name: function (file:line)"""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Periodically samples Python stacks of other threads via sys._current_frames()
+
+    Samples are aggregated into collapsed stacks ("root;child;leaf count"),
+    the input format of flamegraph.pl, speedscope and similar viewers.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.005,
+        thread_ids: Optional[Iterable[int]] = None,
+        max_depth: int = 128,
+        skip_outer: int = 0
+    ):
+        """
+        Args:
+            interval: Seconds between samples
+            thread_ids: Threads to sample (default: every thread except the sampler)
+            max_depth: Frames kept per stack, innermost first
+            skip_outer: Outermost frames dropped from every stack (event loop,
+                server plumbing) so stacks start at the profiled code
+        """
+        self.interval = interval
+        self.thread_ids = set(thread_ids) if thread_ids is not None else None
+        self.max_depth = max_depth
+        self.skip_outer = skip_outer
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _loop(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if self.thread_ids is not None and thread_id not in self.thread_ids:
+                    continue
+
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                if 0 < self.skip_outer < len(labels):
+                    labels = labels[:-self.skip_outer]
+                labels = labels[:self.max_depth]
+                labels.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Collapsed-stack text, one stack per line"""
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+    def top_functions(self, limit: int = 25) -> List[Dict[str, Any]]:
+        """
+        Functions ranked by inclusive sample count
+
+        Returns:
+            List of {function, self_samples, total_samples, total_pct}
+        """
+        total = sum(self.stacks.values())
+        if not total:
+            return []
+
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        for stack, count in self.stacks.items():
+            # First element is the thread name, not a function
+            frames = stack.split(";")[1:]
+            if not frames:
+                continue
+            self_counts[frames[-1]] += count
+            for label in set(frames):
+                total_counts[label] += count
+
+        return [
+            {
+                "function": label,
+                "self_samples": self_counts.get(label, 0),
+                "total_samples": count,
+                "total_pct": round(count / total * 100, 1),
+            }
+            for label, count in total_counts.most_common(limit)
+        ]
+
+
+class ProfileSession:
+    """One profiled request; use via RequestProfiler.profile()"""
+
+    def __init__(self, profiler: "RequestProfiler", label: str, mode: str):
+        self.profiler = profiler
+        self.label = label
+        self.mode = mode
+        self.profile_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.report: Optional[Dict[str, Any]] = None
+        self._cprofile = cProfile.Profile() if mode == "cprofile" else None
+        self._stages_cm = None
+        self._stages: List[Dict[str, Any]] = []
+
+    def __enter__(self):
+        # Frames above the caller of `with` belong to the server, not the request
+        depth = 0
+        frame = sys._getframe(1).f_back
+        while frame is not None:
+            depth += 1
+            frame = frame.f_back
+        self._sampler = StackSampler(
+            interval=self.profiler.sample_interval,
+            thread_ids=[threading.get_ident()],
+            skip_outer=depth,
+        )
+
+        self._stages_cm = collect_stages()
+        self._stages = self._stages_cm.__enter__()
+        self._start = time.perf_counter()
+        self._sampler.start()
+        if self._cprofile is not None:
+            self._cprofile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        self._sampler.stop()
+        wall = time.perf_counter() - self._start
+        self._stages_cm.__exit__(exc_type, exc, tb)
+
+        try:
+            self.report = self._build_report(wall)
+        except Exception as e:
+            print(f"Profile report error: {e}")
+        return False
+
+    def _build_report(self, wall: float) -> Dict[str, Any]:
+        out_dir = os.path.join(self.profiler.output_dir, self.profile_id)
+        os.makedirs(out_dir, exist_ok=True)
+
+        files = {"stacks": os.path.join(out_dir, "stacks.collapsed")}
+        with open(files["stacks"], "w") as f:
+            f.write(self._sampler.collapsed())
+
+        if self._cprofile is not None:
+            files["pstats"] = os.path.join(out_dir, "profile.pstats")
+            self._cprofile.dump_stats(files["pstats"])
+            top_functions = self._cprofile_top(self.profiler.top_n)
+        else:
+            top_functions = self._sampler.top_functions(self.profiler.top_n)
+
+        report = {
+            "profile_id": self.profile_id,
+            "label": self.label,
+            "mode": self.mode,
+            "wall_seconds": round(wall, 4),
+            "samples": self._sampler.samples,
+            "stages": [
+                {
+                    "stage": s["stage"],
+                    "offset_ms": round((s["start"] - self._start) * 1000, 2),
+                    "wall_ms": round(s["seconds"] * 1000, 2),
+                }
+                for s in sorted(self._stages, key=lambda s: s["start"])
+            ],
+            "top_functions": top_functions,
+            "files": files,
+        }
+
+        files["report"] = os.path.join(out_dir, "report.json")
+        with open(files["report"], "w") as f:
+            json.dump(report, f, indent=2)
+
+        return report
+
+    def _cprofile_top(self, limit: int) -> List[Dict[str, Any]]:
+        """Top functions by cumulative time from the deterministic profile"""
+        stats = pstats.Stats(self._cprofile)
+        rows = []
+        for (filename, line, func), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+            rows.append({
+                "function": f"{func} ({os.path.basename(filename)}:{line})",
+                "calls": ncalls,
+                "self_ms": round(tottime * 1000, 2),
+                "total_ms": round(cumtime * 1000, 2),
+            })
+        rows.sort(key=lambda r: r["total_ms"], reverse=True)
+        return rows[:limit]
+
+
+class RequestProfiler:
+    """
+    Profiles individual requests on demand
+
+    The "sample" mode has low overhead and is safe on slow production
+    requests; "cprofile" is deterministic (exact call counts) but slows
+    pure-Python code considerably. Both record a collapsed-stack file for
+    flame graphs and per-stage wall times.
+    """
+
+    def __init__(
+        self,
+        output_dir: str = "var/profiles",
+        mode: str = "sample",
+        sample_interval: float = 0.005,
+        top_n: int = 25
+    ):
+        """
+        Args:
+            output_dir: Directory that receives one folder per profiled request
+            mode: Default mode, "sample" or "cprofile"
+            sample_interval: Seconds between stack samples
+            top_n: Functions listed in the report
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        self.output_dir = output_dir
+        self.mode = mode
+        self.sample_interval = sample_interval
+        self.top_n = top_n
+
+    def profile(self, label: str = "request", mode: Optional[str] = None) -> ProfileSession:
+        """
+        Context manager profiling the code run in the current thread
+
+        Args:
+            label: Free-form name stored in the report
+            mode: Override the default mode for this request
+
+        Returns:
+            Session whose .report is set after the block exits
+        """
+        mode = mode or self.mode
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        return ProfileSession(self, label, mode)
+
+    def load_report(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        """Read a stored report by id"""
+        path = self._artifact_path(profile_id, "report.json")
+        if path is None:
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def load_stacks(self, profile_id: str) -> Optional[str]:
+        """Read a stored collapsed-stack file by id"""
+        path = self._artifact_path(profile_id, "stacks.collapsed")
+        if path is None:
+            return None
+        with open(path) as f:
+            return f.read()
+
+    def _artifact_path(self, profile_id: str, name: str) -> Optional[str]:
+        # Ids are generated here; reject anything that could escape output_dir
+        if not profile_id or os.path.basename(profile_id) != profile_id or profile_id.startswith("."):
+            return None
+        path = os.path.join(self.output_dir, profile_id, name)
+        return path if os.path.isfile(path) else None
+
+
+class ContinuousProfiler:
+    """
+    Process-wide low-rate stack sampler writing one collapsed file per window
+
+    At the default 10 Hz the sampler wakes ten times a second and walks each
+    thread's stack, which costs well under 1% CPU.
+    """
+
+    def __init__(
+        self,
+        output_dir: str = "var/profiles/continuous",
+        window_seconds: float = 60.0,
+        hz: float = 10.0,
+        keep: int = 60
+    ):
+        """
+        Args:
+            output_dir: Directory for the periodic collapsed-stack files
+            window_seconds: Length of each profile window
+            hz: Samples per second
+            keep: Number of most recent files retained
+        """
+        self.output_dir = output_dir
+        self.window_seconds = window_seconds
+        self.interval = 1.0 / hz
+        self.keep = keep
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="continuous-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.window_seconds + 5)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            sampler = StackSampler(interval=self.interval)
+            started = datetime.now()
+            sampler.start()
+            self._stop.wait(self.window_seconds)
+            sampler.stop()
+
+            if sampler.samples:
+                try:
+                    self._write(started, sampler)
+                except Exception as e:
+                    print(f"Continuous profiler error: {e}")
+
+    def _write(self, started: datetime, sampler: StackSampler):
+        path = os.path.join(self.output_dir, f"profile-{started.strftime('%Y%m%d-%H%M%S')}.collapsed")
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(sampler.collapsed())
+        os.replace(tmp, path)
+
+        files = sorted(n for n in os.listdir(self.output_dir) if n.endswith(".collapsed"))
+        for name in files[:-self.keep]:
+            try:
+                os.remove(os.path.join(self.output_dir, name))
+            except OSError:
+                pass
+
+
+if __name__ == "__main__":
+    print("Profiler module loaded successfully")
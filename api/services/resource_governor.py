@@ -0,0 +1,203 @@
+"""
+Resource Governor
+Sizes OpenCV, tesseract (OpenMP) and pipeline thread pools per worker process from the CPUs actually available
+"""
+
+import math
+import os
+from typing import Dict, List, Optional, Any
+
+try:
+    import fcntl
+except ImportError:  # Windows: worker pinning is unavailable
+    fcntl = None
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit(root: str = "/sys/fs/cgroup") -> Optional[float]:
+    """
+    CPU quota of this container in cores, or None when unlimited
+
+    Reads cgroup v2 cpu.max ("<quota> <period>" or "max <period>") and falls
+    back to cgroup v1 cpu.cfs_quota_us / cpu.cfs_period_us.
+    """
+    cpu_max = _read(os.path.join(root, "cpu.max"))
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+
+    for folder in ("cpu", "cpu,cpuacct"):
+        quota = _read(os.path.join(root, folder, "cpu.cfs_quota_us"))
+        period = _read(os.path.join(root, folder, "cpu.cfs_period_us"))
+        if quota and period and int(quota) > 0:
+            return int(quota) / int(period)
+    return None
+
+
+def available_cpus() -> List[int]:
+    """CPU ids this process may run on (its affinity mask)"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_layout(
+    cpus: int,
+    workers: int = 1,
+    job_workers: Optional[int] = None,
+    request_slots: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    Split `cpus` between worker processes and the thread pools inside each
+
+    Every worker gets an equal share. Inside a worker, pipelines run on the
+    job workers plus `request_slots` admitted /verify calls; each
+    pipeline's tesseract process gets an equal part of the worker's share,
+    so all of them together use no more cores than the worker has. OpenCV's
+    pool is process-wide and is sized to the worker's whole share.
+
+    Args:
+        cpus: Cores available to the whole server
+        workers: Server worker processes (uvicorn --workers / WEB_CONCURRENCY)
+        job_workers: Job queue threads per worker (default: half the worker's cores)
+        request_slots: /verify calls admitted at once (default: the worker's cores)
+
+    Returns:
+        cpus_per_worker, job_workers, request_slots, pipelines, opencv_threads, omp_threads
+    """
+    workers = max(1, workers)
+    cpus_per_worker = max(1, cpus // workers)
+    if job_workers is None:
+        job_workers = max(1, cpus_per_worker // 2)
+    if request_slots is None:
+        request_slots = cpus_per_worker
+    pipelines = job_workers + request_slots
+    return {
+        "cpus_per_worker": cpus_per_worker,
+        "job_workers": job_workers,
+        "request_slots": request_slots,
+        "pipelines": pipelines,
+        "opencv_threads": cpus_per_worker,
+        "omp_threads": max(1, cpus_per_worker // pipelines),
+    }
+
+
+class ResourceGovernor:
+    """
+    Applies one consistent thread layout to the current worker process
+
+    Reads the affinity mask and cgroup quota once, plans the layout with
+    plan_layout(), then sets cv2.setNumThreads and OMP_THREAD_LIMIT (read by
+    every tesseract subprocess) and reports the job pool size and /verify
+    admission cap for main.py to use. Explicit OPENCV_THREADS /
+    OMP_THREAD_LIMIT / JOB_WORKERS / ADMISSION_MAX_CONCURRENCY settings win
+    over the plan. With pinning on, each worker claims a slot by locking
+    slot-<n>.lock in data_dir and restricts itself to that slot's cores.
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        cpus: Optional[int] = None,
+        job_workers: Optional[int] = None,
+        request_slots: Optional[int] = None,
+        pin: bool = False,
+        data_dir: str = "var/governor"
+    ):
+        """
+        Args:
+            workers: Server worker processes sharing the machine
+            cpus: Override for the detected core count
+            job_workers: Explicit job queue size (default: planned)
+            request_slots: Explicit /verify concurrency cap (default: planned)
+            pin: Pin this worker process to its own cores
+            data_dir: Folder for the worker slot lock files
+        """
+        self.workers = max(1, workers)
+        self.cpu_ids = available_cpus()
+        self.cgroup_limit = cgroup_cpu_limit()
+        detected = len(self.cpu_ids)
+        if self.cgroup_limit is not None:
+            detected = min(detected, max(1, math.ceil(self.cgroup_limit)))
+        self.cpus = cpus or detected
+        self.pin = pin
+        self.data_dir = data_dir
+        self.layout = plan_layout(self.cpus, self.workers, job_workers, request_slots)
+        self.slot: Optional[int] = None
+        self.pinned_cpus: Optional[List[int]] = None
+        self.applied = False
+        self._slot_file = None
+
+    def apply(self) -> Dict[str, Any]:
+        """Set the thread limits (and affinity) of this process; returns stats()"""
+        if self.applied:
+            return self.stats()
+
+        opencv_threads = int(os.getenv("OPENCV_THREADS") or self.layout["opencv_threads"])
+        omp_threads = int(os.getenv("OMP_THREAD_LIMIT") or self.layout["omp_threads"])
+        self.layout["opencv_threads"] = opencv_threads
+        self.layout["omp_threads"] = omp_threads
+        os.environ["OMP_THREAD_LIMIT"] = str(omp_threads)
+
+        try:
+            import cv2
+            cv2.setNumThreads(opencv_threads)
+        except Exception as e:
+            print(f"Resource governor error: {e}")
+
+        if self.pin:
+            self._pin()
+        self.applied = True
+        return self.stats()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "applied": self.applied,
+            "pid": os.getpid(),
+            "cpus_visible": len(self.cpu_ids),
+            "cgroup_cpu_limit": self.cgroup_limit,
+            "cpus": self.cpus,
+            "workers": self.workers,
+            "layout": dict(self.layout),
+            "slot": self.slot,
+            "pinned_cpus": self.pinned_cpus,
+        }
+
+    def _pin(self):
+        """Claim the first free worker slot and pin to its cores"""
+        if fcntl is None or not hasattr(os, "sched_setaffinity"):
+            return
+        os.makedirs(self.data_dir, exist_ok=True)
+        per_worker = self.layout["cpus_per_worker"]
+        for slot in range(self.workers):
+            handle = open(os.path.join(self.data_dir, f"slot-{slot}.lock"), "w")
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                continue
+            # The lock is held for the life of the process
+            self._slot_file = handle
+            self.slot = slot
+            cores = self.cpu_ids[slot * per_worker:(slot + 1) * per_worker]
+            if cores:
+                try:
+                    os.sched_setaffinity(0, cores)
+                    self.pinned_cpus = cores
+                except OSError as e:
+                    print(f"Resource governor error: {e}")
+            return
+
+
+if __name__ == "__main__":
+    governor = ResourceGovernor(workers=int(os.getenv("WEB_CONCURRENCY", "1")))
+    print(governor.stats())
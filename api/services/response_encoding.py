@@ -0,0 +1,169 @@
+"""
+Response Encoding
+Compact/full views, field selection, fast JSON rendering and gzip negotiation for API responses
+"""
+
+import json
+from typing import Dict, List, Optional, Any, Iterable
+
+from fastapi.responses import JSONResponse
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    import orjson
+except ImportError:  # optional: responses fall back to compact stdlib JSON
+    orjson = None
+
+
+VIEWS = ("compact", "full")
+
+# Fields of VerificationResponse; the compact view keeps all but the last two as they are
+RESULT_FIELDS = (
+    "status", "risk_level", "is_expired", "expiry_date", "gtin", "gtin_verified",
+    "product_name", "batch_number", "manufacturer", "country", "risk_factors",
+    "recommendations", "details", "raw_data",
+)
+
+
+def _source_summary(data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """found/source of a gs1_verification or cdsco_verification dict"""
+    if not data:
+        return None
+    return {"found": bool(data.get("found")), "source": data.get("source")}
+
+
+def compact_view(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The verdict without the evidence behind it
+
+    Keeps every top-level field so clients parse both views the same way,
+    but empties `details` and cuts `raw_data` down to the cache outcome,
+    unavailable sources, the trace id and found/source of the GS1 and CDSCO
+    lookups. Barcodes, OCR previews, frames, catalog matches and the full
+    upstream dicts (Tavily sources and summaries) are left out.
+    """
+    raw = result.get("raw_data") or {}
+    compact = {name: result.get(name) for name in RESULT_FIELDS[:-2]}
+    compact["details"] = {}
+    compact["raw_data"] = {
+        key: value for key, value in (
+            ("cache", raw.get("cache")),
+            ("sources_unavailable", raw.get("sources_unavailable")),
+            ("trace_id", raw.get("trace_id")),
+            ("gs1", _source_summary(raw.get("gs1_verification"))),
+            ("cdsco", _source_summary(raw.get("cdsco_verification"))),
+        )
+        if value is not None
+    }
+    return compact
+
+
+def parse_fields(fields: Optional[str]) -> List[List[str]]:
+    """
+    Split a fields= parameter into key paths
+
+    Args:
+        fields: Comma-separated names; dots select inside a field
+            (e.g. "status,risk_level,raw_data.cache,details.expiry_check")
+
+    Returns:
+        One list of keys per path
+
+    Raises:
+        ValueError: If a path does not start with a VerificationResponse field
+    """
+    paths = []
+    for item in (fields or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        path = item.split(".")
+        if path[0] not in RESULT_FIELDS:
+            raise ValueError(f"Unknown field '{path[0]}' (valid: {', '.join(RESULT_FIELDS)})")
+        paths.append(path)
+    return paths
+
+
+def select_fields(result: Dict[str, Any], paths: Iterable[List[str]]) -> Dict[str, Any]:
+    """
+    Copy only the given key paths out of a result
+
+    Nested paths keep their parent keys (raw_data.cache -> {"raw_data":
+    {"cache": ...}}). Paths that do not exist in this result are skipped.
+    """
+    selected: Dict[str, Any] = {}
+    for path in paths:
+        source: Any = result
+        for key in path:
+            if not isinstance(source, dict) or key not in source:
+                break
+            source = source[key]
+        else:
+            target = selected
+            for key in path[:-1]:
+                target = target.setdefault(key, {})
+            target[path[-1]] = source
+    return selected
+
+
+def shape_response(result: Dict[str, Any], view: str = "full", fields: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Apply a view or field selection to a verification result
+
+    Args:
+        result: Full verification result (not modified)
+        view: "full" or "compact"
+        fields: Comma-separated key paths; takes precedence over view
+
+    Returns:
+        The response body
+    """
+    if fields:
+        return select_fields(result, parse_fields(fields))
+    if view == "compact":
+        return compact_view(result)
+    return result
+
+
+def encode_json(content: Any) -> bytes:
+    """Serialize a response body (orjson when installed, else compact JSON)"""
+    if orjson is not None:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with encode_json()
+
+    Returned directly from a handler it also skips FastAPI's response_model
+    validation and jsonable_encoder pass; the model then only documents the
+    schema.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return encode_json(content)
+
+
+class ResponseCompressionMiddleware(GZipMiddleware):
+    """
+    Gzip for clients that send Accept-Encoding: gzip
+
+    Streaming endpoints listed in exclude_paths are passed through, so NDJSON
+    lines reach the client as they are produced instead of waiting in the
+    compressor's buffer.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, compresslevel: int = 6, exclude_paths: Iterable[str] = ()):
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.exclude_paths = set(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+if __name__ == "__main__":
+    print("Response encoding module loaded successfully")
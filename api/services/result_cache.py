@@ -0,0 +1,452 @@
+"""
+Perceptual Result Cache
+Content-addressed cache of verification results, with barcode-confirmed near matches on image dHashes
+"""
+
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Any, Tuple
+
+import numpy as np
+
+from .cache_backend import CacheBackend, namespace_ttl
+from .metrics import CACHE_REQUESTS
+
+
+# Number of 8-bit bands a 64-bit hash is split into for near-duplicate lookup.
+# Two hashes within distance 7 always share at least one identical band.
+HASH_BANDS = 8
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count("1")
+
+
+def content_digest(image: np.ndarray) -> str:
+    """128-bit BLAKE2 digest of a decoded image's pixels (and shape)"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.shape}{image.dtype}".encode())
+    digest.update(memoryview(np.ascontiguousarray(image)).cast("B"))
+    return digest.hexdigest()
+
+
+def lot_payloads(codes: Iterable[Tuple[str, Dict[str, Any]]]) -> Tuple[str, ...]:
+    """
+    Barcode payloads that identify a production lot
+
+    Only codes whose parsed data carries a batch or expiry count: a plain
+    EAN-13 is shared by every batch of the product and proves nothing
+    about the printed dates.
+
+    Args:
+        codes: (payload, parsed fields) of each decoded barcode
+
+    Returns:
+        Sorted distinct payloads
+    """
+    return tuple(sorted({
+        payload for payload, parsed in codes
+        if payload and parsed and (parsed.get("batch") or parsed.get("expiry"))
+    }))
+
+
+def _result_payloads(result: Dict[str, Any]) -> Tuple[str, ...]:
+    return lot_payloads(
+        (bc.get("data"), bc.get("parsed")) for bc in result.get("raw_data", {}).get("barcodes", [])
+    )
+
+
+class _Entry:
+    """Cached result for one image set"""
+
+    __slots__ = ("key", "hashes", "payloads", "result", "size", "created_at")
+
+    def __init__(self, key: str, hashes: Tuple[int, ...], result: Dict[str, Any], size: int):
+        self.key = key
+        self.hashes = hashes
+        self.payloads = _result_payloads(result)
+        self.result = result
+        self.size = size
+        self.created_at = time.time()
+
+
+class _InFlight:
+    """Computation shared by concurrent identical submissions"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[BaseException] = None
+
+
+class ResultCache:
+    """
+    LRU cache of full verification results for re-scanned packs
+
+    An image set is identified by the sorted content digests of its images
+    (content_digest), so an exact hit means the same pixels. A near match
+    is a cached set of the same size whose dHashes all lie within
+    max_distance bits of the query's; it is only served when the query's
+    lot barcodes (lot_payloads) are known and equal to the cached result's.
+    Packs of one SKU look alike down to the dHash, and only the decoded
+    batch/expiry codes tell them apart. Concurrent identical submissions
+    share one computation (exact key only).
+
+    With a shared backend, local misses are also looked up there by exact
+    key and every stored result is written through, so a pack scanned via
+    one worker is a cache hit on the others.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 3600,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_distance: int = 6,
+        backend: Optional[CacheBackend] = None,
+    ):
+        """
+        Args:
+            ttl_seconds: Entry lifetime
+            max_entries: Maximum number of cached image sets
+            max_bytes: Upper bound on the serialized size of all results
+            max_distance: Maximum per-image Hamming distance for a near match
+            backend: Cross-worker cache (namespace "results"; TTL from CACHE_TTL_RESULTS)
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_distance = min(max_distance, HASH_BANDS - 1)
+        self.backend = backend
+        self.shared_ttl_seconds = namespace_ttl("results", ttl_seconds)
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bands: Dict[Tuple[int, int], set] = {}
+        self._inflight: Dict[str, _InFlight] = {}
+        self._bytes = 0
+
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.shared_hits = 0
+
+    @staticmethod
+    def make_key(digests: List[str]) -> str:
+        """Order-independent key for an image set"""
+        return "-".join(sorted(digests))
+
+    def get(
+        self,
+        digests: List[str],
+        hashes: List[int],
+        payloads: Optional[Callable[[], Tuple[str, ...]]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached result for an image set
+
+        Args:
+            digests: content_digest() of each uploaded image
+            hashes: dHash of each uploaded image
+            payloads: Returns the query's lot_payloads(); called only when a
+                near candidate needs confirming (none: exact hits only)
+
+        Returns:
+            Copy of the cached result, or None on a miss
+        """
+        key = self.make_key(digests)
+        ordered = tuple(sorted(hashes))
+        entry, match = self._lookup(key, ordered, payloads)
+        if entry is None:
+            shared = self._shared_get(digests, hashes)
+            if shared is not None:
+                return shared
+            with self._lock:
+                self.misses += 1
+            CACHE_REQUESTS.inc(cache="verification_results", result="miss")
+            return None
+
+        with self._lock:
+            if match == "exact":
+                self.hits += 1
+                CACHE_REQUESTS.inc(cache="verification_results", result="hit")
+            else:
+                self.near_hits += 1
+                CACHE_REQUESTS.inc(cache="verification_results", result="near_hit")
+            return self._materialize(entry, match)
+
+    def put(self, digests: List[str], hashes: List[int], result: Dict[str, Any], share: bool = True):
+        """
+        Store a result for an image set
+
+        Args:
+            digests: content_digest() of each uploaded image
+            hashes: dHash of each uploaded image
+            result: Verification result to cache
+            share: Also write it to the shared backend
+        """
+        key = self.make_key(digests)
+        ordered = tuple(sorted(hashes))
+        size = len(json.dumps(result, default=str))
+        if size > self.max_bytes:
+            return
+
+        if share and self.backend is not None:
+            try:
+                self.backend.set("results", key, {"created_at": time.time(), "result": result}, self.shared_ttl_seconds)
+            except Exception as e:
+                print(f"Shared result cache error: {e}")
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(self._entries[key])
+
+            entry = _Entry(key, ordered, copy.deepcopy(result), size)
+            self._entries[key] = entry
+            self._bytes += size
+            for band in self._band_keys(ordered):
+                self._bands.setdefault(band, set()).add(key)
+
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries.values()))
+                self._remove(oldest)
+
+    def get_or_compute(
+        self,
+        digests: List[str],
+        hashes: List[int],
+        compute: Callable[[], Dict[str, Any]],
+        payloads: Optional[Callable[[], Tuple[str, ...]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Return a cached result or compute it once for all concurrent callers
+
+        Concurrent submissions of the same image set wait for the first
+        caller instead of running the pipeline again.
+
+        Args:
+            digests: content_digest() of each uploaded image
+            hashes: dHash of each uploaded image
+            compute: Callable that runs the pipeline on a miss
+            payloads: Returns the query's lot_payloads() (see get())
+
+        Returns:
+            Verification result
+        """
+        key = self.make_key(digests)
+        ordered = tuple(sorted(hashes))
+
+        # Near candidates are confirmed outside the lock: decoding the
+        # query's barcodes takes a while
+        entry, match = self._lookup(key, ordered, payloads)
+        with self._lock:
+            if entry is not None:
+                if match == "exact":
+                    self.hits += 1
+                    CACHE_REQUESTS.inc(cache="verification_results", result="hit")
+                else:
+                    self.near_hits += 1
+                    CACHE_REQUESTS.inc(cache="verification_results", result="near_hit")
+                return self._materialize(entry, match)
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _InFlight()
+                self._inflight[key] = flight
+            else:
+                self.coalesced += 1
+                CACHE_REQUESTS.inc(cache="verification_results", result="coalesced")
+
+        if leader:
+            shared = self._shared_get(digests, hashes)
+            if shared is not None:
+                flight.result = copy.deepcopy(shared)
+                with self._lock:
+                    self._inflight.pop(key, None)
+                flight.done.set()
+                return shared
+            with self._lock:
+                self.misses += 1
+            CACHE_REQUESTS.inc(cache="verification_results", result="miss")
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            result = copy.deepcopy(flight.result)
+            result.setdefault("raw_data", {})["cache"] = {"hit": True, "match": "coalesced", "age_seconds": 0.0}
+            return result
+
+        try:
+            result = compute()
+            # Followers get copies of their own; the caller goes on to add
+            # per-request data (memory, trace id, profile) to this one
+            flight.result = copy.deepcopy(result)
+            # A verdict reached without some upstream source would outlive its outage
+            if not result.get("raw_data", {}).get("sources_unavailable"):
+                self.put(digests, hashes, result)
+            return result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache occupancy and hit counters"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "shared_hits": self.shared_hits,
+                "shared_backend": self.backend.stats() if self.backend is not None else None,
+            }
+
+    def clear(self):
+        """Drop all cached results"""
+        with self._lock:
+            self._entries.clear()
+            self._bands.clear()
+            self._bytes = 0
+        if self.backend is not None:
+            try:
+                self.backend.clear("results")
+            except Exception as e:
+                print(f"Shared result cache error: {e}")
+
+    def _shared_get(self, digests: List[str], hashes: List[int]) -> Optional[Dict[str, Any]]:
+        """Look up an exact key in the shared backend and keep a local copy"""
+        if self.backend is None:
+            return None
+        key = self.make_key(digests)
+        try:
+            found = self.backend.get("results", key)
+        except Exception as e:
+            print(f"Shared result cache error: {e}")
+            return None
+        if found is None or found[0] <= time.time():
+            return None
+
+        stored = found[1]
+        self.put(digests, hashes, stored["result"], share=False)
+        with self._lock:
+            self.shared_hits += 1
+        CACHE_REQUESTS.inc(cache="verification_results", result="shared_hit")
+        result = stored["result"]
+        result.setdefault("raw_data", {})["cache"] = {
+            "hit": True,
+            "match": "shared",
+            "age_seconds": round(time.time() - stored["created_at"], 3),
+        }
+        return result
+
+    # ------------------------------------------------------------------
+    # Internal helpers (callers hold self._lock, except _lookup)
+    # ------------------------------------------------------------------
+
+    def _lookup(
+        self,
+        key: str,
+        ordered: Tuple[int, ...],
+        payloads: Optional[Callable[[], Tuple[str, ...]]]
+    ) -> Tuple[Optional[_Entry], Optional[str]]:
+        """Find an exact or a barcode-confirmed near-identical live entry"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry.created_at > self.ttl_seconds:
+                    self._remove(entry)
+                else:
+                    self._entries.move_to_end(key)
+                    return entry, "exact"
+            if payloads is None:
+                return None, None
+
+            candidates = set()
+            for band in self._band_keys(ordered):
+                candidates.update(self._bands.get(band, ()))
+            near = []
+            for candidate_key in candidates:
+                entry = self._entries.get(candidate_key)
+                if entry is None or not entry.payloads or len(entry.hashes) != len(ordered):
+                    continue
+                if now - entry.created_at > self.ttl_seconds:
+                    self._remove(entry)
+                    continue
+                if self._sets_match(ordered, entry.hashes):
+                    near.append(entry)
+        if not near:
+            return None, None
+
+        query_payloads = payloads()
+        if not query_payloads:
+            return None, None
+        for entry in near:
+            if entry.payloads == query_payloads:
+                with self._lock:
+                    if entry.key in self._entries:
+                        self._entries.move_to_end(entry.key)
+                return entry, "near"
+        return None, None
+
+    def _sets_match(self, query: Tuple[int, ...], cached: Tuple[int, ...]) -> bool:
+        """Greedy one-to-one matching of images within max_distance"""
+        unused = list(cached)
+        for h in query:
+            best_idx = None
+            best_dist = self.max_distance + 1
+            for idx, other in enumerate(unused):
+                dist = hamming_distance(h, other)
+                if dist < best_dist:
+                    best_idx, best_dist = idx, dist
+            if best_idx is None:
+                return False
+            unused.pop(best_idx)
+        return True
+
+    def _band_keys(self, hashes: Tuple[int, ...]):
+        """(band index, band value) pairs for every hash in the set"""
+        for h in hashes:
+            for band in range(HASH_BANDS):
+                yield band, (h >> (band * 8)) & 0xFF
+
+    def _remove(self, entry: _Entry):
+        """Evict one entry and its band index references"""
+        if self._entries.pop(entry.key, None) is None:
+            return
+        self._bytes -= entry.size
+        for band in self._band_keys(entry.hashes):
+            keys = self._bands.get(band)
+            if keys is not None:
+                keys.discard(entry.key)
+                if not keys:
+                    del self._bands[band]
+
+    def _materialize(self, entry: _Entry, match: str) -> Dict[str, Any]:
+        """Copy a cached result and annotate it with cache metadata"""
+        result = copy.deepcopy(entry.result)
+        result.setdefault("raw_data", {})["cache"] = {
+            "hit": True,
+            "match": match,
+            "age_seconds": round(time.time() - entry.created_at, 3),
+        }
+        return result
+
+
+if __name__ == "__main__":
+    print("Result cache module loaded successfully")
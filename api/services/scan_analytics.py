@@ -0,0 +1,452 @@
+"""
+Scan Analytics
+Incremental minute/hour/day rollups of the scan history for dashboard queries
+
+Usage (from the api/ directory):
+    python -m services.scan_analytics --rebuild
+"""
+
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Any, Iterable, Tuple
+
+from .scan_history import ScanHistory
+
+
+GRANULARITIES = {"minute": 60, "hour": 3600, "day": 86400}
+GROUP_BY = ("gtin", "manufacturer", "status", "risk_level", "store")
+SUSPICIOUS_STATUSES = ("SUSPICIOUS", "COUNTERFEIT")
+TABLES = ("rollups", "source_failures", "products")
+# rebuild() fills these and swaps them in for TABLES
+_SHADOW_SUFFIX = "_rebuild"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {rollups} (
+    granularity TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    store TEXT NOT NULL,
+    gtin TEXT NOT NULL,
+    manufacturer TEXT NOT NULL,
+    status TEXT NOT NULL,
+    risk_level TEXT NOT NULL,
+    scans INTEGER NOT NULL,
+    expired INTEGER NOT NULL,
+    degraded INTEGER NOT NULL,
+    PRIMARY KEY (granularity, bucket, store, gtin, manufacturer, status, risk_level)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS {source_failures} (
+    granularity TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    store TEXT NOT NULL,
+    source TEXT NOT NULL,
+    failures INTEGER NOT NULL,
+    PRIMARY KEY (granularity, bucket, store, source)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS {products} (
+    gtin TEXT PRIMARY KEY,
+    product_name TEXT,
+    manufacturer TEXT,
+    last_seen REAL
+);
+"""
+
+_ROLLUP_UPSERT = """
+INSERT INTO {table} (granularity, bucket, store, gtin, manufacturer, status, risk_level, scans, expired, degraded)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (granularity, bucket, store, gtin, manufacturer, status, risk_level) DO UPDATE SET
+    scans = scans + excluded.scans,
+    expired = expired + excluded.expired,
+    degraded = degraded + excluded.degraded
+"""
+
+_FAILURE_UPSERT = """
+INSERT INTO {table} (granularity, bucket, store, source, failures) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (granularity, bucket, store, source) DO UPDATE SET failures = failures + excluded.failures
+"""
+
+_PRODUCT_UPSERT = """
+INSERT INTO {table} (gtin, product_name, manufacturer, last_seen) VALUES (?, ?, ?, ?)
+ON CONFLICT (gtin) DO UPDATE SET
+    product_name = COALESCE(excluded.product_name, product_name),
+    manufacturer = COALESCE(excluded.manufacturer, manufacturer),
+    last_seen = MAX(last_seen, excluded.last_seen)
+"""
+
+
+def _bucket(ts: float, granularity: str) -> int:
+    size = GRANULARITIES[granularity]
+    return int(ts // size * size)
+
+
+class ScanAnalytics:
+    """
+    Pre-aggregated scan counts, updated as the scan history writes
+
+    apply() is registered as a ScanHistory listener: each written batch is
+    folded into per-minute, per-hour and per-day rows keyed by store, GTIN,
+    manufacturer, status and risk level (plus per-source failure counts), so
+    dashboard queries read a few hundred rollup rows instead of raw scans.
+    Every worker process adds its own scans to the same file. Minute and
+    hour rows are pruned after `retention` seconds; day rows are kept.
+    rebuild() recomputes everything from the raw history into shadow
+    tables, a chunk per short transaction, and swaps them in at the end, so
+    queries and apply() keep working meanwhile; start_rebuild() runs it in a
+    background thread.
+    """
+
+    def __init__(self, path: str = "var/history/analytics.db", retention: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            path: SQLite file for the rollups
+            retention: Seconds to keep rows per granularity (None: forever)
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.retention = retention or {"minute": 2 * 86400, "hour": 90 * 86400, "day": None}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA.format(**{table: table for table in TABLES}))
+        self._last_prune = 0.0
+        self.applied = 0
+        self._rebuild_thread: Optional[threading.Thread] = None
+        self._rebuild_status: Dict[str, Any] = {"running": False}
+
+    def apply(self, rows: List[Dict[str, Any]]):
+        """Fold a batch of scan history rows into the rollups"""
+        rollups, failures, products = self._aggregate(rows)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._write(rollups, failures, products)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self.applied += len(rows)
+        if time.time() - self._last_prune > 3600:
+            self.prune()
+
+    def rebuild(self, history: ScanHistory, chunk: int = 5000, settle_seconds: float = 60.0) -> int:
+        """
+        Recompute every rollup from the raw scan history
+
+        The history is folded into shadow tables in three passes: everything
+        up to `settle_seconds` before the start, then the scans that arrived
+        during that pass (again minus the settle window, so rows still
+        queued in a worker are not skipped), and finally the remainder
+        inside the transaction that swaps the shadow tables in. Only that
+        last step blocks readers and apply(); scans written by another
+        worker in the instant between its history commit and its apply()
+        can still be counted twice.
+
+        Args:
+            history: Raw scan history
+            chunk: Rows aggregated and written per transaction
+            settle_seconds: Longest expected delay between a scan and its history write
+
+        Returns:
+            Number of scans folded in
+        """
+        shadow = {table: table + _SHADOW_SUFFIX for table in TABLES}
+        with self._lock:
+            for table in shadow.values():
+                self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self._conn.executescript(_SCHEMA.format(**shadow))
+
+        total = 0
+        since = None
+        try:
+            for _ in range(2):
+                until = time.time() - settle_seconds
+                for rows in self._chunks(history, since, until, chunk):
+                    aggregated = self._aggregate(rows)
+                    with self._lock:
+                        self._conn.execute("BEGIN IMMEDIATE")
+                        try:
+                            self._write(*aggregated, suffix=_SHADOW_SUFFIX)
+                            self._conn.execute("COMMIT")
+                        except Exception:
+                            self._conn.execute("ROLLBACK")
+                            raise
+                    total += len(rows)
+                since = math.nextafter(until, math.inf)
+
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for rows in self._chunks(history, since, None, chunk):
+                        self._write(*self._aggregate(rows), suffix=_SHADOW_SUFFIX)
+                        total += len(rows)
+                    for table in TABLES:
+                        self._conn.execute(f"DROP TABLE {table}")
+                        self._conn.execute(f"ALTER TABLE {shadow[table]} RENAME TO {table}")
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        except Exception:
+            with self._lock:
+                for table in shadow.values():
+                    self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+            raise
+        self.prune()
+        return total
+
+    def start_rebuild(self, history: ScanHistory, chunk: int = 5000) -> bool:
+        """
+        Run rebuild() in a background thread
+
+        Returns:
+            False if a rebuild is already running
+        """
+        with self._lock:
+            if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+                return False
+            self._rebuild_status = {
+                "running": True, "started_at": time.time(), "finished_at": None, "scans": None, "error": None,
+            }
+            self._rebuild_thread = threading.Thread(
+                target=self._run_rebuild, args=(history, chunk), name="analytics-rebuild", daemon=True
+            )
+            self._rebuild_thread.start()
+        return True
+
+    def rebuild_status(self) -> Dict[str, Any]:
+        """Progress of the current or last start_rebuild()"""
+        with self._lock:
+            return dict(self._rebuild_status)
+
+    def _run_rebuild(self, history: ScanHistory, chunk: int):
+        scans, error = None, None
+        try:
+            scans = self.rebuild(history, chunk)
+        except Exception as e:
+            error = str(e)
+            print(f"Scan analytics rebuild error: {e}")
+        with self._lock:
+            self._rebuild_status.update(running=False, finished_at=time.time(), scans=scans, error=error)
+
+    @staticmethod
+    def _chunks(
+        history: ScanHistory,
+        since: Optional[float],
+        until: Optional[float],
+        chunk: int
+    ) -> Iterable[List[Dict[str, Any]]]:
+        batch: List[Dict[str, Any]] = []
+        for row in history.iter_rows(since, until):
+            batch.append(row)
+            if len(batch) >= chunk:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def prune(self, now: Optional[float] = None):
+        """Drop rows older than their granularity's retention"""
+        now = now or time.time()
+        with self._lock:
+            for granularity, keep in self.retention.items():
+                if keep is None:
+                    continue
+                for table in ("rollups", "source_failures"):
+                    self._conn.execute(
+                        f"DELETE FROM {table} WHERE granularity = ? AND bucket < ?", (granularity, now - keep)
+                    )
+            self._last_prune = now
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def top_suspicious(self, since: float, limit: int = 10, store: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Products with the most SUSPICIOUS/COUNTERFEIT verdicts since `since`"""
+        where, params = self._where("day", since, store)
+        marks = ",".join("?" * len(SUSPICIOUS_STATUSES))
+        sql = f"""
+            SELECT r.gtin, p.product_name, p.manufacturer, SUM(r.scans) AS scans,
+                   SUM(CASE WHEN r.status IN ({marks}) THEN r.scans ELSE 0 END) AS suspicious
+            FROM rollups r LEFT JOIN products p ON p.gtin = r.gtin
+            WHERE {where} AND r.gtin != ''
+            GROUP BY r.gtin
+            HAVING suspicious > 0
+            ORDER BY suspicious DESC, scans DESC
+            LIMIT ?
+        """
+        rows = self._query(sql, (*SUSPICIOUS_STATUSES, *params, limit))
+        for row in rows:
+            row["suspicious_rate"] = round(row["suspicious"] / row["scans"], 4)
+        return rows
+
+    def expiry_trend(self, since: float, granularity: str = "day", store: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Share of scans found expired, per time bucket"""
+        where, params = self._where(granularity, since, store)
+        rows = self._query(
+            f"SELECT r.bucket, SUM(r.scans) AS scans, SUM(r.expired) AS expired FROM rollups r "
+            f"WHERE {where} GROUP BY r.bucket ORDER BY r.bucket",
+            params,
+        )
+        for row in rows:
+            row["expired_rate"] = round(row["expired"] / row["scans"], 4) if row["scans"] else None
+        return rows
+
+    def source_failure_rates(self, since: float, granularity: str = "day", store: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Per bucket: share of scans verified without each upstream source"""
+        where, params = self._where(granularity, since, store)
+        totals = {
+            row["bucket"]: row for row in self._query(
+                f"SELECT r.bucket, SUM(r.scans) AS scans, SUM(r.degraded) AS degraded FROM rollups r "
+                f"WHERE {where} GROUP BY r.bucket ORDER BY r.bucket",
+                params,
+            )
+        }
+        for row in totals.values():
+            row["degraded_rate"] = round(row["degraded"] / row["scans"], 4) if row["scans"] else None
+            row["sources"] = {}
+        for row in self._query(
+            f"SELECT r.bucket, r.source, SUM(r.failures) AS failures FROM source_failures r "
+            f"WHERE {where} GROUP BY r.bucket, r.source",
+            params,
+        ):
+            bucket = totals.get(row["bucket"])
+            if bucket is not None:
+                bucket["sources"][row["source"]] = {
+                    "failures": row["failures"],
+                    "rate": round(row["failures"] / bucket["scans"], 4) if bucket["scans"] else None,
+                }
+        return list(totals.values())
+
+    def counts(
+        self,
+        by: str,
+        since: float,
+        granularity: str = "day",
+        store: Optional[str] = None,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """Scan counts per bucket and value of `by` (gtin, manufacturer, status, risk_level or store)"""
+        if by not in GROUP_BY:
+            raise ValueError(f"Unknown grouping: {by}")
+        where, params = self._where(granularity, since, store)
+        rows = self._query(
+            f"SELECT r.bucket, r.{by} AS value, SUM(r.scans) AS scans FROM rollups r "
+            f"WHERE {where} GROUP BY r.bucket, r.{by} ORDER BY r.bucket, scans DESC",
+            params,
+        )
+        buckets: Dict[int, Dict[str, Any]] = {}
+        for row in rows:
+            bucket = buckets.setdefault(row["bucket"], {"bucket": row["bucket"], "counts": {}})
+            if len(bucket["counts"]) < limit:
+                bucket["counts"][row["value"] or None] = row["scans"]
+        return list(buckets.values())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            by_granularity = dict(
+                self._conn.execute("SELECT granularity, COUNT(*) FROM rollups GROUP BY granularity").fetchall()
+            )
+        return {"path": self.path, "applied": self.applied, "rows": by_granularity}
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _aggregate(rows: Iterable[Dict[str, Any]]) -> Tuple[Dict[Tuple, List[int]], Dict[Tuple, int], Dict[str, Tuple]]:
+        rollups: Dict[Tuple, List[int]] = {}
+        failures: Dict[Tuple, int] = {}
+        products: Dict[str, Tuple] = {}
+        for row in rows:
+            store = row.get("store") or ""
+            gtin = row.get("gtin") or ""
+            unavailable = row.get("sources_unavailable") or []
+            dims = (store, gtin, row.get("manufacturer") or "", row.get("status") or "", row.get("risk_level") or "")
+            for granularity in GRANULARITIES:
+                bucket = _bucket(row["ts"], granularity)
+                counts = rollups.setdefault((granularity, bucket) + dims, [0, 0, 0])
+                counts[0] += 1
+                counts[1] += 1 if row.get("is_expired") else 0
+                counts[2] += 1 if unavailable else 0
+                for source in unavailable:
+                    key = (granularity, bucket, store, source)
+                    failures[key] = failures.get(key, 0) + 1
+            if gtin:
+                products[gtin] = (row.get("product_name"), row.get("manufacturer"), row["ts"])
+        return rollups, failures, products
+
+    def _write(
+        self,
+        rollups: Dict[Tuple, List[int]],
+        failures: Dict[Tuple, int],
+        products: Dict[str, Tuple],
+        suffix: str = ""
+    ):
+        """Upsert aggregated counts (suffix selects the shadow tables); callers hold _lock inside a transaction"""
+        self._conn.executemany(
+            _ROLLUP_UPSERT.format(table="rollups" + suffix), [key + tuple(counts) for key, counts in rollups.items()]
+        )
+        self._conn.executemany(
+            _FAILURE_UPSERT.format(table="source_failures" + suffix), [key + (n,) for key, n in failures.items()]
+        )
+        self._conn.executemany(
+            _PRODUCT_UPSERT.format(table="products" + suffix), [(gtin,) + values for gtin, values in products.items()]
+        )
+
+    @staticmethod
+    def _where(granularity: str, since: float, store: Optional[str]) -> Tuple[str, List[Any]]:
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity: {granularity}")
+        where = "r.granularity = ? AND r.bucket >= ?"
+        params: List[Any] = [granularity, _bucket(since, granularity)]
+        if store is not None:
+            where += " AND r.store = ?"
+            params.append(store)
+        return where, params
+
+    def _query(self, sql: str, params: Iterable[Any]) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, tuple(params)).fetchall()]
+
+
+# Singleton instance
+_scan_analytics = None
+
+
+def get_scan_analytics() -> ScanAnalytics:
+    """Get singleton scan analytics (SCAN_ANALYTICS_PATH, SCAN_ANALYTICS_MINUTE/HOUR_RETENTION_SECONDS)"""
+    global _scan_analytics
+    if _scan_analytics is None:
+        _scan_analytics = ScanAnalytics(
+            path=os.getenv("SCAN_ANALYTICS_PATH", "var/history/analytics.db"),
+            retention={
+                "minute": float(os.getenv("SCAN_ANALYTICS_MINUTE_RETENTION_SECONDS", str(2 * 86400))),
+                "hour": float(os.getenv("SCAN_ANALYTICS_HOUR_RETENTION_SECONDS", str(90 * 86400))),
+                "day": None,
+            },
+        )
+    return _scan_analytics
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .scan_history import get_scan_history
+
+    parser = argparse.ArgumentParser(description="Scan analytics rollups")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the rollups from the raw scan history")
+    args = parser.parse_args()
+
+    analytics = get_scan_analytics()
+    if args.rebuild:
+        started = time.perf_counter()
+        count = analytics.rebuild(get_scan_history())
+        print(f"Rebuilt rollups from {count} scans in {time.perf_counter() - started:.1f}s")
+    print(analytics.stats())
@@ -0,0 +1,403 @@
+"""
+Scan History
+Append-only audit trail of verification results in day-partitioned SQLite files, written behind the request path
+"""
+
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import closing
+from datetime import datetime, timezone
+from typing import Callable, Deque, Dict, List, Optional, Any, Iterable, Tuple
+
+from .metrics import HISTORY_DROPPED, HISTORY_WRITTEN
+from .serial_registry import serial_scans
+
+
+# Columns of the scans table, in insert order
+COLUMNS = (
+    "ts", "store", "gtin", "batch", "serial", "expiry", "is_expired", "status", "risk_level",
+    "product_name", "manufacturer", "risk_factors", "stages", "image_hashes", "cache_match",
+    "sources_unavailable", "duration_ms",
+)
+# Stored as compact JSON text
+_JSON_COLUMNS = ("risk_factors", "stages", "image_hashes", "sources_unavailable")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    store TEXT,
+    gtin TEXT,
+    batch TEXT,
+    serial TEXT,
+    expiry TEXT,
+    is_expired INTEGER,
+    status TEXT,
+    risk_level TEXT,
+    product_name TEXT,
+    manufacturer TEXT,
+    risk_factors TEXT,
+    stages TEXT,
+    image_hashes TEXT,
+    cache_match TEXT,
+    sources_unavailable TEXT,
+    duration_ms REAL
+);
+CREATE INDEX IF NOT EXISTS idx_scans_store_ts ON scans (store, ts);
+CREATE INDEX IF NOT EXISTS idx_scans_gtin ON scans (gtin);
+"""
+
+
+def _day(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def _compact(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+def scan_row(
+    result: Dict[str, Any],
+    location: Optional[str] = None,
+    stages: Optional[List[Dict[str, Any]]] = None,
+    duration: Optional[float] = None,
+    ts: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    History row for one verification result
+
+    Args:
+        result: Verification result (fields of VerificationResponse)
+        location: Store or scanner id
+        stages: Stage log from metrics.collect_stages()
+        duration: Wall time of the verification in seconds
+        ts: Scan time (default: now)
+    """
+    raw = result.get("raw_data", {})
+    serials = serial_scans(raw.get("barcodes", []))
+    stage_ms: Dict[str, float] = {}
+    for entry in stages or []:
+        stage_ms[entry["stage"]] = round(stage_ms.get(entry["stage"], 0.0) + entry["seconds"] * 1000, 2)
+    return {
+        "ts": ts if ts is not None else time.time(),
+        "store": location,
+        "gtin": result.get("gtin"),
+        "batch": result.get("batch_number"),
+        "serial": serials[0][1] if serials else None,
+        "expiry": result.get("expiry_date"),
+        "is_expired": None if result.get("is_expired") is None else int(bool(result["is_expired"])),
+        "status": result.get("status"),
+        "risk_level": result.get("risk_level"),
+        "product_name": result.get("product_name"),
+        "manufacturer": result.get("manufacturer"),
+        "risk_factors": result.get("risk_factors", []),
+        "stages": stage_ms,
+        "image_hashes": raw.get("image_hashes", []),
+        "cache_match": raw.get("cache", {}).get("match") if raw.get("cache", {}).get("hit") else None,
+        "sources_unavailable": raw.get("sources_unavailable", []),
+        "duration_ms": round(duration * 1000, 2) if duration is not None else None,
+    }
+
+
+class ScanHistory:
+    """
+    Day-partitioned scan store with asynchronous write-behind
+
+    record() only appends to an in-memory queue; a writer thread flushes it
+    every flush_interval seconds (or once batch_size rows are waiting) in one
+    transaction per day file, data_dir/scans-YYYY-MM-DD.db. Rows are never
+    updated, so old days are immutable and a query over a date range opens
+    only the files in that range. When the queue is full new rows are
+    dropped and counted rather than slowing the request down.
+    """
+
+    def __init__(
+        self,
+        data_dir: str = "var/history",
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_queue: int = 100000,
+        open_partitions: int = 4
+    ):
+        """
+        Args:
+            data_dir: Folder holding the day files
+            batch_size: Rows that trigger an early flush
+            flush_interval: Longest time a row waits before it is written
+            max_queue: Rows held in memory before new ones are dropped
+            open_partitions: Day files kept open for writing
+        """
+        self.data_dir = data_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.open_partitions = open_partitions
+        os.makedirs(data_dir, exist_ok=True)
+
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._queue_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self._write_lock = threading.Lock()
+        self._connections: Dict[str, sqlite3.Connection] = {}
+        self._listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+        self.written = 0
+        self.dropped = 0
+        self.last_flush_seconds: Optional[float] = None
+
+    def add_listener(self, callback: Callable[[List[Dict[str, Any]]], None]):
+        """Call `callback` with every batch of rows after it is written"""
+        self._listeners.append(callback)
+
+    def record(
+        self,
+        result: Dict[str, Any],
+        location: Optional[str] = None,
+        stages: Optional[List[Dict[str, Any]]] = None,
+        duration: Optional[float] = None
+    ) -> bool:
+        """
+        Queue one verification result for writing (never blocks on disk)
+
+        Returns:
+            False if the queue was full and the row was dropped
+        """
+        row = scan_row(result, location, stages, duration)
+        with self._queue_lock:
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                HISTORY_DROPPED.inc()
+                return False
+            self._queue.append(row)
+            full = len(self._queue) >= self.batch_size
+        if full:
+            self._wake.set()
+        return True
+
+    def flush(self) -> int:
+        """Write every queued row now; returns the number written"""
+        total = 0
+        while True:
+            with self._queue_lock:
+                batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.batch_size))]
+            if not batch:
+                return total
+            self.write(batch)
+            total += len(batch)
+
+    def write(self, rows: List[Dict[str, Any]]):
+        """Append rows synchronously (used by the writer thread and imports)"""
+        started = time.perf_counter()
+        by_day: Dict[str, List[Tuple]] = {}
+        for row in rows:
+            values = tuple(_compact(row[c]) if c in _JSON_COLUMNS else row[c] for c in COLUMNS)
+            by_day.setdefault(_day(row["ts"]), []).append(values)
+
+        marks = ",".join("?" * len(COLUMNS))
+        with self._write_lock:
+            for day, values in sorted(by_day.items()):
+                conn = self._connection(day)
+                conn.execute("BEGIN")
+                try:
+                    conn.executemany(f"INSERT INTO scans ({','.join(COLUMNS)}) VALUES ({marks})", values)
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            self.written += len(rows)
+            self.last_flush_seconds = round(time.perf_counter() - started, 4)
+        HISTORY_WRITTEN.inc(len(rows))
+
+        for callback in self._listeners:
+            try:
+                callback(rows)
+            except Exception as e:
+                print(f"Scan history listener error: {e}")
+
+    def query(
+        self,
+        store: Optional[str] = None,
+        gtin: Optional[str] = None,
+        status: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """
+        Most recent scans matching the filters, newest first
+
+        Args:
+            store: Store or scanner id
+            gtin: GTIN as returned in results
+            status: Verdict (e.g. "SUSPICIOUS")
+            since: Earliest scan time (epoch seconds)
+            until: Latest scan time (epoch seconds)
+            limit: Maximum rows returned
+        """
+        where, params = ["1 = 1"], []
+        for column, value in (("store", store), ("gtin", gtin), ("status", status)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            where.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("ts <= ?")
+            params.append(until)
+        sql = f"SELECT {','.join(COLUMNS)} FROM scans WHERE {' AND '.join(where)} ORDER BY ts DESC LIMIT ?"
+
+        rows: List[Dict[str, Any]] = []
+        for day, path in reversed(self.partitions(since, until)):
+            with closing(sqlite3.connect(path)) as conn:
+                for values in conn.execute(sql, (*params, limit - len(rows))):
+                    rows.append(self._decode(values))
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def iter_rows(self, since: Optional[float] = None, until: Optional[float] = None) -> Iterable[Dict[str, Any]]:
+        """Every stored row in time order (e.g. to rebuild derived tables)"""
+        for day, path in self.partitions(since, until):
+            with closing(sqlite3.connect(path)) as conn:
+                sql = f"SELECT {','.join(COLUMNS)} FROM scans WHERE ts >= ? AND ts <= ? ORDER BY ts"
+                for values in conn.execute(sql, (since or 0, until or float("inf"))):
+                    yield self._decode(values)
+
+    def top_values(
+        self,
+        column: str,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 100
+    ) -> List[Tuple[str, int]]:
+        """
+        Most frequent non-empty values of a column, most scanned first
+
+        Args:
+            column: Plain (non-JSON) column, e.g. "gtin" or "product_name"
+            since: Earliest scan time (epoch seconds)
+            until: Latest scan time (epoch seconds)
+            limit: Maximum values returned
+
+        Returns:
+            (value, scans) pairs
+        """
+        if column not in COLUMNS or column in _JSON_COLUMNS:
+            raise ValueError(f"Unknown column: {column}")
+        sql = (
+            f"SELECT {column}, COUNT(*) FROM scans WHERE ts >= ? AND ts <= ? "
+            f"AND {column} IS NOT NULL AND {column} != '' GROUP BY {column}"
+        )
+        counts: Dict[str, int] = {}
+        for day, path in self.partitions(since, until):
+            with closing(sqlite3.connect(path)) as conn:
+                for value, scans in conn.execute(sql, (since or 0, until or float("inf"))):
+                    counts[value] = counts.get(value, 0) + scans
+        return sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))[:limit]
+
+    def partitions(self, since: Optional[float] = None, until: Optional[float] = None) -> List[Tuple[str, str]]:
+        """(day, path) of the day files overlapping [since, until], oldest first"""
+        first = _day(since) if since is not None else None
+        last = _day(until) if until is not None else None
+        found = []
+        for path in sorted(glob.glob(os.path.join(self.data_dir, "scans-*.db"))):
+            day = os.path.basename(path)[len("scans-"):-len(".db")]
+            if (first is None or day >= first) and (last is None or day <= last):
+                found.append((day, path))
+        return found
+
+    def start(self):
+        """Start the background writer"""
+        self._stop.clear()
+        self._writer = threading.Thread(target=self._run, name="scan-history", daemon=True)
+        self._writer.start()
+
+    def stop(self):
+        """Stop the writer after flushing everything queued"""
+        self._stop.set()
+        self._wake.set()
+        if self._writer is not None:
+            self._writer.join(timeout=30)
+            self._writer = None
+        self.flush()
+        with self._write_lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._queue_lock:
+            queued = len(self._queue)
+        partitions = self.partitions()
+        return {
+            "data_dir": self.data_dir,
+            "queued": queued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "last_flush_seconds": self.last_flush_seconds,
+            "partitions": len(partitions),
+            "first_day": partitions[0][0] if partitions else None,
+            "last_day": partitions[-1][0] if partitions else None,
+            "bytes": sum(os.path.getsize(path) for _, path in partitions),
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Scan history write error: {e}")
+
+    def _connection(self, day: str) -> sqlite3.Connection:
+        """Open (or reuse) the day file; callers hold _write_lock"""
+        conn = self._connections.get(day)
+        if conn is None:
+            conn = sqlite3.connect(
+                os.path.join(self.data_dir, f"scans-{day}.db"), check_same_thread=False, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._connections[day] = conn
+            # Days only move forward: close the oldest open files
+            for old in sorted(self._connections)[:-self.open_partitions]:
+                self._connections.pop(old).close()
+        return conn
+
+    @staticmethod
+    def _decode(values: Tuple) -> Dict[str, Any]:
+        row = dict(zip(COLUMNS, values))
+        for column in _JSON_COLUMNS:
+            if row[column] is not None:
+                row[column] = json.loads(row[column])
+        return row
+
+
+# Singleton instance
+_scan_history = None
+
+
+def get_scan_history() -> ScanHistory:
+    """Get singleton scan history (configured from SCAN_HISTORY_* env vars)"""
+    global _scan_history
+    if _scan_history is None:
+        _scan_history = ScanHistory(
+            data_dir=os.getenv("SCAN_HISTORY_DIR", "var/history"),
+            batch_size=int(os.getenv("SCAN_HISTORY_BATCH_SIZE", "500")),
+            flush_interval=float(os.getenv("SCAN_HISTORY_FLUSH_SECONDS", "1")),
+            max_queue=int(os.getenv("SCAN_HISTORY_MAX_QUEUE", "100000")),
+        )
+    return _scan_history
+
+
+if __name__ == "__main__":
+    print("Scan history module loaded successfully")
@@ -0,0 +1,578 @@
+"""
+Serial Registry
+Append-optimized store of scanned (GTIN, serial) pairs for detecting cloned GS1 codes
+"""
+
+import glob
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Any, Tuple
+
+import numpy as np
+
+from .gtin import to_gtin14
+
+try:
+    import fcntl
+except ImportError:  # Windows: one worker process, shard locks are thread locks only
+    fcntl = None
+
+
+_MAGIC = b"MSSERIX1"
+_HEADER = struct.Struct("<8sQQ")  # magic, capacity (slots), used slots
+_HEADER_SIZE = 64
+# fingerprint, first_seen, last_seen, scans, first_location, last_location, location_changes
+_SLOT = struct.Struct("<QIIIIII")
+_SLOT_DTYPE = np.dtype([
+    ("fp", "<u8"), ("first_seen", "<u4"), ("last_seen", "<u4"), ("scans", "<u4"),
+    ("first_loc", "<u4"), ("last_loc", "<u4"), ("loc_changes", "<u4"),
+])
+# fingerprint, timestamp, location
+_EVENT = struct.Struct("<QII")
+
+MAX_LOAD = 0.7
+
+
+def serial_fingerprint(gtin: str, serial: str) -> int:
+    """64-bit fingerprint of a (GTIN-14, serial) pair; never 0 (the empty-slot marker)"""
+    key = f"{to_gtin14(gtin) or gtin}\x1f{serial.strip()}".encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+
+def location_id(location: Optional[str]) -> int:
+    """32-bit id of a store/location string; 0 means unknown"""
+    if not location:
+        return 0
+    return int.from_bytes(hashlib.blake2b(location.strip().lower().encode("utf-8"), digest_size=4).digest(), "little") or 1
+
+
+def _iso(ts: int) -> Optional[str]:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat(timespec="seconds") if ts else None
+
+
+class _FingerprintBloom:
+    """Bloom filter over 64-bit fingerprints, bit array held in NumPy"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(capacity, 1024)
+        self.size = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        self._lock = threading.Lock()
+
+    def _positions(self, fp: int):
+        h1, h2 = fp & 0xFFFFFFFF, (fp >> 32) | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, fp: int):
+        with self._lock:
+            for pos in self._positions(fp):
+                self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def add_many(self, fps: np.ndarray):
+        """Vectorized insert used when loading the shards at start-up"""
+        if not len(fps):
+            return
+        h1 = (fps & np.uint64(0xFFFFFFFF)).astype(np.uint64)
+        h2 = (fps >> np.uint64(32)) | np.uint64(1)
+        size = np.uint64(self.size)
+        with self._lock:
+            for i in range(self.hashes):
+                pos = (h1 + np.uint64(i) * h2) % size
+                np.bitwise_or.at(self.bits, (pos >> np.uint64(3)).astype(np.int64),
+                                 (np.uint8(1) << (pos & np.uint64(7)).astype(np.uint8)))
+
+    def __contains__(self, fp: int) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(fp))
+
+
+class _Shard:
+    """
+    Open-addressing hash table of serial states in one memory-mapped file
+
+    Linear probing on the low fingerprint bits; a lookup touches one or two
+    adjacent 32-byte slots, i.e. usually a single page. The table doubles
+    when it is more than MAX_LOAD full.
+
+    Worker processes share the file: every access goes through locked(),
+    which holds an flock on {path}.lock and remaps the table if another
+    process replaced it (growth or compaction) since the last access.
+    """
+
+    def __init__(self, path: str, initial_slots: int):
+        self.path = path
+        self.initial_slots = initial_slots
+        self.lock = threading.Lock()
+        self._lock_file = open(f"{path}.lock", "a")
+        self._mm: Optional[mmap.mmap] = None
+        self._inode: Optional[int] = None
+        # Slot count at which the registry's Bloom filter held every
+        # fingerprint in the table (None: unknown); inserts by other
+        # processes raise the count without reaching the filter
+        self.verified_used: Optional[int] = None
+        # The same for the filter compact() is building
+        self.next_verified: Optional[int] = None
+        with self.locked():
+            pass
+
+    @contextmanager
+    def locked(self) -> Iterator["_Shard"]:
+        """Hold the shard against other threads and processes, with the current table mapped"""
+        with self.lock:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                self._sync()
+                yield self
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _sync(self):
+        """Create the table if missing and remap it if another process replaced it"""
+        if not os.path.exists(self.path):
+            self._create(self.path, self.initial_slots)
+        if self._mm is not None:
+            if os.stat(self.path).st_ino == self._inode and _HEADER.unpack_from(self._mm, 0)[1] == self.capacity:
+                return
+            self.close()
+            # Serials added elsewhere are missing from this process's filters
+            self.verified_used = self.next_verified = None
+        self._open()
+
+    @staticmethod
+    def _create(path: str, capacity: int, records: Optional[np.ndarray] = None):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, capacity, 0).ljust(_HEADER_SIZE, b"\0"))
+            f.truncate(_HEADER_SIZE + capacity * _SLOT.size)
+
+        if records is not None and len(records):
+            with open(tmp, "r+b") as f:
+                mm = mmap.mmap(f.fileno(), 0)
+                try:
+                    # Probe in plain Python over ints, then write all slots at once
+                    mask = capacity - 1
+                    occupied = bytearray(capacity)
+                    positions = []
+                    for fp in records["fp"].tolist():
+                        idx = fp & mask
+                        while occupied[idx]:
+                            idx = (idx + 1) & mask
+                        occupied[idx] = 1
+                        positions.append(idx)
+                    table = np.frombuffer(mm, dtype=_SLOT_DTYPE, count=capacity, offset=_HEADER_SIZE)
+                    table[np.array(positions, dtype=np.int64)] = records
+                    del table
+                    mm[:_HEADER.size] = _HEADER.pack(_MAGIC, capacity, len(records))
+                    mm.flush()
+                finally:
+                    mm.close()
+        os.replace(tmp, path)
+
+    def _open(self):
+        self._file = open(self.path, "r+b")
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        magic, self.capacity, _ = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{self.path} is not a serial index")
+        self._mask = self.capacity - 1
+
+    def close(self):
+        if self._mm is None:
+            return
+        self._mm.flush()
+        self._mm.close()
+        self._mm = None
+        self._file.close()
+
+    @property
+    def used(self) -> int:
+        """Occupied slots, counting inserts by every process"""
+        return _HEADER.unpack_from(self._mm, 0)[2]
+
+    def knows_all(self) -> bool:
+        """True if the registry's Bloom filter holds every fingerprint in the table"""
+        return self.verified_used is not None and self.verified_used == self.used
+
+    def _find(self, fp: int) -> Tuple[int, Optional[tuple]]:
+        mm, mask, size = self._mm, self._mask, _SLOT.size
+        idx = fp & mask
+        while True:
+            slot = _SLOT.unpack_from(mm, _HEADER_SIZE + idx * size)
+            if slot[0] == fp:
+                return idx, slot
+            if slot[0] == 0:
+                return idx, None
+            idx = (idx + 1) & mask
+
+    def get(self, fp: int) -> Optional[tuple]:
+        return self._find(fp)[1]
+
+    def put(self, fp: int, slot: tuple):
+        """Insert or replace the state of fp (caller holds locked() and adds new fps to the filters)"""
+        idx, existing = self._find(fp)
+        if existing is None and (self.used + 1) > self.capacity * MAX_LOAD:
+            self.rewrite(self.capacity * 2)
+            idx, existing = self._find(fp)
+        _SLOT.pack_into(self._mm, _HEADER_SIZE + idx * _SLOT.size, *slot)
+        if existing is None:
+            used = self.used
+            _HEADER.pack_into(self._mm, 0, _MAGIC, self.capacity, used + 1)
+            if self.verified_used == used:
+                self.verified_used = used + 1
+            if self.next_verified == used:
+                self.next_verified = used + 1
+
+    def records(self) -> np.ndarray:
+        """Copy of all occupied slots"""
+        table = np.frombuffer(self._mm, dtype=_SLOT_DTYPE, count=self.capacity, offset=_HEADER_SIZE)
+        live = table[table["fp"] != 0].copy()
+        del table
+        return live
+
+    def rewrite(self, capacity: int, keep_since: Optional[int] = None) -> int:
+        """
+        Rebuild the table at a new capacity, optionally dropping stale serials
+        (caller holds locked())
+
+        Args:
+            capacity: New slot count (power of two)
+            keep_since: Drop serials last seen before this timestamp
+
+        Returns:
+            Number of serials kept
+        """
+        records = self.records()
+        if keep_since is not None:
+            records = records[records["last_seen"] >= keep_since]
+        while len(records) > capacity * MAX_LOAD:
+            capacity *= 2
+        # A filter that held every serial still does once some are dropped
+        verified, next_verified = self.knows_all(), self.next_verified == self.used
+        self.close()
+        self._create(self.path, capacity, records)
+        self._open()
+        self.verified_used = len(records) if verified else None
+        self.next_verified = len(records) if next_verified else None
+        return len(records)
+
+
+class SerialRegistry:
+    """
+    First-seen and replay detection for serialised GS1 codes
+
+    Every scan is appended to a daily event log and folded into one of
+    `shards` memory-mapped hash tables keyed by a 64-bit fingerprint of
+    (GTIN-14, serial). An in-memory Bloom filter short-circuits the common
+    first-scan case without touching the table pages. compact() forgets
+    serials not seen within the retention window and deletes old logs.
+
+    Worker processes may share data_dir. Shard access is serialised with
+    file locks, and the filter only answers "never seen" for a shard while
+    no other process has added serials to it since the filter was built;
+    otherwise the table is probed.
+    """
+
+    def __init__(
+        self,
+        data_dir: str = "var/serials",
+        shards: int = 64,
+        window_days: int = 365,
+        bloom_capacity: int = 10_000_000,
+        max_scans: int = 20,
+        initial_slots: int = 1 << 14,
+    ):
+        """
+        Args:
+            data_dir: Folder for shard tables and event logs
+            shards: Number of shard tables (power of two)
+            window_days: Retention window for compaction
+            bloom_capacity: Serials the Bloom filter is sized for (1% false positives)
+            max_scans: Scans of one serial, from any location, before it is suspicious
+            initial_slots: Slots per new shard table (power of two)
+        """
+        if shards & (shards - 1) or initial_slots & (initial_slots - 1):
+            raise ValueError("shards and initial_slots must be powers of two")
+
+        self.data_dir = data_dir
+        self.window_days = window_days
+        self.max_scans = max_scans
+        self.bloom_capacity = bloom_capacity
+        self.segments_dir = os.path.join(data_dir, "segments")
+        os.makedirs(self.segments_dir, exist_ok=True)
+
+        self._shard_shift = 64 - (shards.bit_length() - 1)
+        self._shards = [
+            _Shard(os.path.join(data_dir, f"shard-{i:03d}.idx"), initial_slots) for i in range(shards)
+        ]
+        self._bloom = _FingerprintBloom(bloom_capacity)
+        for shard in self._shards:
+            with shard.locked():
+                self._bloom.add_many(shard.records()["fp"])
+                shard.verified_used = shard.used
+        # Filter being rebuilt by compact(); new fingerprints go into both
+        self._next_bloom: Optional[_FingerprintBloom] = None
+
+        self._log_lock = threading.Lock()
+        self._log_day: Optional[str] = None
+        self._log = None
+        self._stop = threading.Event()
+        self._compactor: Optional[threading.Thread] = None
+
+    def _shard(self, fp: int) -> _Shard:
+        return self._shards[fp >> self._shard_shift] if self._shard_shift < 64 else self._shards[0]
+
+    def record(self, gtin: str, serial: str, location: Optional[str] = None, ts: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Record a scan and report whether this serial was seen before
+
+        Args:
+            gtin: GTIN from the same barcode
+            serial: AI (21) serial number
+            location: Store or scanner id (None if unknown)
+            ts: Scan time (default now)
+
+        Returns:
+            Scan history of this serial before this scan, and the verdict:
+            replay is True when the serial was scanned at another location,
+            or more than max_scans times in total
+        """
+        now = int(ts if ts is not None else time.time())
+        fp = serial_fingerprint(gtin, serial)
+        loc = location_id(location)
+        self._append_event(fp, now, loc)
+
+        shard = self._shard(fp)
+        with shard.locked():
+            previous = shard.get(fp) if fp in self._bloom or not shard.knows_all() else None
+            if previous is None:
+                shard.put(fp, (fp, now, now, 1, loc, loc, 0))
+                # Under the shard lock: a concurrent scan of the same serial
+                # must not see it missing from the filter and overwrite the slot
+                self._bloom.add(fp)
+                rebuilding = self._next_bloom
+                if rebuilding is not None:
+                    rebuilding.add(fp)
+            else:
+                _, first_seen, _, scans, first_loc, last_loc, changes = previous
+                moved = bool(loc and last_loc and loc != last_loc)
+                shard.put(fp, (fp, first_seen, now, scans + 1, first_loc or loc, loc or last_loc, changes + moved))
+
+        return self._verdict(gtin, serial, previous, loc)
+
+    def lookup(self, gtin: str, serial: str) -> Optional[Dict[str, Any]]:
+        """Scan history of a serial without recording a scan (None if never seen)"""
+        fp = serial_fingerprint(gtin, serial)
+        shard = self._shard(fp)
+        with shard.locked():
+            if fp not in self._bloom and shard.knows_all():
+                return None
+            slot = shard.get(fp)
+        if slot is None:
+            return None
+        _, first_seen, last_seen, scans, _, _, changes = slot
+        return {
+            "scans": scans,
+            "first_seen_at": _iso(first_seen),
+            "last_seen_at": _iso(last_seen),
+            "locations": changes + 1,
+        }
+
+    def _verdict(self, gtin: str, serial: str, previous: Optional[tuple], loc: int) -> Dict[str, Any]:
+        result = {
+            "gtin": gtin,
+            "serial": serial,
+            "first_scan": previous is None,
+            "previous_scans": 0,
+            "first_seen_at": None,
+            "last_seen_at": None,
+            "other_location": False,
+            "locations": 1,
+            "replay": False,
+            "severity": None,
+        }
+        if previous is None:
+            return result
+
+        _, first_seen, last_seen, scans, first_loc, last_loc, changes = previous
+        other_location = bool(loc) and any(p and p != loc for p in (first_loc, last_loc))
+        result.update({
+            "previous_scans": scans,
+            "first_seen_at": _iso(first_seen),
+            "last_seen_at": _iso(last_seen),
+            "other_location": other_location,
+            "locations": changes + 1 + (1 if loc and last_loc and loc != last_loc else 0),
+        })
+
+        if other_location:
+            result["replay"] = True
+            result["severity"] = "CRITICAL" if result["locations"] >= 3 else "HIGH"
+        elif scans + 1 > self.max_scans:
+            result["replay"] = True
+            result["severity"] = "HIGH"
+        return result
+
+    def _append_event(self, fp: int, ts: int, loc: int):
+        day = time.strftime("%Y%m%d", time.gmtime(ts))
+        with self._log_lock:
+            if day != self._log_day:
+                if self._log is not None:
+                    self._log.close()
+                self._log = open(os.path.join(self.segments_dir, f"{day}.log"), "ab", buffering=64 * 1024)
+                self._log_day = day
+            self._log.write(_EVENT.pack(fp, ts, loc))
+
+    def flush(self):
+        """Write buffered events and table pages to disk"""
+        with self._log_lock:
+            if self._log is not None:
+                self._log.flush()
+        for shard in self._shards:
+            with shard.lock:
+                shard._mm.flush()
+
+    def compact(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Forget serials not seen within the window and delete old event logs
+
+        Shards are rewritten one at a time, so scans of other shards carry on
+        while one is compacted. The Bloom filter is rebuilt afterwards; serials
+        first scanned while it is being built are added to it as well.
+        Other worker processes sharing data_dir remap the rewritten shards
+        on their next access.
+        """
+        start = time.perf_counter()
+        cutoff = int((now if now is not None else time.time()) - self.window_days * 86400)
+        kept = 0
+        for shard in self._shards:
+            with shard.locked():
+                capacity = shard.capacity
+                while capacity > 1024 and shard.used < capacity * MAX_LOAD / 4:
+                    capacity //= 2
+                kept += shard.rewrite(capacity, keep_since=cutoff)
+
+        bloom = _FingerprintBloom(self.bloom_capacity)
+        self._next_bloom = bloom
+        swapped = False
+        try:
+            for shard in self._shards:
+                with shard.locked():
+                    bloom.add_many(shard.records()["fp"])
+                    shard.next_verified = shard.used
+            self._bloom = bloom
+            swapped = True
+        finally:
+            self._next_bloom = None
+            for shard in self._shards:
+                with shard.lock:
+                    if swapped:
+                        shard.verified_used = shard.next_verified
+                    shard.next_verified = None
+
+        cutoff_day = time.strftime("%Y%m%d", time.gmtime(cutoff))
+        removed = 0
+        for path in glob.glob(os.path.join(self.segments_dir, "*.log")):
+            if os.path.basename(path)[:8] < cutoff_day:
+                os.remove(path)
+                removed += 1
+
+        return {"serials_kept": kept, "segments_removed": removed, "seconds": round(time.perf_counter() - start, 3)}
+
+    def start_compactor(self, interval: float = 86400.0):
+        """Flush every minute and compact every `interval` seconds in a background thread"""
+        self._stop.clear()
+        self._compactor = threading.Thread(target=self._run_compactor, args=(interval,), name="serial-compactor", daemon=True)
+        self._compactor.start()
+
+    def stop_compactor(self):
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join(timeout=10)
+            self._compactor = None
+        self.flush()
+
+    def _run_compactor(self, interval: float):
+        last = time.monotonic()
+        while not self._stop.wait(60):
+            try:
+                self.flush()
+                if time.monotonic() - last >= interval:
+                    print(f"Serial registry compacted: {self.compact()}")
+                    last = time.monotonic()
+            except Exception as e:
+                print(f"Serial registry compaction error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        serials = sum(s.used for s in self._shards)
+        slots = sum(s.capacity for s in self._shards)
+        return {
+            "serials": serials,
+            "shards": len(self._shards),
+            "load_factor": round(serials / slots, 4) if slots else 0.0,
+            "segments": len(glob.glob(os.path.join(self.segments_dir, "*.log"))),
+            "bloom_bits": self._bloom.size,
+            "window_days": self.window_days,
+        }
+
+    def close(self):
+        self.flush()
+        with self._log_lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+        for shard in self._shards:
+            with shard.lock:
+                shard.close()
+                shard._lock_file.close()
+
+
+def serial_scans(barcodes: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """Distinct (GTIN, serial) pairs among decoded barcodes"""
+    pairs = []
+    for code in barcodes:
+        parsed = code.get("parsed") or {}
+        pair = (parsed.get("gtin"), parsed.get("serial"))
+        if all(pair) and pair not in pairs:
+            pairs.append(pair)
+    return pairs
+
+
+# Singleton instance
+_serial_registry = None
+
+
+def get_serial_registry() -> SerialRegistry:
+    """Get singleton serial registry (configured from SERIAL_REGISTRY_* env vars)"""
+    global _serial_registry
+    if _serial_registry is None:
+        _serial_registry = SerialRegistry(
+            data_dir=os.getenv("SERIAL_REGISTRY_DIR", "var/serials"),
+            window_days=int(os.getenv("SERIAL_REGISTRY_WINDOW_DAYS", "365")),
+            bloom_capacity=int(os.getenv("SERIAL_REGISTRY_BLOOM_CAPACITY", "10000000")),
+            max_scans=int(os.getenv("SERIAL_REPLAY_MAX_SCANS", "20")),
+        )
+    return _serial_registry
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) == 4 and sys.argv[1] == "lookup":
+        print(get_serial_registry().lookup(sys.argv[2], sys.argv[3]))
+    elif len(sys.argv) == 2 and sys.argv[1] == "compact":
+        registry = get_serial_registry()
+        print(registry.compact())
+        registry.close()
+    else:
+        print("Serial registry module loaded successfully")
+        print("Usage: python -m services.serial_registry lookup <gtin> <serial> | compact")
@@ -0,0 +1,115 @@
+"""
+Table Files
+Shared reader for saved CSV/JSON/JSONL/HTML lists and the drop folders they arrive in
+"""
+
+import csv
+import glob
+import json
+import os
+import re
+from typing import Dict, List, Iterable, Mapping, Sequence
+
+TABLE_EXTENSIONS = (".csv", ".json", ".jsonl", ".html", ".htm")
+
+
+def heading(name: str) -> str:
+    """Lower-case column heading with punctuation collapsed ("Batch No." -> "batch no")"""
+    return " ".join(re.sub(r"[^a-z]+", " ", (name or "").lower()).split())
+
+
+def heading_map(column_aliases: Mapping[str, Sequence[str]]) -> Dict[str, str]:
+    """Normalized heading -> field, from field -> accepted headings"""
+    return {heading(alias): field for field, aliases in column_aliases.items() for alias in aliases}
+
+
+def rows_from_table(
+    headings: List[str],
+    rows: Iterable[List[str]],
+    heading_to_field: Mapping[str, str]
+) -> List[Dict[str, str]]:
+    """Map table rows to records by heading; the first non-empty column of a field wins"""
+    fields = [heading_to_field.get(heading(h)) for h in headings]
+    records = []
+    for row in rows:
+        record = {}
+        for field, value in zip(fields, row):
+            if field and value and field not in record:
+                record[field] = str(value).strip()
+        records.append(record)
+    return records
+
+
+def read_table_file(path: str, heading_to_field: Mapping[str, str]) -> List[Dict[str, str]]:
+    """
+    Read the records of a saved list
+
+    CSV, JSON (a list of objects, or {"items": [...]}), JSON lines and saved
+    HTML pages with one or more tables are accepted. Columns (or object
+    keys) are matched by heading; unknown columns are ignored.
+
+    Args:
+        path: File to read
+        heading_to_field: See heading_map()
+
+    Returns:
+        One dict per row, holding the fields that were present
+
+    Raises:
+        ValueError: If the file type is not supported
+    """
+    ext = os.path.splitext(path)[1].lower()
+
+    if ext == ".csv":
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            headings = next(reader, [])
+            return rows_from_table(headings, reader, heading_to_field)
+
+    if ext in (".json", ".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            if ext == ".jsonl":
+                items = [json.loads(line) for line in f if line.strip()]
+            else:
+                items = json.load(f)
+                if isinstance(items, dict):
+                    items = items.get("items", [])
+        return [
+            rows_from_table(list(item), [list(item.values())], heading_to_field)[0]
+            for item in items if isinstance(item, dict)
+        ]
+
+    if ext in (".html", ".htm"):
+        from bs4 import BeautifulSoup
+        with open(path, "rb") as f:
+            soup = BeautifulSoup(f.read(), "html.parser")
+        records = []
+        for table in soup.find_all("table"):
+            rows = [[cell.get_text(" ", strip=True) for cell in tr.find_all(["th", "td"])] for tr in table.find_all("tr")]
+            if rows:
+                records.extend(rows_from_table(rows[0], rows[1:], heading_to_field))
+        return records
+
+    raise ValueError(f"Unsupported file type: {ext}")
+
+
+def changed_drop_files(drops_dir: str, seen: Mapping[str, int]) -> List[str]:
+    """
+    Table files in a drop folder that are new or modified
+
+    Args:
+        drops_dir: Folder to list
+        seen: Absolute path -> st_mtime_ns at its last ingest
+
+    Returns:
+        Sorted paths whose modification time differs from `seen`
+    """
+    paths = sorted(
+        p for p in glob.glob(os.path.join(drops_dir, "*"))
+        if p.lower().endswith(TABLE_EXTENSIONS)
+    )
+    return [p for p in paths if seen.get(os.path.abspath(p)) != os.stat(p).st_mtime_ns]
+
+
+if __name__ == "__main__":
+    print("Table files module loaded successfully")
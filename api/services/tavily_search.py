@@ -4,23 +4,79 @@ Uses Tavily API for intelligent web search and drug verification
 """
 
 from typing import Dict, List, Optional, Any
+import json
 import os
-from tavily import TavilyClient
+import requests
+from .circuit_breaker import guarded_upstream
+from .ttl_cache import DEFAULT_STALE_SECONDS, TTLCache
+
+
+# Search endpoint of the Tavily REST API (what tavily.TavilyClient.search posts to)
+TAVILY_SEARCH_URL = "https://api.tavily.com/search"
 
 
 class TavilySearchService:
     """AI-powered search service using Tavily for drug verification"""
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, cache: Optional[TTLCache] = None):
+        """
+        Args:
+            api_key: Tavily API key (default: TAVILY_API_KEY)
+            cache: Cache of raw search responses keyed by operation and query
+        """
+        self.cache = cache or TTLCache("tavily", ttl_seconds=86400, max_entries=5000, stale_seconds=DEFAULT_STALE_SECONDS)
         self.api_key = api_key or os.getenv("TAVILY_API_KEY")
         if self.api_key:
-            self.client = TavilyClient(api_key=self.api_key)
+            # Called directly rather than through tavily.TavilyClient, whose
+            # search() has a fixed 100 s timeout instead of the adaptive one
+            self.session = requests.Session()
             self.enabled = True
         else:
-            self.client = None
+            self.session = None
             self.enabled = False
             print("Warning: Tavily API key not found. Advanced search disabled.")
 
+    def _search(self, operation: str, **kwargs) -> Dict[str, Any]:
+        """
+        Run one Tavily search, or return its cached response
+
+        A stale response is returned at once and re-fetched in the background.
+        """
+        key = json.dumps([operation, kwargs], sort_keys=True, default=str)
+        cached = self.cache.get(key, refresh=lambda: self._fetch(key, operation, kwargs))
+        if cached is not None:
+            return cached
+        return self._fetch(key, operation, kwargs)
+
+    def _fetch(self, key: str, operation: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Call Tavily, recording its latency per operation (one breaker for all), and cache the response
+
+        The request uses the breaker's adaptive timeout.
+
+        Raises:
+            requests.RequestException: On a timeout, connection error or error status
+        """
+        with guarded_upstream(f"tavily_{operation}", breaker="tavily") as call:
+            http = self.session.post(
+                TAVILY_SEARCH_URL,
+                json=dict(kwargs, api_key=self.api_key),
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=call.timeout,
+            )
+            call.status = http.status_code
+            if http.status_code != 200:
+                call.outcome = "http_error"
+            else:
+                response = http.json()
+                if not response.get("results"):
+                    call.outcome = "not_found"
+        if http.status_code != 200:
+            http.raise_for_status()
+            raise requests.HTTPError(f"Tavily returned HTTP {http.status_code}", response=http)
+        self.cache.set(key, response)
+        return response
+
     def search_medicine_info(self, product_name: str, manufacturer: str = None) -> Dict[str, Any]:
         """
         Search for comprehensive medicine information using AI
@@ -45,7 +101,8 @@ class TavilySearchService:
             query = " ".join(query_parts)
 
             # Perform AI search
-            response = self.client.search(
+            response = self._search(
+                "medicine_info",
                 query=query,
                 search_depth="advanced",
                 max_results=5,
@@ -112,7 +169,8 @@ class TavilySearchService:
         try:
             query = f"GTIN {gtin} pharmaceutical medicine India verification"
 
-            response = self.client.search(
+            response = self._search(
+                "barcode",
                 query=query,
                 search_depth="advanced",
                 max_results=3,
@@ -174,7 +232,8 @@ class TavilySearchService:
 
             query = " ".join(query_parts)
 
-            response = self.client.search(
+            response = self._search(
+                "counterfeit",
                 query=query,
                 search_depth="advanced",
                 max_results=5,
@@ -230,7 +289,8 @@ class TavilySearchService:
         try:
             query = f"{product_name} medicine composition uses dosage manufacturer India"
 
-            response = self.client.search(
+            response = self._search(
+                "medicine_details",
                 query=query,
                 search_depth="advanced",
                 max_results=5
@@ -0,0 +1,381 @@
+"""
+Request Tracing
+Lightweight spans for the verification pipeline, exported as OTLP/JSON
+"""
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Any
+
+import requests
+
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_CURRENT_SPAN: ContextVar[Optional["Span"]] = ContextVar("mediscan_current_span", default=None)
+
+
+def _new_id(nbytes: int) -> str:
+    return f"{random.getrandbits(nbytes * 8):0{nbytes * 2}x}"
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Dict[str, str]]:
+    """
+    Parse a W3C traceparent header so traces can continue from a caller
+
+    Args:
+        header: e.g. "00-<32 hex trace id>-<16 hex span id>-01"
+
+    Returns:
+        {"trace_id", "span_id"} or None if absent or malformed
+    """
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16)
+        int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return {"trace_id": parts[1], "span_id": parts[2]}
+
+
+class Span:
+    """One timed operation inside a trace; use as a context manager"""
+
+    __slots__ = (
+        "tracer", "name", "kind", "trace_id", "span_id", "parent_id", "attributes",
+        "status", "status_message", "start_ns", "end_ns", "_start_perf", "_token",
+    )
+
+    def __init__(
+        self,
+        tracer: "Tracer",
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str],
+        kind: int = SPAN_KIND_INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None
+    ):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes) if attributes else {}
+        self.status = STATUS_UNSET
+        self.status_message = ""
+        self.start_ns = 0
+        self.end_ns = 0
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any):
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def set_error(self, message: str):
+        self.status = STATUS_ERROR
+        self.status_message = message
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        self._start_perf = time.perf_counter_ns()
+        self.attributes.setdefault("thread.name", threading.current_thread().name)
+        self._token = _CURRENT_SPAN.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Monotonic duration, wall-clock start
+        self.end_ns = self.start_ns + (time.perf_counter_ns() - self._start_perf)
+        if exc_type is not None:
+            self.set_error(f"{exc_type.__name__}: {exc}")
+        _CURRENT_SPAN.reset(self._token)
+        self.tracer._finish(self)
+        return False
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": self.status},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.status_message:
+            span["status"]["message"] = self.status_message
+        return span
+
+
+class _NoopSpan:
+    """Returned when no trace is active, so instrumentation costs ~nothing"""
+
+    __slots__ = ()
+
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        pass
+
+    def set_error(self, message: str):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class OTLPJsonExporter:
+    """
+    Batches finished spans and writes them as OTLP/JSON
+
+    Each flush produces one ExportTraceServiceRequest, appended as a line to
+    `file_path` (the OpenTelemetry collector file format) and/or POSTed to
+    an OTLP/HTTP collector at `endpoint` (e.g. http://localhost:4318/v1/traces).
+    Export runs on a background thread; spans are dropped, never blocking
+    requests, when the buffer is full.
+    """
+
+    def __init__(
+        self,
+        file_path: Optional[str] = None,
+        endpoint: Optional[str] = None,
+        service_name: str = "mediscan-api",
+        flush_interval: float = 2.0,
+        max_batch: int = 512,
+        max_buffer: int = 8192
+    ):
+        """
+        Args:
+            file_path: JSON-lines file receiving one export request per flush
+            endpoint: OTLP/HTTP traces URL
+            service_name: Value of the service.name resource attribute
+            flush_interval: Seconds between flushes
+            max_batch: Spans per export request
+            max_buffer: Spans buffered before new ones are dropped
+        """
+        self.file_path = file_path
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=max_buffer)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._session = requests.Session() if endpoint else None
+
+    def export(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        if self.file_path:
+            os.makedirs(os.path.dirname(self.file_path) or ".", exist_ok=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+    def flush(self):
+        """Export everything buffered so far"""
+        while True:
+            batch = []
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "buffered": self._queue.qsize(),
+        }
+
+    def _loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Trace export error: {e}")
+
+    def _write(self, spans: List[Span]):
+        payload = {
+            "resourceSpans": [{
+                "resource": {
+                    "attributes": [
+                        {"key": "service.name", "value": {"stringValue": self.service_name}},
+                        {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+                    ]
+                },
+                "scopeSpans": [{
+                    "scope": {"name": "mediscan"},
+                    "spans": [span.to_otlp() for span in spans],
+                }],
+            }]
+        }
+        body = json.dumps(payload, separators=(",", ":"))
+
+        ok = True
+        if self.file_path:
+            try:
+                with open(self.file_path, "a") as f:
+                    f.write(body + "\n")
+            except OSError as e:
+                print(f"Trace file export error: {e}")
+                ok = False
+        if self._session is not None:
+            try:
+                response = self._session.post(
+                    self.endpoint, data=body, headers={"Content-Type": "application/json"}, timeout=5
+                )
+                ok = ok and response.status_code < 300
+            except requests.RequestException as e:
+                print(f"Trace collector export error: {e}")
+                ok = False
+
+        if ok:
+            self.exported += len(spans)
+        else:
+            self.failed += len(spans)
+
+
+class Tracer:
+    """
+    Creates spans and hands finished ones to the exporter
+
+    Child spans are only recorded inside an active trace, so code paths
+    outside a traced request (benchmarks, scripts) pay only for a context
+    variable lookup.
+    """
+
+    def __init__(self, exporter: Optional[OTLPJsonExporter] = None, sample_rate: float = 1.0):
+        """
+        Args:
+            exporter: Destination for finished spans (None disables tracing)
+            sample_rate: Fraction of root traces recorded
+        """
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def start_trace(
+        self,
+        name: str,
+        traceparent: Optional[str] = None,
+        attributes: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Start a root (server) span for one request or job
+
+        Args:
+            name: Span name, e.g. "POST /verify"
+            traceparent: Incoming W3C traceparent header to continue
+            attributes: Initial span attributes
+
+        Returns:
+            Span context manager (a no-op span when tracing is off or unsampled)
+        """
+        if self.exporter is None:
+            return NOOP_SPAN
+
+        parent = parse_traceparent(traceparent)
+        if parent is None and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return NOOP_SPAN
+
+        trace_id = parent["trace_id"] if parent else _new_id(16)
+        parent_id = parent["span_id"] if parent else None
+        return Span(self, name, trace_id, parent_id, kind=SPAN_KIND_SERVER, attributes=attributes)
+
+    def _finish(self, span: Span):
+        if self.exporter is not None:
+            self.exporter.export(span)
+
+
+def current_span():
+    """Active span of this context, or a no-op span"""
+    return _CURRENT_SPAN.get() or NOOP_SPAN
+
+
+def start_span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes):
+    """
+    Start a child of the active span
+
+    Args:
+        name: Span name
+        kind: OTLP span kind
+        **attributes: Initial attributes
+
+    Returns:
+        Span context manager, or a no-op span outside a trace
+    """
+    parent = _CURRENT_SPAN.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent.tracer, name, parent.trace_id, parent.span_id, kind=kind, attributes=attributes)
+
+
+if __name__ == "__main__":
+    print("Tracing module loaded successfully")
@@ -0,0 +1,224 @@
+"""
+TTL Cache
+Expiring cache with stale-while-revalidate for upstream lookup results, over a pluggable backend
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Any, Iterable, Set, Tuple
+
+from .cache_backend import CacheBackend, get_cache_backend, namespace_ttl
+from .metrics import CACHE_REFRESHES, CACHE_REQUESTS, CACHE_STALE_SECONDS
+
+
+# Default window past the soft TTL in which upstream results are served stale
+DEFAULT_STALE_SECONDS = float(os.getenv("CACHE_STALE_SECONDS", "604800"))
+
+
+class _Refresher:
+    """
+    Bounded pool running background cache refreshes
+
+    A key already being refreshed is not scheduled again, and at most
+    `max_pending` refreshes wait at once; anything beyond that is dropped
+    (the stale value keeps being served until the hard TTL).
+    """
+
+    def __init__(self, max_workers: int = 4, max_pending: int = 1000):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._pending: Set[Tuple[str, str]] = set()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def submit(self, cache_name: str, key: str, refresh: Callable[[], Any]) -> bool:
+        """
+        Schedule refresh() unless the same key is already queued
+
+        Returns:
+            True if a refresh was scheduled
+        """
+        token = (cache_name, key)
+        with self._lock:
+            if token in self._pending:
+                return False
+            if len(self._pending) >= self.max_pending:
+                CACHE_REFRESHES.inc(cache=cache_name, outcome="dropped")
+                return False
+            self._pending.add(token)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="cache-refresh")
+            executor = self._executor
+        executor.submit(self._run, token, refresh)
+        return True
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _run(self, token: Tuple[str, str], refresh: Callable[[], Any]):
+        try:
+            refresh()
+            CACHE_REFRESHES.inc(cache=token[0], outcome="ok")
+        except Exception as e:
+            CACHE_REFRESHES.inc(cache=token[0], outcome="error")
+            print(f"Cache refresh error ({token[0]}): {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(token)
+
+
+# Shared by every cache so the total number of refresh threads stays bounded
+_refresher = _Refresher(max_workers=int(os.getenv("CACHE_REFRESH_CONCURRENCY", "4")))
+
+
+class TTLCache:
+    """
+    Expiring cache of upstream lookup results over a CacheBackend
+
+    Values are serialized by the backend, so callers can mutate what they
+    get back without corrupting the cache. With the default in-process
+    backend this is a per-process LRU; with CACHE_BACKEND=sqlite or redis
+    every worker shares one cache, namespaced by `name`.
+
+    With stale_seconds > 0, an entry past its TTL (the soft TTL) but within
+    stale_seconds more (the hard TTL) is still returned by get() when a
+    refresh callable is given, and that callable is scheduled once in the
+    background to replace it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl_seconds: float = 86400,
+        max_entries: int = 10000,
+        stale_seconds: float = 0,
+        backend: Optional[CacheBackend] = None
+    ):
+        """
+        Args:
+            name: Namespace, and cache label for the cache_requests metric
+            ttl_seconds: Default entry lifetime before it is stale (soft TTL);
+                CACHE_TTL_<NAME> overrides it
+            max_entries: Maximum number of entries of an in-process backend
+            stale_seconds: How long past the soft TTL a stale entry may be served
+            backend: Storage (default: from CACHE_BACKEND, see get_cache_backend)
+        """
+        self.name = name
+        self.ttl_seconds = namespace_ttl(name, ttl_seconds)
+        self.max_entries = max_entries
+        self.stale_seconds = stale_seconds
+        self.backend = backend or get_cache_backend(max_entries)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+
+    def get(self, key: str, default: Any = None, refresh: Optional[Callable[[], Any]] = None) -> Any:
+        """
+        Return the cached value for key, or default if absent or expired
+
+        Args:
+            key: Cache key
+            default: Returned on a miss
+            refresh: Callable that re-fetches and set()s this key; when given,
+                a stale entry is returned and refresh is run in the background
+        """
+        found = self.get_many([key], refresh=(lambda _: refresh) if refresh is not None else None)
+        return found.get(key, default)
+
+    def get_many(
+        self,
+        keys: Iterable[str],
+        refresh: Optional[Callable[[str], Callable[[], Any]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Look up several keys in one backend round trip
+
+        Args:
+            keys: Cache keys
+            refresh: Given a key, returns its refresh callable (see get())
+
+        Returns:
+            {key: value} for the keys that are fresh, or stale with a refresh
+        """
+        keys = list(keys)
+        now = time.time()
+        try:
+            entries = self.backend.get_many(self.name, keys)
+        except Exception as e:
+            print(f"Cache backend error ({self.name}): {e}")
+            entries = {}
+
+        found = {}
+        stale = []
+        for key, (soft_expires_at, value) in entries.items():
+            if soft_expires_at > now:
+                found[key] = value
+            elif refresh is not None and self.stale_seconds > 0:
+                found[key] = value
+                stale.append((key, now - soft_expires_at))
+
+        hits = len(found) - len(stale)
+        misses = len(keys) - len(found)
+        with self._lock:
+            self._hits += hits
+            self._stale_hits += len(stale)
+            self._misses += misses
+        if hits:
+            CACHE_REQUESTS.inc(hits, cache=self.name, result="hit")
+        if misses:
+            CACHE_REQUESTS.inc(misses, cache=self.name, result="miss")
+        for key, stale_for in stale:
+            CACHE_REQUESTS.inc(cache=self.name, result="stale")
+            CACHE_STALE_SECONDS.observe(stale_for, cache=self.name)
+            _refresher.submit(self.name, key, refresh(key))
+        return found
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        """
+        Store a value
+
+        Args:
+            key: Cache key
+            value: Value to store (copied)
+            ttl_seconds: Soft lifetime of this entry (default: the cache TTL)
+        """
+        self.set_many({key: value}, ttl_seconds)
+
+    def set_many(self, items: Dict[str, Any], ttl_seconds: Optional[float] = None):
+        """Store several values with the same lifetime in one backend round trip"""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl <= 0 or not items:
+            return
+        try:
+            self.backend.set_many(self.name, items, ttl, self.stale_seconds)
+        except Exception as e:
+            print(f"Cache backend error ({self.name}): {e}")
+
+    def clear(self):
+        try:
+            self.backend.clear(self.name)
+        except Exception as e:
+            print(f"Cache backend error ({self.name}): {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._stale_hits + self._misses
+            hits, stale_hits, misses = self._hits, self._stale_hits, self._misses
+        return {
+            "backend": self.backend.stats(),
+            "ttl_seconds": self.ttl_seconds,
+            "stale_seconds": self.stale_seconds,
+            "hits": hits,
+            "stale_hits": stale_hits,
+            "misses": misses,
+            "hit_rate": round((hits + stale_hits) / lookups, 4) if lookups else None,
+            "refreshes_pending": _refresher.pending(),
+        }
+
+
+if __name__ == "__main__":
+    print("TTL cache module loaded successfully")
@@ -0,0 +1,269 @@
+"""
+Memory-Bounded Upload Ingestion
+Enforces upload limits and decodes images straight from the spooled upload buffer
+"""
+
+import io
+import mmap
+import os
+import sys
+from typing import List, Optional, Any, Dict, Iterator
+
+import cv2
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Read size used when an upload has to be copied into memory
+CHUNK_SIZE = 256 * 1024
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class UploadLimitError(Exception):
+    """Raised when an upload exceeds the configured count or byte limits"""
+
+    def __init__(self, message: str, status_code: int = 413):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process right now"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        # No procfs (macOS/Windows): fall back to the lifetime peak
+        return max_rss_bytes()
+
+
+def max_rss_bytes() -> int:
+    """Peak resident set size of this process since start"""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemoryTracker:
+    """
+    Samples RSS at pipeline checkpoints to report per-request peak memory
+
+    Sampling only happens at stage boundaries, so the reported peak is a
+    lower bound; the process-wide peak is included for comparison.
+    """
+
+    def __init__(self):
+        self.start = current_rss_bytes()
+        self.peak = self.start
+        self.checkpoints: Dict[str, int] = {}
+
+    def sample(self, label: Optional[str] = None) -> int:
+        """Record current RSS, optionally under a checkpoint label"""
+        rss = current_rss_bytes()
+        if rss > self.peak:
+            self.peak = rss
+        if label:
+            self.checkpoints[label] = rss
+        return rss
+
+    def report(self) -> Dict[str, Any]:
+        """Summary in megabytes"""
+        mb = 1024 * 1024
+        self.sample()
+        return {
+            "rss_start_mb": round(self.start / mb, 1),
+            "peak_rss_mb": round(self.peak / mb, 1),
+            "peak_delta_mb": round((self.peak - self.start) / mb, 1),
+            "process_max_rss_mb": round(max_rss_bytes() / mb, 1),
+            "checkpoints_mb": {k: round(v / mb, 1) for k, v in self.checkpoints.items()},
+        }
+
+
+class UploadIngestor:
+    """
+    Validates upload sizes and yields decoded images one at a time
+
+    Starlette spools each multipart file to a SpooledTemporaryFile (memory
+    up to 1 MB, disk beyond). Instead of read()-ing the whole file into a new
+    bytes object, the decoder reads from the spool's own buffer: the BytesIO
+    buffer for small files, or a read-only mmap of the temp file for large
+    ones. Each buffer is released and the upload closed right after decoding.
+    """
+
+    def __init__(
+        self,
+        max_files: int = 10,
+        max_file_bytes: int = 15 * 1024 * 1024,
+        max_total_bytes: int = 60 * 1024 * 1024,
+    ):
+        """
+        Args:
+            max_files: Maximum number of images per request
+            max_file_bytes: Maximum size of a single image file
+            max_total_bytes: Maximum combined size of all images in a request
+        """
+        self.max_files = max_files
+        self.max_file_bytes = max_file_bytes
+        self.max_total_bytes = max_total_bytes
+
+    def check_content_length(self, content_length: Optional[str]):
+        """
+        Reject oversized requests from the Content-Length header alone
+
+        Args:
+            content_length: Raw Content-Length header value
+        """
+        if not content_length or not content_length.isdigit():
+            return
+        # Allow some slack for multipart boundaries and form fields
+        if int(content_length) > self.max_total_bytes + 64 * 1024:
+            raise UploadLimitError(
+                f"Request body exceeds {self.max_total_bytes // (1024 * 1024)} MB limit"
+            )
+
+    def check_uploads(self, uploads: List[Any]) -> List[int]:
+        """
+        Validate count and sizes without reading file contents
+
+        Args:
+            uploads: Starlette UploadFile objects
+
+        Returns:
+            Size in bytes of each upload
+        """
+        if len(uploads) > self.max_files:
+            raise UploadLimitError(f"At most {self.max_files} images are allowed per request")
+
+        sizes = []
+        total = 0
+        for upload in uploads:
+            size = self._upload_size(upload)
+            if size > self.max_file_bytes:
+                raise UploadLimitError(
+                    f"Image '{upload.filename}' exceeds {self.max_file_bytes // (1024 * 1024)} MB limit"
+                )
+            total += size
+            if total > self.max_total_bytes:
+                raise UploadLimitError(
+                    f"Images exceed {self.max_total_bytes // (1024 * 1024)} MB total limit"
+                )
+            sizes.append(size)
+
+        return sizes
+
+    def iter_buffers(self, uploads: List[Any]) -> Iterator[Any]:
+        """
+        Yield a zero-copy buffer for each upload, releasing it afterwards
+
+        Callers must drop every reference into the buffer (e.g. numpy views)
+        before advancing the iterator.
+
+        Args:
+            uploads: Starlette UploadFile objects (already size-checked)
+        """
+        for upload in uploads:
+            buffer, release = self._open_buffer(upload.file)
+            try:
+                yield buffer
+            finally:
+                release()
+                upload.file.close()
+
+    def decode_images(self, uploads: List[Any], tracker: Optional[MemoryTracker] = None) -> List[np.ndarray]:
+        """
+        Check limits and decode each upload, freeing raw bytes immediately
+
+        Args:
+            uploads: Starlette UploadFile objects
+            tracker: Optional memory tracker to sample after each decode
+
+        Returns:
+            Decoded BGR images (undecodable uploads are skipped)
+        """
+        self.check_uploads(uploads)
+
+        images = []
+        for buffer in self.iter_buffers(uploads):
+            img = decode_buffer(buffer)
+            if img is not None:
+                images.append(img)
+            if tracker is not None:
+                tracker.sample()
+
+        return images
+
+    def _upload_size(self, upload: Any) -> int:
+        """Size of a spooled upload via seek/tell"""
+        if getattr(upload, "size", None) is not None:
+            return upload.size
+        f = upload.file
+        position = f.tell()
+        f.seek(0, io.SEEK_END)
+        size = f.tell()
+        f.seek(position)
+        return size
+
+    def _open_buffer(self, f: Any):
+        """Return (buffer, release) for the spool backing an upload"""
+        f.seek(0)
+        inner = getattr(f, "_file", f)
+
+        if isinstance(inner, io.BytesIO):
+            view = inner.getbuffer()
+            return view, view.release
+
+        try:
+            fileno = inner.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            fileno = None
+
+        if fileno is not None and os.fstat(fileno).st_size > 0:
+            mapped = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+            return mapped, mapped.close
+
+        # Unknown file object: copy in bounded chunks
+        data = bytearray()
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            data.extend(chunk)
+            if len(data) > self.max_file_bytes:
+                raise UploadLimitError(
+                    f"Image exceeds {self.max_file_bytes // (1024 * 1024)} MB limit"
+                )
+        return data, data.clear
+
+
+def decode_buffer(buffer: Any) -> Optional[np.ndarray]:
+    """
+    Decode an encoded image from any buffer-protocol object without copying it
+
+    Args:
+        buffer: bytes, memoryview, bytearray or mmap
+
+    Returns:
+        BGR image or None if the data is not a decodable image
+    """
+    if len(buffer) == 0:
+        return None
+    try:
+        arr = np.frombuffer(buffer, np.uint8)
+        img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
+        # Drop the view so the underlying buffer can be released
+        del arr
+        return img
+    except Exception as e:
+        print(f"Image conversion error: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    print("Upload ingestion module loaded successfully")
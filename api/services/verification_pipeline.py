@@ -0,0 +1,416 @@
+"""
+Verification Pipeline
+Runs the full barcode -> OCR -> GS1 -> CDSCO -> authenticity flow on decoded images
+"""
+
+import time
+import numpy as np
+from typing import List, Dict, Optional, Any, Iterator
+from .barcode_service import BarcodeService
+from .authenticity_checker import apply_serial_checks, verify_authenticity
+from .container import ServiceContainer
+from .image_processor import ImageProcessor
+from .result_cache import ResultCache, content_digest, lot_payloads
+from .upload_ingest import MemoryTracker, decode_buffer
+from .metrics import collect_stages, time_stage
+from .circuit_breaker import collect_unavailable
+from .tracing import current_span
+from .watchlist import Watchlist, get_watchlist
+from .batch_alerts import BatchAlertIndex, get_batch_alert_index
+from .serial_registry import SerialRegistry, get_serial_registry, serial_scans
+from .drug_catalog import DrugCatalog, get_drug_catalog
+from .scan_history import ScanHistory
+
+
+def decode_image_bytes(data: bytes) -> Optional[np.ndarray]:
+    """Convert uploaded file bytes to OpenCV image"""
+    return decode_buffer(data)
+
+
+class VerificationPipeline:
+    """
+    End-to-end medicine verification shared by the synchronous /verify
+    endpoint and the background job workers
+    """
+
+    def __init__(
+        self,
+        tesseract_cmd: Optional[str] = None,
+        result_cache: Optional[ResultCache] = None,
+        max_frames: Optional[int] = 4,
+        services: Optional[ServiceContainer] = None,
+        watchlist: Optional[Watchlist] = None,
+        batch_alerts: Optional[BatchAlertIndex] = None,
+        serial_registry: Optional[SerialRegistry] = None,
+        catalog: Optional[DrugCatalog] = None,
+        history: Optional[ScanHistory] = None
+    ):
+        """
+        Args:
+            tesseract_cmd: Path to the tesseract binary
+            result_cache: Optional perceptual result cache
+            max_frames: Frames analysed per request after pruning
+            services: Shared service instances (built on first use if omitted)
+            watchlist: Counterfeit watchlist scanned over OCR text and barcodes
+            batch_alerts: Index of NSQ, spurious and recalled batches
+            serial_registry: Store of scanned GTIN+serial pairs for replay detection
+            catalog: Local brand/generic catalog used to correct the OCR product name
+            history: Scan history that every result is queued to (none: not recorded)
+        """
+        self.tesseract_cmd = tesseract_cmd
+        self.result_cache = result_cache
+        self.max_frames = max_frames
+        self.services = services or ServiceContainer(tesseract_cmd=tesseract_cmd)
+        self.watchlist = watchlist or get_watchlist()
+        self.batch_alerts = batch_alerts or get_batch_alert_index()
+        self.serial_registry = serial_registry or get_serial_registry()
+        self.catalog = catalog or get_drug_catalog()
+        self.history = history
+        self.processor = ImageProcessor()
+
+    def verify_image_bytes(self, images: List[Any], memory_tracker: Optional[MemoryTracker] = None) -> Dict[str, Any]:
+        """
+        Decode raw uploads and run the verification pipeline
+
+        Args:
+            images: Raw encoded image files (bytes or any buffer); entries are
+                cleared as they are decoded so raw data is freed early
+            memory_tracker: Optional RSS sampler for this request
+
+        Returns:
+            Verification result (fields of VerificationResponse)
+
+        Raises:
+            ValueError: If none of the uploads could be decoded
+        """
+        cv_images = []
+        for idx in range(len(images)):
+            img = decode_buffer(images[idx])
+            images[idx] = None
+            if img is not None:
+                cv_images.append(img)
+
+        return self.verify_images(cv_images, memory_tracker=memory_tracker)
+
+    def verify_images(
+        self,
+        cv_images: List[np.ndarray],
+        memory_tracker: Optional[MemoryTracker] = None,
+        use_cache: bool = True,
+        location: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Run barcode, OCR, registry lookups and authenticity scoring
+
+        Args:
+            cv_images: Decoded BGR images of the same pack. The list is
+                consumed: frames are removed as soon as they are analysed
+            memory_tracker: Optional RSS sampler for this request
+            use_cache: Set False to always run the full pipeline (e.g. when profiling)
+            location: Store or scanner id, recorded with any serial numbers
+
+        Returns:
+            Verification result (fields of VerificationResponse)
+
+        Raises:
+            ValueError: If no images are provided
+        """
+        if not cv_images:
+            raise ValueError("No valid images provided")
+
+        started = time.perf_counter()
+        with collect_stages() as stages:
+            image_hashes = [self.processor.compute_dhash(img) for img in cv_images]
+            span = current_span()
+            span.set_attribute("image_count", len(cv_images))
+
+            if self.result_cache is None or not use_cache:
+                result = self._run(cv_images, image_hashes, memory_tracker)
+            else:
+                with time_stage("cache_key"):
+                    digests = [content_digest(img) for img in cv_images]
+                result = self.result_cache.get_or_compute(
+                    digests,
+                    image_hashes,
+                    lambda: self._run(cv_images, image_hashes, memory_tracker),
+                    payloads=lambda: self._lot_payloads(cv_images),
+                )
+                cache_info = result.get("raw_data", {}).get("cache", {})
+                span.set_attribute("cache.hit", bool(cache_info.get("hit")))
+                span.set_attribute("cache.match", cache_info.get("match"))
+
+            result = self._check_serials(result, location)
+
+        if self.history is not None:
+            # Queued only: written by the history's background thread
+            self.history.record(result, location, stages, time.perf_counter() - started)
+        return result
+
+    def _lot_payloads(self, cv_images: List[np.ndarray]):
+        """Lot barcodes on the uploads, to confirm a near cache match"""
+        with time_stage("cache_confirm"):
+            barcode_service = self.services.build().barcode_service
+            return lot_payloads(
+                (code["raw_data"], code["parsed"])
+                for img in cv_images for code in barcode_service.detect_and_decode(img)
+            )
+
+    def _check_serials(self, result: Dict[str, Any], location: Optional[str]) -> Dict[str, Any]:
+        """
+        Record every scan of a serialised code and flag replays
+
+        Runs outside the result cache: a re-scan of the same pack must still
+        be counted, and its verdict depends on where it was scanned.
+        """
+        pairs = serial_scans(result.get("raw_data", {}).get("barcodes", []))
+        if not pairs:
+            return result
+
+        with time_stage("serial_check") as span:
+            checks = [self.serial_registry.record(gtin, serial, location) for gtin, serial in pairs]
+            span.set_attribute("replayed", any(c["replay"] for c in checks))
+        return apply_serial_checks(result, checks)
+
+    def _run(
+        self,
+        cv_images: List[np.ndarray],
+        image_hashes: List[int],
+        memory_tracker: Optional[MemoryTracker] = None
+    ) -> Dict[str, Any]:
+        """Run every pipeline stage (cache miss path)"""
+        with time_stage("pipeline_total"), collect_unavailable() as unavailable:
+            result = self._run_stages(cv_images, image_hashes, memory_tracker)
+        # Sources skipped because their circuit was open; such a verdict is
+        # not cached (see ResultCache.get_or_compute)
+        result["raw_data"]["sources_unavailable"] = sorted(set(unavailable))
+        return result
+
+    def _run_stages(
+        self,
+        cv_images: List[np.ndarray],
+        image_hashes: List[int],
+        memory_tracker: Optional[MemoryTracker] = None
+    ) -> Dict[str, Any]:
+        # Step 1b: Drop near-duplicate and unusable frames, best frames first
+        with time_stage("frame_selection") as span:
+            frames = self.processor.select_frames(cv_images, max_frames=self.max_frames)
+            span.set_attribute("frames_in", len(cv_images))
+            span.set_attribute("frames_selected", sum(1 for f in frames if f["selected"]))
+        selected_images = [cv_images[f["index"]] for f in frames if f["selected"]]
+        print(f"Selected {len(selected_images)} of {len(cv_images)} frames")
+
+        # Release dropped frames now; selected ones are freed one by one below
+        cv_images.clear()
+
+        # Steps 2-3: Barcodes then OCR, one frame at a time
+        print("Step 2-3: Detecting barcodes and performing OCR...")
+        services = self.services.build()
+        barcode_service = services.barcode_service
+        ocr_service = services.ocr_service
+        all_barcodes = []
+
+        ocr_results = ocr_service.extract_from_multiple_images(
+            self._analyse_frames(selected_images, barcode_service, all_barcodes, memory_tracker)
+        )
+
+        gtin = None
+        barcode_expiry = None
+        batch_from_barcode = None
+
+        # Extract GTIN and other info
+        for code in all_barcodes:
+            if code["parsed"].get("gtin") and not gtin:
+                gtin = code["parsed"]["gtin"]
+            if code["parsed"].get("expiry") and not barcode_expiry:
+                barcode_expiry = code["parsed"]["expiry"]
+            if code["parsed"].get("batch") and not batch_from_barcode:
+                batch_from_barcode = code["parsed"]["batch"]
+
+        print(f"Found {len(all_barcodes)} barcodes, GTIN: {gtin}")
+
+        # Extract key information from OCR
+        ocr_expiry = ocr_results.get("expiry_date", {}).get("date") if ocr_results.get("expiry_date") else None
+        ocr_batch = ocr_results.get("batch_number")
+        product_name = ocr_results.get("product_name")
+
+        print(f"OCR - Product: {product_name}, Expiry: {ocr_expiry}, Batch: {ocr_batch}")
+
+        # Step 3b: Match every OCR line against the local drug catalog; a
+        # confident match replaces the OCR guess at the product name
+        ocr_product_name = product_name
+        with time_stage("catalog_lookup") as span:
+            catalog_matches = self.catalog.match_lines(
+                line for t in ocr_results.get("all_texts", []) for line in t["text"].splitlines()
+            )
+            span.set_attribute("matches", len(catalog_matches))
+        catalog_match = catalog_matches[0] if catalog_matches else None
+        if catalog_match:
+            product_name = catalog_match["brand"] or catalog_match["generic"]
+            print(f"Catalog - Product: {product_name} (score {catalog_match['score']})")
+
+        # Scan all pack text, not just the extracted fields, for watchlist terms
+        with time_stage("watchlist_scan") as span:
+            watchlist_hits = self.watchlist.scan(
+                [(f"ocr:{t['image_index']}", t["text"]) for t in ocr_results.get("all_texts", [])]
+                + [(f"barcode:{i}", bc["raw_data"]) for i, bc in enumerate(all_barcodes)]
+                + [(f"barcode:{i}:batch", bc["parsed"].get("batch")) for i, bc in enumerate(all_barcodes)]
+            )
+            span.set_attribute("matches", len(watchlist_hits))
+
+        # Step 4: Determine final expiry date (prefer barcode, fallback to OCR)
+        final_expiry = barcode_expiry or ocr_expiry
+        final_batch = batch_from_barcode or ocr_batch
+
+        # Step 4b: Check the batch against CDSCO alert lists
+        batch_alert = None
+        if final_batch:
+            with time_stage("batch_alert_lookup") as span:
+                batch_alert = self.batch_alerts.check(product_name, final_batch)
+                span.set_attribute("listed", batch_alert["listed"])
+
+        # Step 5: Verify GTIN against GS1 database
+        print("Step 5: Verifying GTIN with GS1...")
+        gs1_data = None
+        if gtin:
+            gs1_scraper = services.gs1_scraper
+            with time_stage("gs1_lookup") as span:
+                gs1_data = gs1_scraper.verify_gtin(gtin)
+                span.set_attribute("found", bool(gs1_data.get("found")))
+            print(f"GS1 verification: {gs1_data}")
+
+        # Step 6: Check regulatory database (CDSCO)
+        print("Step 6: Checking CDSCO...")
+        cdsco_data = None
+        if product_name or gtin:
+            cdsco_scraper = services.cdsco_scraper
+            manufacturer = gs1_data.get("company_name") if gs1_data else None
+            with time_stage("cdsco_lookup"):
+                cdsco_data = cdsco_scraper.search_drug(
+                    drug_name=product_name,
+                    license_number=None,  # Would need to extract from packaging
+                    manufacturer=manufacturer
+                )
+
+            # Check for counterfeit alerts
+            if product_name or manufacturer:
+                with time_stage("counterfeit_alerts"):
+                    alerts = cdsco_scraper.check_counterfeit_alerts(product_name, manufacturer)
+                if alerts:
+                    if not cdsco_data:
+                        cdsco_data = {}
+                    cdsco_data["warnings"] = alerts
+
+            print(f"CDSCO verification: {cdsco_data}")
+
+        # Step 7: Perform comprehensive authenticity check
+        print("Step 7: Performing authenticity check...")
+        with time_stage("authenticity_scoring") as span:
+            authenticity_result = verify_authenticity(
+                gtin=gtin,
+                expiry_date=final_expiry,
+                batch_number=final_batch,
+                product_name=product_name,
+                gs1_data=gs1_data,
+                cdsco_data=cdsco_data,
+                ocr_data=ocr_results,
+                watchlist_hits=watchlist_hits,
+                batch_alert=batch_alert,
+                catalog_match=catalog_match
+            )
+            span.set_attribute("status", authenticity_result["status"])
+            span.set_attribute("risk_level", authenticity_result["risk_level"])
+
+        print(f"Authenticity result: {authenticity_result['status']}, Risk: {authenticity_result['risk_level']}")
+
+        if memory_tracker is not None:
+            memory_tracker.sample("after_scoring")
+
+        # Step 8: Build response
+        manufacturer = None
+        country = None
+
+        if gs1_data and gs1_data.get("found"):
+            manufacturer = gs1_data.get("company_name")
+            country = gs1_data.get("country")
+
+        return {
+            "status": authenticity_result["status"],
+            "risk_level": authenticity_result["risk_level"],
+            "is_expired": authenticity_result["is_expired"],
+            "expiry_date": authenticity_result["expiry_date"],
+            "gtin": gtin,
+            "gtin_verified": authenticity_result["gtin_verified"],
+            "product_name": product_name,
+            "batch_number": final_batch,
+            "manufacturer": manufacturer,
+            "country": country,
+            "risk_factors": authenticity_result["risk_factors"],
+            "recommendations": authenticity_result["recommendations"],
+            "details": authenticity_result["details"],
+            "raw_data": {
+                "barcodes": [
+                    {
+                        "type": bc["type"],
+                        "data": bc["raw_data"],
+                        "parsed": bc["parsed"]
+                    }
+                    for bc in all_barcodes
+                ],
+                "ocr_texts": [
+                    {
+                        "text_preview": t["text"][:200] + "..." if len(t["text"]) > 200 else t["text"],
+                        "quality_score": t["quality"]["quality_score"]
+                    }
+                    for t in ocr_results.get("all_texts", [])
+                ],
+                "catalog": {
+                    "ocr_product_name": ocr_product_name,
+                    "matches": catalog_matches
+                },
+                "gs1_verification": gs1_data,
+                "cdsco_verification": cdsco_data,
+                "image_hashes": [f"{h:016x}" for h in image_hashes],
+                "frames": [
+                    {
+                        "index": f["index"],
+                        "score": f["score"],
+                        "usable": f["usable"],
+                        "reasons": f["reasons"],
+                        "selected": f["selected"],
+                        "dropped": f.get("dropped")
+                    }
+                    for f in frames
+                ],
+                "cache": {"hit": False}
+            }
+        }
+
+    def _analyse_frames(
+        self,
+        frames: List[np.ndarray],
+        barcode_service: BarcodeService,
+        barcodes: List[Dict[str, Any]],
+        memory_tracker: Optional[MemoryTracker]
+    ) -> Iterator[np.ndarray]:
+        """
+        Decode barcodes on each frame and hand it to OCR, then drop it
+
+        Frames are popped from the list so that once OCR moves on to the
+        next frame, nothing references the previous one any more.
+        """
+        idx = 0
+        while frames:
+            frame = frames.pop(0)
+            with time_stage("barcode") as span:
+                span.set_attribute("image.width", frame.shape[1])
+                span.set_attribute("image.height", frame.shape[0])
+                barcodes.extend(barcode_service.detect_and_decode(frame))
+            yield frame
+            del frame
+            if memory_tracker is not None:
+                memory_tracker.sample(f"frame_{idx}")
+            idx += 1
+
+
+if __name__ == "__main__":
+    print("Verification pipeline module loaded successfully")
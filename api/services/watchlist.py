@@ -0,0 +1,350 @@
+"""
+Counterfeit Watchlist
+Aho-Corasick scan of OCR text and barcode payloads for recalled products, spurious batches and fake manufacturers
+"""
+
+import csv
+import glob
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Any, Iterable, Tuple
+
+from .metrics import WATCHLIST_MATCHES
+
+
+CATEGORIES = ("product", "batch", "manufacturer", "term")
+SEVERITIES = ("CRITICAL", "HIGH", "MEDIUM", "LOW")
+
+# Matches reported per request; a garbled pack can repeat a term many times
+MAX_MATCHES = 50
+
+
+def normalize_text(text: str) -> Tuple[str, List[int]]:
+    """
+    Lower-case text and collapse every run of non-alphanumerics to one space
+
+    Args:
+        text: Raw text
+
+    Returns:
+        (normalized, offsets): offsets[i] is the index in text of normalized[i]
+    """
+    chars: List[str] = []
+    offsets: List[int] = []
+    gap = False
+    for i, ch in enumerate(text):
+        if ch.isalnum():
+            if gap and chars:
+                chars.append(" ")
+                offsets.append(i)
+            gap = False
+            chars.append(ch.lower()[0])
+            offsets.append(i)
+        else:
+            gap = True
+    return "".join(chars), offsets
+
+
+class _Automaton:
+    """
+    Aho-Corasick automaton over normalized watchlist terms
+
+    States are integers; goto[s] maps a character to the next state, fail[s]
+    is the longest proper suffix state and out[s] lists the terms (by index)
+    ending at s, including those inherited through fail links.
+    """
+
+    def __init__(self, entries: List[Dict[str, str]]):
+        self.entries = entries
+        self.lengths = [len(e["normalized"]) for e in entries]
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[Tuple[int, ...]] = [()]
+
+        outputs: List[List[int]] = [[]]
+        for idx, entry in enumerate(entries):
+            state = 0
+            for ch in entry["normalized"]:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    outputs.append([])
+                state = nxt
+            outputs[state].append(idx)
+
+        # Breadth-first so that fail[] of shallower states is final first
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                outputs[nxt].extend(outputs[self.fail[nxt]])
+
+        self.out = [tuple(o) for o in outputs]
+
+    @property
+    def states(self) -> int:
+        return len(self.goto)
+
+    def find(self, text: str) -> Iterable[Tuple[int, int, int]]:
+        """
+        Yield (term index, start, end) of every whole-word occurrence
+
+        Args:
+            text: Normalized text (see normalize_text)
+        """
+        goto, fail, out, lengths = self.goto, self.fail, self.out, self.lengths
+        n = len(text)
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if not out[state]:
+                continue
+            end = i + 1
+            if end < n and text[end] != " ":
+                continue
+            for idx in out[state]:
+                start = end - lengths[idx]
+                if start == 0 or text[start - 1] == " ":
+                    yield idx, start, end
+
+
+def watchlist_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Complete one watchlist term: validated category and severity, note and source_file default to None"""
+    category = (entry.get("category") or "").lower()
+    severity = (entry.get("severity") or "").upper()
+    return dict(
+        entry,
+        category=category if category in CATEGORIES else "term",
+        severity=severity if severity in SEVERITIES else "HIGH",
+        note=entry.get("note") or None,
+        source_file=entry.get("source_file"),
+    )
+
+
+def read_watchlist_csv(path: str) -> List[Dict[str, str]]:
+    """
+    Read watchlist terms from a CSV file
+
+    Columns: term (required), category (product/batch/manufacturer),
+    severity (CRITICAL/HIGH/MEDIUM/LOW) and note.
+    """
+    entries = []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+            term = row.get("term")
+            if not term:
+                continue
+            entries.append(watchlist_entry({
+                "term": term,
+                "category": row.get("category"),
+                "severity": row.get("severity"),
+                "note": row.get("note"),
+                "source_file": os.path.basename(path),
+            }))
+    return entries
+
+
+class Watchlist:
+    """
+    Compiled watchlist of counterfeit indicators
+
+    Terms come from the CSV files in data_dir. A watcher thread notices when
+    a file is added, removed or modified and compiles a new automaton in the
+    background; scans keep using the previous one until it is swapped in.
+    """
+
+    def __init__(self, data_dir: str = "var/watchlist"):
+        """
+        Args:
+            data_dir: Folder of watchlist CSV files
+        """
+        self.data_dir = data_dir
+        self._automaton: Optional[_Automaton] = None
+        self._signature: Optional[Tuple] = None
+        self._built_at: Optional[float] = None
+        self._build_seconds: Optional[float] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self._listeners: List[Callable[[], None]] = []
+
+    def add_listener(self, callback: Callable[[], None]):
+        """Call `callback` after every rebuild (e.g. to drop cached verdicts)"""
+        self._listeners.append(callback)
+
+    def rebuild(self, entries: Optional[List[Dict[str, Any]]] = None) -> int:
+        """
+        Compile a new automaton and swap it in
+
+        Args:
+            entries: Terms to compile (default: read the CSV files in data_dir);
+                only "term" is required, see watchlist_entry()
+
+        Returns:
+            Number of distinct terms compiled
+        """
+        start = time.perf_counter()
+        signature = self._files_signature()
+        if entries is None:
+            entries = []
+            for path in sorted(glob.glob(os.path.join(self.data_dir, "*.csv"))):
+                try:
+                    entries.extend(read_watchlist_csv(path))
+                except (OSError, csv.Error, UnicodeDecodeError) as e:
+                    print(f"Watchlist: skipping {path}: {e}")
+
+        # One automaton output per normalized term; the first entry wins
+        unique: Dict[str, Dict[str, Any]] = {}
+        for entry in entries:
+            normalized, _ = normalize_text(entry.get("term") or "")
+            if normalized and normalized not in unique:
+                unique[normalized] = dict(watchlist_entry(entry), normalized=normalized)
+
+        automaton = _Automaton(list(unique.values()))
+        with self._lock:
+            self._automaton = automaton
+            self._signature = signature
+            self._built_at = time.time()
+            self._build_seconds = round(time.perf_counter() - start, 4)
+
+        for callback in self._listeners:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Watchlist listener error: {e}")
+        return len(unique)
+
+    def refresh(self) -> bool:
+        """
+        Rebuild if the watchlist files changed since the last build
+
+        Returns:
+            True if the automaton was rebuilt
+        """
+        if self._automaton is not None and self._files_signature() == self._signature:
+            return False
+        count = self.rebuild()
+        print(f"Watchlist compiled with {count} terms")
+        return True
+
+    def scan(self, sources: Iterable[Tuple[str, str]], limit: int = MAX_MATCHES) -> List[Dict[str, Any]]:
+        """
+        Find watchlist terms in a request's texts
+
+        Args:
+            sources: (source label, text) pairs, e.g. ("ocr:0", text)
+            limit: Maximum matches to return
+
+        Returns:
+            Matches with term, category, severity, source and the start/end
+            offsets and matched text in the original source text
+        """
+        automaton = self._automaton
+        if automaton is None or not automaton.entries:
+            return []
+
+        matches = []
+        seen = set()
+        for source, text in sources:
+            if not text:
+                continue
+            normalized, offsets = normalize_text(text)
+            for idx, start, end in automaton.find(normalized):
+                begin, finish = offsets[start], offsets[end - 1] + 1
+                if (idx, source, begin) in seen:
+                    continue
+                seen.add((idx, source, begin))
+                entry = automaton.entries[idx]
+                WATCHLIST_MATCHES.inc(category=entry["category"])
+                matches.append({
+                    "term": entry["term"],
+                    "category": entry["category"],
+                    "severity": entry["severity"],
+                    "note": entry["note"],
+                    "source": source,
+                    "start": begin,
+                    "end": finish,
+                    "matched_text": text[begin:finish],
+                })
+                if len(matches) >= limit:
+                    return matches
+        return matches
+
+    def start_watcher(self, interval: float = 60.0):
+        """Check the watchlist folder for changes every `interval` seconds"""
+        os.makedirs(self.data_dir, exist_ok=True)
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="watchlist", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def stats(self) -> Dict[str, Any]:
+        automaton = self._automaton
+        return {
+            "terms": len(automaton.entries) if automaton else 0,
+            "states": automaton.states if automaton else 0,
+            "built_at": self._built_at,
+            "build_seconds": self._build_seconds,
+        }
+
+    def _watch(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Watchlist refresh error: {e}")
+
+    def _files_signature(self) -> Tuple:
+        signature = []
+        for path in sorted(glob.glob(os.path.join(self.data_dir, "*.csv"))):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            signature.append((path, st.st_mtime_ns, st.st_size))
+        return tuple(signature)
+
+
+# Singleton instance
+_watchlist = None
+
+
+def get_watchlist() -> Watchlist:
+    """Get singleton watchlist (CSV folder from WATCHLIST_DIR)"""
+    global _watchlist
+    if _watchlist is None:
+        _watchlist = Watchlist(os.getenv("WATCHLIST_DIR", "var/watchlist"))
+    return _watchlist
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) >= 2 and sys.argv[1] == "scan":
+        watchlist = get_watchlist()
+        watchlist.refresh()
+        text = " ".join(sys.argv[2:]) or sys.stdin.read()
+        for match in watchlist.scan([("input", text)]):
+            print(match)
+    else:
+        print("Watchlist module loaded successfully")
+        print("Usage: python -m services.watchlist scan [text]")
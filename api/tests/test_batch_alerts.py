@@ -0,0 +1,59 @@
+"""
+Batch Alert Index Tests
+Product-confirmed matches and drop ingests seen by every worker sharing the store
+"""
+
+import os
+
+from services.batch_alerts import BatchAlertIndex
+
+
+def drop(data_dir, name, rows):
+    drops = os.path.join(data_dir, "drops")
+    os.makedirs(drops, exist_ok=True)
+    with open(os.path.join(drops, name), "w") as f:
+        f.write("Name of the Drug,Batch No.,Manufacturer\n" + "".join(",".join(row) + "\n" for row in rows))
+
+
+def test_listed_requires_product_match(tmp_path):
+    data_dir = str(tmp_path)
+    drop(data_dir, "nsq-2026-09.csv", [("Dolo 650", "AB1234", "Micro Labs")])
+    index = BatchAlertIndex(data_dir)
+    index.refresh_from_drops()
+
+    assert index.check("DOLO 650 Tablets", "AB1234")["listed"]
+    assert not index.check("Crocin", "AB1234")["listed"]
+    assert index.check(None, "AB1234")["unconfirmed"]
+    assert not index.check("Dolo 650", "ZZ9999")["matches"]
+
+
+def test_ingest_by_one_worker_reaches_the_others(tmp_path):
+    data_dir = str(tmp_path)
+    first, second = BatchAlertIndex(data_dir), BatchAlertIndex(data_dir)
+    invalidated = []
+    second.add_listener(lambda: invalidated.append(True))
+
+    drop(data_dir, "nsq-2026-09.csv", [("Dolo 650", "AB1234", "Micro Labs")])
+    assert first.refresh_from_drops()
+    assert second.refresh_from_drops()
+
+    assert first.check("DOLO 650", "AB1234")["listed"]
+    assert second.check("DOLO 650", "AB1234")["listed"]
+    assert invalidated == [True]
+    assert not second.refresh_from_drops()
+
+
+def test_corrected_list_drops_removed_rows_everywhere(tmp_path):
+    data_dir = str(tmp_path)
+    drop(data_dir, "recall.csv", [("Dolo 650", "AB1234", "Micro Labs"), ("Crocin", "CR0001", "GSK")])
+    first, second = BatchAlertIndex(data_dir), BatchAlertIndex(data_dir)
+    first.refresh_from_drops()
+    second.refresh_from_drops()
+
+    drop(data_dir, "recall.csv", [("Crocin", "CR0001", "GSK")])
+    os.utime(os.path.join(data_dir, "drops", "recall.csv"), ns=(1, 1))
+    first.refresh_from_drops()
+    second.refresh_from_drops()
+
+    assert not second.check("Dolo 650", "AB1234")["listed"]
+    assert second.check("Crocin", "CR0001")["listed"]
@@ -0,0 +1,278 @@
+"""
+Cache Backend Tests
+Memory, SQLite and Redis (against an in-memory fake client) behind the same contract
+"""
+
+import fnmatch
+
+import pytest
+
+from services import cache_backend
+from services.cache_backend import MemoryBackend, RedisBackend, SQLiteBackend, dumps, loads
+
+
+class Clock:
+    """Stand-in for time.time() that tests move forward by hand"""
+
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+class FakeRedis:
+    """
+    The part of redis.Redis that RedisBackend uses, held in a dict
+
+    Expiry follows the shared Clock, so hard TTLs can be tested without
+    sleeping. Round trips are counted to check that batches stay batched.
+    """
+
+    def __init__(self, clock: Clock):
+        self.clock = clock
+        self.data = {}  # key -> (value, expires at or None)
+        self.round_trips = 0
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= self.clock():
+            del self.data[key]
+            return None
+        return value
+
+    def mget(self, keys):
+        self.round_trips += 1
+        return [self._live(key) for key in keys]
+
+    def set(self, key, value, px=None):
+        self.data[key] = (bytes(value), self.clock() + px / 1000 if px is not None else None)
+        return True
+
+    def delete(self, *keys):
+        self.round_trips += 1
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def scan_iter(self, match="*", count=None):
+        for key in list(self.data):
+            if fnmatch.fnmatchcase(key, match) and self._live(key) is not None:
+                yield key
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client: FakeRedis):
+        self.client = client
+        self.commands = []
+
+    def set(self, key, value, px=None):
+        self.commands.append((key, value, px))
+        return self
+
+    def execute(self):
+        self.client.round_trips += 1
+        results = [self.client.set(key, value, px=px) for key, value, px in self.commands]
+        self.commands = []
+        return results
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_backend.time, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, clock, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend(max_entries=100)
+    if request.param == "sqlite":
+        return SQLiteBackend(str(tmp_path / "cache.db"))
+    return RedisBackend(prefix="test", client=FakeRedis(clock))
+
+
+# ----------------------------------------------------------------------
+# Shared contract
+# ----------------------------------------------------------------------
+
+def test_set_then_get_returns_soft_expiry_and_value(backend, clock):
+    backend.set("gs1", "8901234567890", {"found": True, "name": "Dolo 650"}, ttl_seconds=60)
+
+    soft, value = backend.get("gs1", "8901234567890")
+
+    assert soft == pytest.approx(clock() + 60)
+    assert value == {"found": True, "name": "Dolo 650"}
+
+
+def test_get_returns_a_copy(backend):
+    backend.set("gs1", "k", {"sources": ["a"]}, ttl_seconds=60)
+
+    backend.get("gs1", "k")[1]["sources"].append("b")
+
+    assert backend.get("gs1", "k")[1] == {"sources": ["a"]}
+
+
+def test_get_many_returns_only_present_keys(backend):
+    backend.set_many("gs1", {"a": 1, "b": [2], "c": {"v": 3}}, ttl_seconds=60)
+
+    found = backend.get_many("gs1", ["a", "c", "missing"])
+
+    assert {key: value for key, (_, value) in found.items()} == {"a": 1, "c": {"v": 3}}
+    assert backend.get_many("gs1", []) == {}
+    assert backend.get("gs1", "missing") is None
+
+
+def test_set_many_overwrites_existing_keys(backend, clock):
+    backend.set_many("gs1", {"a": 1, "b": 2}, ttl_seconds=60)
+    clock.advance(30)
+    backend.set_many("gs1", {"b": 20}, ttl_seconds=60)
+
+    found = backend.get_many("gs1", ["a", "b"])
+
+    assert found["a"] == (pytest.approx(clock() + 30), 1)
+    assert found["b"] == (pytest.approx(clock() + 60), 20)
+
+
+def test_stale_entry_served_until_hard_expiry(backend, clock):
+    backend.set("gs1", "k", "v", ttl_seconds=60, stale_seconds=30)
+
+    clock.advance(75)
+    soft, value = backend.get("gs1", "k")
+    assert soft < clock() and value == "v"
+
+    clock.advance(16)
+    assert backend.get("gs1", "k") is None
+
+
+def test_entry_without_stale_window_expires_at_ttl(backend, clock):
+    backend.set("gs1", "k", "v", ttl_seconds=60)
+
+    clock.advance(59)
+    assert backend.get("gs1", "k") is not None
+    clock.advance(2)
+    assert backend.get("gs1", "k") is None
+
+
+def test_namespaces_are_isolated(backend):
+    backend.set("gs1", "k", "gs1 value", ttl_seconds=60)
+    backend.set("cdsco", "k", "cdsco value", ttl_seconds=60)
+
+    backend.clear("gs1")
+
+    assert backend.get("gs1", "k") is None
+    assert backend.get("cdsco", "k")[1] == "cdsco value"
+
+
+def test_delete_removes_one_key(backend):
+    backend.set_many("gs1", {"a": 1, "b": 2}, ttl_seconds=60)
+
+    backend.delete("gs1", "a")
+    backend.delete("gs1", "never-set")
+
+    assert set(backend.get_many("gs1", ["a", "b"])) == {"b"}
+
+
+# ----------------------------------------------------------------------
+# Backend specifics
+# ----------------------------------------------------------------------
+
+def test_memory_backend_evicts_least_recently_used(clock):
+    backend = MemoryBackend(max_entries=2)
+    backend.set("ns", "a", 1, ttl_seconds=60)
+    backend.set("ns", "b", 2, ttl_seconds=60)
+    backend.get("ns", "a")
+
+    backend.set("ns", "c", 3, ttl_seconds=60)
+
+    assert set(backend.get_many("ns", ["a", "b", "c"])) == {"a", "c"}
+    assert backend.stats()["entries"] == 2
+
+
+def test_memory_backend_drops_expired_entries_on_read(clock):
+    backend = MemoryBackend()
+    backend.set("ns", "a", 1, ttl_seconds=10)
+
+    clock.advance(11)
+
+    assert backend.get("ns", "a") is None
+    assert backend.stats()["entries"] == 0
+
+
+def test_sqlite_backend_purges_expired_rows(clock, tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.db"), purge_every=3)
+    backend.set_many("ns", {"old-1": 1, "old-2": 2}, ttl_seconds=10)
+
+    clock.advance(11)
+    backend.set("ns", "new", 3, ttl_seconds=10)
+
+    assert backend.stats()["entries"] == {"ns": 1}
+
+
+def test_sqlite_backend_get_many_beyond_parameter_limit(clock, tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.db"))
+    items = {f"gtin-{i}": i for i in range(1200)}
+    backend.set_many("gs1", items, ttl_seconds=60)
+
+    found = backend.get_many("gs1", list(items) + ["missing"])
+
+    assert {key: value for key, (_, value) in found.items()} == items
+
+
+def test_sqlite_backend_shared_between_instances(clock, tmp_path):
+    path = str(tmp_path / "cache.db")
+    SQLiteBackend(path).set("gs1", "k", {"found": True}, ttl_seconds=60)
+
+    assert SQLiteBackend(path).get("gs1", "k")[1] == {"found": True}
+
+
+def test_redis_backend_batches_round_trips(clock):
+    client = FakeRedis(clock)
+    backend = RedisBackend(prefix="test", client=client)
+
+    backend.set_many("gs1", {f"k{i}": i for i in range(50)}, ttl_seconds=60)
+    found = backend.get_many("gs1", [f"k{i}" for i in range(60)])
+
+    assert len(found) == 50
+    assert client.round_trips == 2
+
+
+def test_redis_backend_key_layout_and_hard_ttl(clock):
+    client = FakeRedis(clock)
+    backend = RedisBackend(prefix="test", client=client)
+
+    backend.set("gs1", "8901234567890", "v", ttl_seconds=60, stale_seconds=30)
+
+    value, expires = client.data["test:gs1:8901234567890"]
+    assert expires == pytest.approx(clock() + 90)
+    assert loads(value[cache_backend._HEADER.size:]) == "v"
+
+
+def test_redis_backend_clear_leaves_other_prefixes(clock):
+    client = FakeRedis(clock)
+    ours = RedisBackend(prefix="test", client=client)
+    theirs = RedisBackend(prefix="other", client=client)
+    ours.set_many("gs1", {f"k{i}": i for i in range(2500)}, ttl_seconds=60)
+    theirs.set("gs1", "k0", "kept", ttl_seconds=60)
+
+    ours.clear("gs1")
+
+    assert ours.get_many("gs1", [f"k{i}" for i in range(2500)]) == {}
+    assert theirs.get("gs1", "k0")[1] == "kept"
+
+
+def test_json_fallback_round_trip(monkeypatch):
+    monkeypatch.setattr(cache_backend, "msgpack", None)
+
+    data = dumps({"gtin": "8901234567890", "sources": [1, 2.5, None]})
+
+    assert data[:1] == b"j"
+    assert loads(data) == {"gtin": "8901234567890", "sources": [1, 2.5, None]}
@@ -0,0 +1,69 @@
+"""
+CDSCO Index Tests
+Name search by brand/generic, manufacturer ranking and ingests shared between workers
+"""
+
+import os
+
+from services.cdsco_index import CDSCOIndex
+
+
+def drop(data_dir, name, rows):
+    drops = os.path.join(data_dir, "drops")
+    os.makedirs(drops, exist_ok=True)
+    with open(os.path.join(drops, name), "w") as f:
+        f.write("Name of the Drug,Composition,Name of the Firm,Licence No\n")
+        f.write("".join(",".join(row) + "\n" for row in rows))
+
+
+ROWS = [
+    ("Dolo 650", "Paracetamol 650 mg", "Micro Labs Ltd", "KTK/25/123/2010"),
+    ("Amlong 5", "Amlodipine 5 mg", "Micro Labs Ltd", "KTK/25/123/2010"),
+    ("Calpol 650", "Paracetamol 650 mg", "GSK Pharmaceuticals Ltd", "MH/102/55"),
+]
+
+
+def index_with_rows(tmp_path):
+    data_dir = str(tmp_path)
+    drop(data_dir, "approved.csv", ROWS)
+    index = CDSCOIndex(data_dir)
+    index.refresh_from_drops()
+    return index
+
+
+def test_manufacturer_name_alone_is_not_a_match(tmp_path):
+    index = index_with_rows(tmp_path)
+
+    assert index.search_name("Micro Labs") == []
+    assert [r["name"] for r in index.search_name("Dolo 650 Tablets")] == ["Dolo 650"]
+
+
+def test_generic_name_matches(tmp_path):
+    index = index_with_rows(tmp_path)
+
+    assert {r["name"] for r in index.search_name("Paracetamol 650")} == {"Dolo 650", "Calpol 650"}
+
+
+def test_manufacturer_ranks_its_records_first(tmp_path):
+    index = index_with_rows(tmp_path)
+
+    for manufacturer, first in (("GSK Pharmaceuticals", "Calpol 650"), ("Micro Labs Ltd", "Dolo 650")):
+        results = index.search_name("Paracetamol", manufacturer=manufacturer)
+        assert results[0]["name"] == first
+        assert results[0]["manufacturer_match"] is True
+        assert results[1]["manufacturer_match"] is False
+
+
+def test_ingest_by_one_worker_notifies_the_others(tmp_path):
+    data_dir = str(tmp_path)
+    first, second = CDSCOIndex(data_dir), CDSCOIndex(data_dir)
+    cleared = []
+    second.add_listener(lambda: cleared.append(True))
+
+    drop(data_dir, "approved.csv", ROWS)
+    assert first.refresh_from_drops()
+    assert second.refresh_from_drops()
+    assert not second.refresh_from_drops()
+
+    assert cleared == [True]
+    assert second.search_name("Dolo 650")[0]["name"] == "Dolo 650"
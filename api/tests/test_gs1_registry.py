@@ -0,0 +1,76 @@
+"""
+GS1 Registry Tests
+Drop refresh with several worker processes sharing one data folder
+"""
+
+import os
+import time
+
+from services import gs1_registry
+from services.gs1_registry import GS1Registry
+
+
+def drop(data_dir, name, rows):
+    os.makedirs(os.path.join(data_dir, "drops"), exist_ok=True)
+    # Keep drop mtimes strictly after the previous table
+    time.sleep(0.01)
+    with open(os.path.join(data_dir, "drops", name), "w") as f:
+        f.write("prefix,licensee\n" + "".join(f"{prefix},{name}\n" for prefix, name in rows))
+
+
+def test_second_worker_opens_table_compiled_by_first(tmp_path):
+    data_dir = str(tmp_path)
+    drop(data_dir, "a.csv", [("8901234", "Alpha Pharma")])
+    first, second = GS1Registry(data_dir), GS1Registry(data_dir)
+
+    assert first.refresh_from_drops()
+    assert second.refresh_from_drops()
+
+    assert second.stats()["table"] == first.stats()["table"]
+    assert len([p for p in os.listdir(data_dir) if p.endswith(".bin")]) == 1
+    assert not first.refresh_from_drops() and not second.refresh_from_drops()
+
+
+def test_new_drop_reaches_every_worker(tmp_path):
+    data_dir = str(tmp_path)
+    drop(data_dir, "a.csv", [("8901234", "Alpha Pharma")])
+    first, second = GS1Registry(data_dir), GS1Registry(data_dir)
+    first.refresh_from_drops()
+    second.refresh_from_drops()
+
+    drop(data_dir, "b.csv", [("8905555", "Beta Labs")])
+    assert second.refresh_from_drops()
+    assert first.refresh_from_drops()
+
+    assert first.lookup("8905555000003")["licensee"] == "Beta Labs"
+    assert second.lookup("8905555000003")["licensee"] == "Beta Labs"
+
+
+def test_worker_survives_its_table_being_removed(tmp_path, monkeypatch):
+    data_dir = str(tmp_path)
+    drop(data_dir, "a.csv", [("8901234", "Alpha Pharma")])
+    first, second = GS1Registry(data_dir), GS1Registry(data_dir)
+    first.refresh_from_drops()
+    second.refresh_from_drops()
+    monkeypatch.setattr(gs1_registry, "STALE_TABLE_SECONDS", -1)
+
+    drop(data_dir, "b.csv", [("8905555", "Beta Labs")])
+    first.refresh_from_drops()
+    time.sleep(0.01)
+    drop(data_dir, "c.csv", [("8906666", "Gamma Ltd")])
+    first.refresh_from_drops()
+
+    assert not os.path.exists(os.path.join(data_dir, second.stats()["table"]))
+    assert second.lookup("8901234000007")["licensee"] == "Alpha Pharma"
+    assert second.refresh_from_drops()
+    assert second.lookup("8906666000003")["licensee"] == "Gamma Ltd"
+
+
+def test_superseded_tables_kept_for_grace_period(tmp_path):
+    data_dir = str(tmp_path)
+    registry = GS1Registry(data_dir)
+    for i, name in enumerate(("a.csv", "b.csv", "c.csv")):
+        drop(data_dir, name, [(f"890123{i}", name)])
+        registry.refresh_from_drops()
+
+    assert len([p for p in os.listdir(data_dir) if p.endswith(".bin")]) == 3
@@ -0,0 +1,74 @@
+"""
+Job Queue Tests
+Lease ownership of running jobs when several worker processes share one queue
+"""
+
+import threading
+import time
+
+from services.job_queue import JobQueue, FAILED, QUEUED, RUNNING, SUCCEEDED
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_start_leaves_live_workers_jobs_alone(tmp_path):
+    release = threading.Event()
+
+    def handler(images):
+        release.wait(5)
+        return {"ok": True}
+
+    first = JobQueue(handler, data_dir=str(tmp_path), max_workers=1, lease_seconds=0.3)
+    first.start()
+    try:
+        job_id = first.submit([b"image"])
+        assert wait_for(lambda: first.get(job_id)["status"] == RUNNING)
+
+        # Another worker booting later, well past the lease, must not steal it
+        time.sleep(0.6)
+        second = JobQueue(handler, data_dir=str(tmp_path), max_workers=1, lease_seconds=0.3)
+        assert second.recover_expired() == 0
+        assert first.get(job_id)["status"] == RUNNING
+        assert first.get(job_id)["attempts"] == 1
+
+        release.set()
+        assert wait_for(lambda: first.get(job_id)["status"] == SUCCEEDED)
+    finally:
+        release.set()
+        first.stop()
+
+
+def test_expired_lease_is_requeued_and_old_owner_loses_it(tmp_path):
+    first = JobQueue(lambda images: {}, data_dir=str(tmp_path), lease_seconds=0.05)
+    job_id = first.submit([b"image"])
+    assert first._claim_next()["id"] == job_id
+
+    # No heartbeat: the claiming process is treated as dead
+    time.sleep(0.1)
+    second = JobQueue(lambda images: {}, data_dir=str(tmp_path), lease_seconds=0.05)
+    assert second.recover_expired() == 1
+    assert second.get(job_id)["status"] == QUEUED
+
+    assert second._claim_next()["id"] == job_id
+    first._finish(job_id, FAILED, error="late")
+    assert second.get(job_id)["status"] == RUNNING
+    assert second.get(job_id)["attempts"] == 2
+
+
+def test_expired_job_out_of_attempts_fails(tmp_path):
+    queue = JobQueue(lambda images: {}, data_dir=str(tmp_path), max_attempts=1, lease_seconds=0.05)
+    job_id = queue.submit([b"image"])
+    queue._claim_next()
+
+    time.sleep(0.1)
+    assert queue.recover_expired() == 1
+    job = queue.get(job_id)
+    assert job["status"] == FAILED
+    assert job["error"] == "Worker lost after 1 attempts"
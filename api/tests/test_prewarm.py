@@ -0,0 +1,70 @@
+"""
+Pre-warm Tests
+Scheduler election and pass ownership between worker processes sharing PREWARM_DIR
+"""
+
+import time
+
+import pytest
+
+# The scrapers behind Prewarmer need the zbar shared library
+pytest.importorskip("pyzbar.pyzbar", exc_type=ImportError)
+
+from services.prewarm import Prewarmer, prewarm_items  # noqa: E402
+
+
+class _NoServices:
+    def build(self):
+        return self
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_one_worker_runs_the_schedule(tmp_path):
+    loads = []
+
+    def load():
+        loads.append(1)
+        return {}
+
+    workers = [Prewarmer(_NoServices(), data_dir=str(tmp_path)) for _ in range(3)]
+    try:
+        for worker in workers:
+            worker.start_schedule(load, interval=30)
+        assert wait_for(lambda: loads)
+        time.sleep(0.2)
+        assert [worker.status()["scheduler"] for worker in workers].count(True) == 1
+        assert len(loads) == 1
+
+        # Once the scheduler stops, the next worker to look takes over
+        next(worker for worker in workers if worker.is_scheduler()).stop_schedule()
+        successor = Prewarmer(_NoServices(), data_dir=str(tmp_path))
+        workers.append(successor)
+        successor.start_schedule(load, interval=30)
+        assert wait_for(successor.is_scheduler)
+        assert wait_for(lambda: len(loads) == 2)
+    finally:
+        for worker in workers:
+            worker.stop_schedule()
+
+
+def test_pass_name_runs_in_one_worker(tmp_path):
+    first = Prewarmer(_NoServices(), data_dir=str(tmp_path))
+    second = Prewarmer(_NoServices(), data_dir=str(tmp_path))
+    items = prewarm_items(gtins=["not-a-gtin"])
+
+    held = first._lock_pass("nightly")
+    try:
+        assert not second.start(items, name="nightly")
+        assert second.run(items, name="nightly") is None
+        assert second.run(items, name="other")["outcomes"]["invalid"] == 1
+    finally:
+        held.close()
+    assert second.run(items, name="nightly")["outcomes"]["invalid"] == 1
@@ -0,0 +1,100 @@
+"""
+Serial Registry Tests
+First-scan and replay detection, compaction, and worker processes sharing one registry folder
+"""
+
+import time
+
+from services.serial_registry import SerialRegistry
+
+GTIN = "08901234567890"
+DAY = 86400
+
+
+def registry(data_dir, **kwargs):
+    kwargs.setdefault("shards", 2)
+    kwargs.setdefault("initial_slots", 1024)
+    kwargs.setdefault("bloom_capacity", 10_000)
+    return SerialRegistry(data_dir=str(data_dir), **kwargs)
+
+
+def test_record_and_replay(tmp_path):
+    serials = registry(tmp_path, max_scans=3)
+
+    first = serials.record(GTIN, "SN1", "store-a")
+    assert first["first_scan"] and not first["replay"]
+
+    again = serials.record(GTIN, "SN1", "store-a")
+    assert not again["first_scan"] and not again["replay"]
+    assert again["previous_scans"] == 1
+
+    moved = serials.record(GTIN, "SN1", "store-b")
+    assert moved["replay"] and moved["other_location"]
+    assert moved["severity"] == "HIGH"
+
+    serials.record(GTIN, "SN2")
+    serials.record(GTIN, "SN2")
+    serials.record(GTIN, "SN2")
+    assert serials.record(GTIN, "SN2")["replay"]
+
+    assert serials.lookup(GTIN, "SN1")["scans"] == 3
+    assert serials.lookup(GTIN, "SN3") is None
+    serials.close()
+
+
+def test_replay_across_workers(tmp_path):
+    worker_a = registry(tmp_path)
+    worker_b = registry(tmp_path)
+
+    assert worker_a.record(GTIN, "SN1", "store-a")["first_scan"]
+    clone = worker_b.record(GTIN, "SN1", "store-b")
+    assert not clone["first_scan"]
+    assert clone["replay"] and clone["other_location"]
+
+    # B updated A's slot rather than overwriting it
+    assert worker_a.lookup(GTIN, "SN1")["scans"] == 2
+    assert worker_a.lookup(GTIN, "SN1")["locations"] == 2
+    worker_a.close()
+    worker_b.close()
+
+
+def test_growth_by_one_worker_reaches_the_other(tmp_path):
+    worker_a = registry(tmp_path, shards=1)
+    worker_b = registry(tmp_path, shards=1)
+
+    worker_a.record(GTIN, "SN-A", "store-a")
+    # Past MAX_LOAD of 1024 slots: B replaces the table file A has mapped
+    for i in range(1000):
+        worker_b.record(GTIN, f"SN{i}", "store-b")
+    assert worker_b.stats()["serials"] == 1001
+
+    assert worker_a.lookup(GTIN, "SN999")["scans"] == 1
+    assert worker_a.record(GTIN, "SN-A", "store-a")["previous_scans"] == 1
+    assert worker_a.record(GTIN, "SN-NEW", "store-a")["first_scan"]
+    assert worker_b.lookup(GTIN, "SN-NEW")["scans"] == 1
+    assert worker_a.stats()["serials"] == 1002
+    worker_a.close()
+    worker_b.close()
+
+
+def test_compact_forgets_stale_serials(tmp_path):
+    worker_a = registry(tmp_path, window_days=30)
+    worker_b = registry(tmp_path, window_days=30)
+    now = time.time()
+
+    worker_a.record(GTIN, "OLD", "store-a", ts=now - 60 * DAY)
+    worker_a.record(GTIN, "NEW", "store-a", ts=now - DAY)
+    result = worker_a.compact(now=now)
+    assert result["serials_kept"] == 1
+    assert result["segments_removed"] == 1
+
+    assert worker_a.lookup(GTIN, "OLD") is None
+    assert worker_b.lookup(GTIN, "OLD") is None
+    assert worker_b.record(GTIN, "NEW", "store-a", ts=now)["previous_scans"] == 1
+
+    # After compacting, B's rebuilt filter covers what A recorded before
+    worker_b.compact(now=now)
+    assert worker_b.record(GTIN, "NEW", "store-b", ts=now)["replay"]
+    assert worker_a.record(GTIN, "OLD", "store-a", ts=now)["first_scan"]
+    worker_a.close()
+    worker_b.close()